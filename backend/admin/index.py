@@ -4,608 +4,2108 @@ Args: event - dict с httpMethod, body, queryStringParameters
       context - объект с атрибутами request_id, function_name
 Returns: HTTP response с данными или результатом операции
 '''
+import base64
+import bisect
+import contextvars
+import csv
+import datetime
+import decimal
+import functools
+import io
+import gzip
+import hashlib
+import hmac
 import json
 import os
+import select
+import shutil
+import tempfile
+import threading
+import time
+import uuid
 import psycopg2
-from typing import Dict, Any
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values
+from typing import Dict, Any, BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
 
+try:
+    import orjson
+except ImportError:
+    # orjson необязателен: без него ответы кодирует стандартный json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+try:
+    import xlsxwriter
+except ImportError:
+    # Без xlsxwriter выгрузка доступна только в CSV
+    xlsxwriter = None
+
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '4'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+# Пул живет на уровне модуля и переживает тёплые вызовы функции
+_db_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_db_pool_lock = threading.Lock()
+_conn_last_used: Dict[int, float] = {}
+
+def _connection_is_alive(conn: Any) -> bool:
+    """Проверяет, что соединение из пула еще пригодно для работы"""
+    if conn.closed:
+        return False
+    if time.monotonic() - _conn_last_used.get(id(conn), 0.0) < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def get_connection(database_url: str) -> Any:
+    """Берет соединение из пула, при необходимости создавая пул и заменяя мертвые соединения"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool.closed:
+            _db_pool = pg_pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, database_url)
+    
+    for _ in range(DB_POOL_MAX + 1):
+        conn = _db_pool.getconn()
+        if _connection_is_alive(conn):
+            return conn
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError('No healthy database connection available')
+
+def release_connection(conn: Any) -> None:
+    """Возвращает соединение в пул, откатывая незавершенную транзакцию"""
+    if _db_pool is None or _db_pool.closed:
+        return
+    if conn.closed:
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        return
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        return
+    _conn_last_used[id(conn)] = time.monotonic()
+    _db_pool.putconn(conn)
+
+# Метрики запросов: строка JSON в лог на каждый вызов и, если задан METRICS_PROM_FILE, счетчики Prometheus в файле
+METRICS_LOG = os.environ.get('METRICS_LOG', 'full')
+METRICS_PROM_FILE = os.environ.get('METRICS_PROM_FILE')
+METRICS_PROM_FLUSH_SECONDS = float(os.environ.get('METRICS_PROM_FLUSH_SECONDS', '10'))
+METRICS_MAX_STATEMENTS = 50
+METRICS_STATEMENT_CHARS = 120
+
+_request_metrics: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('request_metrics', default=None)
+_metric_totals: Dict[Tuple[str, str, str, int], List[float]] = {}
+_metric_totals_lock = threading.Lock()
+_metrics_flushed_at = 0.0
+
+def statement_label(query: Any) -> str:
+    """Начало SQL-запроса без значений: по нему видно, какой запрос медленный, но не данные клиентов"""
+    text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    text = ' '.join(text.split())
+    values_at = text.upper().find(' VALUES ')
+    if values_at != -1:
+        text = text[:values_at + len(' VALUES')]
+    return text[:METRICS_STATEMENT_CHARS]
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Курсор, который записывает время и число строк каждого запроса в метрики текущего вызова"""
+    
+    def execute(self, query: Any, vars: Any = None) -> None:
+        started = time.perf_counter()
+        try:
+            super().execute(query, vars)
+        finally:
+            metrics = _request_metrics.get()
+            if metrics is not None:
+                elapsed = time.perf_counter() - started
+                rows = max(self.rowcount, 0)
+                metrics['db_seconds'] += elapsed
+                metrics['sql_count'] += 1
+                metrics['rows'] += rows
+                if len(metrics['sql']) < METRICS_MAX_STATEMENTS:
+                    metrics['sql'].append({'ms': round(elapsed * 1000, 2), 'rows': rows, 'statement': statement_label(query)})
+
+def record_connect(seconds: float) -> None:
+    """Время получения соединения из пула (включая создание пула и проверку соединения)"""
+    metrics = _request_metrics.get()
+    if metrics is not None:
+        metrics['connect_seconds'] += seconds
+
+def write_prometheus_metrics(path: str) -> None:
+    """Пишет накопленные счетчики в формате textfile-коллектора node_exporter"""
+    series = (
+        ('handler_requests_total', 0), ('handler_duration_seconds_total', 1), ('handler_connect_seconds_total', 2),
+        ('handler_db_seconds_total', 3), ('handler_sql_statements_total', 4), ('handler_rows_total', 5),
+        ('handler_response_bytes_total', 6),
+    )
+    with _metric_totals_lock:
+        totals = {key: list(values) for key, values in _metric_totals.items()}
+    lines = []
+    for name, index in series:
+        lines.append(f'# TYPE {name} counter')
+        for (function, action, method, status), values in sorted(totals.items()):
+            labels = f'function="{function}",action="{action}",method="{method}",status="{status}"'
+            lines.append(f'{name}{{{labels}}} {values[index]:g}')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+def emit_metrics(function: str, action: str, method: str, metrics: Dict[str, Any], response: Optional[Dict[str, Any]]) -> None:
+    """Выводит строку метрик вызова и добавляет ее к счетчикам Prometheus"""
+    global _metrics_flushed_at
+    status = response.get('statusCode', 0) if response else 500
+    response_bytes = len(response.get('body') or '') if response else 0
+    if METRICS_LOG != 'off':
+        record = {
+            'event': 'request', 'function': function, 'action': action, 'method': method, 'status': status,
+            'total_ms': round(metrics['total_seconds'] * 1000, 2),
+            'connect_ms': round(metrics['connect_seconds'] * 1000, 2),
+            'db_ms': round(metrics['db_seconds'] * 1000, 2),
+            'sql_count': metrics['sql_count'], 'rows': metrics['rows'], 'response_bytes': response_bytes,
+        }
+        if METRICS_LOG == 'full':
+            record['sql'] = metrics['sql']
+        print(json.dumps(record, ensure_ascii=False))
+    if METRICS_PROM_FILE:
+        with _metric_totals_lock:
+            totals = _metric_totals.setdefault((function, action, method, status), [0.0] * 7)
+            for index, value in enumerate((
+                1, metrics['total_seconds'], metrics['connect_seconds'], metrics['db_seconds'],
+                metrics['sql_count'], metrics['rows'], response_bytes
+            )):
+                totals[index] += value
+        now = time.monotonic()
+        if now - _metrics_flushed_at >= METRICS_PROM_FLUSH_SECONDS:
+            _metrics_flushed_at = now
+            write_prometheus_metrics(METRICS_PROM_FILE)
+
+def instrumented(function: str, default_action: str, routes: Optional[Dict[Tuple[str, str], Any]] = None) -> Callable:
+    """Оборачивает handler: собирает метрики вызова в contextvar, по завершении выводит их"""
+    def decorator(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            method = event.get('httpMethod', 'GET')
+            action = (event.get('queryStringParameters') or {}).get('action', default_action)
+            # Неизвестные действия сводим в одно значение, чтобы метки Prometheus не разрастались
+            if routes is not None and method != 'OPTIONS' and (action, method) not in routes:
+                action = 'unknown'
+            metrics = {'connect_seconds': 0.0, 'db_seconds': 0.0, 'sql_count': 0, 'rows': 0, 'sql': []}
+            token = _request_metrics.set(metrics)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                metrics['total_seconds'] = time.perf_counter() - started
+                _request_metrics.reset(token)
+                emit_metrics(function, action, method, metrics, response)
+        return wrapper
+    return decorator
+
+def photo_url_prefix() -> str:
+    """Префикс публичного URL, к которому дописывается ключ фото из хранилища"""
+    base = os.environ.get('PHOTO_PUBLIC_BASE_URL') or f"https://cdn.poehali.dev/projects/{os.environ.get('AWS_ACCESS_KEY_ID', '')}/bucket"
+    return base.rstrip('/') + '/'
+
+def add_earnings(cur: Any, worker_id: Optional[int], role: str, earned_at: Any, amount: Any, jobs_count: int) -> None:
+    """Добавляет (или при отрицательных значениях вычитает) заработок в помесячную сводку в текущей транзакции"""
+    if worker_id is None or earned_at is None:
+        return
+    cur.execute("""
+        INSERT INTO worker_monthly_earnings (worker_id, role, month, earned, jobs_count)
+        VALUES (%s, %s, date_trunc('month', %s::timestamp)::date, %s, %s)
+        ON CONFLICT (worker_id, role, month) DO UPDATE
+        SET earned = worker_monthly_earnings.earned + EXCLUDED.earned,
+            jobs_count = worker_monthly_earnings.jobs_count + EXCLUDED.jobs_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, (worker_id, role, earned_at, amount or 0, jobs_count))
+
+def retract_earnings(cur: Any, where_sql: str, params: Tuple) -> None:
+    """Вычитает из сводки заработок назначений, которые сейчас будут удалены"""
+    cur.execute(f"""
+        SELECT maid_id, salary, verified_at, senior_cleaner_id, senior_cleaner_salary, inspection_completed_at
+        FROM assignments
+        WHERE {where_sql} AND (verified_at IS NOT NULL OR inspection_completed_at IS NOT NULL)
+    """, params)
+    for maid_id, salary, verified_at, senior_cleaner_id, senior_cleaner_salary, inspection_completed_at in cur.fetchall():
+        add_earnings(cur, maid_id, 'maid', verified_at, -(salary or 0), -1)
+        add_earnings(cur, senior_cleaner_id, 'senior_cleaner', inspection_completed_at, -(senior_cleaner_salary or 0), -1)
+
+# Полный пересчет сводки из assignments: используется миграцией-бэкфиллом и tools/rebuild_salary_summary.py
+REBUILD_EARNINGS_SQL = """
+    DELETE FROM worker_monthly_earnings;
+    INSERT INTO worker_monthly_earnings (worker_id, role, month, earned, jobs_count)
+    SELECT maid_id, 'maid', date_trunc('month', verified_at)::date, COALESCE(SUM(salary), 0), COUNT(*)
+    FROM assignments
+    WHERE verified_at IS NOT NULL
+    GROUP BY maid_id, date_trunc('month', verified_at)::date
+    UNION ALL
+    SELECT senior_cleaner_id, 'senior_cleaner', date_trunc('month', inspection_completed_at)::date,
+           COALESCE(SUM(senior_cleaner_salary), 0), COUNT(*)
+    FROM assignments
+    WHERE inspection_completed_at IS NOT NULL AND senior_cleaner_id IS NOT NULL
+    GROUP BY senior_cleaner_id, date_trunc('month', inspection_completed_at)::date;
+"""
+
+# Колонки списка адресов: (ключ ответа, SQL-выражение, преобразование, входит в view=summary)
+ADDRESS_COLUMNS: List[Tuple[str, str, Any, bool]] = [
+    ('id', 'ca.id', None, True),
+    ('address', 'ca.address', None, True),
+    ('client_name', 'ca.client_name', None, True),
+    ('client_phone', 'ca.client_phone', None, True),
+    ('service_type', 'ca.service_type', None, True),
+    ('area', 'ca.area', None, True),
+    ('price', 'ca.price', float, True),
+    ('scheduled_date', 'ca.scheduled_date', str, True),
+    ('scheduled_time', 'ca.scheduled_time', str, True),
+    ('status', 'ca.status', None, True),
+    ('notes', 'ca.notes', None, True),
+    ('created_at', 'ca.created_at', str, True),
+    # photo_before/photo_after - превью для карточек, *_display - копия для экрана, *_original - исходный файл
+    ('photo_before', 'COALESCE(%s || COALESCE(a.photo_before_thumb_key, a.photo_before_key), a.photo_before)', None, False),
+    ('photo_before_display', '%s || COALESCE(a.photo_before_display_key, a.photo_before_key)', None, False),
+    ('photo_before_original', 'COALESCE(%s || a.photo_before_key, a.photo_before)', None, False),
+    ('photo_after', 'COALESCE(%s || COALESCE(a.photo_after_thumb_key, a.photo_after_key), a.photo_after)', None, False),
+    ('photo_after_display', '%s || COALESCE(a.photo_after_display_key, a.photo_after_key)', None, False),
+    ('photo_after_original', 'COALESCE(%s || a.photo_after_key, a.photo_after)', None, False),
+    ('has_photo_before', '(a.photo_before_key IS NOT NULL OR a.photo_before IS NOT NULL)', None, True),
+    ('has_photo_after', '(a.photo_after_key IS NOT NULL OR a.photo_after IS NOT NULL)', None, True),
+    ('photos_uploaded_at', 'a.photos_uploaded_at', str, True),
+    ('assigned_maid_name', 'u.full_name', None, True),
+    ('salary', 'a.salary', float, True),
+    ('verified_at', 'a.verified_at', str, True),
+    ('senior_cleaner_name', 'sc.full_name', None, True),
+    ('senior_cleaner_salary', 'a.senior_cleaner_salary', float, True),
+    ('inspection_completed_at', 'a.inspection_completed_at', str, True),
+]
+
+# Колонки списка выплат в том же формате, что и ADDRESS_COLUMNS
+PAYMENT_COLUMNS: List[Tuple[str, str, Any, bool]] = [
+    ('id', 'a.id', None, True),
+    ('address', 'ca.address', None, True),
+    ('client_name', 'ca.client_name', None, True),
+    ('scheduled_date', 'ca.scheduled_date', str, True),
+    ('maid_name', 'u.full_name', None, True),
+    ('maid_role', 'u.role', None, True),
+    ('salary', 'COALESCE(a.salary, 0)', float, True),
+    ('verified_at', 'a.verified_at', str, True),
+    ('inspection_completed_at', 'a.inspection_completed_at', str, True),
+    ('paid', 'a.paid', None, True),
+    ('service_type', 'ca.service_type', None, True),
+    ('area', 'ca.area', None, True),
+    ('senior_cleaner_name', 'sc.full_name', None, True),
+    ('senior_cleaner_salary', 'COALESCE(a.senior_cleaner_salary, 0)', float, True),
+]
+
+def select_columns(columns: List[Tuple[str, str, Any, bool]], params: Dict[str, Any], required: Tuple[str, ...] = ('id',)) -> List[Tuple[str, str, Any, bool]]:
+    """Отбирает колонки списка по параметрам fields=a,b,c или view=summary|full"""
+    fields = params.get('fields')
+    if fields:
+        wanted = {name.strip() for name in fields.split(',') if name.strip()} | set(required)
+        unknown = wanted - {column[0] for column in columns}
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        return [column for column in columns if column[0] in wanted]
+    
+    view = params.get('view', 'full')
+    if view not in ('summary', 'full'):
+        raise ValueError('view must be summary or full')
+    return [column for column in columns if view == 'full' or column[3]]
+
+def row_to_dict(columns: List[Tuple[str, str, Any, bool]], row: Tuple) -> Dict[str, Any]:
+    """Собирает словарь ответа из строки, выбранной по тем же колонкам"""
+    return {
+        key: convert(value) if convert and value is not None else value
+        for (key, _, convert, _), value in zip(columns, row)
+    }
+
+# Кодировщик ответов: orjson, если установлен; JSON_ENCODER=json принудительно включает стандартный json
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'orjson' if orjson is not None else 'json')
+# Сборка больших списков: postgres - JSON каждой строки строит БД, python - словари из row_to_dict
+LIST_SERIALIZER = os.environ.get('LIST_SERIALIZER', 'postgres')
+# Преобразования колонок на стороне БД; ::text дает тот же формат дат, что и str() (DateStyle ISO)
+JSON_SQL_CASTS = {str: '::text', float: '::float8'}
+
+class RawJson(str):
+    """Уже закодированный JSON-фрагмент, который вставляется в тело ответа как есть"""
+
+def json_default(value: Any) -> Any:
+    """Типы psycopg2, которых нет в JSON: Decimal - число, даты и время - строка как у str()"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps_json(payload: Any) -> str:
+    """Кодирует тело ответа; значения RawJson верхнего уровня вставляются без повторного кодирования"""
+    if isinstance(payload, dict) and any(isinstance(value, RawJson) for value in payload.values()):
+        return '{' + ', '.join(
+            f'{json.dumps(key)}: {value if isinstance(value, RawJson) else dumps_json(value)}'
+            for key, value in payload.items()
+        ) + '}'
+    if JSON_ENCODER == 'orjson' and orjson is not None:
+        # Даты отдаем через json_default, чтобы формат совпадал со стандартным кодировщиком
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        return orjson.dumps(payload, default=json_default, option=option).decode()
+    return json.dumps(payload, default=json_default)
+
+def json_object_sql(columns: List[Tuple[str, str, Any, bool]]) -> str:
+    """json_build_object(...) строки ответа с теми же ключами и форматом значений, что у row_to_dict"""
+    # json_build_object принимает до 100 аргументов, то есть до 50 колонок
+    pairs = ', '.join(f"'{key}', ({sql}){JSON_SQL_CASTS.get(convert, '')}" for key, sql, convert, _ in columns)
+    return f'json_build_object({pairs})'
+
+def rows_select_sql(columns: List[Tuple[str, str, Any, bool]]) -> str:
+    """SELECT-список строк ответа: колонки по порядку или, в режиме postgres, один json_build_object(...)::text"""
+    if LIST_SERIALIZER == 'postgres':
+        return f'{json_object_sql(columns)}::text'
+    return ', '.join(column[1] for column in columns)
+
+def rows_payload(columns: List[Tuple[str, str, Any, bool]], rows: List[Tuple]) -> Any:
+    """Список для ответа из строк, выбранных по rows_select_sql"""
+    if LIST_SERIALIZER == 'postgres':
+        return RawJson('[' + ','.join(row[0] for row in rows) + ']')
+    return [row_to_dict(columns, row) for row in rows]
+
+ADDRESSES_PAGE_DEFAULT = 100
+ADDRESSES_PAGE_MAX = 500
+
+def encode_cursor(scheduled_date: Any, scheduled_time: Any, address_id: int) -> str:
+    """Кодирует позицию последнего адреса страницы в непрозрачный курсор"""
+    raw = json.dumps([str(scheduled_date), str(scheduled_time), address_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Разбирает курсор обратно в (scheduled_date, scheduled_time, id), ValueError при мусоре"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        scheduled_date, scheduled_time, address_id = json.loads(raw)
+        return [
+            datetime.date.fromisoformat(scheduled_date),
+            datetime.time.fromisoformat(scheduled_time),
+            int(address_id)
+        ]
+    except (TypeError, ValueError) as e:
+        raise ValueError('invalid cursor') from e
+
+EXPORT_STORAGE = os.environ.get('EXPORT_STORAGE', 's3')
+EXPORT_STORAGE_DIR = os.environ.get('EXPORT_STORAGE_DIR', '/tmp/exports')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev')
+S3_BUCKET = os.environ.get('S3_BUCKET', 'files')
+# В выгрузках персональные данные и зарплаты, поэтому ссылка временная, а не публичная
+EXPORT_URL_TTL_SECONDS = int(os.environ.get('EXPORT_URL_TTL_SECONDS', '900'))
+# Сколько строк именованный курсор забирает из БД за один раз
+EXPORT_ITERSIZE = int(os.environ.get('EXPORT_ITERSIZE', '2000'))
+EXPORT_SPOOL_MAX_MEMORY = 1024 * 1024
+XLSX_MAX_ROWS = 1048576
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Заголовки колонок выгрузки выплат, по ключам PAYMENT_COLUMNS
+PAYMENT_EXPORT_TITLES = {
+    'id': 'ID назначения',
+    'address': 'Адрес',
+    'client_name': 'Клиент',
+    'scheduled_date': 'Дата уборки',
+    'maid_name': 'Исполнитель',
+    'maid_role': 'Роль',
+    'salary': 'Зарплата исполнителя',
+    'verified_at': 'Проверено',
+    'inspection_completed_at': 'Инспекция завершена',
+    'paid': 'Выплачено',
+    'service_type': 'Тип уборки',
+    'area': 'Площадь',
+    'senior_cleaner_name': 'Старший клинер',
+    'senior_cleaner_salary': 'Зарплата старшего клинера',
+}
+
+class LocalExportStore:
+    """Хранилище выгрузок в локальной файловой системе (тесты и локальный запуск)"""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def put_file(self, key: str, fileobj: BinaryIO, content_type: str, filename: str) -> None:
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+    
+    def url(self, key: str) -> str:
+        return 'file://' + os.path.join(self.root, key)
+
+class S3ExportStore:
+    """Хранилище выгрузок в S3-совместимом бакете, ссылки на скачивание подписанные"""
+    
+    def __init__(self):
+        import boto3
+        self.client = boto3.client(
+            's3',
+            endpoint_url=S3_ENDPOINT_URL,
+            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
+        )
+    
+    def put_file(self, key: str, fileobj: BinaryIO, content_type: str, filename: str) -> None:
+        # upload_fileobj отправляет файл multipart-частями, не читая его целиком в память
+        self.client.upload_fileobj(fileobj, S3_BUCKET, key, ExtraArgs={
+            'ContentType': content_type,
+            'ContentDisposition': f'attachment; filename="{filename}"',
+            'CacheControl': 'private, no-store'
+        })
+    
+    def url(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': S3_BUCKET, 'Key': key}, ExpiresIn=EXPORT_URL_TTL_SECONDS
+        )
+
+_export_store: Optional[Any] = None
+
+def get_export_store() -> Any:
+    """Возвращает хранилище выгрузок, выбранное переменной EXPORT_STORAGE"""
+    global _export_store
+    if _export_store is None:
+        _export_store = LocalExportStore(EXPORT_STORAGE_DIR) if EXPORT_STORAGE == 'local' else S3ExportStore()
+    return _export_store
+
+def iter_export_rows(conn: Any, sql: str, params: Iterable[Any]) -> Iterator[Tuple]:
+    """Строки выборки через серверный (именованный) курсор: в памяти не больше EXPORT_ITERSIZE строк"""
+    cur = conn.cursor(name=f'export_{uuid.uuid4().hex}')
+    cur.itersize = EXPORT_ITERSIZE
+    try:
+        cur.execute(sql, tuple(params))
+        yield from cur
+    finally:
+        cur.close()
+
+def write_csv_export(rows: Iterable[Tuple], titles: List[str], out: BinaryIO) -> int:
+    """Пишет строки в CSV построчно; BOM и точка с запятой - чтобы файл сразу открывался в Excel"""
+    text = io.TextIOWrapper(out, encoding='utf-8-sig', newline='')
+    writer = csv.writer(text, delimiter=';')
+    writer.writerow(titles)
+    count = 0
+    for row in rows:
+        # Текст, начинающийся с =, +, - или @, Excel принял бы за формулу
+        writer.writerow([f"'{value}" if isinstance(value, str) and value[:1] in FORMULA_PREFIXES else value for value in row])
+        count += 1
+    text.flush()
+    text.detach()
+    return count
+
+def write_xlsx_export(rows: Iterable[Tuple], titles: List[str], path: str) -> int:
+    """Пишет строки в XLSX в режиме constant_memory: xlsxwriter держит в памяти только текущую строку"""
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True, 'strings_to_formulas': False, 'default_date_format': 'dd.mm.yyyy'
+    })
+    datetime_format = workbook.add_format({'num_format': 'dd.mm.yyyy hh:mm'})
+    sheet = workbook.add_worksheet()
+    sheet.write_row(0, 0, titles)
+    line = 1
+    count = 0
+    for row in rows:
+        if line == XLSX_MAX_ROWS:
+            # Лист Excel вмещает чуть больше миллиона строк - продолжаем на следующем
+            sheet = workbook.add_worksheet()
+            sheet.write_row(0, 0, titles)
+            line = 1
+        for column, value in enumerate(row):
+            if isinstance(value, datetime.datetime):
+                sheet.write_datetime(line, column, value, datetime_format)
+            else:
+                sheet.write(line, column, value)
+        line += 1
+        count += 1
+    workbook.close()
+    return count
+
+SERVICE_TYPES = ('basic', 'deep', 'after', 'office')
+BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS', '20000'))
+BULK_PAGE_SIZE = 1000
+
+def parse_bulk_rows(event: Dict[str, Any], key: str) -> List[Dict[str, Any]]:
+    """Достает строки из JSON-тела {key: [...]} или из выгрузки CSV/JSONL (параметр format=csv|jsonl)"""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    body_format = (event.get('queryStringParameters') or {}).get('format', 'json')
+    
+    if body_format == 'csv':
+        rows = [dict(row) for row in csv.DictReader(io.StringIO(body.lstrip('\ufeff')))]
+    elif body_format == 'jsonl':
+        rows = [json.loads(line) for line in body.splitlines() if line.strip()]
+    elif body_format == 'json':
+        rows = json.loads(body or '{}').get(key)
+    else:
+        raise ValueError('format must be json, csv or jsonl')
+    
+    if not isinstance(rows, list) or not rows:
+        raise ValueError(f'{key} must be a non-empty array')
+    if len(rows) > BULK_MAX_ROWS:
+        raise ValueError(f'at most {BULK_MAX_ROWS} rows per request')
+    return rows
+
+def validate_address_row(row: Dict[str, Any]) -> Tuple:
+    """Проверяет строку импорта адреса и приводит к значениям для INSERT; ValueError с причиной"""
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+    if not row.get('address'):
+        raise ValueError('address required')
+    if row.get('service_type') not in SERVICE_TYPES:
+        raise ValueError(f"service_type must be one of {', '.join(SERVICE_TYPES)}")
+    try:
+        area = int(row.get('area'))
+        price = float(row.get('price'))
+        scheduled_date = datetime.date.fromisoformat(str(row.get('scheduled_date')))
+        scheduled_time = datetime.time.fromisoformat(str(row.get('scheduled_time')))
+    except (TypeError, ValueError):
+        raise ValueError('area, price, scheduled_date (YYYY-MM-DD) and scheduled_time (HH:MM) required')
+    return (
+        row['address'],
+        row.get('client_name'),
+        row.get('client_phone'),
+        row['service_type'],
+        area,
+        price,
+        scheduled_date,
+        scheduled_time,
+        row.get('notes') or ''
+    )
+
+def upsert_assignments(cur: Any, values: List[Tuple]) -> List[int]:
+    """Создает/обновляет назначения (address_id, maid_id, senior_cleaner_id, salary, senior_cleaner_salary) пачкой и помечает адреса назначенными"""
+    # Существующие назначения блокируются до перезаписи: проверка не вклинится между чтением прежних сумм и UPDATE
+    previous_rows = execute_values(cur, """
+        SELECT a.id, a.salary, a.senior_cleaner_id, a.senior_cleaner_salary
+        FROM assignments a
+        JOIN (VALUES %s) AS incoming (address_id, maid_id) ON a.address_id = incoming.address_id AND a.maid_id = incoming.maid_id
+        FOR UPDATE OF a
+    """, [value[:2] for value in values], template="(%s::integer, %s::integer)", page_size=BULK_PAGE_SIZE, fetch=True)
+    previous = {row[0]: row[1:] for row in previous_rows}
+    
+    rows = execute_values(cur, """
+        INSERT INTO assignments (address_id, maid_id, senior_cleaner_id, salary, senior_cleaner_salary, status)
+        VALUES %s
+        ON CONFLICT (address_id, maid_id) DO UPDATE 
+        SET salary = EXCLUDED.salary, senior_cleaner_id = EXCLUDED.senior_cleaner_id, senior_cleaner_salary = EXCLUDED.senior_cleaner_salary
+        RETURNING id, maid_id, salary, verified_at, senior_cleaner_id, senior_cleaner_salary, inspection_completed_at
+    """, values, template="(%s, %s, %s, %s, %s, 'assigned')", page_size=BULK_PAGE_SIZE, fetch=True)
+    
+    # Сводка заработка уже учитывает проверенные работы: перезапись зарплаты или старшего клинера
+    # у такого назначения переносит разницу в той же транзакции
+    for assignment_id, maid_id, salary, verified_at, senior_id, senior_salary, inspection_completed_at in rows:
+        if assignment_id not in previous:
+            continue
+        previous_salary, previous_senior_id, previous_senior_salary = previous[assignment_id]
+        if verified_at is not None and previous_salary != salary:
+            add_earnings(cur, maid_id, 'maid', verified_at, (salary or 0) - (previous_salary or 0), 0)
+        if inspection_completed_at is not None and (previous_senior_id, previous_senior_salary) != (senior_id, senior_salary):
+            add_earnings(cur, previous_senior_id, 'senior_cleaner', inspection_completed_at, -(previous_senior_salary or 0), -1)
+            add_earnings(cur, senior_id, 'senior_cleaner', inspection_completed_at, senior_salary, 1)
+    
+    cur.execute("""
+        UPDATE cleaning_addresses 
+        SET status = 'assigned' 
+        WHERE id = ANY(%s)
+    """, (list({value[0] for value in values}),))
+    return [row[0] for row in rows]
+
+# Оценка длительности уборки: база + минуты на м² по типу услуги, округление до 30 минут
+SERVICE_BASE_MINUTES = 30
+SERVICE_MINUTES_PER_SQM = {'basic': 1.2, 'deep': 2.4, 'after': 3.6, 'office': 1.0}
+TRAVEL_BUFFER_MINUTES = int(os.environ.get('SCHEDULE_TRAVEL_BUFFER_MINUTES', '30'))
+WORKDAY_LIMIT_MINUTES = int(os.environ.get('SCHEDULE_WORKDAY_LIMIT_MINUTES', '600'))
+SENIOR_INSPECTIONS_PER_DAY = int(os.environ.get('SCHEDULE_SENIOR_INSPECTIONS_PER_DAY', '8'))
+
+def estimate_duration_minutes(service_type: str, area: Any) -> int:
+    """Оценивает длительность уборки по типу услуги и площади"""
+    minutes = SERVICE_BASE_MINUTES + SERVICE_MINUTES_PER_SQM.get(service_type, 1.2) * float(area or 0)
+    return int(-(-minutes // 30) * 30)
+
+def _fits(intervals: List[Tuple[int, int, Any]], start: int, end: int) -> bool:
+    """Проверяет, что [start, end) с буфером на дорогу не пересекается ни с одним из интервалов"""
+    # Соседей по bisect мало: существующие назначения могут перекрываться (горничная уже записана дважды),
+    # и длинный более ранний интервал накроет start, хотя ближайший сосед слева закончился раньше
+    return not _conflicts(intervals, start, end)
+
+def _conflicts(intervals: List[Tuple[int, int, Any]], start: int, end: int) -> List[Tuple[int, int, Any]]:
+    return [
+        interval for interval in intervals
+        if interval[0] < end + TRAVEL_BUFFER_MINUTES and start < interval[1] + TRAVEL_BUFFER_MINUTES
+    ]
+
+def plan_schedule(
+    jobs: List[Dict[str, Any]],
+    maid_ids: List[int],
+    busy: Dict[Tuple[int, Any], List[Tuple[int, int]]],
+    senior_ids: List[int],
+    senior_load: Dict[Tuple[int, Any], int]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Распределяет адреса по горничным: жадно по времени начала с выбором наименее загруженной
+    свободной горничной, затем локальный поиск (перенос одного мешающего задания к другой горничной)
+    для оставшихся. jobs - [{id, date, start, duration}], start в минутах от полуночи;
+    busy - занятые интервалы (maid_id, date) -> [(start, end)]; senior_load - уже назначенные проверки.
+    Возвращает (план [{address_id, maid_id, senior_cleaner_id, ...}], нераспределенные [{address_id, reason}])
+    """
+    # Интервалы по (горничная, дата): (start, end, address_id | None для существующих назначений)
+    schedule: Dict[Tuple[int, Any], List[Tuple[int, int, Any]]] = {}
+    load: Dict[Tuple[int, Any], int] = {}
+    for key, intervals in busy.items():
+        schedule[key] = sorted((start, end, None) for start, end in intervals)
+        load[key] = sum(end - start for start, end in intervals)
+    
+    placement: Dict[Any, int] = {}
+    
+    def place(job: Dict[str, Any], maid_id: int) -> None:
+        key = (maid_id, job['date'])
+        bisect.insort(schedule.setdefault(key, []), (job['start'], job['start'] + job['duration'], job['id']))
+        load[key] = load.get(key, 0) + job['duration']
+        placement[job['id']] = maid_id
+    
+    def unplace(job: Dict[str, Any], maid_id: int) -> None:
+        key = (maid_id, job['date'])
+        schedule[key].remove((job['start'], job['start'] + job['duration'], job['id']))
+        load[key] -= job['duration']
+        del placement[job['id']]
+    
+    def best_maid(job: Dict[str, Any], exclude: Optional[int] = None) -> Optional[int]:
+        """Наименее загруженная в этот день горничная, у которой задание помещается в расписание"""
+        end = job['start'] + job['duration']
+        best = None
+        best_load = None
+        for maid_id in maid_ids:
+            if maid_id == exclude:
+                continue
+            key = (maid_id, job['date'])
+            maid_load = load.get(key, 0)
+            if maid_load + job['duration'] > WORKDAY_LIMIT_MINUTES or (best_load is not None and maid_load >= best_load):
+                continue
+            if _fits(schedule.get(key, []), job['start'], end):
+                best, best_load = maid_id, maid_load
+                if maid_load == 0:
+                    break
+        return best
+    
+    jobs_by_id = {job['id']: job for job in jobs}
+    ordered = sorted(jobs, key=lambda job: (job['date'], job['start'], -job['duration']))
+    unplaced = []
+    for job in ordered:
+        maid_id = best_maid(job)
+        if maid_id is None:
+            unplaced.append(job)
+        else:
+            place(job, maid_id)
+    
+    # Локальный поиск: освобождаем окно, перенося единственное мешающее запланированное задание к другой горничной.
+    # Задания, которые сейчас некуда перенести, запоминаем до следующего удачного переноса
+    no_alternative = set()
+    still_unplaced = []
+    for job in unplaced:
+        end = job['start'] + job['duration']
+        moved = False
+        for maid_id in maid_ids:
+            key = (maid_id, job['date'])
+            blocking = _conflicts(schedule.get(key, []), job['start'], end)
+            if len(blocking) != 1 or blocking[0][2] is None or blocking[0][2] in no_alternative:
+                continue
+            blocker = jobs_by_id[blocking[0][2]]
+            if load.get(key, 0) - blocker['duration'] + job['duration'] > WORKDAY_LIMIT_MINUTES:
+                continue
+            unplace(blocker, maid_id)
+            alternative = best_maid(blocker, exclude=maid_id)
+            if alternative is None:
+                place(blocker, maid_id)
+                no_alternative.add(blocker['id'])
+                continue
+            place(blocker, alternative)
+            place(job, maid_id)
+            no_alternative.clear()
+            moved = True
+            break
+        if not moved:
+            still_unplaced.append(job)
+    
+    # Старшие клинеры: наименее загруженный в этот день, пока не исчерпан дневной лимит проверок
+    senior_load = dict(senior_load)
+    plan = []
+    for job in ordered:
+        if job['id'] not in placement:
+            continue
+        senior_cleaner_id = None
+        available = [
+            senior_id for senior_id in senior_ids
+            if senior_load.get((senior_id, job['date']), 0) < SENIOR_INSPECTIONS_PER_DAY
+        ]
+        if available:
+            senior_cleaner_id = min(available, key=lambda senior_id: (senior_load.get((senior_id, job['date']), 0), senior_id))
+            senior_load[(senior_cleaner_id, job['date'])] = senior_load.get((senior_cleaner_id, job['date']), 0) + 1
+        plan.append({
+            'address_id': job['id'],
+            'maid_id': placement[job['id']],
+            'senior_cleaner_id': senior_cleaner_id,
+            'scheduled_date': str(job['date']),
+            'start_minute': job['start'],
+            'duration_minutes': job['duration']
+        })
+    
+    unassigned = [{'address_id': job['id'], 'reason': 'no maid available for this time slot'} for job in still_unplaced]
+    return plan, unassigned
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Authorization',
+    'Access-Control-Max-Age': '86400'
+}
+ETAG_CACHE_CONTROL = 'private, no-cache'
+
+# Сжатие ответов: тела меньше порога уходят как есть - выигрыш в трафике не окупает время сжатия
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+# Лента изменений: предел ожидания long-poll, период перепроверки без NOTIFY и предел строк в ответе
+CHANGES_WAIT_MAX_SECONDS = float(os.environ.get('CHANGES_WAIT_MAX_SECONDS', '25'))
+CHANGES_RECHECK_SECONDS = 5
+CHANGES_MAX_ROWS = 500
+# Совпадает со сроком хранения change_tombstones в V0017
+CHANGES_RETENTION_DAYS = 7
+
+def json_response(status: int, payload: Any, headers: Dict[str, str] = JSON_HEADERS) -> Dict[str, Any]:
+    """Ответ с JSON-телом и заранее собранными заголовками"""
+    return {'statusCode': status, 'headers': headers, 'body': dumps_json(payload)}
+
+def read_json_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Тело запроса как JSON; пустое тело считается пустым объектом"""
+    return json.loads(event.get('body') or '{}')
+
+# Подписанные токены сессии от auth: base64url(JSON {uid, role, exp}).base64url(HMAC-SHA256).
+# Без SESSION_SECRET проверка выключена, и функция, как раньше, доверяет параметрам запроса
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+SESSION_CACHE_SIZE = 4096
+SESSION_ROLE = 'admin'
+SESSION_SCOPE_PARAM: Optional[str] = None
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def b64url_encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+# Формат и число итераций совпадают с auth, которая проверяет пароль при входе
+PASSWORD_HASH_PREFIX = 'pbkdf2_sha256'
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '600000'))
+
+def hash_password(password: str) -> str:
+    salt = b64url_encode(os.urandom(16))
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), PASSWORD_HASH_ITERATIONS)
+    return f'{PASSWORD_HASH_PREFIX}${PASSWORD_HASH_ITERATIONS}${salt}${b64url_encode(digest)}'
+
+@functools.lru_cache(maxsize=SESSION_CACHE_SIZE)
+def verify_session_token(token: str) -> Optional[Tuple[int, str, int]]:
+    """(id, роль, срок действия) из токена с верной подписью или None; повторная проверка того же токена берется из кэша"""
+    payload, _, signature = token.partition('.')
+    expected = hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+        return int(claims['uid']), str(claims['role']), int(claims['exp'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def authorize(event: Dict[str, Any], params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Проверка токена из Authorization: Bearer без запроса к БД; None, если доступ разрешен, иначе ответ 401/403"""
+    if not SESSION_SECRET:
+        return None
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'authorization'), '') or ''
+    scheme, _, token = value.partition(' ')
+    claims = verify_session_token(token.strip()) if scheme.lower() == 'bearer' and token.strip() else None
+    # Срок проверяем на каждом вызове: кэш хранит только результат проверки подписи
+    if claims is None or claims[2] <= time.time():
+        return json_response(401, {'error': 'Session token is missing, invalid or expired'})
+    user_id, role, _ = claims
+    if role != SESSION_ROLE:
+        return json_response(403, {'error': 'Forbidden'})
+    if SESSION_SCOPE_PARAM and params.get(SESSION_SCOPE_PARAM) not in (None, '', str(user_id)):
+        return json_response(403, {'error': 'Forbidden'})
+    return None
+
+def request_etags(event: Dict[str, Any]) -> List[str]:
+    """ETag из заголовка If-None-Match (без префикса слабой проверки W/)"""
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'if-none-match'), '') or ''
+    return [tag.strip().removeprefix('W/') for tag in value.split(',') if tag.strip()]
+
+def version_args(version: Tuple[str, Optional[str]], params: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    """Параметры SQL версии данных; None, если в запросе нет id области"""
+    scope_param = version[1]
+    if scope_param is None:
+        return ()
+    value = params.get(scope_param) or ''
+    if not value.isdigit():
+        return None
+    return (int(value),)
+
+def etag_for(version_row: Any, params: Dict[str, Any]) -> str:
+    """ETag ответа: хеш версии данных и параметров запроса"""
+    material = repr((version_row, sorted(params.items()), photo_url_prefix()))
+    return '"' + hashlib.sha1(material.encode('utf-8')).hexdigest() + '"'
+
+def compute_etag(cur: Any, version: Tuple[str, Optional[str]], params: Dict[str, Any]) -> Optional[str]:
+    """ETag ответа по версии данных из БД; None, если в запросе нет id области"""
+    args = version_args(version, params)
+    if args is None:
+        return None
+    cur.execute(version[0], args)
+    return etag_for(cur.fetchone(), params)
+
+def not_modified(etag: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {'Access-Control-Allow-Origin': '*', 'ETag': etag, 'Cache-Control': ETAG_CACHE_CONTROL},
+        'body': ''
+    }
+
+def accepted_encodings(event: Dict[str, Any]) -> List[str]:
+    """Кодировки из Accept-Encoding, которые клиент не запретил через q=0"""
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'accept-encoding'), '') or ''
+    encodings = []
+    for part in value.split(','):
+        name, _, weight = part.partition(';')
+        weight = weight.strip().removeprefix('q=')
+        try:
+            if weight and float(weight) <= 0:
+                continue
+        except ValueError:
+            continue
+        encodings.append(name.strip().lower())
+    return encodings
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """Сжимает тело ответа br или gzip, если клиент это принимает и тело не меньше COMPRESS_MIN_BYTES"""
+    body = response.get('body')
+    if not body or response.get('isBase64Encoded'):
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    
+    encodings = accepted_encodings(event)
+    headers = {**response['headers'], 'Vary': 'Accept-Encoding'}
+    if brotli is not None and 'br' in encodings:
+        encoding, data = 'br', brotli.compress(raw, quality=BROTLI_QUALITY)
+    elif 'gzip' in encodings or '*' in encodings:
+        encoding, data = 'gzip', gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return {**response, 'headers': headers}
+    
+    headers['Content-Encoding'] = encoding
+    # Сжатое представление отличается побайтно, поэтому ETag становится слабым (как делает nginx)
+    if headers.get('ETag', '').startswith('"'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(data).decode('ascii'), 'isBase64Encoded': True}
+
+def encode_change_cursor(horizon: int) -> str:
+    """Курсор ленты изменений: горизонт транзакций и время его выдачи"""
+    raw = json.dumps([horizon, int(time.time())]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_change_cursor(cursor: str) -> Tuple[int, int]:
+    """Разбирает курсор ленты в (горизонт, время выдачи), ValueError при мусоре"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        horizon, issued_at = json.loads(raw)
+        return int(horizon), int(issued_at)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'invalid cursor: {cursor}') from e
+
+def current_horizon(cur: Any) -> int:
+    """xmin текущего снимка: все транзакции с меньшим id уже завершены"""
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+    return cur.fetchone()[0]
+
+def poll_changes(
+    conn: Any, cur: Any, since: int, wait: float, collect: Callable[[int, int], Dict[str, List[Any]]]
+) -> Tuple[int, Dict[str, List[Any]]]:
+    """Собирает изменения в окне [since, горизонт); если их нет, до wait секунд ждет NOTIFY changes"""
+    if wait > 0:
+        cur.execute("LISTEN changes")
+        conn.commit()
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            horizon = current_horizon(cur)
+            changes = collect(since, horizon)
+            # Пока ждем уведомления, соединение не держит открытую транзакцию
+            conn.commit()
+            remaining = deadline - time.monotonic()
+            if any(changes.values()) or remaining <= 0:
+                return horizon, changes
+            # Перепроверяем и без уведомления: горизонт мог сдвинуться после завершения долгой транзакции
+            if select.select([conn], [], [], min(remaining, CHANGES_RECHECK_SECONDS))[0]:
+                conn.poll()
+                conn.notifies.clear()
+    finally:
+        if wait > 0:
+            conn.rollback()
+            cur.execute("UNLISTEN changes")
+            conn.commit()
+
+def parse_change_params(params: Dict[str, Any]) -> Tuple[Optional[int], float, bool]:
+    """(горизонт из since или None, время ожидания, нужен ли клиенту полный reset), ValueError при мусоре"""
+    wait = max(0.0, min(float(params.get('wait') or 0), CHANGES_WAIT_MAX_SECONDS))
+    if not params.get('since'):
+        return None, wait, False
+    since, issued_at = decode_change_cursor(params['since'])
+    if time.time() - issued_at > CHANGES_RETENTION_DAYS * 86400:
+        return None, wait, True
+    return since, wait, False
+
+def table_version(table: str) -> str:
+    """SQL-выражение версии таблицы для ETag: число строк, последнее изменение и сумма отметок updated_at"""
+    return (
+        f"(SELECT ROW(COUNT(*), MAX(updated_at), SUM((EXTRACT(EPOCH FROM updated_at) * 1000000)::bigint))::text "
+        f"FROM {table})"
+    )
+
+# Версия адресов и назначений по ленте изменений V0017: MAX(change_xid) читается по индексу, без обхода таблиц
+# (удаления видны по change_tombstones). Транзакция с меньшим id может закоммитить изменения позже транзакции
+# с максимумом: поэтому в версию входят все незавершенные транзакции до максимума, и ETag сменится,
+# когда любая из них завершится (горизонта xmin мало - его может держать еще более старая транзакция)
+CHANGE_FEED_VERSION_SQL = """(
+    SELECT ROW(max_xid, ARRAY(
+        SELECT xip FROM txid_snapshot_xip(txid_current_snapshot()) AS xip
+        WHERE xip <= max_xid ORDER BY xip
+    ))::text
+    FROM (SELECT GREATEST(
+        (SELECT MAX(change_xid) FROM cleaning_addresses),
+        (SELECT MAX(change_xid) FROM assignments),
+        (SELECT MAX(change_xid) FROM change_tombstones)
+    ) AS max_xid) feed
+)"""
+# users - небольшая таблица сотрудников, ее версию считаем обходом
+ASSIGNMENTS_TABLES_VERSION_SQL = f"SELECT {CHANGE_FEED_VERSION_SQL}, {table_version('users')}"
+# Карточка адреса зависит только от своей строки, ее назначений и имен исполнителей
+ADDRESS_VERSION_SQL = """
+    SELECT ca.updated_at, array_agg(ROW(a.id, a.updated_at, u.updated_at, sc.updated_at) ORDER BY a.id)::text
+    FROM cleaning_addresses ca
+    LEFT JOIN assignments a ON ca.id = a.address_id
+    LEFT JOIN users u ON a.maid_id = u.id
+    LEFT JOIN users sc ON a.senior_cleaner_id = sc.id
+    WHERE ca.id = %s
+    GROUP BY ca.updated_at
+"""
+# Дашборд зависит и от даты: в полночь меняется список работ на сегодня
+DASHBOARD_VERSION_SQL = f"{ASSIGNMENTS_TABLES_VERSION_SQL}, CURRENT_DATE"
+SALARY_STATS_VERSION_SQL = (
+    f"SELECT {table_version('worker_monthly_earnings')}, {table_version('users')}, date_trunc('month', CURRENT_DATE)"
+)
+
+def addresses_query(params: Dict[str, Any]) -> Tuple[str, List[Any], List[Tuple[str, str, Any, bool]], Optional[int]]:
+    """SQL страницы адресов, его параметры, колонки ответа и размер страницы; ValueError при неверном фильтре или курсоре"""
+    # Фильтры и keyset-пагинация применяются к адресам до JOIN,
+    # чтобы страница не обрывалась посреди назначений одного адреса
+    filters = []
+    filter_params: List[Any] = []
+    page_size = None
+    if params.get('status'):
+        filters.append('ca.status = %s')
+        filter_params.append(params['status'])
+    if params.get('service_type'):
+        filters.append('ca.service_type = %s')
+        filter_params.append(params['service_type'])
+    if params.get('date_from'):
+        filters.append('ca.scheduled_date >= %s')
+        filter_params.append(datetime.date.fromisoformat(params['date_from']))
+    if params.get('date_to'):
+        filters.append('ca.scheduled_date <= %s')
+        filter_params.append(datetime.date.fromisoformat(params['date_to']))
+    if params.get('maid_id'):
+        filters.append('EXISTS (SELECT 1 FROM assignments am WHERE am.address_id = ca.id AND am.maid_id = %s)')
+        filter_params.append(int(params['maid_id']))
+    if params.get('limit') or params.get('cursor'):
+        page_size = max(1, min(int(params.get('limit') or ADDRESSES_PAGE_DEFAULT), ADDRESSES_PAGE_MAX))
+    if params.get('cursor'):
+        filters.append('(ca.scheduled_date, ca.scheduled_time, ca.id) < (%s, %s, %s)')
+        filter_params.extend(decode_cursor(params['cursor']))
+    columns = select_columns(ADDRESS_COLUMNS, params, required=('id', 'scheduled_date', 'scheduled_time'))
+    
+    where_sql = f"WHERE {' AND '.join(filters)}" if filters else ''
+    limit_sql = ''
+    if page_size:
+        limit_sql = 'LIMIT %s'
+        filter_params.append(page_size + 1)
+    
+    select_sql = rows_select_sql(columns)
+    select_params = [photo_url_prefix()] * select_sql.count('%s')
+    
+    # Первые три колонки - позиция адреса для пагинации, остальные - сама строка ответа
+    sql = f"""
+        SELECT ca.scheduled_date, ca.scheduled_time, ca.id, {select_sql}
+        FROM (
+            SELECT * FROM cleaning_addresses ca
+            {where_sql}
+            ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC, ca.id DESC
+            {limit_sql}
+        ) ca
+        LEFT JOIN assignments a ON ca.id = a.address_id
+        LEFT JOIN users u ON a.maid_id = u.id
+        LEFT JOIN users sc ON a.senior_cleaner_id = sc.id
+        ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC, ca.id DESC
+    """
+    return sql, [*select_params, *filter_params], columns, page_size
+
+def addresses_response(rows: List[Tuple], columns: List[Tuple[str, str, Any, bool]], page_size: Optional[int]) -> Dict[str, Any]:
+    """Ответ со страницей адресов из строк addresses_query"""
+    next_cursor = None
+    if page_size:
+        page_ids = list(dict.fromkeys(row[2] for row in rows))
+        if len(page_ids) > page_size:
+            # Лишний (page_size + 1)-й адрес только сигнализирует о следующей странице
+            rows = [row for row in rows if row[2] != page_ids[page_size]]
+            next_cursor = encode_cursor(*rows[-1][:3])
+    
+    addresses = rows_payload(columns, [row[3:] for row in rows])
+    return json_response(200, {'addresses': addresses, 'next_cursor': next_cursor})
+
+def handle_get_addresses(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Список адресов с назначениями, фильтрами и курсорной пагинацией"""
+    try:
+        sql, args, columns, page_size = addresses_query(params)
+    except ValueError as e:
+        return json_response(400, {'error': f'invalid filter or cursor: {e}'})
+    cur.execute(sql, args)
+    return addresses_response(cur.fetchall(), columns, page_size)
+
+def handle_post_addresses(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Создание адреса"""
+    body_data = read_json_body(event)
+    cur.execute("""
+        INSERT INTO cleaning_addresses 
+        (address, client_name, client_phone, service_type, area, price, 
+         scheduled_date, scheduled_time, notes)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """, (
+        body_data.get('address'),
+        body_data.get('client_name'),
+        body_data.get('client_phone'),
+        body_data.get('service_type'),
+        body_data.get('area'),
+        body_data.get('price'),
+        body_data.get('scheduled_date'),
+        body_data.get('scheduled_time'),
+        body_data.get('notes', '')
+    ))
+    new_id = cur.fetchone()[0]
+    conn.commit()
+    return json_response(201, {'id': new_id, 'message': 'Address created'})
+
+def handle_put_addresses(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Изменение адреса"""
+    address_id = params.get('id')
+    
+    if not address_id:
+        return json_response(400, {'error': 'id required'})
+    
+    body_data = read_json_body(event)
+    cur.execute("""
+        UPDATE cleaning_addresses 
+        SET address = %s, client_name = %s, client_phone = %s, 
+            service_type = %s, area = %s, price = %s, 
+            scheduled_date = %s, scheduled_time = %s, notes = %s
+        WHERE id = %s
+    """, (
+        body_data.get('address'),
+        body_data.get('client_name'),
+        body_data.get('client_phone'),
+        body_data.get('service_type'),
+        body_data.get('area'),
+        body_data.get('price'),
+        body_data.get('scheduled_date'),
+        body_data.get('scheduled_time'),
+        body_data.get('notes', ''),
+        int(address_id)
+    ))
+    conn.commit()
+    return json_response(200, {'message': 'Address updated'})
+
+def handle_delete_addresses(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Удаление адреса"""
+    address_id = params.get('id')
+    
+    if not address_id:
+        return json_response(400, {'error': 'id required'})
+    
+    retract_earnings(cur, 'address_id = %s', (int(address_id),))
+    cur.execute("DELETE FROM assignments WHERE address_id = %s", (int(address_id),))
+    cur.execute("DELETE FROM cleaning_addresses WHERE id = %s", (int(address_id),))
+    conn.commit()
+    return json_response(200, {'message': 'Address deleted'})
+
+def handle_get_address(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Карточка одного адреса"""
+    address_id = params.get('id')
+    
+    if not address_id:
+        return json_response(400, {'error': 'id required'})
+    
+    select_sql = ', '.join(column[1] for column in ADDRESS_COLUMNS)
+    cur.execute(f"""
+        SELECT {select_sql}
+        FROM cleaning_addresses ca
+        LEFT JOIN assignments a ON ca.id = a.address_id
+        LEFT JOIN users u ON a.maid_id = u.id
+        LEFT JOIN users sc ON a.senior_cleaner_id = sc.id
+        WHERE ca.id = %s
+        ORDER BY a.assigned_at DESC NULLS LAST
+        LIMIT 1
+    """, (*[photo_url_prefix()] * select_sql.count('%s'), int(address_id)))
+    row = cur.fetchone()
+    
+    if not row:
+        return json_response(404, {'error': 'Address not found'})
+    
+    return json_response(200, {'address': row_to_dict(ADDRESS_COLUMNS, row)})
+
+def handle_get_maids(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Список горничных и старших клинеров со статистикой"""
+    cur.execute("""
+        SELECT 
+            u.id, 
+            u.full_name, 
+            u.email, 
+            u.phone,
+            u.role,
+            COUNT(CASE WHEN ca.status = 'completed' THEN 1 END) as completed_count,
+            COUNT(CASE WHEN ca.status = 'in_progress' THEN 1 END) as in_progress_count,
+            COUNT(CASE WHEN ca.status = 'assigned' THEN 1 END) as assigned_count,
+            COUNT(a.id) as total_assignments
+        FROM users u
+        LEFT JOIN assignments a ON u.id = a.maid_id
+        LEFT JOIN cleaning_addresses ca ON a.address_id = ca.id
+        WHERE u.role IN ('maid', 'senior_cleaner')
+        GROUP BY u.id, u.full_name, u.email, u.phone, u.role
+        ORDER BY u.role, u.full_name
+    """)
+    rows = cur.fetchall()
+    maids = []
+    for row in rows:
+        maids.append({
+            'id': row[0],
+            'full_name': row[1],
+            'email': row[2],
+            'phone': row[3],
+            'role': row[4],
+            'completed_count': row[5],
+            'in_progress_count': row[6],
+            'assigned_count': row[7],
+            'total_assignments': row[8]
+        })
+    
+    return json_response(200, {'maids': maids})
+
+def handle_put_maids(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Изменение данных сотрудника"""
+    body_data = read_json_body(event)
+    maid_id = body_data.get('id')
+    # Пустой пароль в форме редактирования оставляет прежний
+    password = body_data.get('password')
+    cur.execute("""
+        UPDATE users 
+        SET full_name = %s, email = %s, phone = %s, password_hash = COALESCE(%s, password_hash)
+        WHERE id = %s AND role IN ('maid', 'senior_cleaner')
+    """, (
+        body_data.get('full_name'),
+        body_data.get('email'),
+        body_data.get('phone'),
+        hash_password(password) if password and isinstance(password, str) else None,
+        maid_id
+    ))
+    conn.commit()
+    return json_response(200, {'message': 'Maid updated'})
+
+def handle_delete_maids(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Удаление сотрудника"""
+    body_data = read_json_body(event)
+    maid_id = body_data.get('id')
+    
+    retract_earnings(cur, 'maid_id = %s', (maid_id,))
+    cur.execute("DELETE FROM assignments WHERE maid_id = %s", (maid_id,))
+    cur.execute("DELETE FROM users WHERE id = %s AND role IN ('maid', 'senior_cleaner')", (maid_id,))
+    conn.commit()
+    return json_response(200, {'message': 'Maid deleted'})
+
+def handle_post_maids(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Создание сотрудника"""
+    body_data = read_json_body(event)
+    role = body_data.get('role', 'maid')
+    password = body_data.get('password')
+    if not password or not isinstance(password, str):
+        return json_response(400, {'error': 'password required'})
+    cur.execute("""
+        INSERT INTO users (email, password_hash, full_name, phone, role)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """, (
+        body_data.get('email'),
+        hash_password(password),
+        body_data.get('full_name'),
+        body_data.get('phone'),
+        role
+    ))
+    new_id = cur.fetchone()[0]
+    conn.commit()
+    return json_response(201, {'id': new_id, 'message': 'Maid created'})
+
+def handle_post_assign(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Назначение горничной и старшего клинера на адрес"""
+    body_data = read_json_body(event)
+    address_id = body_data.get('address_id')
+    maid_id = body_data.get('maid_id')
+    senior_cleaner_id = body_data.get('senior_cleaner_id')
+    salary = body_data.get('salary', 5000)
+    senior_cleaner_salary = body_data.get('senior_cleaner_salary', 2000)
+    
+    # Тот же путь, что у bulk-assign и schedule: перезапись проверенной работы переносит заработок в сводке
+    assignment_ids = upsert_assignments(cur, [(address_id, maid_id, senior_cleaner_id, salary, senior_cleaner_salary)])
+    if assignment_ids:
+        conn.commit()
+    
+    return json_response(200, {'message': 'Assignment created'})
+
+def handle_post_bulk_addresses(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Массовый импорт адресов"""
+    # Массовый импорт: JSON {addresses: [...]}, CSV или JSONL; один INSERT на страницу, одна транзакция
+    try:
+        rows = parse_bulk_rows(event, 'addresses')
+    except (ValueError, AttributeError, csv.Error) as e:
+        return json_response(400, {'error': str(e)})
+    
+    all_or_nothing = params.get('all_or_nothing') == 'true'
+    results: List[Dict[str, Any]] = [{} for _ in rows]
+    valid_indexes = []
+    values = []
+    for index, row in enumerate(rows):
+        try:
+            values.append(validate_address_row(row))
+            valid_indexes.append(index)
+        except ValueError as e:
+            results[index] = {'row': index, 'status': 'error', 'error': str(e)}
+    
+    failed = len(rows) - len(valid_indexes)
+    if values and not (all_or_nothing and failed):
+        new_ids = execute_values(cur, """
+            INSERT INTO cleaning_addresses 
+            (address, client_name, client_phone, service_type, area, price, 
+             scheduled_date, scheduled_time, notes)
+            VALUES %s
+            RETURNING id
+        """, values, page_size=BULK_PAGE_SIZE, fetch=True)
+        for index, (new_id,) in zip(valid_indexes, new_ids):
+            results[index] = {'row': index, 'status': 'created', 'id': new_id}
+        conn.commit()
+    else:
+        for index in valid_indexes:
+            results[index] = {'row': index, 'status': 'skipped'}
+    
+    return json_response(200 if not failed else 207, {
+        'created': sum(1 for result in results if result['status'] == 'created'),
+        'failed': failed,
+        'results': results
+    })
+
+def handle_post_bulk_assign(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Массовое создание назначений"""
+    try:
+        rows = parse_bulk_rows(event, 'assignments')
+    except (ValueError, AttributeError, csv.Error) as e:
+        return json_response(400, {'error': str(e)})
+    
+    results = [{} for _ in rows]
+    parsed: Dict[Tuple[int, int], Tuple[int, Tuple]] = {}
+    for index, row in enumerate(rows):
+        try:
+            address_id = int(row['address_id'])
+            maid_id = int(row['maid_id'])
+            senior_cleaner_id = int(row['senior_cleaner_id']) if row.get('senior_cleaner_id') not in (None, '') else None
+            salary = float(row.get('salary') or 5000)
+            senior_cleaner_salary = float(row.get('senior_cleaner_salary') or 2000)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            results[index] = {'row': index, 'status': 'error', 'error': 'address_id and maid_id required, ids and salaries must be numbers'}
+            continue
+        # Повтор той же пары адрес/горничная в пачке: побеждает последняя строка
+        previous = parsed.get((address_id, maid_id))
+        if previous:
+            results[previous[0]] = {'row': previous[0], 'status': 'superseded', 'by_row': index}
+        parsed[(address_id, maid_id)] = (index, (address_id, maid_id, senior_cleaner_id, salary, senior_cleaner_salary))
+    
+    # Проверяем ссылки заранее, чтобы одна битая строка не откатила всю пачку
+    address_ids = list({key[0] for key in parsed})
+    worker_ids = list({key[1] for key in parsed} | {value[1][2] for value in parsed.values() if value[1][2]})
+    cur.execute("SELECT id FROM cleaning_addresses WHERE id = ANY(%s)", (address_ids,))
+    known_addresses = {row[0] for row in cur.fetchall()}
+    cur.execute("SELECT id, role FROM users WHERE id = ANY(%s)", (worker_ids,))
+    worker_roles = dict(cur.fetchall())
+    
+    values = []
+    value_indexes = []
+    for index, value in parsed.values():
+        address_id, maid_id, senior_cleaner_id = value[:3]
+        if address_id not in known_addresses:
+            results[index] = {'row': index, 'status': 'error', 'error': 'address not found'}
+        elif worker_roles.get(maid_id) not in ('maid', 'senior_cleaner'):
+            results[index] = {'row': index, 'status': 'error', 'error': 'maid not found'}
+        elif senior_cleaner_id and worker_roles.get(senior_cleaner_id) != 'senior_cleaner':
+            results[index] = {'row': index, 'status': 'error', 'error': 'senior cleaner not found'}
+        else:
+            values.append(value)
+            value_indexes.append(index)
+    
+    if values:
+        assignment_ids = upsert_assignments(cur, values)
+        conn.commit()
+        for index, assignment_id in zip(value_indexes, assignment_ids):
+            results[index] = {'row': index, 'status': 'assigned', 'id': assignment_id}
+    
+    failed = sum(1 for result in results if result['status'] == 'error')
+    return json_response(200 if not failed else 207, {
+        'assigned': len(values),
+        'failed': failed,
+        'results': results
+    })
+
+def handle_post_schedule(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Автоматическое распределение ожидающих адресов"""
+    # Автоматическое распределение ожидающих адресов за период; apply=true сразу создает назначения
+    body_data = read_json_body(event)
+    try:
+        date_from = datetime.date.fromisoformat(body_data['date_from'])
+        date_to = datetime.date.fromisoformat(body_data.get('date_to') or body_data['date_from'])
+        maid_filter = [int(worker_id) for worker_id in body_data.get('maid_ids') or []]
+        senior_filter = [int(worker_id) for worker_id in body_data.get('senior_cleaner_ids') or []]
+        salary = float(body_data.get('salary', 5000))
+        senior_cleaner_salary = float(body_data.get('senior_cleaner_salary', 2000))
+    except (KeyError, TypeError, ValueError):
+        return json_response(400, {'error': 'date_from (YYYY-MM-DD) required, date_to/maid_ids/senior_cleaner_ids/salaries must be valid'})
+    
+    started = time.perf_counter()
+    cur.execute("""
+        SELECT id, scheduled_date, scheduled_time, service_type, area
+        FROM cleaning_addresses
+        WHERE status = 'pending' AND scheduled_date BETWEEN %s AND %s
+    """, (date_from, date_to))
+    jobs = [
+        {
+            'id': row[0],
+            'date': row[1],
+            'start': row[2].hour * 60 + row[2].minute,
+            'duration': estimate_duration_minutes(row[3], row[4])
+        }
+        for row in cur.fetchall()
+    ]
+    
+    cur.execute("SELECT id, role FROM users WHERE role IN ('maid', 'senior_cleaner') ORDER BY id")
+    workers = cur.fetchall()
+    maid_ids = [row[0] for row in workers if row[1] == 'maid' and (not maid_filter or row[0] in maid_filter)]
+    senior_ids = [row[0] for row in workers if row[1] == 'senior_cleaner' and (not senior_filter or row[0] in senior_filter)]
+    
+    # Уже существующие назначения занимают время горничных и лимит проверок старших клинеров
+    cur.execute("""
+        SELECT a.maid_id, a.senior_cleaner_id, ca.scheduled_date, ca.scheduled_time, ca.service_type, ca.area
+        FROM assignments a
+        JOIN cleaning_addresses ca ON a.address_id = ca.id
+        WHERE ca.scheduled_date BETWEEN %s AND %s
+          AND a.status <> 'cancelled' AND ca.status <> 'cancelled'
+    """, (date_from, date_to))
+    busy: Dict[Tuple[int, Any], List[Tuple[int, int]]] = {}
+    senior_load: Dict[Tuple[int, Any], int] = {}
+    for maid_id, senior_cleaner_id, scheduled_date, scheduled_time, service_type, area in cur.fetchall():
+        start = scheduled_time.hour * 60 + scheduled_time.minute
+        busy.setdefault((maid_id, scheduled_date), []).append((start, start + estimate_duration_minutes(service_type, area)))
+        if senior_cleaner_id:
+            senior_load[(senior_cleaner_id, scheduled_date)] = senior_load.get((senior_cleaner_id, scheduled_date), 0) + 1
+    
+    plan, unassigned = plan_schedule(jobs, maid_ids, busy, senior_ids, senior_load)
+    planned_ms = round((time.perf_counter() - started) * 1000, 1)
+    
+    applied = False
+    if body_data.get('apply') and plan:
+        assignment_ids = upsert_assignments(cur, [
+            (item['address_id'], item['maid_id'], item['senior_cleaner_id'], salary,
+             senior_cleaner_salary if item['senior_cleaner_id'] else None)
+            for item in plan
+        ])
+        conn.commit()
+        for item, assignment_id in zip(plan, assignment_ids):
+            item['assignment_id'] = assignment_id
+        applied = True
+    
+    return json_response(200, {
+        'plan': plan,
+        'unassigned': unassigned,
+        'applied': applied,
+        'stats': {
+            'pending': len(jobs),
+            'planned': len(plan),
+            'maids': len(maid_ids),
+            'senior_cleaners': len(senior_ids),
+            'planning_ms': planned_ms
+        }
+    })
+
+def handle_post_verify(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Подтверждение выполненной уборки"""
+    body_data = read_json_body(event)
+    address_id = body_data.get('address_id')
+    admin_id = body_data.get('admin_id')
+    
+    cur.execute("""
+        WITH prev AS (
+            SELECT id, verified_at FROM assignments
+            WHERE address_id = %s AND status = 'completed'
+            FOR UPDATE
+        )
+        UPDATE assignments a
+        SET verified_at = NOW(), verified_by = %s
+        FROM prev
+        WHERE a.id = prev.id
+        RETURNING a.id, a.maid_id, a.salary, prev.verified_at, a.verified_at
+    """, (address_id, admin_id))
+    
+    verified_rows = cur.fetchall()
+    # Сводка заработка обновляется в той же транзакции; повторная проверка переносит сумму в новый месяц
+    for _, maid_id, salary, previous_verified_at, verified_at in verified_rows:
+        if previous_verified_at is not None:
+            add_earnings(cur, maid_id, 'maid', previous_verified_at, -(salary or 0), -1)
+        add_earnings(cur, maid_id, 'maid', verified_at, salary, 1)
+    
+    if verified_rows:
+        cur.execute("""
+            UPDATE cleaning_addresses
+            SET status = 'verified'
+            WHERE id = %s
+        """, (address_id,))
+        conn.commit()
+    
+    return json_response(200, {'message': 'Verified and salary assigned'})
+
+def handle_post_cancel_assignment(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Отмена назначения по адресу"""
+    body_data = read_json_body(event)
+    address_id = body_data.get('address_id')
+    
+    if not address_id:
+        return json_response(400, {'error': 'address_id required'})
+    
+    cur.execute("""
+        UPDATE cleaning_addresses 
+        SET status = 'cancelled' 
+        WHERE id = %s
+    """, (address_id,))
+    
+    cur.execute("""
+        UPDATE assignments 
+        SET status = 'cancelled' 
+        WHERE address_id = %s
+    """, (address_id,))
+    
+    conn.commit()
+    return json_response(200, {'message': 'Assignment cancelled'})
+
+def handle_post_mark_paid(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Отметка о выплате за назначение"""
+    body_data = read_json_body(event)
+    assignment_id = body_data.get('assignment_id')
+    
+    if not assignment_id:
+        return json_response(400, {'error': 'assignment_id required'})
+    
+    cur.execute("""
+        UPDATE assignments 
+        SET paid = TRUE
+        WHERE id = %s
+    """, (int(assignment_id),))
+    conn.commit()
+    
+    return json_response(200, {'message': 'Payment marked'})
+
+def load_payroll_batch(cur: Any, batch_id: int) -> Dict[str, Any]:
+    """Пакет выплат с суммами по сотрудникам"""
+    cur.execute("""
+        SELECT id, period_from, period_to, worker_ids, assignments_count, total_salary, total_senior_cleaner_salary, created_at
+        FROM payroll_batches WHERE id = %s
+    """, (batch_id,))
+    row = cur.fetchone()
+    cur.execute("""
+        SELECT w.worker_id, u.full_name, w.role, w.assignments_count, w.amount
+        FROM payroll_batch_workers w
+        JOIN users u ON w.worker_id = u.id
+        WHERE w.batch_id = %s
+        ORDER BY w.amount DESC, w.worker_id
+    """, (batch_id,))
+    return {
+        'id': row[0],
+        'period_from': str(row[1]),
+        'period_to': str(row[2]),
+        'worker_ids': row[3],
+        'assignments_count': row[4],
+        'total_salary': float(row[5]),
+        'total_senior_cleaner_salary': float(row[6]),
+        'created_at': str(row[7]),
+        'workers': [
+            {'worker_id': worker[0], 'full_name': worker[1], 'role': worker[2], 'assignments_count': worker[3], 'amount': float(worker[4])}
+            for worker in cur.fetchall()
+        ]
+    }
+
+def handle_post_payroll_run(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Выплата за период: все неоплаченные назначения периода (и выбранных сотрудников) помечаются оплаченными одним UPDATE"""
+    body_data = read_json_body(event)
+    try:
+        period_from = datetime.date.fromisoformat(body_data['date_from'])
+        period_to = datetime.date.fromisoformat(body_data['date_to'])
+        worker_ids = sorted({int(worker_id) for worker_id in body_data['worker_ids']}) if body_data.get('worker_ids') else None
+    except (KeyError, TypeError, ValueError) as e:
+        return json_response(400, {'error': f'date_from and date_to required, worker_ids must be a list of ids: {e}'})
+    if period_from > period_to:
+        return json_response(400, {'error': 'date_from must not be after date_to'})
+    idempotency_key = body_data.get('idempotency_key') or None
+    if idempotency_key is not None and (not isinstance(idempotency_key, str) or len(idempotency_key) > 100):
+        return json_response(400, {'error': 'idempotency_key must be a string up to 100 characters'})
+    
+    # Параллельный запрос с тем же ключом ждет здесь коммита первого и получает конфликт
+    cur.execute("""
+        INSERT INTO payroll_batches (idempotency_key, period_from, period_to, worker_ids)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id
+    """, (idempotency_key, period_from, period_to, worker_ids))
+    inserted = cur.fetchone()
+    if inserted is None:
+        conn.rollback()
+        cur.execute("SELECT id FROM payroll_batches WHERE idempotency_key = %s", (idempotency_key,))
+        return json_response(200, {'batch': load_payroll_batch(cur, cur.fetchone()[0]), 'replayed': True})
+    batch_id = inserted[0]
+    
+    # Оплата отмечается на назначении целиком: и зарплата горничной, и зарплата старшего клинера.
+    # Строки, которые уже оплатил параллельный запуск, после ожидания блокировки не проходят paid IS NOT TRUE
+    worker_sql = 'AND (a.maid_id = ANY(%s) OR a.senior_cleaner_id = ANY(%s))' if worker_ids else ''
+    cur.execute(f"""
+        WITH paid AS (
+            UPDATE assignments a
+            SET paid = TRUE, payroll_batch_id = %s
+            WHERE (a.verified_at IS NOT NULL OR a.inspection_completed_at IS NOT NULL)
+              AND a.paid IS NOT TRUE
+              AND COALESCE(a.verified_at, a.inspection_completed_at) >= %s
+              AND COALESCE(a.verified_at, a.inspection_completed_at) < %s
+              {worker_sql}
+            RETURNING a.maid_id, a.salary, a.verified_at, a.senior_cleaner_id, a.senior_cleaner_salary, a.inspection_completed_at
+        ), workers AS (
+            INSERT INTO payroll_batch_workers (batch_id, worker_id, role, assignments_count, amount)
+            SELECT %s, maid_id, 'maid', COUNT(*), COALESCE(SUM(salary), 0)
+            FROM paid WHERE verified_at IS NOT NULL
+            GROUP BY maid_id
+            UNION ALL
+            SELECT %s, senior_cleaner_id, 'senior_cleaner', COUNT(*), COALESCE(SUM(senior_cleaner_salary), 0)
+            FROM paid WHERE inspection_completed_at IS NOT NULL AND senior_cleaner_id IS NOT NULL
+            GROUP BY senior_cleaner_id
+            RETURNING role, amount
+        )
+        UPDATE payroll_batches
+        SET assignments_count = (SELECT COUNT(*) FROM paid),
+            total_salary = COALESCE((SELECT SUM(amount) FROM workers WHERE role = 'maid'), 0),
+            total_senior_cleaner_salary = COALESCE((SELECT SUM(amount) FROM workers WHERE role = 'senior_cleaner'), 0)
+        WHERE id = %s
+        RETURNING assignments_count
+    """, (
+        batch_id, period_from, period_to + datetime.timedelta(days=1),
+        *((worker_ids, worker_ids) if worker_ids else ()),
+        batch_id, batch_id, batch_id
+    ))
+    if cur.fetchone()[0] == 0:
+        # Платить нечего - пустой пакет не сохраняем
+        conn.rollback()
+        return json_response(200, {'batch': None, 'replayed': False})
+    
+    batch = load_payroll_batch(cur, batch_id)
+    conn.commit()
+    return json_response(200, {'batch': batch, 'replayed': False})
+
+def handle_get_salary_stats(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Заработок сотрудников за текущий месяц"""
+    # Читаем помесячную сводку вместо агрегации всей истории assignments
+    cur.execute("""
+        SELECT 
+            u.id as maid_id,
+            u.full_name as maid_name,
+            u.role,
+            COALESCE(SUM(e.earned), 0) as total_earned,
+            COALESCE(SUM(e.jobs_count), 0) as completed_count,
+            COALESCE(SUM(e.earned) FILTER (WHERE e.month = date_trunc('month', CURRENT_DATE)::date), 0) as current_month_earned,
+            COALESCE(SUM(e.jobs_count) FILTER (WHERE e.month = date_trunc('month', CURRENT_DATE)::date), 0) as current_month_count
+        FROM users u
+        LEFT JOIN worker_monthly_earnings e ON e.worker_id = u.id AND e.role = u.role
+        WHERE u.role IN ('maid', 'senior_cleaner')
+        GROUP BY u.id, u.full_name, u.role
+    """)
+    
+    worker_stats = cur.fetchall()
+    
+    stats = []
+    total_paid = 0
+    
+    for row in worker_stats:
+        total_earned = float(row[3]) if row[3] else 0
+        current_month_earned = float(row[5]) if row[5] else 0
+        total_paid += total_earned
+    
+        stats.append({
+            'maid_id': row[0],
+            'maid_name': row[1],
+            'role': row[2],
+            'total_earned': total_earned,
+            'completed_count': row[4],
+            'current_month_earned': current_month_earned,
+            'current_month_count': row[6]
+        })
+    
+    # Сортируем по общему заработку
+    stats.sort(key=lambda x: x['total_earned'], reverse=True)
+    
+    return json_response(200, {'stats': stats, 'total_paid': total_paid})
+
+def payment_filters(params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """WHERE для списка и выгрузки выплат по параметрам paid, date_from, date_to; ValueError при неверной дате"""
+    filters = ['(a.verified_at IS NOT NULL OR a.inspection_completed_at IS NOT NULL)']
+    filter_params: List[Any] = []
+    paid_filter = params.get('paid')
+    if paid_filter == 'true':
+        filters.append('a.paid = TRUE')
+    elif paid_filter == 'false':
+        filters.append('a.paid = FALSE')
+    
+    if params.get('date_from'):
+        filters.append('COALESCE(a.verified_at, a.inspection_completed_at) >= %s')
+        filter_params.append(datetime.date.fromisoformat(params['date_from']))
+    
+    if params.get('date_to'):
+        filters.append('COALESCE(a.verified_at, a.inspection_completed_at) < %s')
+        filter_params.append(datetime.date.fromisoformat(params['date_to']) + datetime.timedelta(days=1))
+    
+    return ' AND '.join(filters), filter_params
+
+PAYMENTS_FROM_SQL = """
+    FROM assignments a
+    JOIN cleaning_addresses ca ON a.address_id = ca.id
+    JOIN users u ON a.maid_id = u.id
+    LEFT JOIN users sc ON a.senior_cleaner_id = sc.id
+"""
+
+def handle_get_payments(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Список выплат с фильтрами"""
+    try:
+        where_sql, filter_params = payment_filters(params)
+    except ValueError as e:
+        return json_response(400, {'error': f'invalid date: {e}'})
+    
+    cur.execute(f"""
+        SELECT {rows_select_sql(PAYMENT_COLUMNS)}
+        {PAYMENTS_FROM_SQL}
+        WHERE {where_sql}
+        ORDER BY COALESCE(a.verified_at, a.inspection_completed_at) DESC
+    """, filter_params)
+    
+    return json_response(200, {'payments': rows_payload(PAYMENT_COLUMNS, cur.fetchall())})
+
+def handle_get_payments_export(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Выгрузка выплат в CSV или XLSX для бухгалтерии: файл пишется потоком и отдается ссылкой"""
+    export_format = params.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return json_response(400, {'error': 'format must be csv or xlsx'})
+    if export_format == 'xlsx' and xlsxwriter is None:
+        return json_response(501, {'error': 'xlsx export is not available'})
+    
+    try:
+        where_sql, filter_params = payment_filters(params)
+    except ValueError as e:
+        return json_response(400, {'error': f'invalid date: {e}'})
+    
+    # Сортирует БД (при нехватке work_mem - на диске), функция же держит в памяти только текущую порцию строк
+    rows = iter_export_rows(conn, f"""
+        SELECT {', '.join(column[1] for column in PAYMENT_COLUMNS)}
+        {PAYMENTS_FROM_SQL}
+        WHERE {where_sql}
+        ORDER BY COALESCE(a.verified_at, a.inspection_completed_at), a.id
+    """, filter_params)
+    titles = [PAYMENT_EXPORT_TITLES[column[0]] for column in PAYMENT_COLUMNS]
+    filename = f"payments_{params.get('date_from') or 'all'}_{params.get('date_to') or 'all'}.{export_format}"
+    key = f'exports/{uuid.uuid4().hex}/{filename}'
+    store = get_export_store()
+    
+    if export_format == 'csv':
+        with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_MEMORY) as spool:
+            count = write_csv_export(rows, titles, spool)
+            spool.seek(0)
+            store.put_file(key, spool, EXPORT_FORMATS[export_format], filename)
+    else:
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            count = write_xlsx_export(rows, titles, path)
+            with open(path, 'rb') as f:
+                store.put_file(key, f, EXPORT_FORMATS[export_format], filename)
+        finally:
+            os.remove(path)
+    conn.rollback()
+    
+    return json_response(200, {'url': store.url(key), 'filename': filename, 'format': export_format, 'rows': count})
+
+def handle_delete_payments(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Удаление записи о выплате"""
+    assignment_id = params.get('id')
+    
+    if not assignment_id:
+        return json_response(400, {'error': 'id required'})
+    
+    retract_earnings(cur, 'id = %s', (int(assignment_id),))
+    cur.execute("DELETE FROM assignments WHERE id = %s", (int(assignment_id),))
+    conn.commit()
+    return json_response(200, {'message': 'Payment deleted'})
+
+def handle_get_changes(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Адреса с назначениями, измененные после курсора since; с wait=N ждет изменений до N секунд"""
+    try:
+        since, wait, reset = parse_change_params(params)
+        columns = select_columns(ADDRESS_COLUMNS, params, required=('id', 'scheduled_date', 'scheduled_time'))
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    
+    # Без since отдаем только курсор: клиент берет его до загрузки списка и дальше получает дельты
+    if since is None:
+        return json_response(200, {'cursor': encode_change_cursor(current_horizon(cur)), 'addresses': [], 'removed': [], 'reset': reset})
+    
+    def collect(since_xid: int, horizon: int) -> Dict[str, List[Any]]:
+        # Адрес считается измененным и когда меняется или удаляется одно из его назначений
+        window = (since_xid, horizon)
+        cur.execute("""
+            SELECT id FROM cleaning_addresses WHERE change_xid >= %s AND change_xid < %s
+            UNION
+            SELECT address_id FROM assignments WHERE change_xid >= %s AND change_xid < %s
+            UNION
+            SELECT address_id FROM change_tombstones
+            WHERE table_name = 'assignments' AND change_xid >= %s AND change_xid < %s
+            LIMIT %s
+        """, (*window, *window, *window, CHANGES_MAX_ROWS + 1))
+        changed_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("""
+            SELECT DISTINCT row_id FROM change_tombstones
+            WHERE table_name = 'cleaning_addresses' AND change_xid >= %s AND change_xid < %s
+        """, window)
+        return {'changed': changed_ids, 'removed': [row[0] for row in cur.fetchall()]}
+    
+    horizon, changes = poll_changes(conn, cur, since, wait, collect)
+    if len(changes['changed']) > CHANGES_MAX_ROWS:
+        # Изменилось слишком много - дешевле перезагрузить список целиком
+        return json_response(200, {'cursor': encode_change_cursor(horizon), 'addresses': [], 'removed': [], 'reset': True})
+    
+    addresses = []
+    if changes['changed']:
+        select_sql = ', '.join(column[1] for column in columns)
+        cur.execute(f"""
+            SELECT {select_sql}
+            FROM cleaning_addresses ca
+            LEFT JOIN assignments a ON ca.id = a.address_id
+            LEFT JOIN users u ON a.maid_id = u.id
+            LEFT JOIN users sc ON a.senior_cleaner_id = sc.id
+            WHERE ca.id = ANY(%s)
+            ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC, ca.id DESC
+        """, (*[photo_url_prefix()] * select_sql.count('%s'), changes['changed']))
+        addresses = [row_to_dict(columns, row) for row in cur.fetchall()]
+    
+    return json_response(200, {
+        'cursor': encode_change_cursor(horizon),
+        'addresses': addresses,
+        'removed': changes['removed'],
+        'reset': False
+    })
+
+def dashboard_query(params: Dict[str, Any]) -> Tuple[str, Tuple[Any, ...]]:
+    """SQL сводки админки и его параметры; ValueError при неверной дате"""
+    # Все части собираются одним запросом в JSON на стороне БД: один round-trip и одно соединение вместо четырех вызовов
+    day = datetime.date.fromisoformat(params['date']) if params.get('date') else None
+    
+    columns = select_columns(ADDRESS_COLUMNS, {'view': 'summary'})
+    job_sql = json_object_sql(columns)
+    unpaid_where_sql, unpaid_params = payment_filters({'paid': 'false'})
+    sql = f"""
+        SELECT
+            (SELECT COALESCE(json_object_agg(status, total), '{{}}')
+             FROM (SELECT status, COUNT(*) AS total FROM cleaning_addresses GROUP BY status) s)::text,
+            (SELECT COALESCE(json_agg({job_sql} ORDER BY ca.scheduled_time, ca.id), '[]')
+             FROM cleaning_addresses ca
+             LEFT JOIN assignments a ON ca.id = a.address_id
+             LEFT JOIN users u ON a.maid_id = u.id
+             LEFT JOIN users sc ON a.senior_cleaner_id = sc.id
+             WHERE ca.scheduled_date = COALESCE(%s, CURRENT_DATE))::text,
+            (SELECT COALESCE(json_agg(json_build_object(
+                        'id', u.id, 'full_name', u.full_name, 'email', u.email, 'phone', u.phone, 'role', u.role,
+                        'completed_count', COALESCE(w.completed_count, 0),
+                        'in_progress_count', COALESCE(w.in_progress_count, 0),
+                        'assigned_count', COALESCE(w.assigned_count, 0),
+                        'total_assignments', COALESCE(w.total_assignments, 0)
+                    ) ORDER BY u.role, u.full_name), '[]')
+             FROM users u
+             LEFT JOIN (
+                 SELECT a.maid_id,
+                        COUNT(*) FILTER (WHERE ca.status = 'completed') AS completed_count,
+                        COUNT(*) FILTER (WHERE ca.status = 'in_progress') AS in_progress_count,
+                        COUNT(*) FILTER (WHERE ca.status = 'assigned') AS assigned_count,
+                        COUNT(*) AS total_assignments
+                 FROM assignments a
+                 LEFT JOIN cleaning_addresses ca ON a.address_id = ca.id
+                 GROUP BY a.maid_id
+             ) w ON w.maid_id = u.id
+             WHERE u.role IN ('maid', 'senior_cleaner'))::text,
+            (SELECT json_build_object(
+                        'count', COUNT(*),
+                        'amount', COALESCE(SUM(COALESCE(a.salary, 0) + COALESCE(a.senior_cleaner_salary, 0)), 0)::float8
+                    )
+             {PAYMENTS_FROM_SQL}
+             WHERE {unpaid_where_sql})::text,
+            COALESCE(%s, CURRENT_DATE)::text
+    """
+    return sql, (day, *unpaid_params, day)
+
+def dashboard_response(row: Tuple) -> Dict[str, Any]:
+    """Ответ сводки админки из строки dashboard_query"""
+    status_counts, today, workers, unpaid, date = row
+    return json_response(200, {
+        'date': date,
+        'status_counts': RawJson(status_counts),
+        'today': RawJson(today),
+        'workers': RawJson(workers),
+        'unpaid': RawJson(unpaid),
+    })
+
+def handle_get_dashboard(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Сводка для первой отрисовки админки: счетчики по статусам, работы на сегодня, сотрудники и долг по выплатам"""
+    try:
+        sql, args = dashboard_query(params)
+    except ValueError as e:
+        return json_response(400, {'error': f'invalid date: {e}'})
+    cur.execute(sql, args)
+    return dashboard_response(cur.fetchone())
+
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '20'))
+# Долгий опрос сам управляет транзакциями и ждет на соединении, вложенный batch не нужен
+BATCH_EXCLUDED_ACTIONS = ('batch', 'changes')
+
+class BatchConnection:
+    """Соединение для шага атомарного batch: commit откладывается до конца пакета, rollback откатывает только шаг"""
+    
+    def __init__(self, conn: Any, cur: Any):
+        self._conn = conn
+        self._cur = cur
+    
+    def commit(self) -> None:
+        pass
+    
+    def rollback(self) -> None:
+        self._cur.execute("ROLLBACK TO SAVEPOINT batch_step")
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+def parse_batch_requests(body_data: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any], Any]]:
+    """Шаги batch как (action, method, params, body); ValueError при неверном описании"""
+    requests = body_data.get('requests')
+    if not isinstance(requests, list) or not requests:
+        raise ValueError('requests must be a non-empty list')
+    if len(requests) > BATCH_MAX_REQUESTS:
+        raise ValueError(f'at most {BATCH_MAX_REQUESTS} requests per batch')
+    steps = []
+    for index, request in enumerate(requests):
+        if not isinstance(request, dict) or not isinstance(request.get('action'), str):
+            raise ValueError(f'requests[{index}]: action is required')
+        action = request['action']
+        method = str(request.get('method', 'GET')).upper()
+        if action in BATCH_EXCLUDED_ACTIONS or (action, method) not in ROUTES:
+            raise ValueError(f'requests[{index}]: {method} {action} is not allowed in batch')
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            raise ValueError(f'requests[{index}]: params must be an object')
+        steps.append((action, method, {key: str(value) for key, value in params.items()}, request.get('body')))
+    return steps
+
+def handle_post_batch(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Несколько действий за один вызов на одном соединении; с atomic=true - в одной транзакции"""
+    # {requests: [{action, method, params, body}], atomic} -> {results: [{action, status, body}], committed}
+    body_data = read_json_body(event)
+    try:
+        steps = parse_batch_requests(body_data)
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    atomic = bool(body_data.get('atomic'))
+    
+    results: List[Dict[str, Any]] = []
+    failed = False
+    for action, method, step_params, step_body in steps:
+        if failed:
+            results.append({'action': action, 'status': None, 'body': {'error': 'skipped'}})
+            continue
+        step_event = {
+            'httpMethod': method,
+            'queryStringParameters': {**step_params, 'action': action},
+            'headers': event.get('headers') or {},
+            'body': step_body if step_body is None or isinstance(step_body, str) else json.dumps(step_body),
+            'isBase64Encoded': False,
+        }
+        denied = authorize(step_event, step_event['queryStringParameters'])
+        if denied is not None:
+            results.append({'action': action, 'status': denied['statusCode'], 'body': json.loads(denied['body'])})
+            conn.rollback()
+            failed = atomic
+            continue
+        step_conn = conn
+        if atomic:
+            cur.execute("SAVEPOINT batch_step")
+            step_conn = BatchConnection(conn, cur)
+        try:
+            response = ROUTES[(action, method)](step_event, step_event['queryStringParameters'], step_conn, cur)
+        except Exception as e:
+            print(f"Batch step {method} {action} failed: {str(e)}")
+            response = json_response(500, {'error': f'Server error: {str(e)}'})
+        status = response['statusCode']
+        results.append({'action': action, 'status': status, 'body': json.loads(response['body']) if response['body'] else None})
+        if status >= 400:
+            conn.rollback()
+            # В атомарном пакете ошибка шага отменяет уже выполненные шаги и пропускает оставшиеся
+            failed = atomic
+        elif atomic:
+            cur.execute("RELEASE SAVEPOINT batch_step")
+    
+    committed = atomic and not failed
+    if committed:
+        conn.commit()
+    return json_response(200, {'results': results, 'committed': committed if atomic else None})
+
+ROUTES = {
+    ('addresses', 'GET'): handle_get_addresses,
+    ('addresses', 'POST'): handle_post_addresses,
+    ('addresses', 'PUT'): handle_put_addresses,
+    ('addresses', 'DELETE'): handle_delete_addresses,
+    ('address', 'GET'): handle_get_address,
+    ('maids', 'GET'): handle_get_maids,
+    ('maids', 'PUT'): handle_put_maids,
+    ('maids', 'DELETE'): handle_delete_maids,
+    ('maids', 'POST'): handle_post_maids,
+    ('assign', 'POST'): handle_post_assign,
+    ('bulk-addresses', 'POST'): handle_post_bulk_addresses,
+    ('bulk-assign', 'POST'): handle_post_bulk_assign,
+    ('schedule', 'POST'): handle_post_schedule,
+    ('verify', 'POST'): handle_post_verify,
+    ('cancel-assignment', 'POST'): handle_post_cancel_assignment,
+    ('mark-paid', 'POST'): handle_post_mark_paid,
+    ('payroll-run', 'POST'): handle_post_payroll_run,
+    ('salary-stats', 'GET'): handle_get_salary_stats,
+    ('payments', 'GET'): handle_get_payments,
+    ('payments-export', 'GET'): handle_get_payments_export,
+    ('payments', 'DELETE'): handle_delete_payments,
+    ('changes', 'GET'): handle_get_changes,
+    ('dashboard', 'GET'): handle_get_dashboard,
+    ('batch', 'POST'): handle_post_batch,
+}
+
+# GET-действия с ETag: (SQL версии данных, параметр запроса с id области или None)
+ROUTE_VERSIONS: Dict[Tuple[str, str], Tuple[str, Optional[str]]] = {
+    ('addresses', 'GET'): (ASSIGNMENTS_TABLES_VERSION_SQL, None),
+    ('address', 'GET'): (ADDRESS_VERSION_SQL, 'id'),
+    ('maids', 'GET'): (ASSIGNMENTS_TABLES_VERSION_SQL, None),
+    ('payments', 'GET'): (ASSIGNMENTS_TABLES_VERSION_SQL, None),
+    ('salary-stats', 'GET'): (SALARY_STATS_VERSION_SQL, None),
+    ('dashboard', 'GET'): (DASHBOARD_VERSION_SQL, None),
+}
+
+@instrumented('admin', 'addresses', ROUTES)
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
-    params = event.get('queryStringParameters', {})
-    action = params.get('action', 'addresses') if params else 'addresses'
+    params = event.get('queryStringParameters') or {}
+    action = params.get('action', 'addresses')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'body': ''}
+    
+    # Маршрут ищем до подключения к БД: неизвестные действия не занимают соединение из пула
+    route = ROUTES.get((action, method))
+    if route is None:
+        return json_response(404, {'error': 'Not found'})
+    
+    denied = authorize(event, params)
+    if denied is not None:
+        return denied
     
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Database connection error'})
-        }
+        return json_response(500, {'error': 'Database connection error'})
     
+    conn = None
+    cur = None
     try:
-        conn = psycopg2.connect(database_url)
-        cur = conn.cursor()
-        
-        if action == 'addresses':
-            if method == 'GET':
-                cur.execute("""
-                    SELECT 
-                        ca.id, ca.address, ca.client_name, ca.client_phone, ca.service_type, 
-                        ca.area, ca.price, ca.scheduled_date, ca.scheduled_time, ca.status, ca.notes, ca.created_at,
-                        a.photo_before, a.photo_after, a.photos_uploaded_at,
-                        u.full_name as assigned_maid_name,
-                        a.salary, a.verified_at, sc.full_name as senior_cleaner_name,
-                        a.senior_cleaner_salary, a.inspection_completed_at
-                    FROM cleaning_addresses ca
-                    LEFT JOIN assignments a ON ca.id = a.address_id
-                    LEFT JOIN users u ON a.maid_id = u.id
-                    LEFT JOIN users sc ON a.senior_cleaner_id = sc.id
-                    ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC
-                """)
-                rows = cur.fetchall()
-                addresses = []
-                for row in rows:
-                    addresses.append({
-                        'id': row[0],
-                        'address': row[1],
-                        'client_name': row[2],
-                        'client_phone': row[3],
-                        'service_type': row[4],
-                        'area': row[5],
-                        'price': float(row[6]),
-                        'scheduled_date': str(row[7]),
-                        'scheduled_time': str(row[8]),
-                        'status': row[9],
-                        'notes': row[10],
-                        'created_at': str(row[11]) if row[11] else None,
-                        'photo_before': row[12],
-                        'photo_after': row[13],
-                        'photos_uploaded_at': str(row[14]) if row[14] else None,
-                        'assigned_maid_name': row[15],
-                        'salary': float(row[16]) if row[16] else None,
-                        'verified_at': str(row[17]) if row[17] else None,
-                        'senior_cleaner_name': row[18],
-                        'senior_cleaner_salary': float(row[19]) if row[19] else None,
-                        'inspection_completed_at': str(row[20]) if row[20] else None
-                    })
-                
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'addresses': addresses})
-                }
-            
-            elif method == 'POST':
-                body_data = json.loads(event.get('body', '{}'))
-                cur.execute("""
-                    INSERT INTO cleaning_addresses 
-                    (address, client_name, client_phone, service_type, area, price, 
-                     scheduled_date, scheduled_time, notes)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
-                """, (
-                    body_data.get('address'),
-                    body_data.get('client_name'),
-                    body_data.get('client_phone'),
-                    body_data.get('service_type'),
-                    body_data.get('area'),
-                    body_data.get('price'),
-                    body_data.get('scheduled_date'),
-                    body_data.get('scheduled_time'),
-                    body_data.get('notes', '')
-                ))
-                new_id = cur.fetchone()[0]
-                conn.commit()
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 201,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'id': new_id, 'message': 'Address created'})
-                }
-            
-            elif method == 'PUT':
-                params = event.get('queryStringParameters', {})
-                address_id = params.get('id')
-                
-                if not address_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'id required'})
-                    }
-                
-                body_data = json.loads(event.get('body', '{}'))
-                cur.execute("""
-                    UPDATE cleaning_addresses 
-                    SET address = %s, client_name = %s, client_phone = %s, 
-                        service_type = %s, area = %s, price = %s, 
-                        scheduled_date = %s, scheduled_time = %s, notes = %s
-                    WHERE id = %s
-                """, (
-                    body_data.get('address'),
-                    body_data.get('client_name'),
-                    body_data.get('client_phone'),
-                    body_data.get('service_type'),
-                    body_data.get('area'),
-                    body_data.get('price'),
-                    body_data.get('scheduled_date'),
-                    body_data.get('scheduled_time'),
-                    body_data.get('notes', ''),
-                    int(address_id)
-                ))
-                conn.commit()
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'message': 'Address updated'})
-                }
-            
-            elif method == 'DELETE':
-                params = event.get('queryStringParameters', {})
-                address_id = params.get('id')
-                
-                if not address_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'id required'})
-                    }
-                
-                cur.execute("DELETE FROM assignments WHERE address_id = %s", (int(address_id),))
-                cur.execute("DELETE FROM cleaning_addresses WHERE id = %s", (int(address_id),))
-                conn.commit()
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'message': 'Address deleted'})
-                }
-        
-        elif action == 'maids':
-            if method == 'GET':
-                cur.execute("""
-                    SELECT 
-                        u.id, 
-                        u.full_name, 
-                        u.email, 
-                        u.phone,
-                        u.role,
-                        COUNT(CASE WHEN ca.status = 'completed' THEN 1 END) as completed_count,
-                        COUNT(CASE WHEN ca.status = 'in_progress' THEN 1 END) as in_progress_count,
-                        COUNT(CASE WHEN ca.status = 'assigned' THEN 1 END) as assigned_count,
-                        COUNT(a.id) as total_assignments
-                    FROM users u
-                    LEFT JOIN assignments a ON u.id = a.maid_id
-                    LEFT JOIN cleaning_addresses ca ON a.address_id = ca.id
-                    WHERE u.role IN ('maid', 'senior_cleaner')
-                    GROUP BY u.id, u.full_name, u.email, u.phone, u.role
-                    ORDER BY u.role, u.full_name
-                """)
-                rows = cur.fetchall()
-                maids = []
-                for row in rows:
-                    maids.append({
-                        'id': row[0],
-                        'full_name': row[1],
-                        'email': row[2],
-                        'phone': row[3],
-                        'role': row[4],
-                        'completed_count': row[5],
-                        'in_progress_count': row[6],
-                        'assigned_count': row[7],
-                        'total_assignments': row[8]
-                    })
-                
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'maids': maids})
-                }
-            
-            elif method == 'PUT':
-                body_data = json.loads(event.get('body', '{}'))
-                maid_id = body_data.get('id')
-                cur.execute("""
-                    UPDATE users 
-                    SET full_name = %s, email = %s, phone = %s, password_hash = %s
-                    WHERE id = %s AND role IN ('maid', 'senior_cleaner')
-                """, (
-                    body_data.get('full_name'),
-                    body_data.get('email'),
-                    body_data.get('phone'),
-                    body_data.get('password'),
-                    maid_id
-                ))
-                conn.commit()
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'message': 'Maid updated'})
-                }
-            
-            elif method == 'DELETE':
-                body_data = json.loads(event.get('body', '{}'))
-                maid_id = body_data.get('id')
-                
-                cur.execute("DELETE FROM assignments WHERE maid_id = %s", (maid_id,))
-                cur.execute("DELETE FROM users WHERE id = %s AND role IN ('maid', 'senior_cleaner')", (maid_id,))
-                conn.commit()
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'message': 'Maid deleted'})
-                }
-            
-            elif method == 'POST':
-                body_data = json.loads(event.get('body', '{}'))
-                role = body_data.get('role', 'maid')
-                cur.execute("""
-                    INSERT INTO users (email, password_hash, full_name, phone, role)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id
-                """, (
-                    body_data.get('email'),
-                    body_data.get('password'),
-                    body_data.get('full_name'),
-                    body_data.get('phone'),
-                    role
-                ))
-                new_id = cur.fetchone()[0]
-                conn.commit()
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 201,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'id': new_id, 'message': 'Maid created'})
-                }
-        
-        elif action == 'assign' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            address_id = body_data.get('address_id')
-            maid_id = body_data.get('maid_id')
-            senior_cleaner_id = body_data.get('senior_cleaner_id')
-            salary = body_data.get('salary', 5000)
-            senior_cleaner_salary = body_data.get('senior_cleaner_salary', 2000)
-            
-            cur.execute("""
-                INSERT INTO assignments (address_id, maid_id, senior_cleaner_id, salary, senior_cleaner_salary, status)
-                VALUES (%s, %s, %s, %s, %s, 'assigned')
-                ON CONFLICT (address_id, maid_id) DO UPDATE 
-                SET salary = EXCLUDED.salary, senior_cleaner_id = EXCLUDED.senior_cleaner_id, senior_cleaner_salary = EXCLUDED.senior_cleaner_salary
-                RETURNING id
-            """, (address_id, maid_id, senior_cleaner_id, salary, senior_cleaner_salary))
-            
-            result = cur.fetchone()
-            if result:
-                cur.execute("""
-                    UPDATE cleaning_addresses 
-                    SET status = 'assigned' 
-                    WHERE id = %s
-                """, (address_id,))
-                conn.commit()
-            
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Assignment created'})
-            }
-        
-        elif action == 'verify' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            address_id = body_data.get('address_id')
-            admin_id = body_data.get('admin_id')
-            
-            cur.execute("""
-                UPDATE assignments 
-                SET verified_at = NOW(), verified_by = %s
-                WHERE address_id = %s AND status = 'completed'
-                RETURNING id
-            """, (admin_id, address_id))
-            
-            result = cur.fetchone()
-            if result:
-                cur.execute("""
-                    UPDATE cleaning_addresses
-                    SET status = 'verified'
-                    WHERE id = %s
-                """, (address_id,))
-                conn.commit()
-            
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Verified and salary assigned'})
-            }
-        
-        elif action == 'cancel-assignment' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            address_id = body_data.get('address_id')
-            
-            if not address_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'address_id required'})
-                }
-            
-            cur.execute("""
-                UPDATE cleaning_addresses 
-                SET status = 'cancelled' 
-                WHERE id = %s
-            """, (address_id,))
-            
-            cur.execute("""
-                UPDATE assignments 
-                SET status = 'cancelled' 
-                WHERE address_id = %s
-            """, (address_id,))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Assignment cancelled'})
-            }
+        connect_started = time.perf_counter()
+        conn = get_connection(database_url)
+        record_connect(time.perf_counter() - connect_started)
+        cur = conn.cursor(cursor_factory=TimedCursor)
         
-        elif action == 'mark-paid' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            assignment_id = body_data.get('assignment_id')
-            
-            if not assignment_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'assignment_id required'})
-                }
-            
-            cur.execute("""
-                UPDATE assignments 
-                SET paid = TRUE
-                WHERE id = %s
-            """, (int(assignment_id),))
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Payment marked'})
-            }
+        # Версию данных считаем до выборки: если данные изменятся между запросами, следующий ETag просто не совпадет
+        etag = None
+        version = ROUTE_VERSIONS.get((action, method))
+        if version is not None:
+            etag = compute_etag(cur, version, params)
+            if etag is not None and etag in request_etags(event):
+                return not_modified(etag)
         
-        elif action == 'salary-stats' and method == 'GET':
-            # Статистика для горничных
-            cur.execute("""
-                SELECT 
-                    u.id as maid_id,
-                    u.full_name as maid_name,
-                    u.role,
-                    COALESCE(SUM(a.salary), 0) as total_earned,
-                    COUNT(CASE WHEN a.verified_at IS NOT NULL THEN 1 END) as completed_count,
-                    COALESCE(SUM(CASE 
-                        WHEN EXTRACT(MONTH FROM a.verified_at) = EXTRACT(MONTH FROM CURRENT_DATE)
-                        AND EXTRACT(YEAR FROM a.verified_at) = EXTRACT(YEAR FROM CURRENT_DATE)
-                        THEN a.salary ELSE 0 END), 0) as current_month_earned,
-                    COUNT(CASE 
-                        WHEN EXTRACT(MONTH FROM a.verified_at) = EXTRACT(MONTH FROM CURRENT_DATE)
-                        AND EXTRACT(YEAR FROM a.verified_at) = EXTRACT(YEAR FROM CURRENT_DATE)
-                        THEN 1 END) as current_month_count
-                FROM users u
-                LEFT JOIN assignments a ON u.id = a.maid_id
-                WHERE u.role = 'maid'
-                GROUP BY u.id, u.full_name, u.role
-            """)
-            
-            maid_stats = cur.fetchall()
-            
-            # Статистика для старших клинеров
-            cur.execute("""
-                SELECT 
-                    u.id as senior_id,
-                    u.full_name as senior_name,
-                    u.role,
-                    COALESCE(SUM(a.senior_cleaner_salary), 0) as total_earned,
-                    COUNT(CASE WHEN a.inspection_completed_at IS NOT NULL THEN 1 END) as completed_count,
-                    COALESCE(SUM(CASE 
-                        WHEN EXTRACT(MONTH FROM a.inspection_completed_at) = EXTRACT(MONTH FROM CURRENT_DATE)
-                        AND EXTRACT(YEAR FROM a.inspection_completed_at) = EXTRACT(YEAR FROM CURRENT_DATE)
-                        THEN a.senior_cleaner_salary ELSE 0 END), 0) as current_month_earned,
-                    COUNT(CASE 
-                        WHEN EXTRACT(MONTH FROM a.inspection_completed_at) = EXTRACT(MONTH FROM CURRENT_DATE)
-                        AND EXTRACT(YEAR FROM a.inspection_completed_at) = EXTRACT(YEAR FROM CURRENT_DATE)
-                        THEN 1 END) as current_month_count
-                FROM users u
-                LEFT JOIN assignments a ON u.id = a.senior_cleaner_id
-                WHERE u.role = 'senior_cleaner'
-                GROUP BY u.id, u.full_name, u.role
-            """)
-            
-            senior_stats = cur.fetchall()
-            
-            stats = []
-            total_paid = 0
-            
-            # Обрабатываем статистику горничных
-            for row in maid_stats:
-                total_earned = float(row[3]) if row[3] else 0
-                current_month_earned = float(row[5]) if row[5] else 0
-                total_paid += total_earned
-                
-                stats.append({
-                    'maid_id': row[0],
-                    'maid_name': row[1],
-                    'role': row[2],
-                    'total_earned': total_earned,
-                    'completed_count': row[4],
-                    'current_month_earned': current_month_earned,
-                    'current_month_count': row[6]
-                })
-            
-            # Обрабатываем статистику старших клинеров
-            for row in senior_stats:
-                total_earned = float(row[3]) if row[3] else 0
-                current_month_earned = float(row[5]) if row[5] else 0
-                total_paid += total_earned
-                
-                stats.append({
-                    'maid_id': row[0],
-                    'maid_name': row[1],
-                    'role': row[2],
-                    'total_earned': total_earned,
-                    'completed_count': row[4],
-                    'current_month_earned': current_month_earned,
-                    'current_month_count': row[6]
-                })
-            
-            # Сортируем по общему заработку
-            stats.sort(key=lambda x: x['total_earned'], reverse=True)
-            
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'stats': stats, 'total_paid': total_paid})
+        response = route(event, params, conn, cur)
+        if etag is not None and response['statusCode'] == 200:
+            response['headers'] = {
+                **response['headers'], 'ETag': etag, 'Cache-Control': ETAG_CACHE_CONTROL,
+                'Access-Control-Expose-Headers': 'ETag'
             }
-        
-        elif action == 'payments':
-            if method == 'GET':
-                paid_filter = params.get('paid')
-                date_from = params.get('date_from')
-                date_to = params.get('date_to')
-                
-                query = """
-                    SELECT 
-                        a.id,
-                        ca.address,
-                        ca.client_name,
-                        ca.scheduled_date,
-                        u.full_name as maid_name,
-                        u.role as maid_role,
-                        a.salary,
-                        a.verified_at,
-                        a.inspection_completed_at,
-                        a.paid,
-                        ca.service_type,
-                        ca.area,
-                        sc.full_name as senior_cleaner_name,
-                        a.senior_cleaner_salary
-                    FROM assignments a
-                    JOIN cleaning_addresses ca ON a.address_id = ca.id
-                    JOIN users u ON a.maid_id = u.id
-                    LEFT JOIN users sc ON a.senior_cleaner_id = sc.id
-                    WHERE a.verified_at IS NOT NULL OR a.inspection_completed_at IS NOT NULL
-                """
-                
-                if paid_filter == 'true':
-                    query += " AND a.paid = TRUE"
-                elif paid_filter == 'false':
-                    query += " AND a.paid = FALSE"
-                
-                if date_from:
-                    query += f" AND COALESCE(a.verified_at, a.inspection_completed_at) >= '{date_from}'"
-                
-                if date_to:
-                    query += f" AND COALESCE(a.verified_at, a.inspection_completed_at) <= '{date_to} 23:59:59'"
-                
-                query += " ORDER BY COALESCE(a.verified_at, a.inspection_completed_at) DESC"
-                
-                cur.execute(query)
-                rows = cur.fetchall()
-                
-                payments = []
-                for row in rows:
-                    payments.append({
-                        'id': row[0],
-                        'address': row[1],
-                        'client_name': row[2],
-                        'scheduled_date': str(row[3]),
-                        'maid_name': row[4],
-                        'maid_role': row[5],
-                        'salary': float(row[6]) if row[6] else 0,
-                        'verified_at': str(row[7]) if row[7] else None,
-                        'inspection_completed_at': str(row[8]) if row[8] else None,
-                        'paid': row[9],
-                        'service_type': row[10],
-                        'area': row[11],
-                        'senior_cleaner_name': row[12],
-                        'senior_cleaner_salary': float(row[13]) if row[13] else 0
-                    })
-                
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'payments': payments})
-                }
-            
-            elif method == 'DELETE':
-                assignment_id = params.get('id')
-                
-                if not assignment_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'id required'})
-                    }
-                
-                cur.execute("DELETE FROM assignments WHERE id = %s", (int(assignment_id),))
-                conn.commit()
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'message': 'Payment deleted'})
-                }
-        
-        cur.close()
-        conn.close()
-        return {
-            'statusCode': 404,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Not found'})
-        }
-        
+        return compress_response(event, response)
     except Exception as e:
         print(f"Error: {str(e)}")
         import traceback
         traceback.print_exc()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
\ No newline at end of file
+        return json_response(500, {'error': f'Server error: {str(e)}'})
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            release_connection(conn)
\ No newline at end of file
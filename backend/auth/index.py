@@ -2,71 +2,290 @@
 Business: Аутентификация пользователей (вход в систему)
 Args: event - dict с httpMethod, body (email, password)
       context - объект с атрибутами request_id, function_name
-Returns: HTTP response с данными пользователя или ошибкой
+Returns: HTTP response с данными пользователя и подписанным токеном сессии или ошибкой
 '''
+import base64
+import contextvars
+import functools
+import hashlib
+import hmac
 import json
 import os
+import threading
+import time
 import psycopg2
-from typing import Dict, Any
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from typing import Dict, Any, Callable, List, Optional, Tuple
 
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '4'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+# Пул живет на уровне модуля и переживает тёплые вызовы функции
+_db_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_db_pool_lock = threading.Lock()
+_conn_last_used: Dict[int, float] = {}
+
+def _connection_is_alive(conn: Any) -> bool:
+    """Проверяет, что соединение из пула еще пригодно для работы"""
+    if conn.closed:
+        return False
+    if time.monotonic() - _conn_last_used.get(id(conn), 0.0) < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def get_connection(database_url: str) -> Any:
+    """Берет соединение из пула, при необходимости создавая пул и заменяя мертвые соединения"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool.closed:
+            _db_pool = pg_pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, database_url)
+    
+    for _ in range(DB_POOL_MAX + 1):
+        conn = _db_pool.getconn()
+        if _connection_is_alive(conn):
+            return conn
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError('No healthy database connection available')
+
+def release_connection(conn: Any) -> None:
+    """Возвращает соединение в пул, откатывая незавершенную транзакцию"""
+    if _db_pool is None or _db_pool.closed:
+        return
+    if conn.closed:
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        return
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        return
+    _conn_last_used[id(conn)] = time.monotonic()
+    _db_pool.putconn(conn)
+
+# Метрики запросов: строка JSON в лог на каждый вызов и, если задан METRICS_PROM_FILE, счетчики Prometheus в файле
+METRICS_LOG = os.environ.get('METRICS_LOG', 'full')
+METRICS_PROM_FILE = os.environ.get('METRICS_PROM_FILE')
+METRICS_PROM_FLUSH_SECONDS = float(os.environ.get('METRICS_PROM_FLUSH_SECONDS', '10'))
+METRICS_MAX_STATEMENTS = 50
+METRICS_STATEMENT_CHARS = 120
+
+_request_metrics: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('request_metrics', default=None)
+_metric_totals: Dict[Tuple[str, str, str, int], List[float]] = {}
+_metric_totals_lock = threading.Lock()
+_metrics_flushed_at = 0.0
+
+def statement_label(query: Any) -> str:
+    """Начало SQL-запроса без значений: по нему видно, какой запрос медленный, но не данные клиентов"""
+    text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    text = ' '.join(text.split())
+    values_at = text.upper().find(' VALUES ')
+    if values_at != -1:
+        text = text[:values_at + len(' VALUES')]
+    return text[:METRICS_STATEMENT_CHARS]
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Курсор, который записывает время и число строк каждого запроса в метрики текущего вызова"""
+    
+    def execute(self, query: Any, vars: Any = None) -> None:
+        started = time.perf_counter()
+        try:
+            super().execute(query, vars)
+        finally:
+            metrics = _request_metrics.get()
+            if metrics is not None:
+                elapsed = time.perf_counter() - started
+                rows = max(self.rowcount, 0)
+                metrics['db_seconds'] += elapsed
+                metrics['sql_count'] += 1
+                metrics['rows'] += rows
+                if len(metrics['sql']) < METRICS_MAX_STATEMENTS:
+                    metrics['sql'].append({'ms': round(elapsed * 1000, 2), 'rows': rows, 'statement': statement_label(query)})
+
+def record_connect(seconds: float) -> None:
+    """Время получения соединения из пула (включая создание пула и проверку соединения)"""
+    metrics = _request_metrics.get()
+    if metrics is not None:
+        metrics['connect_seconds'] += seconds
+
+def write_prometheus_metrics(path: str) -> None:
+    """Пишет накопленные счетчики в формате textfile-коллектора node_exporter"""
+    series = (
+        ('handler_requests_total', 0), ('handler_duration_seconds_total', 1), ('handler_connect_seconds_total', 2),
+        ('handler_db_seconds_total', 3), ('handler_sql_statements_total', 4), ('handler_rows_total', 5),
+        ('handler_response_bytes_total', 6),
+    )
+    with _metric_totals_lock:
+        totals = {key: list(values) for key, values in _metric_totals.items()}
+    lines = []
+    for name, index in series:
+        lines.append(f'# TYPE {name} counter')
+        for (function, action, method, status), values in sorted(totals.items()):
+            labels = f'function="{function}",action="{action}",method="{method}",status="{status}"'
+            lines.append(f'{name}{{{labels}}} {values[index]:g}')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+def emit_metrics(function: str, action: str, method: str, metrics: Dict[str, Any], response: Optional[Dict[str, Any]]) -> None:
+    """Выводит строку метрик вызова и добавляет ее к счетчикам Prometheus"""
+    global _metrics_flushed_at
+    status = response.get('statusCode', 0) if response else 500
+    response_bytes = len(response.get('body') or '') if response else 0
+    if METRICS_LOG != 'off':
+        record = {
+            'event': 'request', 'function': function, 'action': action, 'method': method, 'status': status,
+            'total_ms': round(metrics['total_seconds'] * 1000, 2),
+            'connect_ms': round(metrics['connect_seconds'] * 1000, 2),
+            'db_ms': round(metrics['db_seconds'] * 1000, 2),
+            'sql_count': metrics['sql_count'], 'rows': metrics['rows'], 'response_bytes': response_bytes,
+        }
+        if METRICS_LOG == 'full':
+            record['sql'] = metrics['sql']
+        print(json.dumps(record, ensure_ascii=False))
+    if METRICS_PROM_FILE:
+        with _metric_totals_lock:
+            totals = _metric_totals.setdefault((function, action, method, status), [0.0] * 7)
+            for index, value in enumerate((
+                1, metrics['total_seconds'], metrics['connect_seconds'], metrics['db_seconds'],
+                metrics['sql_count'], metrics['rows'], response_bytes
+            )):
+                totals[index] += value
+        now = time.monotonic()
+        if now - _metrics_flushed_at >= METRICS_PROM_FLUSH_SECONDS:
+            _metrics_flushed_at = now
+            write_prometheus_metrics(METRICS_PROM_FILE)
+
+def instrumented(function: str, default_action: str, routes: Optional[Dict[Tuple[str, str], Any]] = None) -> Callable:
+    """Оборачивает handler: собирает метрики вызова в contextvar, по завершении выводит их"""
+    def decorator(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            method = event.get('httpMethod', 'GET')
+            action = (event.get('queryStringParameters') or {}).get('action', default_action)
+            # Неизвестные действия сводим в одно значение, чтобы метки Prometheus не разрастались
+            if routes is not None and method != 'OPTIONS' and (action, method) not in routes:
+                action = 'unknown'
+            metrics = {'connect_seconds': 0.0, 'db_seconds': 0.0, 'sql_count': 0, 'rows': 0, 'sql': []}
+            token = _request_metrics.set(metrics)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                metrics['total_seconds'] = time.perf_counter() - started
+                _request_metrics.reset(token)
+                emit_metrics(function, action, method, metrics, response)
+        return wrapper
+    return decorator
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Max-Age': '86400'
+}
+
+def json_response(status: int, payload: Any, headers: Dict[str, str] = JSON_HEADERS) -> Dict[str, Any]:
+    """Ответ с JSON-телом и заранее собранными заголовками"""
+    return {'statusCode': status, 'headers': headers, 'body': json.dumps(payload)}
+
+# Токен сессии проверяется остальными функциями локально по тому же SESSION_SECRET, без запроса к users
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', '43200'))
+
+def b64url_encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def issue_session_token(user_id: int, role: str) -> Tuple[str, int]:
+    """Токен base64url(JSON {uid, role, exp}).base64url(HMAC-SHA256) и срок его действия"""
+    expires_at = int(time.time()) + SESSION_TTL_SECONDS
+    payload = b64url_encode(json.dumps({'uid': user_id, 'role': role, 'exp': expires_at}, separators=(',', ':')).encode())
+    signature = hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    return f'{payload}.{b64url_encode(signature)}', expires_at
+
+# Пароли хранятся как pbkdf2_sha256$итерации$соль$хеш (тот же формат пишет admin при создании сотрудника).
+# Строки без префикса - пароли, сохраненные открытым текстом до хеширования; при входе они перехешируются
+PASSWORD_HASH_PREFIX = 'pbkdf2_sha256'
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '600000'))
+
+def hash_password(password: str) -> str:
+    salt = b64url_encode(os.urandom(16))
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), PASSWORD_HASH_ITERATIONS)
+    return f'{PASSWORD_HASH_PREFIX}${PASSWORD_HASH_ITERATIONS}${salt}${b64url_encode(digest)}'
+
+def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """(пароль верен, хеш нужно пересчитать) для сохраненного значения password_hash"""
+    algorithm, _, rest = (stored or '').partition('$')
+    if algorithm != PASSWORD_HASH_PREFIX:
+        return hmac.compare_digest(password.encode(), (stored or '').encode()), True
+    iterations, salt, digest = rest.split('$', 2)
+    expected = b64url_encode(hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), int(iterations)))
+    return hmac.compare_digest(expected, digest), int(iterations) != PASSWORD_HASH_ITERATIONS
+
+def read_json_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Тело запроса как JSON; пустое тело считается пустым объектом"""
+    return json.loads(event.get('body') or '{}')
+
+@instrumented('auth', 'login')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'body': ''}
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return json_response(405, {'error': 'Method not allowed'})
     
-    body_data = json.loads(event.get('body', '{}'))
+    body_data = read_json_body(event)
     email = body_data.get('email')
     password = body_data.get('password')
     
-    if not email or not password:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Email и пароль обязательны'})
-        }
+    if not email or not password or not isinstance(password, str):
+        return json_response(400, {'error': 'Email и пароль обязательны'})
     
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Database connection error'})
-        }
+        return json_response(500, {'error': 'Database connection error'})
     
+    conn = None
     try:
-        conn = psycopg2.connect(database_url)
-        cur = conn.cursor()
+        connect_started = time.perf_counter()
+        conn = get_connection(database_url)
+        record_connect(time.perf_counter() - connect_started)
+        cur = conn.cursor(cursor_factory=TimedCursor)
         
-        query = f"SELECT id, email, full_name, role, phone FROM users WHERE email = '{email}'"
-        cur.execute(query)
+        cur.execute("SELECT id, email, full_name, role, phone, password_hash FROM users WHERE email = %s", (email,))
         user_row = cur.fetchone()
         
-        cur.close()
-        conn.close()
+        valid, needs_rehash = verify_password(password, user_row[5]) if user_row else (False, False)
+        if not valid:
+            cur.close()
+            return json_response(401, {'error': 'Неверный email или пароль'})
         
-        if not user_row:
-            return {
-                'statusCode': 401,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Неверный email или пароль'})
-            }
+        if needs_rehash:
+            # Условие на старое значение: при одновременных входах хеш запишет только первый
+            cur.execute(
+                "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                (hash_password(password), user_row[0], user_row[5])
+            )
+            conn.commit()
+        cur.close()
         
         user = {
             'id': user_row[0],
@@ -76,16 +295,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'phone': user_row[4]
         }
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'user': user})
-        }
+        if not SESSION_SECRET:
+            return json_response(200, {'user': user, 'token': None})
+        token, expires_at = issue_session_token(user['id'], user['role'])
+        return json_response(200, {'user': user, 'token': token, 'expires_at': expires_at})
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
+        return json_response(500, {'error': f'Server error: {str(e)}'})
+
+    finally:
+        if conn is not None:
+            release_connection(conn)
\ No newline at end of file
@@ -4,371 +4,1495 @@ Args: event - dict с httpMethod, body, queryStringParameters
       context - объект с атрибутами request_id, function_name
 Returns: HTTP response с заданиями или результатом операции
 '''
+import base64
+import contextvars
+import functools
+import gzip
+import hashlib
+import hmac
+import io
 import json
 import os
+import re
+import select
+import shutil
+import tempfile
+import threading
+import uuid
+import time
 import psycopg2
-from typing import Dict, Any, List
-
-def get_checklist_for_service_type(service_type: str) -> List[Dict[str, Any]]:
-    """Генерирует чек-лист для типа уборки"""
-    base_items = [
-        {'id': '1', 'text': 'Протереть пыль с мебели', 'category': 'Общие зоны', 'checked': False},
-        {'id': '2', 'text': 'Пропылесосить полы', 'category': 'Общие зоны', 'checked': False},
-        {'id': '3', 'text': 'Вымыть полы', 'category': 'Общие зоны', 'checked': False},
-        {'id': '4', 'text': 'Протереть зеркала', 'category': 'Общие зоны', 'checked': False},
-        {'id': '5', 'text': 'Протереть дверные ручки', 'category': 'Общие зоны', 'checked': False},
-        {'id': '6', 'text': 'Протереть выключатели', 'category': 'Общие зоны', 'checked': False},
-        {'id': '7', 'text': 'Вынести мусор', 'category': 'Общие зоны', 'checked': False},
-        {'id': '13', 'text': 'Вымыть раковину', 'category': 'Кухня', 'checked': False},
-        {'id': '14', 'text': 'Очистить плиту', 'category': 'Кухня', 'checked': False},
-        {'id': '15', 'text': 'Протереть столешницы', 'category': 'Кухня', 'checked': False},
-        {'id': '16', 'text': 'Вымыть холодильник снаружи', 'category': 'Кухня', 'checked': False},
-        {'id': '17', 'text': 'Очистить микроволновку', 'category': 'Кухня', 'checked': False},
-        {'id': '18', 'text': 'Протереть смесители', 'category': 'Кухня', 'checked': False},
-        {'id': '24', 'text': 'Вымыть унитаз', 'category': 'Ванная', 'checked': False},
-        {'id': '25', 'text': 'Очистить раковину', 'category': 'Ванная', 'checked': False},
-        {'id': '26', 'text': 'Вымыть ванну/душевую', 'category': 'Ванная', 'checked': False},
-        {'id': '27', 'text': 'Протереть зеркало', 'category': 'Ванная', 'checked': False},
-        {'id': '28', 'text': 'Вымыть плитку', 'category': 'Ванная', 'checked': False},
-        {'id': '29', 'text': 'Протереть смесители', 'category': 'Ванная', 'checked': False},
-        {'id': '33', 'text': 'Протереть подоконники', 'category': 'Спальня', 'checked': False},
-        {'id': '34', 'text': 'Пропылесосить под кроватью', 'category': 'Спальня', 'checked': False},
-        {'id': '35', 'text': 'Протереть пыль со всех поверхностей', 'category': 'Спальня', 'checked': False},
-    ]
-    
-    deep_items = [
-        {'id': '8', 'text': 'Помыть плинтусы', 'category': 'Общие зоны', 'checked': False},
-        {'id': '9', 'text': 'Протереть двери', 'category': 'Общие зоны', 'checked': False},
-        {'id': '10', 'text': 'Протереть батареи', 'category': 'Общие зоны', 'checked': False},
-        {'id': '11', 'text': 'Помыть люстры и светильники', 'category': 'Общие зоны', 'checked': False},
-        {'id': '19', 'text': 'Помыть холодильник внутри', 'category': 'Кухня', 'checked': False},
-        {'id': '20', 'text': 'Помыть духовку внутри', 'category': 'Кухня', 'checked': False},
-        {'id': '21', 'text': 'Помыть вытяжку', 'category': 'Кухня', 'checked': False},
-        {'id': '22', 'text': 'Помыть кухонные шкафы снаружи', 'category': 'Кухня', 'checked': False},
-        {'id': '30', 'text': 'Очистить швы между плиткой', 'category': 'Ванная', 'checked': False},
-        {'id': '31', 'text': 'Отполировать сантехнику', 'category': 'Ванная', 'checked': False},
-        {'id': '32', 'text': 'Помыть полотенцесушитель', 'category': 'Ванная', 'checked': False},
-        {'id': '36', 'text': 'Протереть шкафы снаружи', 'category': 'Спальня', 'checked': False},
-        {'id': '37', 'text': 'Пропылесосить мебель', 'category': 'Спальня', 'checked': False},
-        {'id': '38', 'text': 'Помыть окна', 'category': 'Окна', 'checked': False},
-        {'id': '39', 'text': 'Помыть рамы и подоконники', 'category': 'Окна', 'checked': False},
-    ]
-    
-    after_items = [
-        {'id': '12', 'text': 'Удалить строительную пыль', 'category': 'Общие зоны', 'checked': False},
-        {'id': '23', 'text': 'Очистить следы от ремонта', 'category': 'Кухня', 'checked': False},
-    ]
-    
-    office_items = [
-        {'id': '40', 'text': 'Протереть рабочие столы', 'category': 'Офис', 'checked': False},
-        {'id': '41', 'text': 'Протереть оргтехнику', 'category': 'Офис', 'checked': False},
-        {'id': '42', 'text': 'Убрать переговорную', 'category': 'Офис', 'checked': False},
-        {'id': '43', 'text': 'Помыть кухонную зону', 'category': 'Офис', 'checked': False},
-    ]
-    
-    if service_type == 'basic':
-        return base_items
-    elif service_type == 'deep':
-        return base_items + deep_items
-    elif service_type == 'after':
-        return base_items + deep_items + after_items
-    elif service_type == 'office':
-        return base_items + office_items
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from PIL import Image, ImageOps
+from typing import Dict, Any, Callable, BinaryIO, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '4'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+# Пул живет на уровне модуля и переживает тёплые вызовы функции
+_db_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_db_pool_lock = threading.Lock()
+_conn_last_used: Dict[int, float] = {}
+
+def _connection_is_alive(conn: Any) -> bool:
+    """Проверяет, что соединение из пула еще пригодно для работы"""
+    if conn.closed:
+        return False
+    if time.monotonic() - _conn_last_used.get(id(conn), 0.0) < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def get_connection(database_url: str) -> Any:
+    """Берет соединение из пула, при необходимости создавая пул и заменяя мертвые соединения"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool.closed:
+            _db_pool = pg_pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, database_url)
+    
+    for _ in range(DB_POOL_MAX + 1):
+        conn = _db_pool.getconn()
+        if _connection_is_alive(conn):
+            return conn
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError('No healthy database connection available')
+
+def release_connection(conn: Any) -> None:
+    """Возвращает соединение в пул, откатывая незавершенную транзакцию"""
+    if _db_pool is None or _db_pool.closed:
+        return
+    if conn.closed:
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        return
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        return
+    _conn_last_used[id(conn)] = time.monotonic()
+    _db_pool.putconn(conn)
+
+# Метрики запросов: строка JSON в лог на каждый вызов и, если задан METRICS_PROM_FILE, счетчики Prometheus в файле
+METRICS_LOG = os.environ.get('METRICS_LOG', 'full')
+METRICS_PROM_FILE = os.environ.get('METRICS_PROM_FILE')
+METRICS_PROM_FLUSH_SECONDS = float(os.environ.get('METRICS_PROM_FLUSH_SECONDS', '10'))
+METRICS_MAX_STATEMENTS = 50
+METRICS_STATEMENT_CHARS = 120
+
+_request_metrics: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('request_metrics', default=None)
+_metric_totals: Dict[Tuple[str, str, str, int], List[float]] = {}
+_metric_totals_lock = threading.Lock()
+_metrics_flushed_at = 0.0
+
+def statement_label(query: Any) -> str:
+    """Начало SQL-запроса без значений: по нему видно, какой запрос медленный, но не данные клиентов"""
+    text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    text = ' '.join(text.split())
+    values_at = text.upper().find(' VALUES ')
+    if values_at != -1:
+        text = text[:values_at + len(' VALUES')]
+    return text[:METRICS_STATEMENT_CHARS]
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Курсор, который записывает время и число строк каждого запроса в метрики текущего вызова"""
+    
+    def execute(self, query: Any, vars: Any = None) -> None:
+        started = time.perf_counter()
+        try:
+            super().execute(query, vars)
+        finally:
+            metrics = _request_metrics.get()
+            if metrics is not None:
+                elapsed = time.perf_counter() - started
+                rows = max(self.rowcount, 0)
+                metrics['db_seconds'] += elapsed
+                metrics['sql_count'] += 1
+                metrics['rows'] += rows
+                if len(metrics['sql']) < METRICS_MAX_STATEMENTS:
+                    metrics['sql'].append({'ms': round(elapsed * 1000, 2), 'rows': rows, 'statement': statement_label(query)})
+
+def record_connect(seconds: float) -> None:
+    """Время получения соединения из пула (включая создание пула и проверку соединения)"""
+    metrics = _request_metrics.get()
+    if metrics is not None:
+        metrics['connect_seconds'] += seconds
+
+def write_prometheus_metrics(path: str) -> None:
+    """Пишет накопленные счетчики в формате textfile-коллектора node_exporter"""
+    series = (
+        ('handler_requests_total', 0), ('handler_duration_seconds_total', 1), ('handler_connect_seconds_total', 2),
+        ('handler_db_seconds_total', 3), ('handler_sql_statements_total', 4), ('handler_rows_total', 5),
+        ('handler_response_bytes_total', 6),
+    )
+    with _metric_totals_lock:
+        totals = {key: list(values) for key, values in _metric_totals.items()}
+    lines = []
+    for name, index in series:
+        lines.append(f'# TYPE {name} counter')
+        for (function, action, method, status), values in sorted(totals.items()):
+            labels = f'function="{function}",action="{action}",method="{method}",status="{status}"'
+            lines.append(f'{name}{{{labels}}} {values[index]:g}')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+def emit_metrics(function: str, action: str, method: str, metrics: Dict[str, Any], response: Optional[Dict[str, Any]]) -> None:
+    """Выводит строку метрик вызова и добавляет ее к счетчикам Prometheus"""
+    global _metrics_flushed_at
+    status = response.get('statusCode', 0) if response else 500
+    response_bytes = len(response.get('body') or '') if response else 0
+    if METRICS_LOG != 'off':
+        record = {
+            'event': 'request', 'function': function, 'action': action, 'method': method, 'status': status,
+            'total_ms': round(metrics['total_seconds'] * 1000, 2),
+            'connect_ms': round(metrics['connect_seconds'] * 1000, 2),
+            'db_ms': round(metrics['db_seconds'] * 1000, 2),
+            'sql_count': metrics['sql_count'], 'rows': metrics['rows'], 'response_bytes': response_bytes,
+        }
+        if METRICS_LOG == 'full':
+            record['sql'] = metrics['sql']
+        print(json.dumps(record, ensure_ascii=False))
+    if METRICS_PROM_FILE:
+        with _metric_totals_lock:
+            totals = _metric_totals.setdefault((function, action, method, status), [0.0] * 7)
+            for index, value in enumerate((
+                1, metrics['total_seconds'], metrics['connect_seconds'], metrics['db_seconds'],
+                metrics['sql_count'], metrics['rows'], response_bytes
+            )):
+                totals[index] += value
+        now = time.monotonic()
+        if now - _metrics_flushed_at >= METRICS_PROM_FLUSH_SECONDS:
+            _metrics_flushed_at = now
+            write_prometheus_metrics(METRICS_PROM_FILE)
+
+def instrumented(function: str, default_action: str, routes: Optional[Dict[Tuple[str, str], Any]] = None) -> Callable:
+    """Оборачивает handler: собирает метрики вызова в contextvar, по завершении выводит их"""
+    def decorator(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            method = event.get('httpMethod', 'GET')
+            action = (event.get('queryStringParameters') or {}).get('action', default_action)
+            # Неизвестные действия сводим в одно значение, чтобы метки Prometheus не разрастались
+            if routes is not None and method != 'OPTIONS' and (action, method) not in routes:
+                action = 'unknown'
+            metrics = {'connect_seconds': 0.0, 'db_seconds': 0.0, 'sql_count': 0, 'rows': 0, 'sql': []}
+            token = _request_metrics.set(metrics)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                metrics['total_seconds'] = time.perf_counter() - started
+                _request_metrics.reset(token)
+                emit_metrics(function, action, method, metrics, response)
+        return wrapper
+    return decorator
+
+PHOTO_STORAGE = os.environ.get('PHOTO_STORAGE', 's3')
+PHOTO_STORAGE_DIR = os.environ.get('PHOTO_STORAGE_DIR', '/tmp/photos')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev')
+S3_BUCKET = os.environ.get('S3_BUCKET', 'files')
+
+# Уменьшенные копии фото: превью для карточек (2x от 192px) и копия для просмотра на экране
+PHOTO_VARIANTS = (
+    ('thumb', int(os.environ.get('PHOTO_THUMB_SIZE', '384')), int(os.environ.get('PHOTO_THUMB_QUALITY', '70'))),
+    ('display', int(os.environ.get('PHOTO_DISPLAY_SIZE', '1600')), int(os.environ.get('PHOTO_DISPLAY_QUALITY', '80'))),
+)
+
+# Загрузка фото частями: размер части, предел размера файла и время жизни незавершенной сессии
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(256 * 1024)))
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', str(25 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', '24'))
+UPLOAD_READ_BLOCK = 64 * 1024
+UPLOAD_SPOOL_MAX_MEMORY = 1024 * 1024
+
+DATA_URL_PREFIX = re.compile(r'^data:(?P<content_type>[\w.+-]+/[\w.+-]+)?(;[\w.+-]+=[\w.+-]+)*;base64,')
+PHOTO_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/heic': 'heic',
+    'image/gif': 'gif',
+}
+
+class LocalPhotoStore:
+    """Хранилище фото в локальной файловой системе (тесты и локальный запуск)"""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def put(self, key: str, data: bytes, content_type: str, overwrite: bool = False) -> None:
+        path = os.path.join(self.root, key)
+        if os.path.exists(path) and not overwrite:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def put_file(self, key: str, fileobj: BinaryIO, content_type: str) -> None:
+        path = os.path.join(self.root, key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        os.replace(tmp_path, path)
+    
+    def get(self, key: str) -> bytes:
+        with open(os.path.join(self.root, key), 'rb') as f:
+            return f.read()
+    
+    def open(self, key: str) -> BinaryIO:
+        return open(os.path.join(self.root, key), 'rb')
+    
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+class S3PhotoStore:
+    """Хранилище фото в S3-совместимом бакете"""
+    
+    def __init__(self):
+        import boto3
+        self.client = boto3.client(
+            's3',
+            endpoint_url=S3_ENDPOINT_URL,
+            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
+        )
+    
+    def put(self, key: str, data: bytes, content_type: str, overwrite: bool = False) -> None:
+        # Ключ зависит только от содержимого, поэтому объект можно кешировать навсегда
+        self.client.put_object(
+            Bucket=S3_BUCKET, Key=key, Body=data, ContentType=content_type,
+            CacheControl='public, max-age=31536000, immutable'
+        )
+    
+    def put_file(self, key: str, fileobj: BinaryIO, content_type: str) -> None:
+        # upload_fileobj отправляет файл multipart-частями, не читая его целиком в память
+        self.client.upload_fileobj(fileobj, S3_BUCKET, key, ExtraArgs={
+            'ContentType': content_type,
+            'CacheControl': 'public, max-age=31536000, immutable'
+        })
+    
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=S3_BUCKET, Key=key)['Body'].read()
+    
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=S3_BUCKET, Key=key)['Body']
+    
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=S3_BUCKET, Key=key)
+
+_photo_store: Optional[Any] = None
+
+def get_photo_store() -> Any:
+    """Возвращает хранилище фото, выбранное переменной PHOTO_STORAGE"""
+    global _photo_store
+    if _photo_store is None:
+        _photo_store = LocalPhotoStore(PHOTO_STORAGE_DIR) if PHOTO_STORAGE == 'local' else S3PhotoStore()
+    return _photo_store
+
+def decode_photo(value: str) -> Tuple[bytes, str]:
+    """Разбирает data URL (или голый base64) из запроса в байты и MIME-тип"""
+    match = DATA_URL_PREFIX.match(value)
+    if match:
+        content_type = match.group('content_type') or 'image/jpeg'
+        payload = value[match.end():]
+    else:
+        content_type = 'image/jpeg'
+        payload = value
+    return base64.b64decode(payload, validate=False), content_type
+
+def render_photo_variants(source: BinaryIO) -> Dict[str, bytes]:
+    """Декодирует фото один раз и возвращает JPEG-копии из PHOTO_VARIANTS; пустой словарь, если формат не читается"""
+    largest = max(size for _, size, _ in PHOTO_VARIANTS)
+    try:
+        image = Image.open(source)
+        # Для JPEG декодер сразу уменьшает картинку кратно 1/2..1/8, не разворачивая полный размер
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return {}
+    
+    variants = {}
+    for name, size, quality in sorted(PHOTO_VARIANTS, key=lambda variant: -variant[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        variants[name] = buffer.getvalue()
+    return variants
+
+def store_photo_variants(source: BinaryIO, digest: str) -> Dict[str, Optional[str]]:
+    """Кладет уменьшенные копии фото рядом с оригиналом и возвращает их ключи (None, если копий нет)"""
+    variants = render_photo_variants(source)
+    keys: Dict[str, Optional[str]] = {}
+    for name, _, _ in PHOTO_VARIANTS:
+        if name not in variants:
+            keys[f'{name}_key'] = None
+            continue
+        key = f'photos/{digest[:2]}/{digest}.{name}.jpg'
+        get_photo_store().put(key, variants[name], 'image/jpeg')
+        keys[f'{name}_key'] = key
+    return keys
+
+def photo_key(digest: str, content_type: str) -> str:
+    """Ключ оригинала фото в хранилище: зависит только от содержимого"""
+    return f'photos/{digest[:2]}/{digest}.{PHOTO_EXTENSIONS.get(content_type, "bin")}'
+
+def store_photo(value: str) -> Dict[str, Optional[str]]:
+    """Кладет фото и его уменьшенные копии в хранилище по адресу от содержимого, возвращает ключи"""
+    data, content_type = decode_photo(value)
+    digest = hashlib.sha256(data).hexdigest()
+    key = photo_key(digest, content_type)
+    get_photo_store().put(key, data, content_type)
+    return {'key': key, **store_photo_variants(io.BytesIO(data), digest)}
+
+def upload_chunk_key(upload_id: str, index: int) -> str:
+    """Ключ части загружаемого фото во временной папке сессии"""
+    return f'uploads/{upload_id}/{index:06d}'
+
+def assemble_upload(upload_id: str, chunks: int, spool: BinaryIO) -> str:
+    """Переписывает части сессии по порядку во временный файл и возвращает sha256 содержимого"""
+    store = get_photo_store()
+    digest = hashlib.sha256()
+    for index in range(chunks):
+        part = store.open(upload_chunk_key(upload_id, index))
+        try:
+            # Читаем часть кусками, чтобы в памяти не было ни части, ни файла целиком
+            for block in iter(lambda: part.read(UPLOAD_READ_BLOCK), b''):
+                digest.update(block)
+                spool.write(block)
+        finally:
+            part.close()
+    spool.seek(0)
+    return digest.hexdigest()
+
+def delete_upload_chunks(upload_id: str, chunks: int) -> None:
+    """Удаляет временные части сессии загрузки"""
+    store = get_photo_store()
+    for index in range(chunks):
+        store.delete(upload_chunk_key(upload_id, index))
+
+def load_upload_session(cur: Any, upload_id: str, params: Dict[str, Any], lock: bool = False) -> Optional[Dict[str, Any]]:
+    """Сессия загрузки фото, если она есть, не просрочена и относится к назначению пользователя; lock=True блокирует строку до конца транзакции"""
+    owner_sql, owner_params = owner_filter(params, 'a.')
+    cur.execute(f"""
+        SELECT id, assignment_id, photo_column, content_type, total_size, chunk_size, received_size, status
+        FROM photo_upload_sessions s
+        WHERE id = %s AND updated_at > CURRENT_TIMESTAMP - make_interval(hours => %s)
+          AND EXISTS (SELECT 1 FROM assignments a WHERE a.id = s.assignment_id{owner_sql})
+        {'FOR UPDATE OF s' if lock else ''}
+    """, (upload_id, UPLOAD_SESSION_TTL_HOURS, *owner_params))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip(
+        ('id', 'assignment_id', 'photo_column', 'content_type', 'total_size', 'chunk_size', 'received', 'status'),
+        row
+    ))
+
+def read_binary_body(event: Dict[str, Any]) -> bytes:
+    """Сырое тело запроса: бинарные тела платформа передает в base64"""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        return base64.b64decode(body)
+    return body.encode('utf-8')
+
+def photo_url_prefix() -> str:
+    """Префикс публичного URL, к которому дописывается ключ фото из хранилища"""
+    base = os.environ.get('PHOTO_PUBLIC_BASE_URL') or f"https://cdn.poehali.dev/projects/{os.environ.get('AWS_ACCESS_KEY_ID', '')}/bucket"
+    return base.rstrip('/') + '/'
+
+# Колонки списка заданий: (ключ ответа, SQL-выражение, преобразование, входит в view=summary)
+ASSIGNMENT_COLUMNS: List[Tuple[str, str, Any, bool]] = [
+    ('id', 'a.id', None, True),
+    ('address', 'ca.address', None, True),
+    ('client_name', 'ca.client_name', None, True),
+    ('client_phone', 'ca.client_phone', None, True),
+    ('service_type', 'ca.service_type', None, True),
+    ('area', 'ca.area', None, True),
+    ('price', 'ca.price', float, True),
+    ('scheduled_date', 'ca.scheduled_date', str, True),
+    ('scheduled_time', 'ca.scheduled_time', str, True),
+    ('status', 'ca.status', None, True),
+    ('notes', 'ca.notes', None, True),
+    ('assigned_at', 'a.assigned_at', str, True),
+    # photo_before/photo_after - превью для карточек, *_display - копия для экрана, *_original - исходный файл
+    ('photo_before', 'COALESCE(%s || COALESCE(a.photo_before_thumb_key, a.photo_before_key), a.photo_before)', None, False),
+    ('photo_before_display', '%s || COALESCE(a.photo_before_display_key, a.photo_before_key)', None, False),
+    ('photo_before_original', 'COALESCE(%s || a.photo_before_key, a.photo_before)', None, False),
+    ('photo_after', 'COALESCE(%s || COALESCE(a.photo_after_thumb_key, a.photo_after_key), a.photo_after)', None, False),
+    ('photo_after_display', '%s || COALESCE(a.photo_after_display_key, a.photo_after_key)', None, False),
+    ('photo_after_original', 'COALESCE(%s || a.photo_after_key, a.photo_after)', None, False),
+    ('has_photo_before', '(a.photo_before_key IS NOT NULL OR a.photo_before IS NOT NULL)', None, True),
+    ('has_photo_after', '(a.photo_after_key IS NOT NULL OR a.photo_after IS NOT NULL)', None, True),
+    ('photos_uploaded_at', 'a.photos_uploaded_at', str, True),
+    ('salary', 'a.salary', float, True),
+    ('verified_at', 'a.verified_at', str, True),
+    ('checklist_data', 'a.checklist_data', None, False),
+    ('checklist_template_id', 'a.checklist_template_id', None, True),
+    ('checklist_checked', 'a.checklist_checked', None, True),
+    ('checklist_started_at', 'a.checklist_started_at', str, True),
+]
+
+def select_columns(columns: List[Tuple[str, str, Any, bool]], params: Dict[str, Any], required: Tuple[str, ...] = ('id',)) -> List[Tuple[str, str, Any, bool]]:
+    """Отбирает колонки списка по параметрам fields=a,b,c или view=summary|full"""
+    fields = params.get('fields')
+    if fields:
+        wanted = {name.strip() for name in fields.split(',') if name.strip()} | set(required)
+        unknown = wanted - {column[0] for column in columns}
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        return [column for column in columns if column[0] in wanted]
+    
+    view = params.get('view', 'full')
+    if view not in ('summary', 'full'):
+        raise ValueError('view must be summary or full')
+    return [column for column in columns if view == 'full' or column[3]]
+
+def row_to_dict(columns: List[Tuple[str, str, Any, bool]], row: Tuple) -> Dict[str, Any]:
+    """Собирает словарь ответа из строки, выбранной по тем же колонкам"""
+    return {
+        key: convert(value) if convert and value is not None else value
+        for (key, _, convert, _), value in zip(columns, row)
+    }
+
+CHECKLIST_KIND = 'cleaning'
+CHECKLIST_LATEST_TTL_SECONDS = float(os.environ.get('CHECKLIST_LATEST_TTL_SECONDS', '60'))
+
+# Кеш шаблонов на время жизни инстанса: версия шаблона неизменна, поэтому кеш не устаревает
+_checklist_templates: Dict[Tuple[str, int], Dict[str, Any]] = {}
+_checklist_template_keys: Dict[int, Tuple[str, int]] = {}
+_latest_checklist_versions: Dict[str, Tuple[int, float]] = {}
+
+def _cache_checklist_template(template_id: int, service_type: str, version: int, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    template = {
+        'id': template_id,
+        'service_type': service_type,
+        'version': version,
+        'items': items,
+        'json': json.dumps({'id': template_id, 'service_type': service_type, 'version': version, 'items': items})
+    }
+    _checklist_templates[(service_type, version)] = template
+    _checklist_template_keys[template_id] = (service_type, version)
+    return template
+
+def get_checklist_template(cur: Any, template_id: int) -> Dict[str, Any]:
+    """Возвращает шаблон чек-листа уборки по id, обращаясь к БД только при первом запросе"""
+    key = _checklist_template_keys.get(template_id)
+    if key:
+        return _checklist_templates[key]
+    cur.execute("""
+        SELECT id, service_type, version, items FROM checklist_templates WHERE id = %s
+    """, (template_id,))
+    row = cur.fetchone()
+    if not row:
+        raise LookupError(f'Checklist template {template_id} not found')
+    return _cache_checklist_template(*row)
+
+def get_latest_checklist_template(cur: Any, service_type: str) -> Dict[str, Any]:
+    """Возвращает актуальную версию шаблона чек-листа уборки для типа уборки (для неизвестных типов - basic)"""
+    cached = _latest_checklist_versions.get(service_type)
+    if cached and time.monotonic() - cached[1] < CHECKLIST_LATEST_TTL_SECONDS:
+        key = (service_type, cached[0])
+        if key in _checklist_templates:
+            return _checklist_templates[key]
+    
+    cur.execute("""
+        SELECT id, service_type, version, items FROM checklist_templates
+        WHERE kind = %s AND service_type IN (%s, 'basic')
+        ORDER BY (service_type = %s) DESC, version DESC
+        LIMIT 1
+    """, (CHECKLIST_KIND, service_type, service_type))
+    row = cur.fetchone()
+    if not row:
+        raise LookupError(f'No checklist template for {service_type}')
+    template = _cache_checklist_template(*row)
+    if template['service_type'] == service_type:
+        _latest_checklist_versions[service_type] = (template['version'], time.monotonic())
+    return template
+
+def expand_checklist(template: Dict[str, Any], checked_ids: List[str]) -> List[Dict[str, Any]]:
+    """Собирает полный чек-лист с отметками из шаблона и списка отмеченных id"""
+    checked = set(checked_ids or [])
+    return [dict(item, checked=item['id'] in checked) for item in template['items']]
+
+CHECKLIST_TEMPLATES_SQL = "SELECT id, service_type, version, items FROM checklist_templates WHERE id = ANY(%s)"
+
+def missing_checklist_templates(records: List[Dict[str, Any]], data_key: str, template_key: str) -> List[int]:
+    """id шаблонов, которые нужны записям со ссылкой на шаблон, но еще не в кеше"""
+    return sorted({
+        record[template_key] for record in records
+        if data_key in record and record[data_key] is None and record.get(template_key)
+        and record[template_key] not in _checklist_template_keys
+    })
+
+def cache_checklist_templates(rows: List[Tuple]) -> None:
+    """Кладет в кеш шаблоны, выбранные по CHECKLIST_TEMPLATES_SQL"""
+    for row in rows:
+        _cache_checklist_template(*row)
+
+def expand_checklists(records: List[Dict[str, Any]], data_key: str, template_key: str, checked_key: str) -> None:
+    """Подставляет развернутый чек-лист из кеша шаблонов в записи, где он хранится как ссылка на шаблон"""
+    for record in records:
+        if data_key in record and record[data_key] is None and record.get(template_key):
+            key = _checklist_template_keys.get(record[template_key])
+            if key is None:
+                raise LookupError(f'Checklist template {record[template_key]} not found')
+            record[data_key] = expand_checklist(_checklist_templates[key], record[checked_key])
+
+def attach_checklists(cur: Any, records: List[Dict[str, Any]], data_key: str, template_key: str, checked_key: str) -> None:
+    """Подставляет развернутый чек-лист в записи, где он хранится как ссылка на шаблон"""
+    # Недостающие шаблоны выбираются одним запросом на всю страницу, а не по запросу на запись
+    missing = missing_checklist_templates(records, data_key, template_key)
+    if missing:
+        cur.execute(CHECKLIST_TEMPLATES_SQL, (missing,))
+        cache_checklist_templates(cur.fetchall())
+    expand_checklists(records, data_key, template_key, checked_key)
+
+def fold_checklist_toggles(body_data: Dict[str, Any]) -> Dict[int, Dict[str, bool]]:
+    """Сворачивает очередь переключений в итоговое состояние пунктов по назначениям (последнее переключение побеждает)"""
+    default_assignment_id = body_data.get('assignment_id')
+    toggles = body_data.get('toggles')
+    if toggles is None and 'item_id' in body_data:
+        toggles = [{'item_id': body_data.get('item_id'), 'checked': body_data.get('checked')}]
+    
+    states: Dict[int, Dict[str, bool]] = {}
+    for toggle in toggles or []:
+        assignment_id = toggle.get('assignment_id', default_assignment_id)
+        if assignment_id is None or toggle.get('item_id') is None or not isinstance(toggle.get('checked'), bool):
+            raise ValueError('each toggle needs assignment_id, item_id and boolean checked')
+        states.setdefault(int(assignment_id), {})[str(toggle['item_id'])] = toggle['checked']
+    if not states:
+        raise ValueError('toggles required')
+    return states
+
+def patch_checklist(cur: Any, assignment_id: int, states: Dict[str, bool], data_column: str, template_column: str, checked_column: str, params: Dict[str, Any]) -> Optional[List[str]]:
+    """Атомарно применяет переключения к чек-листу назначения пользователя; возвращает id отмеченных пунктов или None, если чек-листа нет"""
+    owner_sql, owner_params = owner_filter(params)
+    checked_on = [item_id for item_id, checked in states.items() if checked]
+    checked_off = [item_id for item_id, checked in states.items() if not checked]
+    cur.execute(f"""
+        UPDATE assignments
+        SET {checked_column} = ARRAY(
+            SELECT DISTINCT item_id FROM unnest({checked_column} || %s::text[]) AS item_id
+            WHERE item_id <> ALL(%s::text[])
+            ORDER BY item_id
+        )
+        WHERE id = %s AND {template_column} IS NOT NULL{owner_sql}
+        RETURNING {checked_column}
+    """, (checked_on, checked_off, assignment_id, *owner_params))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    
+    # Назначения, начатые до шаблонов: меняем только нужные элементы JSONB-массива
+    cur.execute(f"""
+        UPDATE assignments
+        SET {data_column} = (
+            SELECT jsonb_agg(
+                CASE WHEN %s::jsonb ? (item->>'id')
+                     THEN jsonb_set(item, '{{checked}}', %s::jsonb -> (item->>'id'))
+                     ELSE item END
+                ORDER BY position
+            )
+            FROM jsonb_array_elements({data_column}) WITH ORDINALITY AS e(item, position)
+        )
+        WHERE id = %s AND {data_column} IS NOT NULL{owner_sql}
+        RETURNING ARRAY(
+            SELECT item->>'id' FROM jsonb_array_elements({data_column}) AS item
+            WHERE (item->>'checked')::boolean
+        )
+    """, (json.dumps(states), json.dumps(states), assignment_id, *owner_params))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Authorization',
+    'Access-Control-Max-Age': '86400'
+}
+ETAG_CACHE_CONTROL = 'private, no-cache'
+
+# Сжатие ответов: тела меньше порога уходят как есть - выигрыш в трафике не окупает время сжатия
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+# Лента изменений: предел ожидания long-poll, период перепроверки без NOTIFY и предел строк в ответе
+CHANGES_WAIT_MAX_SECONDS = float(os.environ.get('CHANGES_WAIT_MAX_SECONDS', '25'))
+CHANGES_RECHECK_SECONDS = 5
+CHANGES_MAX_ROWS = 500
+# Совпадает со сроком хранения change_tombstones в V0017
+CHANGES_RETENTION_DAYS = 7
+IMMUTABLE_JSON_HEADERS = {**JSON_HEADERS, 'Cache-Control': 'public, max-age=31536000, immutable'}
+
+def json_response(status: int, payload: Any, headers: Dict[str, str] = JSON_HEADERS) -> Dict[str, Any]:
+    """Ответ с JSON-телом и заранее собранными заголовками"""
+    return {'statusCode': status, 'headers': headers, 'body': json.dumps(payload)}
+
+def read_json_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Тело запроса как JSON; пустое тело считается пустым объектом"""
+    return json.loads(event.get('body') or '{}')
+
+# Подписанные токены сессии от auth: base64url(JSON {uid, role, exp}).base64url(HMAC-SHA256).
+# Без SESSION_SECRET проверка выключена, и функция, как раньше, доверяет параметрам запроса
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+SESSION_CACHE_SIZE = 4096
+SESSION_ROLE = 'maid'
+# Параметр с id пользователя: горничная видит и меняет только свои назначения
+SESSION_SCOPE_PARAM: Optional[str] = 'maid_id'
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+@functools.lru_cache(maxsize=SESSION_CACHE_SIZE)
+def verify_session_token(token: str) -> Optional[Tuple[int, str, int]]:
+    """(id, роль, срок действия) из токена с верной подписью или None; повторная проверка того же токена берется из кэша"""
+    payload, _, signature = token.partition('.')
+    expected = hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+        return int(claims['uid']), str(claims['role']), int(claims['exp'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def authorize(event: Dict[str, Any], params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Проверка токена из Authorization: Bearer без запроса к БД; None, если доступ разрешен, иначе ответ 401/403"""
+    if not SESSION_SECRET:
+        return None
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'authorization'), '') or ''
+    scheme, _, token = value.partition(' ')
+    claims = verify_session_token(token.strip()) if scheme.lower() == 'bearer' and token.strip() else None
+    # Срок проверяем на каждом вызове: кэш хранит только результат проверки подписи
+    if claims is None or claims[2] <= time.time():
+        return json_response(401, {'error': 'Session token is missing, invalid or expired'})
+    user_id, role, _ = claims
+    if role != SESSION_ROLE:
+        return json_response(403, {'error': 'Forbidden'})
+    if SESSION_SCOPE_PARAM and params.get(SESSION_SCOPE_PARAM) not in (None, '', str(user_id)):
+        return json_response(403, {'error': 'Forbidden'})
+    # Обработчики берут id пользователя из params: подставляем проверенный, даже если клиент его не передал
+    if SESSION_SCOPE_PARAM:
+        params[SESSION_SCOPE_PARAM] = str(user_id)
+    return None
+
+def owner_filter(params: Dict[str, Any], alias: str = '') -> Tuple[str, Tuple[int, ...]]:
+    """Условие "назначение принадлежит пользователю" для WHERE по id назначения; без id пользователя - пустое"""
+    owner_id = params.get(SESSION_SCOPE_PARAM)
+    if not owner_id:
+        return '', ()
+    return f' AND {alias}{SESSION_SCOPE_PARAM} = %s', (int(owner_id),)
+
+def request_etags(event: Dict[str, Any]) -> List[str]:
+    """ETag из заголовка If-None-Match (без префикса слабой проверки W/)"""
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'if-none-match'), '') or ''
+    return [tag.strip().removeprefix('W/') for tag in value.split(',') if tag.strip()]
+
+def version_args(version: Tuple[str, Optional[str]], params: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    """Параметры SQL версии данных; None, если в запросе нет id области"""
+    scope_param = version[1]
+    if scope_param is None:
+        return ()
+    value = params.get(scope_param) or ''
+    if not value.isdigit():
+        return None
+    return (int(value),)
+
+def etag_for(version_row: Any, params: Dict[str, Any]) -> str:
+    """ETag ответа: хеш версии данных и параметров запроса"""
+    material = repr((version_row, sorted(params.items()), photo_url_prefix()))
+    return '"' + hashlib.sha1(material.encode('utf-8')).hexdigest() + '"'
+
+def compute_etag(cur: Any, version: Tuple[str, Optional[str]], params: Dict[str, Any]) -> Optional[str]:
+    """ETag ответа по версии данных из БД; None, если в запросе нет id области"""
+    args = version_args(version, params)
+    if args is None:
+        return None
+    cur.execute(version[0], args)
+    return etag_for(cur.fetchone(), params)
+
+def not_modified(etag: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {'Access-Control-Allow-Origin': '*', 'ETag': etag, 'Cache-Control': ETAG_CACHE_CONTROL},
+        'body': ''
+    }
+
+def accepted_encodings(event: Dict[str, Any]) -> List[str]:
+    """Кодировки из Accept-Encoding, которые клиент не запретил через q=0"""
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'accept-encoding'), '') or ''
+    encodings = []
+    for part in value.split(','):
+        name, _, weight = part.partition(';')
+        weight = weight.strip().removeprefix('q=')
+        try:
+            if weight and float(weight) <= 0:
+                continue
+        except ValueError:
+            continue
+        encodings.append(name.strip().lower())
+    return encodings
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """Сжимает тело ответа br или gzip, если клиент это принимает и тело не меньше COMPRESS_MIN_BYTES"""
+    body = response.get('body')
+    if not body or response.get('isBase64Encoded'):
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    
+    encodings = accepted_encodings(event)
+    headers = {**response['headers'], 'Vary': 'Accept-Encoding'}
+    if brotli is not None and 'br' in encodings:
+        encoding, data = 'br', brotli.compress(raw, quality=BROTLI_QUALITY)
+    elif 'gzip' in encodings or '*' in encodings:
+        encoding, data = 'gzip', gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return {**response, 'headers': headers}
+    
+    headers['Content-Encoding'] = encoding
+    # Сжатое представление отличается побайтно, поэтому ETag становится слабым (как делает nginx)
+    if headers.get('ETag', '').startswith('"'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(data).decode('ascii'), 'isBase64Encoded': True}
+
+def encode_change_cursor(horizon: int) -> str:
+    """Курсор ленты изменений: горизонт транзакций и время его выдачи"""
+    raw = json.dumps([horizon, int(time.time())]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_change_cursor(cursor: str) -> Tuple[int, int]:
+    """Разбирает курсор ленты в (горизонт, время выдачи), ValueError при мусоре"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        horizon, issued_at = json.loads(raw)
+        return int(horizon), int(issued_at)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'invalid cursor: {cursor}') from e
+
+def current_horizon(cur: Any) -> int:
+    """xmin текущего снимка: все транзакции с меньшим id уже завершены"""
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+    return cur.fetchone()[0]
+
+def poll_changes(
+    conn: Any, cur: Any, since: int, wait: float, collect: Callable[[int, int], Dict[str, List[Any]]]
+) -> Tuple[int, Dict[str, List[Any]]]:
+    """Собирает изменения в окне [since, горизонт); если их нет, до wait секунд ждет NOTIFY changes"""
+    if wait > 0:
+        cur.execute("LISTEN changes")
+        conn.commit()
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            horizon = current_horizon(cur)
+            changes = collect(since, horizon)
+            # Пока ждем уведомления, соединение не держит открытую транзакцию
+            conn.commit()
+            remaining = deadline - time.monotonic()
+            if any(changes.values()) or remaining <= 0:
+                return horizon, changes
+            # Перепроверяем и без уведомления: горизонт мог сдвинуться после завершения долгой транзакции
+            if select.select([conn], [], [], min(remaining, CHANGES_RECHECK_SECONDS))[0]:
+                conn.poll()
+                conn.notifies.clear()
+    finally:
+        if wait > 0:
+            conn.rollback()
+            cur.execute("UNLISTEN changes")
+            conn.commit()
+
+def parse_change_params(params: Dict[str, Any]) -> Tuple[Optional[int], float, bool]:
+    """(горизонт из since или None, время ожидания, нужен ли клиенту полный reset), ValueError при мусоре"""
+    wait = max(0.0, min(float(params.get('wait') or 0), CHANGES_WAIT_MAX_SECONDS))
+    if not params.get('since'):
+        return None, wait, False
+    since, issued_at = decode_change_cursor(params['since'])
+    if time.time() - issued_at > CHANGES_RETENTION_DAYS * 86400:
+        return None, wait, True
+    return since, wait, False
+
+# Версия назначений для ETag: число строк, последнее изменение и сумма отметок updated_at назначений и адресов.
+# Сумма меняется при любом UPDATE, даже если транзакция с более ранней отметкой закоммитилась позже соседней
+ASSIGNMENTS_VERSION_SQL = """
+    SELECT COUNT(*), MAX(GREATEST(a.updated_at, ca.updated_at)),
+           SUM((EXTRACT(EPOCH FROM a.updated_at) * 1000000)::bigint + (EXTRACT(EPOCH FROM ca.updated_at) * 1000000)::bigint)
+    FROM assignments a
+    JOIN cleaning_addresses ca ON a.address_id = ca.id
+    WHERE {where}
+"""
+
+def assignments_query(params: Dict[str, Any]) -> Tuple[str, List[Any], List[Tuple[str, str, Any, bool]]]:
+    """SQL списка назначений или одного назначения по id, его параметры и колонки ответа; ValueError с текстом ошибки 400"""
+    action = params.get('action', 'assignments')
+    maid_id = params.get('maid_id')
+    assignment_id = params.get('id')
+    
+    if action == 'assignments' and not maid_id:
+        raise ValueError('maid_id required')
+    
+    if action == 'assignment' and not assignment_id:
+        raise ValueError('id required')
+    
+    # Детальная карточка всегда полная, список можно сузить через fields= или view=summary
+    columns = select_columns(
+        ASSIGNMENT_COLUMNS, params if action == 'assignments' else {},
+        required=('id', 'checklist_template_id', 'checklist_checked')
+    )
+    
+    select_sql = ', '.join(column[1] for column in columns)
+    select_params = [photo_url_prefix()] * select_sql.count('%s')
+    
+    if action == 'assignment':
+        where_sql = 'a.id = %s'
+        where_params = [int(assignment_id)]
+        if maid_id:
+            where_sql += ' AND a.maid_id = %s'
+            where_params.append(int(maid_id))
     else:
-        return base_items
+        where_sql = 'a.maid_id = %s'
+        where_params = [int(maid_id)]
+    
+    sql = f"""
+        SELECT {select_sql}
+        FROM assignments a
+        JOIN cleaning_addresses ca ON a.address_id = ca.id
+        WHERE {where_sql}
+        ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC
+    """
+    return sql, [*select_params, *where_params], columns
 
+def assignments_response(params: Dict[str, Any], assignments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Ответ со списком назначений или одного назначения из строк assignments_query с развернутыми чек-листами"""
+    if params.get('action', 'assignments') == 'assignment':
+        if not assignments:
+            return json_response(404, {'error': 'Assignment not found'})
+        return json_response(200, {'assignment': assignments[0]})
+    
+    return json_response(200, {'assignments': assignments})
+
+def handle_get_assignments(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Назначения горничной или одно назначение по id"""
+    try:
+        sql, args, columns = assignments_query(params)
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    cur.execute(sql, args)
+    assignments = [row_to_dict(columns, row) for row in cur.fetchall()]
+    attach_checklists(cur, assignments, 'checklist_data', 'checklist_template_id', 'checklist_checked')
+    return assignments_response(params, assignments)
+
+def handle_post_upload_photos(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Загрузка фото до и после уборки"""
+    body_data = read_json_body(event)
+    assignment_id = body_data.get('assignment_id')
+    photo_before = body_data.get('photo_before')
+    photo_after = body_data.get('photo_after')
+    
+    if not assignment_id:
+        return json_response(400, {'error': 'assignment_id required'})
+    
+    owner_sql, owner_params = owner_filter(params)
+    cur.execute(f"SELECT 1 FROM assignments WHERE id = %s{owner_sql}", (int(assignment_id), *owner_params))
+    if cur.fetchone() is None:
+        return json_response(404, {'error': 'Assignment not found'})
+    
+    update_parts = []
+    update_params = []
+    
+    # В строке назначения храним только ключи: оригинал отдается по запросу, в списках - превью
+    for column, value in (('photo_before', photo_before), ('photo_after', photo_after)):
+        if not value:
+            continue
+        keys = store_photo(value)
+        update_parts.append(
+            f'{column}_key = %s, {column}_thumb_key = %s, {column}_display_key = %s, {column} = NULL'
+        )
+        update_params.extend((keys['key'], keys['thumb_key'], keys['display_key']))
+    
+    if update_parts:
+        update_parts.append('photos_uploaded_at = CURRENT_TIMESTAMP')
+        update_params.append(int(assignment_id))
+        update_params.extend(owner_params)
+    
+        cur.execute(f"""
+            UPDATE assignments 
+            SET {', '.join(update_parts)}
+            WHERE id = %s{owner_sql}
+        """, tuple(update_params))
+    
+        conn.commit()
+    
+    return json_response(200, {'message': 'Photos uploaded'})
+
+def handle_post_upload_init(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Открытие сессии загрузки фото частями"""
+    body_data = read_json_body(event)
+    assignment_id = body_data.get('assignment_id')
+    photo_column = {'before': 'photo_before', 'after': 'photo_after'}.get(body_data.get('kind'))
+    content_type = body_data.get('content_type') or 'image/jpeg'
+    try:
+        total_size = int(body_data.get('size') or 0)
+    except (TypeError, ValueError):
+        total_size = 0
+    
+    if not assignment_id or not photo_column:
+        return json_response(400, {'error': 'assignment_id and kind (before|after) required'})
+    if content_type not in PHOTO_EXTENSIONS:
+        return json_response(400, {'error': f'Unsupported content_type: {content_type}'})
+    if not 0 < total_size <= UPLOAD_MAX_SIZE:
+        return json_response(400, {'error': f'size must be between 1 and {UPLOAD_MAX_SIZE} bytes'})
+    
+    owner_sql, owner_params = owner_filter(params)
+    cur.execute(f"SELECT 1 FROM assignments WHERE id = %s{owner_sql}", (int(assignment_id), *owner_params))
+    if cur.fetchone() is None:
+        return json_response(404, {'error': 'Assignment not found'})
+    
+    upload_id = uuid.uuid4().hex
+    cur.execute("""
+        INSERT INTO photo_upload_sessions (id, assignment_id, photo_column, content_type, total_size, chunk_size)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (upload_id, int(assignment_id), photo_column, content_type, total_size, UPLOAD_CHUNK_SIZE))
+    conn.commit()
+    
+    return json_response(200, {
+        'upload_id': upload_id,
+        'chunk_size': UPLOAD_CHUNK_SIZE,
+        'received': 0,
+        'total': total_size
+    })
+
+def handle_get_upload_status(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Сколько байт сессии уже подтверждено: с этого смещения клиент продолжает загрузку"""
+    upload_id = params.get('upload_id')
+    if not upload_id:
+        return json_response(400, {'error': 'upload_id required'})
+    
+    session = load_upload_session(cur, upload_id, params)
+    if session is None:
+        return json_response(404, {'error': 'Upload session not found or expired'})
+    
+    return json_response(200, {
+        'upload_id': upload_id,
+        'chunk_size': session['chunk_size'],
+        'received': session['received'],
+        'total': session['total_size'],
+        'status': session['status']
+    })
+
+def handle_put_upload_chunk(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Прием очередной части фото: тело запроса - сырые байты с позиции offset"""
+    upload_id = params.get('upload_id')
+    try:
+        offset = int(params.get('offset', ''))
+    except ValueError:
+        offset = -1
+    if not upload_id or offset < 0:
+        return json_response(400, {'error': 'upload_id and offset required'})
+    
+    data = read_binary_body(event)
+    # Блокировка строки упорядочивает повторные отправки одной и той же части
+    session = load_upload_session(cur, upload_id, params, lock=True)
+    if session is None:
+        return json_response(404, {'error': 'Upload session not found or expired'})
+    if session['status'] != 'open':
+        return json_response(409, {'error': 'Upload already completed', 'received': session['received']})
+    
+    received = session['received']
+    total_size = session['total_size']
+    chunk_size = session['chunk_size']
+    end = offset + len(data)
+    if offset < received and end <= received:
+        # Повтор уже подтвержденной части: ответ на прошлую попытку не дошел до клиента
+        return json_response(200, {'received': received, 'total': total_size})
+    if offset != received:
+        return json_response(409, {'error': 'Unexpected offset', 'received': received})
+    if not data or end > total_size or (len(data) != chunk_size and end != total_size):
+        return json_response(400, {
+            'error': f'Chunk must be {chunk_size} bytes (the last one may be shorter) and stay within the declared size',
+            'received': received
+        })
+    
+    get_photo_store().put(upload_chunk_key(upload_id, offset // chunk_size), data, 'application/octet-stream', overwrite=True)
+    cur.execute("""
+        UPDATE photo_upload_sessions
+        SET received_size = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, (end, upload_id))
+    conn.commit()
+    
+    return json_response(200, {'received': end, 'total': total_size})
+
+def handle_post_upload_finalize(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Сборка фото из частей, проверка sha256 и привязка к назначению"""
+    body_data = read_json_body(event)
+    upload_id = body_data.get('upload_id')
+    expected_digest = (body_data.get('sha256') or '').lower()
+    if not upload_id or not expected_digest:
+        return json_response(400, {'error': 'upload_id and sha256 required'})
+    
+    session = load_upload_session(cur, upload_id, params, lock=True)
+    if session is None:
+        return json_response(404, {'error': 'Upload session not found or expired'})
+    if session['status'] == 'completed':
+        # Повтор после потерянного ответа: фото уже привязано к назначению
+        return json_response(200, {'message': 'Photo uploaded', 'sha256': expected_digest})
+    if session['received'] < session['total_size']:
+        return json_response(409, {'error': 'Upload incomplete', 'received': session['received']})
+    
+    chunks = -(-session['total_size'] // session['chunk_size'])
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY) as spool:
+        digest = assemble_upload(upload_id, chunks, spool)
+        if digest != expected_digest:
+            # Части не сходятся с файлом клиента - сессию придется начать заново
+            cur.execute("DELETE FROM photo_upload_sessions WHERE id = %s", (upload_id,))
+            conn.commit()
+            delete_upload_chunks(upload_id, chunks)
+            return json_response(422, {'error': 'Checksum mismatch', 'sha256': digest})
+        
+        key = photo_key(digest, session['content_type'])
+        get_photo_store().put_file(key, spool, session['content_type'])
+        spool.seek(0)
+        keys = store_photo_variants(spool, digest)
+    
+    column = session['photo_column']
+    cur.execute(f"""
+        UPDATE assignments
+        SET {column}_key = %s, {column}_thumb_key = %s, {column}_display_key = %s, {column} = NULL,
+            photos_uploaded_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, (key, keys['thumb_key'], keys['display_key'], session['assignment_id']))
+    cur.execute("""
+        UPDATE photo_upload_sessions
+        SET status = 'completed', updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, (upload_id,))
+    conn.commit()
+    delete_upload_chunks(upload_id, chunks)
+    
+    return json_response(200, {'message': 'Photo uploaded', 'sha256': digest})
+
+def handle_post_update_status(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Смена статуса назначения"""
+    body_data = read_json_body(event)
+    assignment_id = body_data.get('assignment_id')
+    status = body_data.get('status')
+    
+    if not assignment_id or not status:
+        return json_response(400, {'error': 'assignment_id and status required'})
+    
+    owner_sql, owner_params = owner_filter(params, 'a.')
+    cur.execute(f"""
+        SELECT address_id, ca.service_type FROM assignments a
+        JOIN cleaning_addresses ca ON a.address_id = ca.id
+        WHERE a.id = %s{owner_sql}
+    """, (int(assignment_id), *owner_params))
+    
+    result = cur.fetchone()
+    if not result:
+        return json_response(404, {'error': 'Assignment not found'})
+    
+    address_id = result[0]
+    service_type = result[1]
+    
+    # Если статус меняется на in_progress, привязываем актуальный шаблон чек-листа
+    if status == 'in_progress':
+        template = get_latest_checklist_template(cur, service_type)
+        cur.execute("""
+            UPDATE assignments 
+            SET status = %s, checklist_template_id = %s, checklist_checked = '{}',
+                checklist_data = NULL, checklist_started_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (status, template['id'], int(assignment_id)))
+    else:
+        cur.execute("""
+            UPDATE assignments 
+            SET status = %s
+            WHERE id = %s
+        """, (status, int(assignment_id)))
+    
+    cur.execute("""
+        UPDATE cleaning_addresses 
+        SET status = %s 
+        WHERE id = %s
+    """, (status, address_id))
+    
+    if status == 'completed':
+        cur.execute("""
+            UPDATE assignments 
+            SET completed_at = CURRENT_TIMESTAMP 
+            WHERE id = %s
+        """, (int(assignment_id),))
+    
+    conn.commit()
+    
+    return json_response(200, {'message': 'Status updated'})
+
+def handle_post_update_checklist(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Сохранение чек-листа целиком"""
+    body_data = read_json_body(event)
+    assignment_id = body_data.get('assignment_id')
+    checklist_data = body_data.get('checklist_data')
+    
+    if not assignment_id or not checklist_data:
+        return json_response(400, {'error': 'assignment_id and checklist_data required'})
+    
+    # Для чек-листов по шаблону храним только id отмеченных пунктов
+    checked_ids = [str(item['id']) for item in checklist_data if item.get('checked')]
+    owner_sql, owner_params = owner_filter(params)
+    cur.execute(f"""
+        UPDATE assignments 
+        SET checklist_checked = %s
+        WHERE id = %s AND checklist_template_id IS NOT NULL{owner_sql}
+    """, (checked_ids, int(assignment_id), *owner_params))
+    
+    if cur.rowcount == 0:
+        cur.execute(f"""
+            UPDATE assignments 
+            SET checklist_data = %s
+            WHERE id = %s{owner_sql}
+        """, (json.dumps(checklist_data), int(assignment_id), *owner_params))
+        if cur.rowcount == 0:
+            conn.rollback()
+            return json_response(404, {'error': 'Assignment not found'})
+    
+    conn.commit()
+    
+    return json_response(200, {'message': 'Checklist updated'})
+
+def handle_post_patch_checklist(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Применение переключений пунктов чек-листа"""
+    # Принимает одно переключение {assignment_id, item_id, checked} или очередь {toggles: [...]}
+    body_data = read_json_body(event)
+    try:
+        states = fold_checklist_toggles(body_data)
+    except (TypeError, ValueError) as e:
+        return json_response(400, {'error': str(e)})
+    
+    results = []
+    for assignment_id, item_states in states.items():
+        checked = patch_checklist(cur, assignment_id, item_states, 'checklist_data', 'checklist_template_id', 'checklist_checked', params)
+        if checked is None:
+            conn.rollback()
+            return json_response(404, {'error': f'Checklist not found for assignment {assignment_id}'})
+        results.append({'assignment_id': assignment_id, 'checked': checked})
+    
+    conn.commit()
+    
+    return json_response(200, {'message': 'Checklist updated', 'results': results})
+
+def handle_get_checklist_template(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Версия шаблона чек-листа"""
+    template_id = params.get('id')
+    
+    if not template_id:
+        return json_response(400, {'error': 'id required'})
+    
+    try:
+        template = get_checklist_template(cur, int(template_id))
+    except LookupError:
+        return json_response(404, {'error': 'Checklist template not found'})
+    
+    # Версия шаблона не меняется, поэтому отдаем заранее сериализованный JSON с долгим кешем
+    return {'statusCode': 200, 'headers': IMMUTABLE_JSON_HEADERS, 'body': template['json']}
+
+def handle_get_salary_history(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """История заработка горничной"""
+    maid_id = params.get('maid_id')
+    
+    if not maid_id:
+        return json_response(400, {'error': 'maid_id required'})
+    
+    cur.execute("""
+        SELECT 
+            a.id,
+            ca.address,
+            ca.client_name,
+            ca.scheduled_date,
+            a.completed_at,
+            a.verified_at,
+            a.salary,
+            ca.service_type,
+            ca.area,
+            a.paid
+        FROM assignments a
+        JOIN cleaning_addresses ca ON a.address_id = ca.id
+        WHERE a.maid_id = %s AND a.verified_at IS NOT NULL
+        ORDER BY a.verified_at DESC
+    """, (int(maid_id),))
+    
+    rows = cur.fetchall()
+    records = []
+    total_earned = 0
+    
+    for row in rows:
+        salary = float(row[6]) if row[6] else 0
+        total_earned += salary
+        records.append({
+            'id': row[0],
+            'address': row[1],
+            'client_name': row[2],
+            'scheduled_date': str(row[3]),
+            'completed_at': str(row[4]) if row[4] else None,
+            'verified_at': str(row[5]) if row[5] else None,
+            'salary': salary,
+            'service_type': row[7],
+            'area': row[8],
+            'paid': row[9] if row[9] else False
+        })
+    
+    return json_response(200, {'records': records, 'total_earned': total_earned})
+
+def handle_get_changes(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Назначения горничной, измененные после курсора since; с wait=N ждет изменений до N секунд"""
+    maid_id = params.get('maid_id')
+    if not maid_id:
+        return json_response(400, {'error': 'maid_id required'})
+    
+    try:
+        since, wait, reset = parse_change_params(params)
+        columns = select_columns(ASSIGNMENT_COLUMNS, params, required=('id', 'checklist_template_id', 'checklist_checked'))
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    
+    # Без since отдаем только курсор: клиент берет его до загрузки списка и дальше получает дельты
+    if since is None:
+        return json_response(200, {'cursor': encode_change_cursor(current_horizon(cur)), 'assignments': [], 'removed': [], 'reset': reset})
+    
+    select_sql = ', '.join(column[1] for column in columns)
+    select_params = [photo_url_prefix()] * select_sql.count('%s')
+    
+    def collect(since_xid: int, horizon: int) -> Dict[str, List[Any]]:
+        cur.execute(f"""
+            SELECT {select_sql}
+            FROM assignments a
+            JOIN cleaning_addresses ca ON a.address_id = ca.id
+            WHERE a.maid_id = %s
+              AND ((a.change_xid >= %s AND a.change_xid < %s) OR (ca.change_xid >= %s AND ca.change_xid < %s))
+            ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC
+            LIMIT %s
+        """, (*select_params, int(maid_id), since_xid, horizon, since_xid, horizon, CHANGES_MAX_ROWS + 1))
+        rows = cur.fetchall()
+        cur.execute("""
+            SELECT DISTINCT row_id FROM change_tombstones
+            WHERE table_name = 'assignments' AND maid_id = %s AND change_xid >= %s AND change_xid < %s
+        """, (int(maid_id), since_xid, horizon))
+        return {'rows': rows, 'removed': [row[0] for row in cur.fetchall()]}
+    
+    horizon, changes = poll_changes(conn, cur, since, wait, collect)
+    if len(changes['rows']) > CHANGES_MAX_ROWS:
+        # Изменилось слишком много - дешевле перезагрузить список целиком
+        return json_response(200, {'cursor': encode_change_cursor(horizon), 'assignments': [], 'removed': [], 'reset': True})
+    
+    items = [row_to_dict(columns, row) for row in changes['rows']]
+    attach_checklists(cur, items, 'checklist_data', 'checklist_template_id', 'checklist_checked')
+    return json_response(200, {
+        'cursor': encode_change_cursor(horizon),
+        'assignments': items,
+        'removed': changes['removed'],
+        'reset': False
+    })
+
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '20'))
+# Долгий опрос сам управляет транзакциями и ждет на соединении, вложенный batch не нужен
+BATCH_EXCLUDED_ACTIONS = ('batch', 'changes')
+
+class BatchConnection:
+    """Соединение для шага атомарного batch: commit откладывается до конца пакета, rollback откатывает только шаг"""
+    
+    def __init__(self, conn: Any, cur: Any):
+        self._conn = conn
+        self._cur = cur
+    
+    def commit(self) -> None:
+        pass
+    
+    def rollback(self) -> None:
+        self._cur.execute("ROLLBACK TO SAVEPOINT batch_step")
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+def parse_batch_requests(body_data: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any], Any]]:
+    """Шаги batch как (action, method, params, body); ValueError при неверном описании"""
+    requests = body_data.get('requests')
+    if not isinstance(requests, list) or not requests:
+        raise ValueError('requests must be a non-empty list')
+    if len(requests) > BATCH_MAX_REQUESTS:
+        raise ValueError(f'at most {BATCH_MAX_REQUESTS} requests per batch')
+    steps = []
+    for index, request in enumerate(requests):
+        if not isinstance(request, dict) or not isinstance(request.get('action'), str):
+            raise ValueError(f'requests[{index}]: action is required')
+        action = request['action']
+        method = str(request.get('method', 'GET')).upper()
+        if action in BATCH_EXCLUDED_ACTIONS or (action, method) not in ROUTES:
+            raise ValueError(f'requests[{index}]: {method} {action} is not allowed in batch')
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            raise ValueError(f'requests[{index}]: params must be an object')
+        steps.append((action, method, {key: str(value) for key, value in params.items()}, request.get('body')))
+    return steps
+
+def handle_post_batch(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Несколько действий за один вызов на одном соединении; с atomic=true - в одной транзакции"""
+    # {requests: [{action, method, params, body}], atomic} -> {results: [{action, status, body}], committed}
+    body_data = read_json_body(event)
+    try:
+        steps = parse_batch_requests(body_data)
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    atomic = bool(body_data.get('atomic'))
+    
+    results: List[Dict[str, Any]] = []
+    failed = False
+    for action, method, step_params, step_body in steps:
+        if failed:
+            results.append({'action': action, 'status': None, 'body': {'error': 'skipped'}})
+            continue
+        step_event = {
+            'httpMethod': method,
+            'queryStringParameters': {**step_params, 'action': action},
+            'headers': event.get('headers') or {},
+            'body': step_body if step_body is None or isinstance(step_body, str) else json.dumps(step_body),
+            'isBase64Encoded': False,
+        }
+        denied = authorize(step_event, step_event['queryStringParameters'])
+        if denied is not None:
+            results.append({'action': action, 'status': denied['statusCode'], 'body': json.loads(denied['body'])})
+            conn.rollback()
+            failed = atomic
+            continue
+        step_conn = conn
+        if atomic:
+            cur.execute("SAVEPOINT batch_step")
+            step_conn = BatchConnection(conn, cur)
+        try:
+            response = ROUTES[(action, method)](step_event, step_event['queryStringParameters'], step_conn, cur)
+        except Exception as e:
+            print(f"Batch step {method} {action} failed: {str(e)}")
+            response = json_response(500, {'error': f'Server error: {str(e)}'})
+        status = response['statusCode']
+        results.append({'action': action, 'status': status, 'body': json.loads(response['body']) if response['body'] else None})
+        if status >= 400:
+            conn.rollback()
+            # В атомарном пакете ошибка шага отменяет уже выполненные шаги и пропускает оставшиеся
+            failed = atomic
+        elif atomic:
+            cur.execute("RELEASE SAVEPOINT batch_step")
+    
+    committed = atomic and not failed
+    if committed:
+        conn.commit()
+    return json_response(200, {'results': results, 'committed': committed if atomic else None})
+
+ROUTES = {
+    ('assignments', 'GET'): handle_get_assignments,
+    ('assignment', 'GET'): handle_get_assignments,
+    ('upload-photos', 'POST'): handle_post_upload_photos,
+    ('upload-init', 'POST'): handle_post_upload_init,
+    ('upload-status', 'GET'): handle_get_upload_status,
+    ('upload-chunk', 'PUT'): handle_put_upload_chunk,
+    ('upload-finalize', 'POST'): handle_post_upload_finalize,
+    ('update-status', 'POST'): handle_post_update_status,
+    ('update-checklist', 'POST'): handle_post_update_checklist,
+    ('patch-checklist', 'POST'): handle_post_patch_checklist,
+    ('checklist-template', 'GET'): handle_get_checklist_template,
+    ('salary-history', 'GET'): handle_get_salary_history,
+    ('changes', 'GET'): handle_get_changes,
+    ('batch', 'POST'): handle_post_batch,
+}
+
+# GET-действия с ETag: (SQL версии данных, параметр запроса с id области или None)
+ROUTE_VERSIONS: Dict[Tuple[str, str], Tuple[str, Optional[str]]] = {
+    ('assignments', 'GET'): (ASSIGNMENTS_VERSION_SQL.format(where='a.maid_id = %s'), 'maid_id'),
+    ('assignment', 'GET'): (ASSIGNMENTS_VERSION_SQL.format(where='a.id = %s'), 'id'),
+    ('salary-history', 'GET'): (ASSIGNMENTS_VERSION_SQL.format(where='a.maid_id = %s'), 'maid_id'),
+}
+
+@instrumented('maid', 'assignments', ROUTES)
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
-    params = event.get('queryStringParameters', {})
-    action = params.get('action', 'assignments') if params else 'assignments'
+    params = event.get('queryStringParameters') or {}
+    action = params.get('action', 'assignments')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'body': ''}
+    
+    # Маршрут ищем до подключения к БД: неизвестные действия не занимают соединение из пула
+    route = ROUTES.get((action, method))
+    if route is None:
+        return json_response(404, {'error': 'Not found'})
+    
+    denied = authorize(event, params)
+    if denied is not None:
+        return denied
     
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Database connection error'})
-        }
+        return json_response(500, {'error': 'Database connection error'})
     
+    conn = None
+    cur = None
     try:
-        conn = psycopg2.connect(database_url)
-        cur = conn.cursor()
+        connect_started = time.perf_counter()
+        conn = get_connection(database_url)
+        record_connect(time.perf_counter() - connect_started)
+        cur = conn.cursor(cursor_factory=TimedCursor)
         
-        if action == 'assignments' and method == 'GET':
-            params = event.get('queryStringParameters', {})
-            maid_id = params.get('maid_id')
-            
-            if not maid_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'maid_id required'})
-                }
-            
-            cur.execute("""
-                SELECT a.id, ca.address, ca.client_name, ca.client_phone, 
-                       ca.service_type, ca.area, ca.price, ca.scheduled_date, 
-                       ca.scheduled_time, ca.status, ca.notes, a.assigned_at,
-                       a.photo_before, a.photo_after, a.photos_uploaded_at,
-                       a.salary, a.verified_at, a.checklist_data, a.checklist_started_at
-                FROM assignments a
-                JOIN cleaning_addresses ca ON a.address_id = ca.id
-                WHERE a.maid_id = %s
-                ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC
-            """, (int(maid_id),))
-            
-            rows = cur.fetchall()
-            assignments = []
-            for row in rows:
-                assignments.append({
-                    'id': row[0],
-                    'address': row[1],
-                    'client_name': row[2],
-                    'client_phone': row[3],
-                    'service_type': row[4],
-                    'area': row[5],
-                    'price': float(row[6]),
-                    'scheduled_date': str(row[7]),
-                    'scheduled_time': str(row[8]),
-                    'status': row[9],
-                    'notes': row[10],
-                    'assigned_at': str(row[11]) if row[11] else None,
-                    'photo_before': row[12],
-                    'photo_after': row[13],
-                    'photos_uploaded_at': str(row[14]) if row[14] else None,
-                    'salary': float(row[15]) if row[15] else None,
-                    'verified_at': str(row[16]) if row[16] else None,
-                    'checklist_data': row[17],
-                    'checklist_started_at': str(row[18]) if row[18] else None
-                })
-            
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'assignments': assignments})
-            }
+        # Версию данных считаем до выборки: если данные изменятся между запросами, следующий ETag просто не совпадет
+        etag = None
+        version = ROUTE_VERSIONS.get((action, method))
+        if version is not None:
+            etag = compute_etag(cur, version, params)
+            if etag is not None and etag in request_etags(event):
+                return not_modified(etag)
         
-        elif action == 'upload-photos' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            assignment_id = body_data.get('assignment_id')
-            photo_before = body_data.get('photo_before')
-            photo_after = body_data.get('photo_after')
-            
-            if not assignment_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'assignment_id required'})
-                }
-            
-            update_parts = []
-            params = []
-            
-            if photo_before:
-                update_parts.append('photo_before = %s')
-                params.append(photo_before)
-            
-            if photo_after:
-                update_parts.append('photo_after = %s')
-                params.append(photo_after)
-            
-            if update_parts:
-                update_parts.append('photos_uploaded_at = CURRENT_TIMESTAMP')
-                params.append(int(assignment_id))
-                
-                cur.execute(f"""
-                    UPDATE assignments 
-                    SET {', '.join(update_parts)}
-                    WHERE id = %s
-                """, tuple(params))
-                
-                conn.commit()
-            
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Photos uploaded'})
+        response = route(event, params, conn, cur)
+        if etag is not None and response['statusCode'] == 200:
+            response['headers'] = {
+                **response['headers'], 'ETag': etag, 'Cache-Control': ETAG_CACHE_CONTROL,
+                'Access-Control-Expose-Headers': 'ETag'
             }
-        
-        elif action == 'update-status' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            assignment_id = body_data.get('assignment_id')
-            status = body_data.get('status')
-            
-            if not assignment_id or not status:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'assignment_id and status required'})
-                }
-            
-            cur.execute("""
-                SELECT address_id, ca.service_type FROM assignments a
-                JOIN cleaning_addresses ca ON a.address_id = ca.id
-                WHERE a.id = %s
-            """, (int(assignment_id),))
-            
-            result = cur.fetchone()
-            if not result:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Assignment not found'})
-                }
-            
-            address_id = result[0]
-            service_type = result[1]
-            
-            # Если статус меняется на in_progress, создаем чек-лист
-            if status == 'in_progress':
-                checklist_items = get_checklist_for_service_type(service_type)
-                cur.execute("""
-                    UPDATE assignments 
-                    SET status = %s, checklist_data = %s, checklist_started_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (status, json.dumps(checklist_items), int(assignment_id)))
-            else:
-                cur.execute("""
-                    UPDATE assignments 
-                    SET status = %s
-                    WHERE id = %s
-                """, (status, int(assignment_id)))
-            
-            cur.execute("""
-                UPDATE cleaning_addresses 
-                SET status = %s 
-                WHERE id = %s
-            """, (status, address_id))
-            
-            if status == 'completed':
-                cur.execute("""
-                    UPDATE assignments 
-                    SET completed_at = CURRENT_TIMESTAMP 
-                    WHERE id = %s
-                """, (int(assignment_id),))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Status updated'})
-            }
-        
-        elif action == 'update-checklist' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            assignment_id = body_data.get('assignment_id')
-            checklist_data = body_data.get('checklist_data')
-            
-            if not assignment_id or not checklist_data:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'assignment_id and checklist_data required'})
-                }
-            
-            cur.execute("""
-                UPDATE assignments 
-                SET checklist_data = %s
-                WHERE id = %s
-            """, (json.dumps(checklist_data), int(assignment_id)))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Checklist updated'})
-            }
-        
-        elif action == 'salary-history' and method == 'GET':
-            params = event.get('queryStringParameters', {})
-            maid_id = params.get('maid_id')
-            
-            if not maid_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'maid_id required'})
-                }
-            
-            cur.execute("""
-                SELECT 
-                    a.id,
-                    ca.address,
-                    ca.client_name,
-                    ca.scheduled_date,
-                    a.completed_at,
-                    a.verified_at,
-                    a.salary,
-                    ca.service_type,
-                    ca.area,
-                    a.paid
-                FROM assignments a
-                JOIN cleaning_addresses ca ON a.address_id = ca.id
-                WHERE a.maid_id = %s AND a.verified_at IS NOT NULL
-                ORDER BY a.verified_at DESC
-            """, (int(maid_id),))
-            
-            rows = cur.fetchall()
-            records = []
-            total_earned = 0
-            
-            for row in rows:
-                salary = float(row[6]) if row[6] else 0
-                total_earned += salary
-                records.append({
-                    'id': row[0],
-                    'address': row[1],
-                    'client_name': row[2],
-                    'scheduled_date': str(row[3]),
-                    'completed_at': str(row[4]) if row[4] else None,
-                    'verified_at': str(row[5]) if row[5] else None,
-                    'salary': salary,
-                    'service_type': row[7],
-                    'area': row[8],
-                    'paid': row[9] if row[9] else False
-                })
-            
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'records': records, 'total_earned': total_earned})
-            }
-        
-        cur.close()
-        conn.close()
-        return {
-            'statusCode': 404,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Not found'})
-        }
-        
+        return compress_response(event, response)
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
\ No newline at end of file
+        return json_response(500, {'error': f'Server error: {str(e)}'})
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            release_connection(conn)
\ No newline at end of file
@@ -4,353 +4,1125 @@ Args: event - dict с httpMethod, body, queryStringParameters
       context - объект с атрибутами request_id, function_name
 Returns: HTTP response с заданиями на проверку или результатом операции
 '''
+import base64
+import contextvars
+import functools
+import gzip
+import hashlib
+import hmac
 import json
 import os
+import select
+import threading
+import time
 import psycopg2
-from typing import Dict, Any, List
-
-def get_inspection_checklist_for_service_type(service_type: str) -> List[Dict[str, Any]]:
-    """Генерирует чек-лист проверки для типа уборки"""
-    base_items = [
-        {'id': 'i1', 'text': 'Качество уборки пыли с поверхностей', 'category': 'Общая проверка', 'checked': False},
-        {'id': 'i2', 'text': 'Чистота полов (без разводов и пятен)', 'category': 'Общая проверка', 'checked': False},
-        {'id': 'i3', 'text': 'Зеркала без разводов', 'category': 'Общая проверка', 'checked': False},
-        {'id': 'i4', 'text': 'Отсутствие пыли на батареях и подоконниках', 'category': 'Общая проверка', 'checked': False},
-        {'id': 'i5', 'text': 'Чистота дверных ручек и выключателей', 'category': 'Общая проверка', 'checked': False},
-        {'id': 'i6', 'text': 'Мусор вынесен', 'category': 'Общая проверка', 'checked': False},
-        
-        {'id': 'i7', 'text': 'Раковина без налета и пятен', 'category': 'Кухня', 'checked': False},
-        {'id': 'i8', 'text': 'Плита и столешницы идеально чистые', 'category': 'Кухня', 'checked': False},
-        {'id': 'i9', 'text': 'Холодильник снаружи без отпечатков', 'category': 'Кухня', 'checked': False},
-        {'id': 'i10', 'text': 'Микроволновка чистая внутри и снаружи', 'category': 'Кухня', 'checked': False},
-        {'id': 'i11', 'text': 'Смесители блестят', 'category': 'Кухня', 'checked': False},
-        
-        {'id': 'i12', 'text': 'Унитаз идеально чистый', 'category': 'Ванная', 'checked': False},
-        {'id': 'i13', 'text': 'Раковина без известкового налета', 'category': 'Ванная', 'checked': False},
-        {'id': 'i14', 'text': 'Ванна/душ без мыльных разводов', 'category': 'Ванная', 'checked': False},
-        {'id': 'i15', 'text': 'Плитка чистая, швы без грязи', 'category': 'Ванная', 'checked': False},
-        {'id': 'i16', 'text': 'Зеркала без разводов и капель', 'category': 'Ванная', 'checked': False},
-        {'id': 'i17', 'text': 'Смесители блестящие', 'category': 'Ванная', 'checked': False},
-    ]
-    
-    deep_items = [
-        {'id': 'i18', 'text': 'Плинтусы чистые по всей длине', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i19', 'text': 'Двери протерты с обеих сторон', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i20', 'text': 'Батареи чистые между секциями', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i21', 'text': 'Люстры и светильники без пыли', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i22', 'text': 'Холодильник чист внутри', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i23', 'text': 'Духовка чистая внутри', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i24', 'text': 'Вытяжка чистая', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i25', 'text': 'Кухонные шкафы протерты снаружи', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i26', 'text': 'Швы между плиткой чистые', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i27', 'text': 'Сантехника отполирована', 'category': 'Детальная проверка', 'checked': False},
-        {'id': 'i28', 'text': 'Окна чистые (если входит в услугу)', 'category': 'Детальная проверка', 'checked': False},
-    ]
-    
-    after_items = [
-        {'id': 'i29', 'text': 'Отсутствие строительной пыли', 'category': 'После ремонта', 'checked': False},
-        {'id': 'i30', 'text': 'Следы от ремонта удалены', 'category': 'После ремонта', 'checked': False},
-        {'id': 'i31', 'text': 'Окна очищены от защитной пленки', 'category': 'После ремонта', 'checked': False},
-    ]
-    
-    office_items = [
-        {'id': 'i32', 'text': 'Рабочие столы протерты', 'category': 'Офис', 'checked': False},
-        {'id': 'i33', 'text': 'Оргтехника чистая', 'category': 'Офис', 'checked': False},
-        {'id': 'i34', 'text': 'Переговорная убрана', 'category': 'Офис', 'checked': False},
-        {'id': 'i35', 'text': 'Кухонная зона чистая', 'category': 'Офис', 'checked': False},
-    ]
-    
-    if service_type == 'basic':
-        return base_items
-    elif service_type == 'deep':
-        return base_items + deep_items
-    elif service_type == 'after':
-        return base_items + deep_items + after_items
-    elif service_type == 'office':
-        return base_items + office_items
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '4'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+# Пул живет на уровне модуля и переживает тёплые вызовы функции
+_db_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_db_pool_lock = threading.Lock()
+_conn_last_used: Dict[int, float] = {}
+
+def _connection_is_alive(conn: Any) -> bool:
+    """Проверяет, что соединение из пула еще пригодно для работы"""
+    if conn.closed:
+        return False
+    if time.monotonic() - _conn_last_used.get(id(conn), 0.0) < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def get_connection(database_url: str) -> Any:
+    """Берет соединение из пула, при необходимости создавая пул и заменяя мертвые соединения"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool.closed:
+            _db_pool = pg_pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, database_url)
+    
+    for _ in range(DB_POOL_MAX + 1):
+        conn = _db_pool.getconn()
+        if _connection_is_alive(conn):
+            return conn
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError('No healthy database connection available')
+
+def release_connection(conn: Any) -> None:
+    """Возвращает соединение в пул, откатывая незавершенную транзакцию"""
+    if _db_pool is None or _db_pool.closed:
+        return
+    if conn.closed:
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        return
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _conn_last_used.pop(id(conn), None)
+        _db_pool.putconn(conn, close=True)
+        return
+    _conn_last_used[id(conn)] = time.monotonic()
+    _db_pool.putconn(conn)
+
+# Метрики запросов: строка JSON в лог на каждый вызов и, если задан METRICS_PROM_FILE, счетчики Prometheus в файле
+METRICS_LOG = os.environ.get('METRICS_LOG', 'full')
+METRICS_PROM_FILE = os.environ.get('METRICS_PROM_FILE')
+METRICS_PROM_FLUSH_SECONDS = float(os.environ.get('METRICS_PROM_FLUSH_SECONDS', '10'))
+METRICS_MAX_STATEMENTS = 50
+METRICS_STATEMENT_CHARS = 120
+
+_request_metrics: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('request_metrics', default=None)
+_metric_totals: Dict[Tuple[str, str, str, int], List[float]] = {}
+_metric_totals_lock = threading.Lock()
+_metrics_flushed_at = 0.0
+
+def statement_label(query: Any) -> str:
+    """Начало SQL-запроса без значений: по нему видно, какой запрос медленный, но не данные клиентов"""
+    text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    text = ' '.join(text.split())
+    values_at = text.upper().find(' VALUES ')
+    if values_at != -1:
+        text = text[:values_at + len(' VALUES')]
+    return text[:METRICS_STATEMENT_CHARS]
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Курсор, который записывает время и число строк каждого запроса в метрики текущего вызова"""
+    
+    def execute(self, query: Any, vars: Any = None) -> None:
+        started = time.perf_counter()
+        try:
+            super().execute(query, vars)
+        finally:
+            metrics = _request_metrics.get()
+            if metrics is not None:
+                elapsed = time.perf_counter() - started
+                rows = max(self.rowcount, 0)
+                metrics['db_seconds'] += elapsed
+                metrics['sql_count'] += 1
+                metrics['rows'] += rows
+                if len(metrics['sql']) < METRICS_MAX_STATEMENTS:
+                    metrics['sql'].append({'ms': round(elapsed * 1000, 2), 'rows': rows, 'statement': statement_label(query)})
+
+def record_connect(seconds: float) -> None:
+    """Время получения соединения из пула (включая создание пула и проверку соединения)"""
+    metrics = _request_metrics.get()
+    if metrics is not None:
+        metrics['connect_seconds'] += seconds
+
+def write_prometheus_metrics(path: str) -> None:
+    """Пишет накопленные счетчики в формате textfile-коллектора node_exporter"""
+    series = (
+        ('handler_requests_total', 0), ('handler_duration_seconds_total', 1), ('handler_connect_seconds_total', 2),
+        ('handler_db_seconds_total', 3), ('handler_sql_statements_total', 4), ('handler_rows_total', 5),
+        ('handler_response_bytes_total', 6),
+    )
+    with _metric_totals_lock:
+        totals = {key: list(values) for key, values in _metric_totals.items()}
+    lines = []
+    for name, index in series:
+        lines.append(f'# TYPE {name} counter')
+        for (function, action, method, status), values in sorted(totals.items()):
+            labels = f'function="{function}",action="{action}",method="{method}",status="{status}"'
+            lines.append(f'{name}{{{labels}}} {values[index]:g}')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+def emit_metrics(function: str, action: str, method: str, metrics: Dict[str, Any], response: Optional[Dict[str, Any]]) -> None:
+    """Выводит строку метрик вызова и добавляет ее к счетчикам Prometheus"""
+    global _metrics_flushed_at
+    status = response.get('statusCode', 0) if response else 500
+    response_bytes = len(response.get('body') or '') if response else 0
+    if METRICS_LOG != 'off':
+        record = {
+            'event': 'request', 'function': function, 'action': action, 'method': method, 'status': status,
+            'total_ms': round(metrics['total_seconds'] * 1000, 2),
+            'connect_ms': round(metrics['connect_seconds'] * 1000, 2),
+            'db_ms': round(metrics['db_seconds'] * 1000, 2),
+            'sql_count': metrics['sql_count'], 'rows': metrics['rows'], 'response_bytes': response_bytes,
+        }
+        if METRICS_LOG == 'full':
+            record['sql'] = metrics['sql']
+        print(json.dumps(record, ensure_ascii=False))
+    if METRICS_PROM_FILE:
+        with _metric_totals_lock:
+            totals = _metric_totals.setdefault((function, action, method, status), [0.0] * 7)
+            for index, value in enumerate((
+                1, metrics['total_seconds'], metrics['connect_seconds'], metrics['db_seconds'],
+                metrics['sql_count'], metrics['rows'], response_bytes
+            )):
+                totals[index] += value
+        now = time.monotonic()
+        if now - _metrics_flushed_at >= METRICS_PROM_FLUSH_SECONDS:
+            _metrics_flushed_at = now
+            write_prometheus_metrics(METRICS_PROM_FILE)
+
+def instrumented(function: str, default_action: str, routes: Optional[Dict[Tuple[str, str], Any]] = None) -> Callable:
+    """Оборачивает handler: собирает метрики вызова в contextvar, по завершении выводит их"""
+    def decorator(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            method = event.get('httpMethod', 'GET')
+            action = (event.get('queryStringParameters') or {}).get('action', default_action)
+            # Неизвестные действия сводим в одно значение, чтобы метки Prometheus не разрастались
+            if routes is not None and method != 'OPTIONS' and (action, method) not in routes:
+                action = 'unknown'
+            metrics = {'connect_seconds': 0.0, 'db_seconds': 0.0, 'sql_count': 0, 'rows': 0, 'sql': []}
+            token = _request_metrics.set(metrics)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                metrics['total_seconds'] = time.perf_counter() - started
+                _request_metrics.reset(token)
+                emit_metrics(function, action, method, metrics, response)
+        return wrapper
+    return decorator
+
+def photo_url_prefix() -> str:
+    """Префикс публичного URL, к которому дописывается ключ фото из хранилища"""
+    base = os.environ.get('PHOTO_PUBLIC_BASE_URL') or f"https://cdn.poehali.dev/projects/{os.environ.get('AWS_ACCESS_KEY_ID', '')}/bucket"
+    return base.rstrip('/') + '/'
+
+def add_earnings(cur: Any, worker_id: Optional[int], role: str, earned_at: Any, amount: Any, jobs_count: int) -> None:
+    """Добавляет (или при отрицательных значениях вычитает) заработок в помесячную сводку в текущей транзакции"""
+    if worker_id is None or earned_at is None:
+        return
+    cur.execute("""
+        INSERT INTO worker_monthly_earnings (worker_id, role, month, earned, jobs_count)
+        VALUES (%s, %s, date_trunc('month', %s::timestamp)::date, %s, %s)
+        ON CONFLICT (worker_id, role, month) DO UPDATE
+        SET earned = worker_monthly_earnings.earned + EXCLUDED.earned,
+            jobs_count = worker_monthly_earnings.jobs_count + EXCLUDED.jobs_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, (worker_id, role, earned_at, amount or 0, jobs_count))
+
+# Колонки списка проверок: (ключ ответа, SQL-выражение, преобразование, входит в view=summary)
+INSPECTION_COLUMNS: List[Tuple[str, str, Any, bool]] = [
+    ('id', 'a.id', None, True),
+    ('address', 'ca.address', None, True),
+    ('client_name', 'ca.client_name', None, True),
+    ('client_phone', 'ca.client_phone', None, True),
+    ('service_type', 'ca.service_type', None, True),
+    ('area', 'ca.area', None, True),
+    ('price', 'ca.price', float, True),
+    ('scheduled_date', 'ca.scheduled_date', str, True),
+    ('scheduled_time', 'ca.scheduled_time', str, True),
+    ('status', 'ca.status', None, True),
+    ('notes', 'ca.notes', None, True),
+    # photo_before/photo_after - превью для карточек, *_display - копия для экрана, *_original - исходный файл
+    ('photo_before', 'COALESCE(%s || COALESCE(a.photo_before_thumb_key, a.photo_before_key), a.photo_before)', None, False),
+    ('photo_before_display', '%s || COALESCE(a.photo_before_display_key, a.photo_before_key)', None, False),
+    ('photo_before_original', 'COALESCE(%s || a.photo_before_key, a.photo_before)', None, False),
+    ('photo_after', 'COALESCE(%s || COALESCE(a.photo_after_thumb_key, a.photo_after_key), a.photo_after)', None, False),
+    ('photo_after_display', '%s || COALESCE(a.photo_after_display_key, a.photo_after_key)', None, False),
+    ('photo_after_original', 'COALESCE(%s || a.photo_after_key, a.photo_after)', None, False),
+    ('has_photo_before', '(a.photo_before_key IS NOT NULL OR a.photo_before IS NOT NULL)', None, True),
+    ('has_photo_after', '(a.photo_after_key IS NOT NULL OR a.photo_after IS NOT NULL)', None, True),
+    ('photos_uploaded_at', 'a.photos_uploaded_at', str, True),
+    ('senior_cleaner_salary', 'a.senior_cleaner_salary', float, True),
+    ('inspection_checklist_data', 'a.inspection_checklist_data', None, False),
+    ('inspection_checklist_template_id', 'a.inspection_checklist_template_id', None, True),
+    ('inspection_checklist_checked', 'a.inspection_checklist_checked', None, True),
+    ('inspection_started_at', 'a.inspection_started_at', str, True),
+    ('inspection_completed_at', 'a.inspection_completed_at', str, True),
+    ('maid_name', 'u.full_name', None, True),
+]
+
+def select_columns(columns: List[Tuple[str, str, Any, bool]], params: Dict[str, Any], required: Tuple[str, ...] = ('id',)) -> List[Tuple[str, str, Any, bool]]:
+    """Отбирает колонки списка по параметрам fields=a,b,c или view=summary|full"""
+    fields = params.get('fields')
+    if fields:
+        wanted = {name.strip() for name in fields.split(',') if name.strip()} | set(required)
+        unknown = wanted - {column[0] for column in columns}
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        return [column for column in columns if column[0] in wanted]
+    
+    view = params.get('view', 'full')
+    if view not in ('summary', 'full'):
+        raise ValueError('view must be summary or full')
+    return [column for column in columns if view == 'full' or column[3]]
+
+def row_to_dict(columns: List[Tuple[str, str, Any, bool]], row: Tuple) -> Dict[str, Any]:
+    """Собирает словарь ответа из строки, выбранной по тем же колонкам"""
+    return {
+        key: convert(value) if convert and value is not None else value
+        for (key, _, convert, _), value in zip(columns, row)
+    }
+
+CHECKLIST_KIND = 'inspection'
+CHECKLIST_LATEST_TTL_SECONDS = float(os.environ.get('CHECKLIST_LATEST_TTL_SECONDS', '60'))
+
+# Кеш шаблонов на время жизни инстанса: версия шаблона неизменна, поэтому кеш не устаревает
+_checklist_templates: Dict[Tuple[str, int], Dict[str, Any]] = {}
+_checklist_template_keys: Dict[int, Tuple[str, int]] = {}
+_latest_checklist_versions: Dict[str, Tuple[int, float]] = {}
+
+def _cache_checklist_template(template_id: int, service_type: str, version: int, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    template = {
+        'id': template_id,
+        'service_type': service_type,
+        'version': version,
+        'items': items,
+        'json': json.dumps({'id': template_id, 'service_type': service_type, 'version': version, 'items': items})
+    }
+    _checklist_templates[(service_type, version)] = template
+    _checklist_template_keys[template_id] = (service_type, version)
+    return template
+
+def get_checklist_template(cur: Any, template_id: int) -> Dict[str, Any]:
+    """Возвращает шаблон чек-листа проверки по id, обращаясь к БД только при первом запросе"""
+    key = _checklist_template_keys.get(template_id)
+    if key:
+        return _checklist_templates[key]
+    cur.execute("""
+        SELECT id, service_type, version, items FROM checklist_templates WHERE id = %s
+    """, (template_id,))
+    row = cur.fetchone()
+    if not row:
+        raise LookupError(f'Checklist template {template_id} not found')
+    return _cache_checklist_template(*row)
+
+def get_latest_checklist_template(cur: Any, service_type: str) -> Dict[str, Any]:
+    """Возвращает актуальную версию шаблона чек-листа проверки для типа уборки (для неизвестных типов - basic)"""
+    cached = _latest_checklist_versions.get(service_type)
+    if cached and time.monotonic() - cached[1] < CHECKLIST_LATEST_TTL_SECONDS:
+        key = (service_type, cached[0])
+        if key in _checklist_templates:
+            return _checklist_templates[key]
+    
+    cur.execute("""
+        SELECT id, service_type, version, items FROM checklist_templates
+        WHERE kind = %s AND service_type IN (%s, 'basic')
+        ORDER BY (service_type = %s) DESC, version DESC
+        LIMIT 1
+    """, (CHECKLIST_KIND, service_type, service_type))
+    row = cur.fetchone()
+    if not row:
+        raise LookupError(f'No checklist template for {service_type}')
+    template = _cache_checklist_template(*row)
+    if template['service_type'] == service_type:
+        _latest_checklist_versions[service_type] = (template['version'], time.monotonic())
+    return template
+
+def expand_checklist(template: Dict[str, Any], checked_ids: List[str]) -> List[Dict[str, Any]]:
+    """Собирает полный чек-лист с отметками из шаблона и списка отмеченных id"""
+    checked = set(checked_ids or [])
+    return [dict(item, checked=item['id'] in checked) for item in template['items']]
+
+CHECKLIST_TEMPLATES_SQL = "SELECT id, service_type, version, items FROM checklist_templates WHERE id = ANY(%s)"
+
+def missing_checklist_templates(records: List[Dict[str, Any]], data_key: str, template_key: str) -> List[int]:
+    """id шаблонов, которые нужны записям со ссылкой на шаблон, но еще не в кеше"""
+    return sorted({
+        record[template_key] for record in records
+        if data_key in record and record[data_key] is None and record.get(template_key)
+        and record[template_key] not in _checklist_template_keys
+    })
+
+def cache_checklist_templates(rows: List[Tuple]) -> None:
+    """Кладет в кеш шаблоны, выбранные по CHECKLIST_TEMPLATES_SQL"""
+    for row in rows:
+        _cache_checklist_template(*row)
+
+def expand_checklists(records: List[Dict[str, Any]], data_key: str, template_key: str, checked_key: str) -> None:
+    """Подставляет развернутый чек-лист из кеша шаблонов в записи, где он хранится как ссылка на шаблон"""
+    for record in records:
+        if data_key in record and record[data_key] is None and record.get(template_key):
+            key = _checklist_template_keys.get(record[template_key])
+            if key is None:
+                raise LookupError(f'Checklist template {record[template_key]} not found')
+            record[data_key] = expand_checklist(_checklist_templates[key], record[checked_key])
+
+def attach_checklists(cur: Any, records: List[Dict[str, Any]], data_key: str, template_key: str, checked_key: str) -> None:
+    """Подставляет развернутый чек-лист в записи, где он хранится как ссылка на шаблон"""
+    # Недостающие шаблоны выбираются одним запросом на всю страницу, а не по запросу на запись
+    missing = missing_checklist_templates(records, data_key, template_key)
+    if missing:
+        cur.execute(CHECKLIST_TEMPLATES_SQL, (missing,))
+        cache_checklist_templates(cur.fetchall())
+    expand_checklists(records, data_key, template_key, checked_key)
+
+def fold_checklist_toggles(body_data: Dict[str, Any]) -> Dict[int, Dict[str, bool]]:
+    """Сворачивает очередь переключений в итоговое состояние пунктов по назначениям (последнее переключение побеждает)"""
+    default_assignment_id = body_data.get('assignment_id')
+    toggles = body_data.get('toggles')
+    if toggles is None and 'item_id' in body_data:
+        toggles = [{'item_id': body_data.get('item_id'), 'checked': body_data.get('checked')}]
+    
+    states: Dict[int, Dict[str, bool]] = {}
+    for toggle in toggles or []:
+        assignment_id = toggle.get('assignment_id', default_assignment_id)
+        if assignment_id is None or toggle.get('item_id') is None or not isinstance(toggle.get('checked'), bool):
+            raise ValueError('each toggle needs assignment_id, item_id and boolean checked')
+        states.setdefault(int(assignment_id), {})[str(toggle['item_id'])] = toggle['checked']
+    if not states:
+        raise ValueError('toggles required')
+    return states
+
+def patch_checklist(cur: Any, assignment_id: int, states: Dict[str, bool], data_column: str, template_column: str, checked_column: str, params: Dict[str, Any]) -> Optional[List[str]]:
+    """Атомарно применяет переключения к чек-листу назначения пользователя; возвращает id отмеченных пунктов или None, если чек-листа нет"""
+    owner_sql, owner_params = owner_filter(params)
+    checked_on = [item_id for item_id, checked in states.items() if checked]
+    checked_off = [item_id for item_id, checked in states.items() if not checked]
+    cur.execute(f"""
+        UPDATE assignments
+        SET {checked_column} = ARRAY(
+            SELECT DISTINCT item_id FROM unnest({checked_column} || %s::text[]) AS item_id
+            WHERE item_id <> ALL(%s::text[])
+            ORDER BY item_id
+        )
+        WHERE id = %s AND {template_column} IS NOT NULL{owner_sql}
+        RETURNING {checked_column}
+    """, (checked_on, checked_off, assignment_id, *owner_params))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    
+    # Назначения, начатые до шаблонов: меняем только нужные элементы JSONB-массива
+    cur.execute(f"""
+        UPDATE assignments
+        SET {data_column} = (
+            SELECT jsonb_agg(
+                CASE WHEN %s::jsonb ? (item->>'id')
+                     THEN jsonb_set(item, '{{checked}}', %s::jsonb -> (item->>'id'))
+                     ELSE item END
+                ORDER BY position
+            )
+            FROM jsonb_array_elements({data_column}) WITH ORDINALITY AS e(item, position)
+        )
+        WHERE id = %s AND {data_column} IS NOT NULL{owner_sql}
+        RETURNING ARRAY(
+            SELECT item->>'id' FROM jsonb_array_elements({data_column}) AS item
+            WHERE (item->>'checked')::boolean
+        )
+    """, (json.dumps(states), json.dumps(states), assignment_id, *owner_params))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Authorization',
+    'Access-Control-Max-Age': '86400'
+}
+ETAG_CACHE_CONTROL = 'private, no-cache'
+
+# Сжатие ответов: тела меньше порога уходят как есть - выигрыш в трафике не окупает время сжатия
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+# Лента изменений: предел ожидания long-poll, период перепроверки без NOTIFY и предел строк в ответе
+CHANGES_WAIT_MAX_SECONDS = float(os.environ.get('CHANGES_WAIT_MAX_SECONDS', '25'))
+CHANGES_RECHECK_SECONDS = 5
+CHANGES_MAX_ROWS = 500
+# Совпадает со сроком хранения change_tombstones в V0017
+CHANGES_RETENTION_DAYS = 7
+IMMUTABLE_JSON_HEADERS = {**JSON_HEADERS, 'Cache-Control': 'public, max-age=31536000, immutable'}
+
+def json_response(status: int, payload: Any, headers: Dict[str, str] = JSON_HEADERS) -> Dict[str, Any]:
+    """Ответ с JSON-телом и заранее собранными заголовками"""
+    return {'statusCode': status, 'headers': headers, 'body': json.dumps(payload)}
+
+def read_json_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Тело запроса как JSON; пустое тело считается пустым объектом"""
+    return json.loads(event.get('body') or '{}')
+
+# Подписанные токены сессии от auth: base64url(JSON {uid, role, exp}).base64url(HMAC-SHA256).
+# Без SESSION_SECRET проверка выключена, и функция, как раньше, доверяет параметрам запроса
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+SESSION_CACHE_SIZE = 4096
+SESSION_ROLE = 'senior_cleaner'
+# Параметр с id пользователя: старший клинер видит и меняет только свои проверки
+SESSION_SCOPE_PARAM: Optional[str] = 'senior_cleaner_id'
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+@functools.lru_cache(maxsize=SESSION_CACHE_SIZE)
+def verify_session_token(token: str) -> Optional[Tuple[int, str, int]]:
+    """(id, роль, срок действия) из токена с верной подписью или None; повторная проверка того же токена берется из кэша"""
+    payload, _, signature = token.partition('.')
+    expected = hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(b64url_decode(signature), expected):
+            return None
+        claims = json.loads(b64url_decode(payload))
+        return int(claims['uid']), str(claims['role']), int(claims['exp'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def authorize(event: Dict[str, Any], params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Проверка токена из Authorization: Bearer без запроса к БД; None, если доступ разрешен, иначе ответ 401/403"""
+    if not SESSION_SECRET:
+        return None
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'authorization'), '') or ''
+    scheme, _, token = value.partition(' ')
+    claims = verify_session_token(token.strip()) if scheme.lower() == 'bearer' and token.strip() else None
+    # Срок проверяем на каждом вызове: кэш хранит только результат проверки подписи
+    if claims is None or claims[2] <= time.time():
+        return json_response(401, {'error': 'Session token is missing, invalid or expired'})
+    user_id, role, _ = claims
+    if role != SESSION_ROLE:
+        return json_response(403, {'error': 'Forbidden'})
+    if SESSION_SCOPE_PARAM and params.get(SESSION_SCOPE_PARAM) not in (None, '', str(user_id)):
+        return json_response(403, {'error': 'Forbidden'})
+    # Обработчики берут id пользователя из params: подставляем проверенный, даже если клиент его не передал
+    if SESSION_SCOPE_PARAM:
+        params[SESSION_SCOPE_PARAM] = str(user_id)
+    return None
+
+def owner_filter(params: Dict[str, Any], alias: str = '') -> Tuple[str, Tuple[int, ...]]:
+    """Условие "назначение принадлежит пользователю" для WHERE по id назначения; без id пользователя - пустое"""
+    owner_id = params.get(SESSION_SCOPE_PARAM)
+    if not owner_id:
+        return '', ()
+    return f' AND {alias}{SESSION_SCOPE_PARAM} = %s', (int(owner_id),)
+
+def request_etags(event: Dict[str, Any]) -> List[str]:
+    """ETag из заголовка If-None-Match (без префикса слабой проверки W/)"""
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'if-none-match'), '') or ''
+    return [tag.strip().removeprefix('W/') for tag in value.split(',') if tag.strip()]
+
+def version_args(version: Tuple[str, Optional[str]], params: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    """Параметры SQL версии данных; None, если в запросе нет id области"""
+    scope_param = version[1]
+    if scope_param is None:
+        return ()
+    value = params.get(scope_param) or ''
+    if not value.isdigit():
+        return None
+    return (int(value),)
+
+def etag_for(version_row: Any, params: Dict[str, Any]) -> str:
+    """ETag ответа: хеш версии данных и параметров запроса"""
+    material = repr((version_row, sorted(params.items()), photo_url_prefix()))
+    return '"' + hashlib.sha1(material.encode('utf-8')).hexdigest() + '"'
+
+def compute_etag(cur: Any, version: Tuple[str, Optional[str]], params: Dict[str, Any]) -> Optional[str]:
+    """ETag ответа по версии данных из БД; None, если в запросе нет id области"""
+    args = version_args(version, params)
+    if args is None:
+        return None
+    cur.execute(version[0], args)
+    return etag_for(cur.fetchone(), params)
+
+def not_modified(etag: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {'Access-Control-Allow-Origin': '*', 'ETag': etag, 'Cache-Control': ETAG_CACHE_CONTROL},
+        'body': ''
+    }
+
+def accepted_encodings(event: Dict[str, Any]) -> List[str]:
+    """Кодировки из Accept-Encoding, которые клиент не запретил через q=0"""
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'accept-encoding'), '') or ''
+    encodings = []
+    for part in value.split(','):
+        name, _, weight = part.partition(';')
+        weight = weight.strip().removeprefix('q=')
+        try:
+            if weight and float(weight) <= 0:
+                continue
+        except ValueError:
+            continue
+        encodings.append(name.strip().lower())
+    return encodings
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """Сжимает тело ответа br или gzip, если клиент это принимает и тело не меньше COMPRESS_MIN_BYTES"""
+    body = response.get('body')
+    if not body or response.get('isBase64Encoded'):
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    
+    encodings = accepted_encodings(event)
+    headers = {**response['headers'], 'Vary': 'Accept-Encoding'}
+    if brotli is not None and 'br' in encodings:
+        encoding, data = 'br', brotli.compress(raw, quality=BROTLI_QUALITY)
+    elif 'gzip' in encodings or '*' in encodings:
+        encoding, data = 'gzip', gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
     else:
-        return base_items
+        return {**response, 'headers': headers}
+    
+    headers['Content-Encoding'] = encoding
+    # Сжатое представление отличается побайтно, поэтому ETag становится слабым (как делает nginx)
+    if headers.get('ETag', '').startswith('"'):
+        headers['ETag'] = 'W/' + headers['ETag']
+    return {**response, 'headers': headers, 'body': base64.b64encode(data).decode('ascii'), 'isBase64Encoded': True}
+
+def encode_change_cursor(horizon: int) -> str:
+    """Курсор ленты изменений: горизонт транзакций и время его выдачи"""
+    raw = json.dumps([horizon, int(time.time())]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_change_cursor(cursor: str) -> Tuple[int, int]:
+    """Разбирает курсор ленты в (горизонт, время выдачи), ValueError при мусоре"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        horizon, issued_at = json.loads(raw)
+        return int(horizon), int(issued_at)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'invalid cursor: {cursor}') from e
+
+def current_horizon(cur: Any) -> int:
+    """xmin текущего снимка: все транзакции с меньшим id уже завершены"""
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+    return cur.fetchone()[0]
+
+def poll_changes(
+    conn: Any, cur: Any, since: int, wait: float, collect: Callable[[int, int], Dict[str, List[Any]]]
+) -> Tuple[int, Dict[str, List[Any]]]:
+    """Собирает изменения в окне [since, горизонт); если их нет, до wait секунд ждет NOTIFY changes"""
+    if wait > 0:
+        cur.execute("LISTEN changes")
+        conn.commit()
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            horizon = current_horizon(cur)
+            changes = collect(since, horizon)
+            # Пока ждем уведомления, соединение не держит открытую транзакцию
+            conn.commit()
+            remaining = deadline - time.monotonic()
+            if any(changes.values()) or remaining <= 0:
+                return horizon, changes
+            # Перепроверяем и без уведомления: горизонт мог сдвинуться после завершения долгой транзакции
+            if select.select([conn], [], [], min(remaining, CHANGES_RECHECK_SECONDS))[0]:
+                conn.poll()
+                conn.notifies.clear()
+    finally:
+        if wait > 0:
+            conn.rollback()
+            cur.execute("UNLISTEN changes")
+            conn.commit()
+
+def parse_change_params(params: Dict[str, Any]) -> Tuple[Optional[int], float, bool]:
+    """(горизонт из since или None, время ожидания, нужен ли клиенту полный reset), ValueError при мусоре"""
+    wait = max(0.0, min(float(params.get('wait') or 0), CHANGES_WAIT_MAX_SECONDS))
+    if not params.get('since'):
+        return None, wait, False
+    since, issued_at = decode_change_cursor(params['since'])
+    if time.time() - issued_at > CHANGES_RETENTION_DAYS * 86400:
+        return None, wait, True
+    return since, wait, False
+
+# Версия проверок для ETag: число строк, последнее изменение и сумма отметок updated_at назначений, адресов и горничных.
+# Сумма меняется при любом UPDATE, даже если транзакция с более ранней отметкой закоммитилась позже соседней
+ASSIGNMENTS_VERSION_SQL = """
+    SELECT COUNT(*), MAX(GREATEST(a.updated_at, ca.updated_at, u.updated_at)),
+           SUM((EXTRACT(EPOCH FROM a.updated_at) * 1000000)::bigint + (EXTRACT(EPOCH FROM ca.updated_at) * 1000000)::bigint
+               + COALESCE((EXTRACT(EPOCH FROM u.updated_at) * 1000000)::bigint, 0))
+    FROM assignments a
+    JOIN cleaning_addresses ca ON a.address_id = ca.id
+    LEFT JOIN users u ON a.maid_id = u.id
+    WHERE {where}
+"""
+
+def inspections_query(params: Dict[str, Any]) -> Tuple[str, List[Any], List[Tuple[str, str, Any, bool]]]:
+    """SQL списка проверок или одной проверки по id, его параметры и колонки ответа; ValueError с текстом ошибки 400"""
+    action = params.get('action', 'inspections')
+    senior_cleaner_id = params.get('senior_cleaner_id')
+    assignment_id = params.get('id')
+    
+    if action == 'inspections' and not senior_cleaner_id:
+        raise ValueError('senior_cleaner_id required')
+    
+    if action == 'inspection' and not assignment_id:
+        raise ValueError('id required')
+    
+    # Детальная карточка всегда полная, список можно сузить через fields= или view=summary
+    columns = select_columns(
+        INSPECTION_COLUMNS, params if action == 'inspections' else {},
+        required=('id', 'inspection_checklist_template_id', 'inspection_checklist_checked')
+    )
+    
+    select_sql = ', '.join(column[1] for column in columns)
+    select_params = [photo_url_prefix()] * select_sql.count('%s')
+    
+    if action == 'inspection':
+        where_sql = 'a.id = %s'
+        where_params = [int(assignment_id)]
+        if senior_cleaner_id:
+            where_sql += ' AND a.senior_cleaner_id = %s'
+            where_params.append(int(senior_cleaner_id))
+    else:
+        where_sql = 'a.senior_cleaner_id = %s'
+        where_params = [int(senior_cleaner_id)]
+    
+    sql = f"""
+        SELECT {select_sql}
+        FROM assignments a
+        JOIN cleaning_addresses ca ON a.address_id = ca.id
+        LEFT JOIN users u ON a.maid_id = u.id
+        WHERE {where_sql}
+        ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC
+    """
+    return sql, [*select_params, *where_params], columns
+
+def inspections_response(params: Dict[str, Any], inspections: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Ответ со списком проверок или одной проверки из строк inspections_query с развернутыми чек-листами"""
+    if params.get('action', 'inspections') == 'inspection':
+        if not inspections:
+            return json_response(404, {'error': 'Inspection not found'})
+        return json_response(200, {'inspection': inspections[0]})
+    
+    return json_response(200, {'inspections': inspections})
+
+def handle_get_inspections(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Проверки старшего клинера или одна проверка по id"""
+    try:
+        sql, args, columns = inspections_query(params)
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    cur.execute(sql, args)
+    inspections = [row_to_dict(columns, row) for row in cur.fetchall()]
+    attach_checklists(cur, inspections, 'inspection_checklist_data', 'inspection_checklist_template_id', 'inspection_checklist_checked')
+    return inspections_response(params, inspections)
+
+def handle_post_start_inspection(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Начало проверки"""
+    body_data = read_json_body(event)
+    assignment_id = body_data.get('assignment_id')
+    
+    if not assignment_id:
+        return json_response(400, {'error': 'assignment_id required'})
+    
+    owner_sql, owner_params = owner_filter(params, 'a.')
+    cur.execute(f"""
+        SELECT ca.service_type FROM assignments a
+        JOIN cleaning_addresses ca ON a.address_id = ca.id
+        WHERE a.id = %s{owner_sql}
+    """, (int(assignment_id), *owner_params))
+    
+    result = cur.fetchone()
+    if not result:
+        return json_response(404, {'error': 'Assignment not found'})
+    
+    service_type = result[0]
+    template = get_latest_checklist_template(cur, service_type)
+    
+    cur.execute("""
+        UPDATE assignments 
+        SET inspection_checklist_template_id = %s, inspection_checklist_checked = '{}',
+            inspection_checklist_data = NULL, inspection_started_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, (template['id'], int(assignment_id)))
+    
+    conn.commit()
+    
+    return json_response(200, {'message': 'Inspection started'})
+
+def handle_post_update_inspection_checklist(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Сохранение чек-листа проверки целиком"""
+    body_data = read_json_body(event)
+    assignment_id = body_data.get('assignment_id')
+    checklist_data = body_data.get('checklist_data')
+    
+    if not assignment_id or not checklist_data:
+        return json_response(400, {'error': 'assignment_id and checklist_data required'})
+    
+    # Для чек-листов по шаблону храним только id отмеченных пунктов
+    checked_ids = [str(item['id']) for item in checklist_data if item.get('checked')]
+    owner_sql, owner_params = owner_filter(params)
+    cur.execute(f"""
+        UPDATE assignments 
+        SET inspection_checklist_checked = %s
+        WHERE id = %s AND inspection_checklist_template_id IS NOT NULL{owner_sql}
+    """, (checked_ids, int(assignment_id), *owner_params))
+    
+    if cur.rowcount == 0:
+        cur.execute(f"""
+            UPDATE assignments 
+            SET inspection_checklist_data = %s
+            WHERE id = %s{owner_sql}
+        """, (json.dumps(checklist_data), int(assignment_id), *owner_params))
+        if cur.rowcount == 0:
+            conn.rollback()
+            return json_response(404, {'error': 'Assignment not found'})
+    
+    conn.commit()
+    
+    return json_response(200, {'message': 'Inspection checklist updated'})
+
+def handle_post_complete_inspection(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Завершение проверки"""
+    body_data = read_json_body(event)
+    assignment_id = body_data.get('assignment_id')
+    
+    if not assignment_id:
+        return json_response(400, {'error': 'assignment_id required'})
+    
+    owner_sql, owner_params = owner_filter(params)
+    cur.execute(f"""
+        SELECT address_id, maid_id, salary, verified_at,
+               senior_cleaner_id, senior_cleaner_salary, inspection_completed_at
+        FROM assignments WHERE id = %s{owner_sql}
+        FOR UPDATE
+    """, (int(assignment_id), *owner_params))
+    
+    result = cur.fetchone()
+    if not result:
+        return json_response(404, {'error': 'Assignment not found'})
+    
+    address_id, maid_id, salary, previous_verified_at, senior_cleaner_id, senior_cleaner_salary, previous_completed_at = result
+    
+    # Обновляем статус проверки и адреса
+    cur.execute("""
+        UPDATE assignments 
+        SET inspection_completed_at = CURRENT_TIMESTAMP, verified_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+        RETURNING inspection_completed_at
+    """, (int(assignment_id),))
+    completed_at = cur.fetchone()[0]
+    
+    # Сводка заработка обновляется в той же транзакции; повторное завершение переносит суммы в новый месяц
+    if previous_verified_at is not None:
+        add_earnings(cur, maid_id, 'maid', previous_verified_at, -(salary or 0), -1)
+    add_earnings(cur, maid_id, 'maid', completed_at, salary, 1)
+    if previous_completed_at is not None:
+        add_earnings(cur, senior_cleaner_id, 'senior_cleaner', previous_completed_at, -(senior_cleaner_salary or 0), -1)
+    add_earnings(cur, senior_cleaner_id, 'senior_cleaner', completed_at, senior_cleaner_salary, 1)
+    
+    cur.execute("""
+        UPDATE cleaning_addresses 
+        SET status = 'verified' 
+        WHERE id = %s
+    """, (address_id,))
+    
+    conn.commit()
+    
+    return json_response(200, {'message': 'Inspection completed, verified, and salaries assigned'})
+
+def handle_post_patch_inspection_checklist(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Применение переключений пунктов чек-листа проверки"""
+    # Принимает одно переключение {assignment_id, item_id, checked} или очередь {toggles: [...]}
+    body_data = read_json_body(event)
+    try:
+        states = fold_checklist_toggles(body_data)
+    except (TypeError, ValueError) as e:
+        return json_response(400, {'error': str(e)})
+    
+    results = []
+    for assignment_id, item_states in states.items():
+        checked = patch_checklist(cur, assignment_id, item_states, 'inspection_checklist_data', 'inspection_checklist_template_id', 'inspection_checklist_checked', params)
+        if checked is None:
+            conn.rollback()
+            return json_response(404, {'error': f'Checklist not found for assignment {assignment_id}'})
+        results.append({'assignment_id': assignment_id, 'checked': checked})
+    
+    conn.commit()
+    
+    return json_response(200, {'message': 'Inspection checklist updated', 'results': results})
+
+def handle_get_checklist_template(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Версия шаблона чек-листа"""
+    template_id = params.get('id')
+    
+    if not template_id:
+        return json_response(400, {'error': 'id required'})
+    
+    try:
+        template = get_checklist_template(cur, int(template_id))
+    except LookupError:
+        return json_response(404, {'error': 'Checklist template not found'})
+    
+    # Версия шаблона не меняется, поэтому отдаем заранее сериализованный JSON с долгим кешем
+    return {'statusCode': 200, 'headers': IMMUTABLE_JSON_HEADERS, 'body': template['json']}
+
+def handle_get_salary_history(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """История заработка старшего клинера"""
+    senior_cleaner_id = params.get('senior_cleaner_id')
+    
+    if not senior_cleaner_id:
+        return json_response(400, {'error': 'senior_cleaner_id required'})
+    
+    cur.execute("""
+        SELECT 
+            a.id,
+            ca.address,
+            ca.client_name,
+            ca.scheduled_date,
+            a.inspection_started_at,
+            a.inspection_completed_at,
+            a.senior_cleaner_salary,
+            ca.service_type,
+            ca.area,
+            a.paid
+        FROM assignments a
+        JOIN cleaning_addresses ca ON a.address_id = ca.id
+        WHERE a.senior_cleaner_id = %s AND a.inspection_completed_at IS NOT NULL
+        ORDER BY a.inspection_completed_at DESC
+    """, (int(senior_cleaner_id),))
+    
+    rows = cur.fetchall()
+    records = []
+    total_earned = 0
+    
+    for row in rows:
+        salary = float(row[6]) if row[6] else 0
+        total_earned += salary
+        records.append({
+            'id': row[0],
+            'address': row[1],
+            'client_name': row[2],
+            'scheduled_date': str(row[3]),
+            'inspection_started_at': str(row[4]) if row[4] else None,
+            'inspection_completed_at': str(row[5]) if row[5] else None,
+            'salary': salary,
+            'service_type': row[7],
+            'area': row[8],
+            'paid': row[9] if row[9] else False
+        })
+    
+    return json_response(200, {'records': records, 'total_earned': total_earned})
+
+def handle_get_changes(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Проверки старшего клинера, измененные после курсора since; с wait=N ждет изменений до N секунд"""
+    senior_cleaner_id = params.get('senior_cleaner_id')
+    if not senior_cleaner_id:
+        return json_response(400, {'error': 'senior_cleaner_id required'})
+    
+    try:
+        since, wait, reset = parse_change_params(params)
+        columns = select_columns(INSPECTION_COLUMNS, params, required=('id', 'inspection_checklist_template_id', 'inspection_checklist_checked'))
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    
+    # Без since отдаем только курсор: клиент берет его до загрузки списка и дальше получает дельты
+    if since is None:
+        return json_response(200, {'cursor': encode_change_cursor(current_horizon(cur)), 'inspections': [], 'removed': [], 'reset': reset})
+    
+    select_sql = ', '.join(column[1] for column in columns)
+    select_params = [photo_url_prefix()] * select_sql.count('%s')
+    
+    def collect(since_xid: int, horizon: int) -> Dict[str, List[Any]]:
+        cur.execute(f"""
+            SELECT {select_sql}
+            FROM assignments a
+            JOIN cleaning_addresses ca ON a.address_id = ca.id
+            LEFT JOIN users u ON a.maid_id = u.id
+            WHERE a.senior_cleaner_id = %s
+              AND ((a.change_xid >= %s AND a.change_xid < %s) OR (ca.change_xid >= %s AND ca.change_xid < %s))
+            ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC
+            LIMIT %s
+        """, (*select_params, int(senior_cleaner_id), since_xid, horizon, since_xid, horizon, CHANGES_MAX_ROWS + 1))
+        rows = cur.fetchall()
+        cur.execute("""
+            SELECT DISTINCT row_id FROM change_tombstones
+            WHERE table_name = 'assignments' AND senior_cleaner_id = %s AND change_xid >= %s AND change_xid < %s
+        """, (int(senior_cleaner_id), since_xid, horizon))
+        return {'rows': rows, 'removed': [row[0] for row in cur.fetchall()]}
+    
+    horizon, changes = poll_changes(conn, cur, since, wait, collect)
+    if len(changes['rows']) > CHANGES_MAX_ROWS:
+        # Изменилось слишком много - дешевле перезагрузить список целиком
+        return json_response(200, {'cursor': encode_change_cursor(horizon), 'inspections': [], 'removed': [], 'reset': True})
+    
+    items = [row_to_dict(columns, row) for row in changes['rows']]
+    attach_checklists(cur, items, 'inspection_checklist_data', 'inspection_checklist_template_id', 'inspection_checklist_checked')
+    return json_response(200, {
+        'cursor': encode_change_cursor(horizon),
+        'inspections': items,
+        'removed': changes['removed'],
+        'reset': False
+    })
+
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '20'))
+# Долгий опрос сам управляет транзакциями и ждет на соединении, вложенный batch не нужен
+BATCH_EXCLUDED_ACTIONS = ('batch', 'changes')
+
+class BatchConnection:
+    """Соединение для шага атомарного batch: commit откладывается до конца пакета, rollback откатывает только шаг"""
+    
+    def __init__(self, conn: Any, cur: Any):
+        self._conn = conn
+        self._cur = cur
+    
+    def commit(self) -> None:
+        pass
+    
+    def rollback(self) -> None:
+        self._cur.execute("ROLLBACK TO SAVEPOINT batch_step")
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+def parse_batch_requests(body_data: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any], Any]]:
+    """Шаги batch как (action, method, params, body); ValueError при неверном описании"""
+    requests = body_data.get('requests')
+    if not isinstance(requests, list) or not requests:
+        raise ValueError('requests must be a non-empty list')
+    if len(requests) > BATCH_MAX_REQUESTS:
+        raise ValueError(f'at most {BATCH_MAX_REQUESTS} requests per batch')
+    steps = []
+    for index, request in enumerate(requests):
+        if not isinstance(request, dict) or not isinstance(request.get('action'), str):
+            raise ValueError(f'requests[{index}]: action is required')
+        action = request['action']
+        method = str(request.get('method', 'GET')).upper()
+        if action in BATCH_EXCLUDED_ACTIONS or (action, method) not in ROUTES:
+            raise ValueError(f'requests[{index}]: {method} {action} is not allowed in batch')
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            raise ValueError(f'requests[{index}]: params must be an object')
+        steps.append((action, method, {key: str(value) for key, value in params.items()}, request.get('body')))
+    return steps
 
+def handle_post_batch(event: Dict[str, Any], params: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    """Несколько действий за один вызов на одном соединении; с atomic=true - в одной транзакции"""
+    # {requests: [{action, method, params, body}], atomic} -> {results: [{action, status, body}], committed}
+    body_data = read_json_body(event)
+    try:
+        steps = parse_batch_requests(body_data)
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+    atomic = bool(body_data.get('atomic'))
+    
+    results: List[Dict[str, Any]] = []
+    failed = False
+    for action, method, step_params, step_body in steps:
+        if failed:
+            results.append({'action': action, 'status': None, 'body': {'error': 'skipped'}})
+            continue
+        step_event = {
+            'httpMethod': method,
+            'queryStringParameters': {**step_params, 'action': action},
+            'headers': event.get('headers') or {},
+            'body': step_body if step_body is None or isinstance(step_body, str) else json.dumps(step_body),
+            'isBase64Encoded': False,
+        }
+        denied = authorize(step_event, step_event['queryStringParameters'])
+        if denied is not None:
+            results.append({'action': action, 'status': denied['statusCode'], 'body': json.loads(denied['body'])})
+            conn.rollback()
+            failed = atomic
+            continue
+        step_conn = conn
+        if atomic:
+            cur.execute("SAVEPOINT batch_step")
+            step_conn = BatchConnection(conn, cur)
+        try:
+            response = ROUTES[(action, method)](step_event, step_event['queryStringParameters'], step_conn, cur)
+        except Exception as e:
+            print(f"Batch step {method} {action} failed: {str(e)}")
+            response = json_response(500, {'error': f'Server error: {str(e)}'})
+        status = response['statusCode']
+        results.append({'action': action, 'status': status, 'body': json.loads(response['body']) if response['body'] else None})
+        if status >= 400:
+            conn.rollback()
+            # В атомарном пакете ошибка шага отменяет уже выполненные шаги и пропускает оставшиеся
+            failed = atomic
+        elif atomic:
+            cur.execute("RELEASE SAVEPOINT batch_step")
+    
+    committed = atomic and not failed
+    if committed:
+        conn.commit()
+    return json_response(200, {'results': results, 'committed': committed if atomic else None})
+
+ROUTES = {
+    ('inspections', 'GET'): handle_get_inspections,
+    ('inspection', 'GET'): handle_get_inspections,
+    ('start-inspection', 'POST'): handle_post_start_inspection,
+    ('update-inspection-checklist', 'POST'): handle_post_update_inspection_checklist,
+    ('complete-inspection', 'POST'): handle_post_complete_inspection,
+    ('patch-inspection-checklist', 'POST'): handle_post_patch_inspection_checklist,
+    ('checklist-template', 'GET'): handle_get_checklist_template,
+    ('salary-history', 'GET'): handle_get_salary_history,
+    ('changes', 'GET'): handle_get_changes,
+    ('batch', 'POST'): handle_post_batch,
+}
+
+# GET-действия с ETag: (SQL версии данных, параметр запроса с id области или None)
+ROUTE_VERSIONS: Dict[Tuple[str, str], Tuple[str, Optional[str]]] = {
+    ('inspections', 'GET'): (ASSIGNMENTS_VERSION_SQL.format(where='a.senior_cleaner_id = %s'), 'senior_cleaner_id'),
+    ('inspection', 'GET'): (ASSIGNMENTS_VERSION_SQL.format(where='a.id = %s'), 'id'),
+    ('salary-history', 'GET'): (ASSIGNMENTS_VERSION_SQL.format(where='a.senior_cleaner_id = %s'), 'senior_cleaner_id'),
+}
+
+@instrumented('senior-cleaner', 'inspections', ROUTES)
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
-    params = event.get('queryStringParameters', {})
-    action = params.get('action', 'inspections') if params else 'inspections'
+    params = event.get('queryStringParameters') or {}
+    action = params.get('action', 'inspections')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return {'statusCode': 200, 'headers': PREFLIGHT_HEADERS, 'body': ''}
+    
+    # Маршрут ищем до подключения к БД: неизвестные действия не занимают соединение из пула
+    route = ROUTES.get((action, method))
+    if route is None:
+        return json_response(400, {'error': 'Invalid action or method'})
+    
+    denied = authorize(event, params)
+    if denied is not None:
+        return denied
     
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Database connection error'})
-        }
+        return json_response(500, {'error': 'Database connection error'})
     
+    conn = None
+    cur = None
     try:
-        conn = psycopg2.connect(database_url)
-        cur = conn.cursor()
+        connect_started = time.perf_counter()
+        conn = get_connection(database_url)
+        record_connect(time.perf_counter() - connect_started)
+        cur = conn.cursor(cursor_factory=TimedCursor)
         
-        if action == 'inspections' and method == 'GET':
-            params = event.get('queryStringParameters', {})
-            senior_cleaner_id = params.get('senior_cleaner_id')
-            
-            if not senior_cleaner_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'senior_cleaner_id required'})
-                }
-            
-            cur.execute("""
-                SELECT a.id, ca.address, ca.client_name, ca.client_phone, 
-                       ca.service_type, ca.area, ca.price, ca.scheduled_date, 
-                       ca.scheduled_time, ca.status, ca.notes,
-                       a.photo_before, a.photo_after, a.photos_uploaded_at,
-                       a.senior_cleaner_salary, a.inspection_checklist_data, 
-                       a.inspection_started_at, a.inspection_completed_at,
-                       u.full_name as maid_name
-                FROM assignments a
-                JOIN cleaning_addresses ca ON a.address_id = ca.id
-                LEFT JOIN users u ON a.maid_id = u.id
-                WHERE a.senior_cleaner_id = %s
-                ORDER BY ca.scheduled_date DESC, ca.scheduled_time DESC
-            """, (int(senior_cleaner_id),))
-            
-            rows = cur.fetchall()
-            inspections = []
-            for row in rows:
-                inspections.append({
-                    'id': row[0],
-                    'address': row[1],
-                    'client_name': row[2],
-                    'client_phone': row[3],
-                    'service_type': row[4],
-                    'area': row[5],
-                    'price': float(row[6]),
-                    'scheduled_date': str(row[7]),
-                    'scheduled_time': str(row[8]),
-                    'status': row[9],
-                    'notes': row[10],
-                    'photo_before': row[11],
-                    'photo_after': row[12],
-                    'photos_uploaded_at': str(row[13]) if row[13] else None,
-                    'senior_cleaner_salary': float(row[14]) if row[14] else None,
-                    'inspection_checklist_data': row[15],
-                    'inspection_started_at': str(row[16]) if row[16] else None,
-                    'inspection_completed_at': str(row[17]) if row[17] else None,
-                    'maid_name': row[18]
-                })
-            
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'inspections': inspections})
-            }
+        # Версию данных считаем до выборки: если данные изменятся между запросами, следующий ETag просто не совпадет
+        etag = None
+        version = ROUTE_VERSIONS.get((action, method))
+        if version is not None:
+            etag = compute_etag(cur, version, params)
+            if etag is not None and etag in request_etags(event):
+                return not_modified(etag)
         
-        elif action == 'start-inspection' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            assignment_id = body_data.get('assignment_id')
-            
-            if not assignment_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'assignment_id required'})
-                }
-            
-            cur.execute("""
-                SELECT ca.service_type FROM assignments a
-                JOIN cleaning_addresses ca ON a.address_id = ca.id
-                WHERE a.id = %s
-            """, (int(assignment_id),))
-            
-            result = cur.fetchone()
-            if not result:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Assignment not found'})
-                }
-            
-            service_type = result[0]
-            inspection_checklist = get_inspection_checklist_for_service_type(service_type)
-            
-            cur.execute("""
-                UPDATE assignments 
-                SET inspection_checklist_data = %s, inspection_started_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-            """, (json.dumps(inspection_checklist), int(assignment_id)))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Inspection started'})
+        response = route(event, params, conn, cur)
+        if etag is not None and response['statusCode'] == 200:
+            response['headers'] = {
+                **response['headers'], 'ETag': etag, 'Cache-Control': ETAG_CACHE_CONTROL,
+                'Access-Control-Expose-Headers': 'ETag'
             }
-        
-        elif action == 'update-inspection-checklist' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            assignment_id = body_data.get('assignment_id')
-            checklist_data = body_data.get('checklist_data')
-            
-            if not assignment_id or not checklist_data:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'assignment_id and checklist_data required'})
-                }
-            
-            cur.execute("""
-                UPDATE assignments 
-                SET inspection_checklist_data = %s
-                WHERE id = %s
-            """, (json.dumps(checklist_data), int(assignment_id)))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Inspection checklist updated'})
-            }
-        
-        elif action == 'complete-inspection' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            assignment_id = body_data.get('assignment_id')
-            
-            if not assignment_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'assignment_id required'})
-                }
-            
-            cur.execute("""
-                SELECT address_id FROM assignments WHERE id = %s
-            """, (int(assignment_id),))
-            
-            result = cur.fetchone()
-            if not result:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Assignment not found'})
-                }
-            
-            address_id = result[0]
-            
-            # Обновляем статус проверки и адреса
-            cur.execute("""
-                UPDATE assignments 
-                SET inspection_completed_at = CURRENT_TIMESTAMP, verified_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-            """, (int(assignment_id),))
-            
-            cur.execute("""
-                UPDATE cleaning_addresses 
-                SET status = 'verified' 
-                WHERE id = %s
-            """, (address_id,))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Inspection completed, verified, and salaries assigned'})
-            }
-        
-        elif action == 'salary-history' and method == 'GET':
-            params = event.get('queryStringParameters', {})
-            senior_cleaner_id = params.get('senior_cleaner_id')
-            
-            if not senior_cleaner_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'senior_cleaner_id required'})
-                }
-            
-            cur.execute("""
-                SELECT 
-                    a.id,
-                    ca.address,
-                    ca.client_name,
-                    ca.scheduled_date,
-                    a.inspection_started_at,
-                    a.inspection_completed_at,
-                    a.senior_cleaner_salary,
-                    ca.service_type,
-                    ca.area,
-                    a.paid
-                FROM assignments a
-                JOIN cleaning_addresses ca ON a.address_id = ca.id
-                WHERE a.senior_cleaner_id = %s AND a.inspection_completed_at IS NOT NULL
-                ORDER BY a.inspection_completed_at DESC
-            """, (int(senior_cleaner_id),))
-            
-            rows = cur.fetchall()
-            records = []
-            total_earned = 0
-            
-            for row in rows:
-                salary = float(row[6]) if row[6] else 0
-                total_earned += salary
-                records.append({
-                    'id': row[0],
-                    'address': row[1],
-                    'client_name': row[2],
-                    'scheduled_date': str(row[3]),
-                    'inspection_started_at': str(row[4]) if row[4] else None,
-                    'inspection_completed_at': str(row[5]) if row[5] else None,
-                    'salary': salary,
-                    'service_type': row[7],
-                    'area': row[8],
-                    'paid': row[9] if row[9] else False
-                })
-            
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'records': records, 'total_earned': total_earned})
-            }
-        
-        cur.close()
-        conn.close()
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Invalid action or method'})
-        }
-        
+        return compress_response(event, response)
     except Exception as e:
         print(f"Error: {str(e)}")
         import traceback
         traceback.print_exc()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        return json_response(500, {'error': str(e)})
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            release_connection(conn)
\ No newline at end of file
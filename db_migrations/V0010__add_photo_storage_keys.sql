@@ -0,0 +1,9 @@
+-- Фото хранятся в объектном хранилище, в назначении остается только ключ
+ALTER TABLE assignments
+ADD COLUMN IF NOT EXISTS photo_before_key VARCHAR(255) NULL,
+ADD COLUMN IF NOT EXISTS photo_after_key VARCHAR(255) NULL;
+
+COMMENT ON COLUMN assignments.photo_before_key IS 'Ключ фото "до" в хранилище (sha256 содержимого)';
+COMMENT ON COLUMN assignments.photo_after_key IS 'Ключ фото "после" в хранилище (sha256 содержимого)';
+COMMENT ON COLUMN assignments.photo_before IS 'Устаревшее: фото "до" в виде data URL, переносится в хранилище';
+COMMENT ON COLUMN assignments.photo_after IS 'Устаревшее: фото "после" в виде data URL, переносится в хранилище';
@@ -0,0 +1,11 @@
+-- Индексы под keyset-пагинацию списка адресов по (scheduled_date, scheduled_time, id)
+CREATE INDEX IF NOT EXISTS idx_cleaning_addresses_schedule
+    ON cleaning_addresses (scheduled_date DESC, scheduled_time DESC, id DESC);
+
+-- Тот же порядок внутри статуса: фильтр по статусу не требует сортировки
+CREATE INDEX IF NOT EXISTS idx_cleaning_addresses_status_schedule
+    ON cleaning_addresses (status, scheduled_date DESC, scheduled_time DESC, id DESC);
+
+-- Фильтр по горничной: EXISTS по assignments(maid_id, address_id)
+CREATE INDEX IF NOT EXISTS idx_assignments_maid_address
+    ON assignments (maid_id, address_id);
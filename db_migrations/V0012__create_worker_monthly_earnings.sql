@@ -0,0 +1,28 @@
+-- Помесячная сводка заработка сотрудников: обновляется в транзакциях verify и complete-inspection,
+-- чтобы salary-stats не агрегировал всю историю assignments
+CREATE TABLE IF NOT EXISTS worker_monthly_earnings (
+    worker_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    role VARCHAR(50) NOT NULL CHECK (role IN ('maid', 'senior_cleaner')),
+    month DATE NOT NULL,
+    earned NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    jobs_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (worker_id, role, month)
+);
+
+COMMENT ON TABLE worker_monthly_earnings IS 'Заработок сотрудника за месяц (по verified_at для горничных, по inspection_completed_at для старших клинеров)';
+COMMENT ON COLUMN worker_monthly_earnings.month IS 'Первое число месяца';
+
+-- Начальное заполнение из существующих назначений
+INSERT INTO worker_monthly_earnings (worker_id, role, month, earned, jobs_count)
+SELECT maid_id, 'maid', date_trunc('month', verified_at)::date, COALESCE(SUM(salary), 0), COUNT(*)
+FROM assignments
+WHERE verified_at IS NOT NULL
+GROUP BY maid_id, date_trunc('month', verified_at)::date
+UNION ALL
+SELECT senior_cleaner_id, 'senior_cleaner', date_trunc('month', inspection_completed_at)::date,
+       COALESCE(SUM(senior_cleaner_salary), 0), COUNT(*)
+FROM assignments
+WHERE inspection_completed_at IS NOT NULL AND senior_cleaner_id IS NOT NULL
+GROUP BY senior_cleaner_id, date_trunc('month', inspection_completed_at)::date
+ON CONFLICT (worker_id, role, month) DO NOTHING;
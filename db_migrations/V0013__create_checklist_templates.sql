@@ -0,0 +1,36 @@
+-- Шаблоны чек-листов хранятся один раз и версионируются; в назначении остаются
+-- только ссылка на шаблон и список отмеченных пунктов
+CREATE TABLE IF NOT EXISTS checklist_templates (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('cleaning', 'inspection')),
+    service_type VARCHAR(50) NOT NULL,
+    version INTEGER NOT NULL,
+    items JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (kind, service_type, version)
+);
+
+COMMENT ON TABLE checklist_templates IS 'Версии чек-листов уборки (kind=cleaning) и проверки (kind=inspection) по типу услуги';
+COMMENT ON COLUMN checklist_templates.items IS 'Массив пунктов [{id, text, category}] без отметок';
+
+ALTER TABLE assignments
+ADD COLUMN IF NOT EXISTS checklist_template_id INTEGER NULL REFERENCES checklist_templates(id),
+ADD COLUMN IF NOT EXISTS checklist_checked TEXT[] NOT NULL DEFAULT '{}',
+ADD COLUMN IF NOT EXISTS inspection_checklist_template_id INTEGER NULL REFERENCES checklist_templates(id),
+ADD COLUMN IF NOT EXISTS inspection_checklist_checked TEXT[] NOT NULL DEFAULT '{}';
+
+COMMENT ON COLUMN assignments.checklist_checked IS 'id отмеченных пунктов чек-листа уборки';
+COMMENT ON COLUMN assignments.inspection_checklist_checked IS 'id отмеченных пунктов чек-листа проверки';
+COMMENT ON COLUMN assignments.checklist_data IS 'Устаревшее: полный чек-лист для назначений, начатых до появления шаблонов';
+COMMENT ON COLUMN assignments.inspection_checklist_data IS 'Устаревшее: полный чек-лист проверки для назначений, начатых до появления шаблонов';
+
+INSERT INTO checklist_templates (kind, service_type, version, items) VALUES
+('cleaning', 'basic', 1, '[{"id": "1", "text": "Протереть пыль с мебели", "category": "Общие зоны"}, {"id": "2", "text": "Пропылесосить полы", "category": "Общие зоны"}, {"id": "3", "text": "Вымыть полы", "category": "Общие зоны"}, {"id": "4", "text": "Протереть зеркала", "category": "Общие зоны"}, {"id": "5", "text": "Протереть дверные ручки", "category": "Общие зоны"}, {"id": "6", "text": "Протереть выключатели", "category": "Общие зоны"}, {"id": "7", "text": "Вынести мусор", "category": "Общие зоны"}, {"id": "13", "text": "Вымыть раковину", "category": "Кухня"}, {"id": "14", "text": "Очистить плиту", "category": "Кухня"}, {"id": "15", "text": "Протереть столешницы", "category": "Кухня"}, {"id": "16", "text": "Вымыть холодильник снаружи", "category": "Кухня"}, {"id": "17", "text": "Очистить микроволновку", "category": "Кухня"}, {"id": "18", "text": "Протереть смесители", "category": "Кухня"}, {"id": "24", "text": "Вымыть унитаз", "category": "Ванная"}, {"id": "25", "text": "Очистить раковину", "category": "Ванная"}, {"id": "26", "text": "Вымыть ванну/душевую", "category": "Ванная"}, {"id": "27", "text": "Протереть зеркало", "category": "Ванная"}, {"id": "28", "text": "Вымыть плитку", "category": "Ванная"}, {"id": "29", "text": "Протереть смесители", "category": "Ванная"}, {"id": "33", "text": "Протереть подоконники", "category": "Спальня"}, {"id": "34", "text": "Пропылесосить под кроватью", "category": "Спальня"}, {"id": "35", "text": "Протереть пыль со всех поверхностей", "category": "Спальня"}]'::jsonb),
+('cleaning', 'deep', 1, '[{"id": "1", "text": "Протереть пыль с мебели", "category": "Общие зоны"}, {"id": "2", "text": "Пропылесосить полы", "category": "Общие зоны"}, {"id": "3", "text": "Вымыть полы", "category": "Общие зоны"}, {"id": "4", "text": "Протереть зеркала", "category": "Общие зоны"}, {"id": "5", "text": "Протереть дверные ручки", "category": "Общие зоны"}, {"id": "6", "text": "Протереть выключатели", "category": "Общие зоны"}, {"id": "7", "text": "Вынести мусор", "category": "Общие зоны"}, {"id": "13", "text": "Вымыть раковину", "category": "Кухня"}, {"id": "14", "text": "Очистить плиту", "category": "Кухня"}, {"id": "15", "text": "Протереть столешницы", "category": "Кухня"}, {"id": "16", "text": "Вымыть холодильник снаружи", "category": "Кухня"}, {"id": "17", "text": "Очистить микроволновку", "category": "Кухня"}, {"id": "18", "text": "Протереть смесители", "category": "Кухня"}, {"id": "24", "text": "Вымыть унитаз", "category": "Ванная"}, {"id": "25", "text": "Очистить раковину", "category": "Ванная"}, {"id": "26", "text": "Вымыть ванну/душевую", "category": "Ванная"}, {"id": "27", "text": "Протереть зеркало", "category": "Ванная"}, {"id": "28", "text": "Вымыть плитку", "category": "Ванная"}, {"id": "29", "text": "Протереть смесители", "category": "Ванная"}, {"id": "33", "text": "Протереть подоконники", "category": "Спальня"}, {"id": "34", "text": "Пропылесосить под кроватью", "category": "Спальня"}, {"id": "35", "text": "Протереть пыль со всех поверхностей", "category": "Спальня"}, {"id": "8", "text": "Помыть плинтусы", "category": "Общие зоны"}, {"id": "9", "text": "Протереть двери", "category": "Общие зоны"}, {"id": "10", "text": "Протереть батареи", "category": "Общие зоны"}, {"id": "11", "text": "Помыть люстры и светильники", "category": "Общие зоны"}, {"id": "19", "text": "Помыть холодильник внутри", "category": "Кухня"}, {"id": "20", "text": "Помыть духовку внутри", "category": "Кухня"}, {"id": "21", "text": "Помыть вытяжку", "category": "Кухня"}, {"id": "22", "text": "Помыть кухонные шкафы снаружи", "category": "Кухня"}, {"id": "30", "text": "Очистить швы между плиткой", "category": "Ванная"}, {"id": "31", "text": "Отполировать сантехнику", "category": "Ванная"}, {"id": "32", "text": "Помыть полотенцесушитель", "category": "Ванная"}, {"id": "36", "text": "Протереть шкафы снаружи", "category": "Спальня"}, {"id": "37", "text": "Пропылесосить мебель", "category": "Спальня"}, {"id": "38", "text": "Помыть окна", "category": "Окна"}, {"id": "39", "text": "Помыть рамы и подоконники", "category": "Окна"}]'::jsonb),
+('cleaning', 'after', 1, '[{"id": "1", "text": "Протереть пыль с мебели", "category": "Общие зоны"}, {"id": "2", "text": "Пропылесосить полы", "category": "Общие зоны"}, {"id": "3", "text": "Вымыть полы", "category": "Общие зоны"}, {"id": "4", "text": "Протереть зеркала", "category": "Общие зоны"}, {"id": "5", "text": "Протереть дверные ручки", "category": "Общие зоны"}, {"id": "6", "text": "Протереть выключатели", "category": "Общие зоны"}, {"id": "7", "text": "Вынести мусор", "category": "Общие зоны"}, {"id": "13", "text": "Вымыть раковину", "category": "Кухня"}, {"id": "14", "text": "Очистить плиту", "category": "Кухня"}, {"id": "15", "text": "Протереть столешницы", "category": "Кухня"}, {"id": "16", "text": "Вымыть холодильник снаружи", "category": "Кухня"}, {"id": "17", "text": "Очистить микроволновку", "category": "Кухня"}, {"id": "18", "text": "Протереть смесители", "category": "Кухня"}, {"id": "24", "text": "Вымыть унитаз", "category": "Ванная"}, {"id": "25", "text": "Очистить раковину", "category": "Ванная"}, {"id": "26", "text": "Вымыть ванну/душевую", "category": "Ванная"}, {"id": "27", "text": "Протереть зеркало", "category": "Ванная"}, {"id": "28", "text": "Вымыть плитку", "category": "Ванная"}, {"id": "29", "text": "Протереть смесители", "category": "Ванная"}, {"id": "33", "text": "Протереть подоконники", "category": "Спальня"}, {"id": "34", "text": "Пропылесосить под кроватью", "category": "Спальня"}, {"id": "35", "text": "Протереть пыль со всех поверхностей", "category": "Спальня"}, {"id": "8", "text": "Помыть плинтусы", "category": "Общие зоны"}, {"id": "9", "text": "Протереть двери", "category": "Общие зоны"}, {"id": "10", "text": "Протереть батареи", "category": "Общие зоны"}, {"id": "11", "text": "Помыть люстры и светильники", "category": "Общие зоны"}, {"id": "19", "text": "Помыть холодильник внутри", "category": "Кухня"}, {"id": "20", "text": "Помыть духовку внутри", "category": "Кухня"}, {"id": "21", "text": "Помыть вытяжку", "category": "Кухня"}, {"id": "22", "text": "Помыть кухонные шкафы снаружи", "category": "Кухня"}, {"id": "30", "text": "Очистить швы между плиткой", "category": "Ванная"}, {"id": "31", "text": "Отполировать сантехнику", "category": "Ванная"}, {"id": "32", "text": "Помыть полотенцесушитель", "category": "Ванная"}, {"id": "36", "text": "Протереть шкафы снаружи", "category": "Спальня"}, {"id": "37", "text": "Пропылесосить мебель", "category": "Спальня"}, {"id": "38", "text": "Помыть окна", "category": "Окна"}, {"id": "39", "text": "Помыть рамы и подоконники", "category": "Окна"}, {"id": "12", "text": "Удалить строительную пыль", "category": "Общие зоны"}, {"id": "23", "text": "Очистить следы от ремонта", "category": "Кухня"}]'::jsonb),
+('cleaning', 'office', 1, '[{"id": "1", "text": "Протереть пыль с мебели", "category": "Общие зоны"}, {"id": "2", "text": "Пропылесосить полы", "category": "Общие зоны"}, {"id": "3", "text": "Вымыть полы", "category": "Общие зоны"}, {"id": "4", "text": "Протереть зеркала", "category": "Общие зоны"}, {"id": "5", "text": "Протереть дверные ручки", "category": "Общие зоны"}, {"id": "6", "text": "Протереть выключатели", "category": "Общие зоны"}, {"id": "7", "text": "Вынести мусор", "category": "Общие зоны"}, {"id": "13", "text": "Вымыть раковину", "category": "Кухня"}, {"id": "14", "text": "Очистить плиту", "category": "Кухня"}, {"id": "15", "text": "Протереть столешницы", "category": "Кухня"}, {"id": "16", "text": "Вымыть холодильник снаружи", "category": "Кухня"}, {"id": "17", "text": "Очистить микроволновку", "category": "Кухня"}, {"id": "18", "text": "Протереть смесители", "category": "Кухня"}, {"id": "24", "text": "Вымыть унитаз", "category": "Ванная"}, {"id": "25", "text": "Очистить раковину", "category": "Ванная"}, {"id": "26", "text": "Вымыть ванну/душевую", "category": "Ванная"}, {"id": "27", "text": "Протереть зеркало", "category": "Ванная"}, {"id": "28", "text": "Вымыть плитку", "category": "Ванная"}, {"id": "29", "text": "Протереть смесители", "category": "Ванная"}, {"id": "33", "text": "Протереть подоконники", "category": "Спальня"}, {"id": "34", "text": "Пропылесосить под кроватью", "category": "Спальня"}, {"id": "35", "text": "Протереть пыль со всех поверхностей", "category": "Спальня"}, {"id": "40", "text": "Протереть рабочие столы", "category": "Офис"}, {"id": "41", "text": "Протереть оргтехнику", "category": "Офис"}, {"id": "42", "text": "Убрать переговорную", "category": "Офис"}, {"id": "43", "text": "Помыть кухонную зону", "category": "Офис"}]'::jsonb),
+('inspection', 'basic', 1, '[{"id": "i1", "text": "Качество уборки пыли с поверхностей", "category": "Общая проверка"}, {"id": "i2", "text": "Чистота полов (без разводов и пятен)", "category": "Общая проверка"}, {"id": "i3", "text": "Зеркала без разводов", "category": "Общая проверка"}, {"id": "i4", "text": "Отсутствие пыли на батареях и подоконниках", "category": "Общая проверка"}, {"id": "i5", "text": "Чистота дверных ручек и выключателей", "category": "Общая проверка"}, {"id": "i6", "text": "Мусор вынесен", "category": "Общая проверка"}, {"id": "i7", "text": "Раковина без налета и пятен", "category": "Кухня"}, {"id": "i8", "text": "Плита и столешницы идеально чистые", "category": "Кухня"}, {"id": "i9", "text": "Холодильник снаружи без отпечатков", "category": "Кухня"}, {"id": "i10", "text": "Микроволновка чистая внутри и снаружи", "category": "Кухня"}, {"id": "i11", "text": "Смесители блестят", "category": "Кухня"}, {"id": "i12", "text": "Унитаз идеально чистый", "category": "Ванная"}, {"id": "i13", "text": "Раковина без известкового налета", "category": "Ванная"}, {"id": "i14", "text": "Ванна/душ без мыльных разводов", "category": "Ванная"}, {"id": "i15", "text": "Плитка чистая, швы без грязи", "category": "Ванная"}, {"id": "i16", "text": "Зеркала без разводов и капель", "category": "Ванная"}, {"id": "i17", "text": "Смесители блестящие", "category": "Ванная"}]'::jsonb),
+('inspection', 'deep', 1, '[{"id": "i1", "text": "Качество уборки пыли с поверхностей", "category": "Общая проверка"}, {"id": "i2", "text": "Чистота полов (без разводов и пятен)", "category": "Общая проверка"}, {"id": "i3", "text": "Зеркала без разводов", "category": "Общая проверка"}, {"id": "i4", "text": "Отсутствие пыли на батареях и подоконниках", "category": "Общая проверка"}, {"id": "i5", "text": "Чистота дверных ручек и выключателей", "category": "Общая проверка"}, {"id": "i6", "text": "Мусор вынесен", "category": "Общая проверка"}, {"id": "i7", "text": "Раковина без налета и пятен", "category": "Кухня"}, {"id": "i8", "text": "Плита и столешницы идеально чистые", "category": "Кухня"}, {"id": "i9", "text": "Холодильник снаружи без отпечатков", "category": "Кухня"}, {"id": "i10", "text": "Микроволновка чистая внутри и снаружи", "category": "Кухня"}, {"id": "i11", "text": "Смесители блестят", "category": "Кухня"}, {"id": "i12", "text": "Унитаз идеально чистый", "category": "Ванная"}, {"id": "i13", "text": "Раковина без известкового налета", "category": "Ванная"}, {"id": "i14", "text": "Ванна/душ без мыльных разводов", "category": "Ванная"}, {"id": "i15", "text": "Плитка чистая, швы без грязи", "category": "Ванная"}, {"id": "i16", "text": "Зеркала без разводов и капель", "category": "Ванная"}, {"id": "i17", "text": "Смесители блестящие", "category": "Ванная"}, {"id": "i18", "text": "Плинтусы чистые по всей длине", "category": "Детальная проверка"}, {"id": "i19", "text": "Двери протерты с обеих сторон", "category": "Детальная проверка"}, {"id": "i20", "text": "Батареи чистые между секциями", "category": "Детальная проверка"}, {"id": "i21", "text": "Люстры и светильники без пыли", "category": "Детальная проверка"}, {"id": "i22", "text": "Холодильник чист внутри", "category": "Детальная проверка"}, {"id": "i23", "text": "Духовка чистая внутри", "category": "Детальная проверка"}, {"id": "i24", "text": "Вытяжка чистая", "category": "Детальная проверка"}, {"id": "i25", "text": "Кухонные шкафы протерты снаружи", "category": "Детальная проверка"}, {"id": "i26", "text": "Швы между плиткой чистые", "category": "Детальная проверка"}, {"id": "i27", "text": "Сантехника отполирована", "category": "Детальная проверка"}, {"id": "i28", "text": "Окна чистые (если входит в услугу)", "category": "Детальная проверка"}]'::jsonb),
+('inspection', 'after', 1, '[{"id": "i1", "text": "Качество уборки пыли с поверхностей", "category": "Общая проверка"}, {"id": "i2", "text": "Чистота полов (без разводов и пятен)", "category": "Общая проверка"}, {"id": "i3", "text": "Зеркала без разводов", "category": "Общая проверка"}, {"id": "i4", "text": "Отсутствие пыли на батареях и подоконниках", "category": "Общая проверка"}, {"id": "i5", "text": "Чистота дверных ручек и выключателей", "category": "Общая проверка"}, {"id": "i6", "text": "Мусор вынесен", "category": "Общая проверка"}, {"id": "i7", "text": "Раковина без налета и пятен", "category": "Кухня"}, {"id": "i8", "text": "Плита и столешницы идеально чистые", "category": "Кухня"}, {"id": "i9", "text": "Холодильник снаружи без отпечатков", "category": "Кухня"}, {"id": "i10", "text": "Микроволновка чистая внутри и снаружи", "category": "Кухня"}, {"id": "i11", "text": "Смесители блестят", "category": "Кухня"}, {"id": "i12", "text": "Унитаз идеально чистый", "category": "Ванная"}, {"id": "i13", "text": "Раковина без известкового налета", "category": "Ванная"}, {"id": "i14", "text": "Ванна/душ без мыльных разводов", "category": "Ванная"}, {"id": "i15", "text": "Плитка чистая, швы без грязи", "category": "Ванная"}, {"id": "i16", "text": "Зеркала без разводов и капель", "category": "Ванная"}, {"id": "i17", "text": "Смесители блестящие", "category": "Ванная"}, {"id": "i18", "text": "Плинтусы чистые по всей длине", "category": "Детальная проверка"}, {"id": "i19", "text": "Двери протерты с обеих сторон", "category": "Детальная проверка"}, {"id": "i20", "text": "Батареи чистые между секциями", "category": "Детальная проверка"}, {"id": "i21", "text": "Люстры и светильники без пыли", "category": "Детальная проверка"}, {"id": "i22", "text": "Холодильник чист внутри", "category": "Детальная проверка"}, {"id": "i23", "text": "Духовка чистая внутри", "category": "Детальная проверка"}, {"id": "i24", "text": "Вытяжка чистая", "category": "Детальная проверка"}, {"id": "i25", "text": "Кухонные шкафы протерты снаружи", "category": "Детальная проверка"}, {"id": "i26", "text": "Швы между плиткой чистые", "category": "Детальная проверка"}, {"id": "i27", "text": "Сантехника отполирована", "category": "Детальная проверка"}, {"id": "i28", "text": "Окна чистые (если входит в услугу)", "category": "Детальная проверка"}, {"id": "i29", "text": "Отсутствие строительной пыли", "category": "После ремонта"}, {"id": "i30", "text": "Следы от ремонта удалены", "category": "После ремонта"}, {"id": "i31", "text": "Окна очищены от защитной пленки", "category": "После ремонта"}]'::jsonb),
+('inspection', 'office', 1, '[{"id": "i1", "text": "Качество уборки пыли с поверхностей", "category": "Общая проверка"}, {"id": "i2", "text": "Чистота полов (без разводов и пятен)", "category": "Общая проверка"}, {"id": "i3", "text": "Зеркала без разводов", "category": "Общая проверка"}, {"id": "i4", "text": "Отсутствие пыли на батареях и подоконниках", "category": "Общая проверка"}, {"id": "i5", "text": "Чистота дверных ручек и выключателей", "category": "Общая проверка"}, {"id": "i6", "text": "Мусор вынесен", "category": "Общая проверка"}, {"id": "i7", "text": "Раковина без налета и пятен", "category": "Кухня"}, {"id": "i8", "text": "Плита и столешницы идеально чистые", "category": "Кухня"}, {"id": "i9", "text": "Холодильник снаружи без отпечатков", "category": "Кухня"}, {"id": "i10", "text": "Микроволновка чистая внутри и снаружи", "category": "Кухня"}, {"id": "i11", "text": "Смесители блестят", "category": "Кухня"}, {"id": "i12", "text": "Унитаз идеально чистый", "category": "Ванная"}, {"id": "i13", "text": "Раковина без известкового налета", "category": "Ванная"}, {"id": "i14", "text": "Ванна/душ без мыльных разводов", "category": "Ванная"}, {"id": "i15", "text": "Плитка чистая, швы без грязи", "category": "Ванная"}, {"id": "i16", "text": "Зеркала без разводов и капель", "category": "Ванная"}, {"id": "i17", "text": "Смесители блестящие", "category": "Ванная"}, {"id": "i32", "text": "Рабочие столы протерты", "category": "Офис"}, {"id": "i33", "text": "Оргтехника чистая", "category": "Офис"}, {"id": "i34", "text": "Переговорная убрана", "category": "Офис"}, {"id": "i35", "text": "Кухонная зона чистая", "category": "Офис"}]'::jsonb)
+ON CONFLICT (kind, service_type, version) DO NOTHING;
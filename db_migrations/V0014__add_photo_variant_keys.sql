@@ -0,0 +1,11 @@
+-- Уменьшенные копии фото: превью для карточек и копия для просмотра на экране
+ALTER TABLE assignments
+ADD COLUMN IF NOT EXISTS photo_before_thumb_key VARCHAR(255) NULL,
+ADD COLUMN IF NOT EXISTS photo_before_display_key VARCHAR(255) NULL,
+ADD COLUMN IF NOT EXISTS photo_after_thumb_key VARCHAR(255) NULL,
+ADD COLUMN IF NOT EXISTS photo_after_display_key VARCHAR(255) NULL;
+
+COMMENT ON COLUMN assignments.photo_before_thumb_key IS 'Ключ превью фото "до" (JPEG, до 384px по большей стороне)';
+COMMENT ON COLUMN assignments.photo_before_display_key IS 'Ключ копии фото "до" для просмотра (JPEG, до 1600px)';
+COMMENT ON COLUMN assignments.photo_after_thumb_key IS 'Ключ превью фото "после" (JPEG, до 384px по большей стороне)';
+COMMENT ON COLUMN assignments.photo_after_display_key IS 'Ключ копии фото "после" для просмотра (JPEG, до 1600px)';
@@ -0,0 +1,17 @@
+-- Сессии загрузки фото частями: части лежат в хранилище под uploads/<id>/, здесь - сколько байт подтверждено
+CREATE TABLE IF NOT EXISTS photo_upload_sessions (
+    id VARCHAR(32) PRIMARY KEY,
+    assignment_id INTEGER NOT NULL REFERENCES assignments(id) ON DELETE CASCADE,
+    photo_column VARCHAR(20) NOT NULL CHECK (photo_column IN ('photo_before', 'photo_after')),
+    content_type VARCHAR(50) NOT NULL,
+    total_size BIGINT NOT NULL CHECK (total_size > 0),
+    chunk_size INTEGER NOT NULL,
+    received_size BIGINT NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'open' CHECK (status IN ('open', 'completed')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_photo_upload_sessions_assignment ON photo_upload_sessions (assignment_id);
+
+COMMENT ON COLUMN photo_upload_sessions.received_size IS 'Подтвержденные байты с начала файла; клиент продолжает загрузку с этого смещения';
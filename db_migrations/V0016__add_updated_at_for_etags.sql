@@ -0,0 +1,27 @@
+-- Отметка последнего изменения строки: по ней GET-действия считают ETag и отвечают 304 без выборки данных
+ALTER TABLE cleaning_addresses ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+-- clock_timestamp, а не время начала транзакции: повторное изменение строки всегда дает новую отметку
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cleaning_addresses_set_updated_at ON cleaning_addresses;
+CREATE TRIGGER cleaning_addresses_set_updated_at BEFORE UPDATE ON cleaning_addresses
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS assignments_set_updated_at ON assignments;
+CREATE TRIGGER assignments_set_updated_at BEFORE UPDATE ON assignments
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS users_set_updated_at ON users;
+CREATE TRIGGER users_set_updated_at BEFORE UPDATE ON users
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- Версия списка проверок старшего клинера считается по его назначениям
+CREATE INDEX IF NOT EXISTS idx_assignments_senior_cleaner ON assignments (senior_cleaner_id);
@@ -0,0 +1,67 @@
+-- Лента изменений для дашбордов: каждая строка помнит id транзакции, изменившей ее последней.
+-- Курсор ленты - горизонт xmin снимка: все транзакции с меньшим id уже завершены, поэтому
+-- выборка change_xid в [since, xmin) не пропускает строки транзакций, закоммиченных не по порядку
+ALTER TABLE cleaning_addresses ADD COLUMN IF NOT EXISTS change_xid BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS change_xid BIGINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_cleaning_addresses_change_xid ON cleaning_addresses (change_xid);
+CREATE INDEX IF NOT EXISTS idx_assignments_change_xid ON assignments (change_xid);
+
+-- Удаленные строки и назначения, переданные другому исполнителю: прежние владельцы должны убрать их из списков
+CREATE TABLE IF NOT EXISTS change_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    change_xid BIGINT NOT NULL,
+    table_name VARCHAR(50) NOT NULL CHECK (table_name IN ('cleaning_addresses', 'assignments')),
+    row_id INTEGER NOT NULL,
+    address_id INTEGER NULL,
+    maid_id INTEGER NULL,
+    senior_cleaner_id INTEGER NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_tombstones_change_xid ON change_tombstones (change_xid);
+CREATE INDEX IF NOT EXISTS idx_change_tombstones_created_at ON change_tombstones (created_at);
+
+CREATE OR REPLACE FUNCTION track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_xid = txid_current();
+    -- Уведомление доставляется при коммите; одинаковые уведомления транзакции PostgreSQL схлопывает
+    PERFORM pg_notify('changes', TG_TABLE_NAME);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_removal() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'cleaning_addresses' THEN
+        INSERT INTO change_tombstones (change_xid, table_name, row_id, address_id)
+        VALUES (txid_current(), TG_TABLE_NAME, OLD.id, OLD.id);
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO change_tombstones (change_xid, table_name, row_id, address_id, maid_id, senior_cleaner_id)
+        VALUES (txid_current(), TG_TABLE_NAME, OLD.id, OLD.address_id, OLD.maid_id, OLD.senior_cleaner_id);
+    ELSIF OLD.maid_id IS DISTINCT FROM NEW.maid_id OR OLD.senior_cleaner_id IS DISTINCT FROM NEW.senior_cleaner_id THEN
+        INSERT INTO change_tombstones (change_xid, table_name, row_id, address_id, maid_id, senior_cleaner_id)
+        VALUES (txid_current(), TG_TABLE_NAME, OLD.id, OLD.address_id, OLD.maid_id, OLD.senior_cleaner_id);
+    END IF;
+    -- Клиенты с курсором старше срока хранения получают reset и перезагружают список целиком
+    DELETE FROM change_tombstones WHERE created_at < CURRENT_TIMESTAMP - INTERVAL '7 days';
+    PERFORM pg_notify('changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cleaning_addresses_track_change ON cleaning_addresses;
+CREATE TRIGGER cleaning_addresses_track_change BEFORE INSERT OR UPDATE ON cleaning_addresses
+FOR EACH ROW EXECUTE FUNCTION track_change();
+
+DROP TRIGGER IF EXISTS assignments_track_change ON assignments;
+CREATE TRIGGER assignments_track_change BEFORE INSERT OR UPDATE ON assignments
+FOR EACH ROW EXECUTE FUNCTION track_change();
+
+DROP TRIGGER IF EXISTS cleaning_addresses_track_removal ON cleaning_addresses;
+CREATE TRIGGER cleaning_addresses_track_removal AFTER DELETE ON cleaning_addresses
+FOR EACH ROW EXECUTE FUNCTION track_removal();
+
+DROP TRIGGER IF EXISTS assignments_track_removal ON assignments;
+CREATE TRIGGER assignments_track_removal AFTER DELETE OR UPDATE OF maid_id, senior_cleaner_id ON assignments
+FOR EACH ROW EXECUTE FUNCTION track_removal();
@@ -0,0 +1,24 @@
+-- Список и выгрузка выплат: диапазон и сортировка по COALESCE(verified_at, inspection_completed_at)
+-- среди проверенных или проинспектированных назначений. Условие индекса повторяет WHERE из payment_filters
+CREATE INDEX IF NOT EXISTS idx_assignments_payment_date
+    ON assignments ((COALESCE(verified_at, inspection_completed_at)))
+    WHERE verified_at IS NOT NULL OR inspection_completed_at IS NOT NULL;
+
+-- Тот же порядок внутри фильтра paid=true/false
+CREATE INDEX IF NOT EXISTS idx_assignments_payment_paid_date
+    ON assignments (paid, (COALESCE(verified_at, inspection_completed_at)))
+    WHERE verified_at IS NOT NULL OR inspection_completed_at IS NOT NULL;
+
+-- История заработка горничной: maid_id = ? AND verified_at IS NOT NULL ORDER BY verified_at DESC.
+-- INCLUDE покрывает остальные колонки назначения, строку assignments читать не нужно
+CREATE INDEX IF NOT EXISTS idx_assignments_maid_salary_history
+    ON assignments (maid_id, verified_at DESC)
+    INCLUDE (id, address_id, completed_at, salary, paid)
+    WHERE verified_at IS NOT NULL;
+
+-- История заработка старшего клинера: senior_cleaner_id = ? AND inspection_completed_at IS NOT NULL
+-- ORDER BY inspection_completed_at DESC (простой индекс по senior_cleaner_id добавлен в V0016)
+CREATE INDEX IF NOT EXISTS idx_assignments_senior_salary_history
+    ON assignments (senior_cleaner_id, inspection_completed_at DESC)
+    INCLUDE (id, address_id, inspection_started_at, senior_cleaner_salary, paid)
+    WHERE inspection_completed_at IS NOT NULL;
@@ -0,0 +1,27 @@
+-- Выплаты за период одним действием payroll-run: пакет, суммы по сотрудникам и ссылка из назначений
+CREATE TABLE IF NOT EXISTS payroll_batches (
+    id SERIAL PRIMARY KEY,
+    idempotency_key VARCHAR(100) NULL UNIQUE,
+    period_from DATE NOT NULL,
+    period_to DATE NOT NULL,
+    worker_ids INTEGER[] NULL,
+    assignments_count INTEGER NOT NULL DEFAULT 0,
+    total_salary NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    total_senior_cleaner_salary NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN payroll_batches.idempotency_key IS 'Ключ запроса: повтор с тем же ключом возвращает уже проведенный пакет';
+COMMENT ON COLUMN payroll_batches.worker_ids IS 'Сотрудники, которым выплачивали; NULL - все';
+
+CREATE TABLE IF NOT EXISTS payroll_batch_workers (
+    batch_id INTEGER NOT NULL REFERENCES payroll_batches(id) ON DELETE CASCADE,
+    worker_id INTEGER NOT NULL REFERENCES users(id),
+    role VARCHAR(50) NOT NULL CHECK (role IN ('maid', 'senior_cleaner')),
+    assignments_count INTEGER NOT NULL,
+    amount NUMERIC(12, 2) NOT NULL,
+    PRIMARY KEY (batch_id, worker_id, role)
+);
+
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS payroll_batch_id INTEGER NULL REFERENCES payroll_batches(id);
+CREATE INDEX IF NOT EXISTS idx_assignments_payroll_batch ON assignments (payroll_batch_id);
@@ -189,21 +189,25 @@ const AddressCard = ({ address, maids, showAssignForm, onAssign, onShowAssignFor
               {address.photo_before && (
                 <div>
                   <p className="text-gray-400 text-sm mb-2">Фото ДО уборки</p>
-                  <img 
-                    src={address.photo_before} 
-                    alt="До уборки" 
-                    className="w-full h-64 object-cover rounded-lg border-2 border-gray-600"
-                  />
+                  <a href={address.photo_before_display || address.photo_before_original} target="_blank" rel="noopener noreferrer">
+                    <img 
+                      src={address.photo_before} 
+                      alt="До уборки" 
+                      className="w-full h-64 object-cover rounded-lg border-2 border-gray-600"
+                    />
+                  </a>
                 </div>
               )}
               {address.photo_after && (
                 <div>
                   <p className="text-gray-400 text-sm mb-2">Фото ПОСЛЕ уборки</p>
-                  <img 
-                    src={address.photo_after} 
-                    alt="После уборки" 
-                    className="w-full h-64 object-cover rounded-lg border-2 border-gray-600"
-                  />
+                  <a href={address.photo_after_display || address.photo_after_original} target="_blank" rel="noopener noreferrer">
+                    <img 
+                      src={address.photo_after} 
+                      alt="После уборки" 
+                      className="w-full h-64 object-cover rounded-lg border-2 border-gray-600"
+                    />
+                  </a>
                 </div>
               )}
             </div>
@@ -27,6 +27,10 @@ export interface Address {
   notes?: string;
   photo_before?: string;
   photo_after?: string;
+  photo_before_display?: string;
+  photo_after_display?: string;
+  photo_before_original?: string;
+  photo_after_original?: string;
   photos_uploaded_at?: string;
   assigned_maid_name?: string;
   salary?: number;
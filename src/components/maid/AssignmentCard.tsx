@@ -26,6 +26,10 @@ interface Assignment {
   assigned_at: string;
   photo_before?: string;
   photo_after?: string;
+  photo_before_display?: string;
+  photo_after_display?: string;
+  photo_before_original?: string;
+  photo_after_original?: string;
   photos_uploaded_at?: string;
   salary?: number;
   verified_at?: string;
@@ -180,13 +184,17 @@ const AssignmentCard = ({
               {assignment.photo_before && (
                 <div>
                   <p className="text-gray-400 text-xs sm:text-sm mb-2">Фото ДО уборки</p>
-                  <img src={assignment.photo_before} alt="До уборки" className="w-full h-40 sm:h-48 object-cover rounded-lg" />
+                  <a href={assignment.photo_before_display || assignment.photo_before_original} target="_blank" rel="noopener noreferrer">
+                    <img src={assignment.photo_before} alt="До уборки" className="w-full h-40 sm:h-48 object-cover rounded-lg" />
+                  </a>
                 </div>
               )}
               {assignment.photo_after && (
                 <div>
                   <p className="text-gray-400 text-xs sm:text-sm mb-2">Фото ПОСЛЕ уборки</p>
-                  <img src={assignment.photo_after} alt="После уборки" className="w-full h-40 sm:h-48 object-cover rounded-lg" />
+                  <a href={assignment.photo_after_display || assignment.photo_after_original} target="_blank" rel="noopener noreferrer">
+                    <img src={assignment.photo_after} alt="После уборки" className="w-full h-40 sm:h-48 object-cover rounded-lg" />
+                  </a>
                 </div>
               )}
             </div>
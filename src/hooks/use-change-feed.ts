@@ -0,0 +1,100 @@
+import { useEffect, useRef } from 'react';
+import { authFetch } from '@/lib/session';
+
+export interface ChangeFeedPage<T> {
+  cursor: string;
+  removed: number[];
+  reset: boolean;
+  items: T[];
+}
+
+interface Scheduled {
+  id: number;
+  scheduled_date: string;
+  scheduled_time: string;
+}
+
+const WAIT_SECONDS = 25;
+const RETRY_MIN_MS = 1000;
+const RETRY_MAX_MS = 30000;
+
+const sleep = (ms: number, signal: AbortSignal) =>
+  new Promise<void>((resolve) => {
+    const timer = setTimeout(resolve, ms);
+    signal.addEventListener('abort', () => {
+      clearTimeout(timer);
+      resolve();
+    });
+  });
+
+// Убирает удаленные и измененные строки (по id, для адресов - все строки адреса) и вставляет свежие версии
+export function mergeChanges<T extends Scheduled>(rows: T[], changed: T[], removed: number[]): T[] {
+  const dropped = new Set([...removed, ...changed.map((row) => row.id)]);
+  return [...rows.filter((row) => !dropped.has(row.id)), ...changed].sort(
+    (a, b) =>
+      b.scheduled_date.localeCompare(a.scheduled_date) ||
+      b.scheduled_time.localeCompare(a.scheduled_time) ||
+      b.id - a.id
+  );
+}
+
+// Берет курсор до полной загрузки списка, затем держит long-poll ?action=changes и отдает только дельты.
+// url - адрес changes без since/wait или null, пока пользователь не известен
+export function useChangeFeed<T>(
+  url: string | null,
+  itemsKey: string,
+  reload: () => Promise<void>,
+  onChanges: (page: ChangeFeedPage<T>) => void
+) {
+  const reloadRef = useRef(reload);
+  const onChangesRef = useRef(onChanges);
+  reloadRef.current = reload;
+  onChangesRef.current = onChanges;
+
+  useEffect(() => {
+    if (!url) return;
+    const controller = new AbortController();
+    const { signal } = controller;
+
+    const fetchPage = async (query: string): Promise<ChangeFeedPage<T>> => {
+      const response = await authFetch(`${url}${query}`, { signal });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      const data = await response.json();
+      return { cursor: data.cursor, removed: data.removed, reset: data.reset, items: data[itemsKey] };
+    };
+
+    const run = async () => {
+      let cursor: string | null = null;
+      let retryMs = RETRY_MIN_MS;
+      while (!signal.aborted) {
+        try {
+          if (cursor === null) {
+            // Курсор берем до загрузки: изменения, попавшие между ними, придут повторно, но не потеряются
+            cursor = (await fetchPage('')).cursor;
+            await reloadRef.current();
+          }
+          const page = await fetchPage(`&since=${encodeURIComponent(cursor)}&wait=${WAIT_SECONDS}`);
+          if (page.reset) {
+            cursor = null;
+            continue;
+          }
+          if (page.items.length > 0 || page.removed.length > 0) {
+            onChangesRef.current(page);
+          }
+          cursor = page.cursor;
+          retryMs = RETRY_MIN_MS;
+        } catch (error) {
+          if (signal.aborted) return;
+          console.error('Change feed failed:', error);
+          await sleep(retryMs, signal);
+          retryMs = Math.min(retryMs * 2, RETRY_MAX_MS);
+        }
+      }
+    };
+
+    run();
+    return () => controller.abort();
+  }, [url, itemsKey]);
+}
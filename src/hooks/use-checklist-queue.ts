@@ -0,0 +1,62 @@
+import { useCallback, useEffect, useRef } from 'react';
+import { authFetch } from '@/lib/session';
+
+export interface ChecklistToggle {
+  assignment_id: number;
+  item_id: string;
+  checked: boolean;
+}
+
+const FLUSH_DELAY_MS = 600;
+
+// Копит переключения пунктов чек-листа и отправляет их одним запросом после паузы в кликах
+export function useChecklistQueue(url: string, onError?: (error: unknown) => void) {
+  const queue = useRef<ChecklistToggle[]>([]);
+  const timer = useRef<ReturnType<typeof setTimeout> | null>(null);
+
+  const flush = useCallback(async () => {
+    if (timer.current) {
+      clearTimeout(timer.current);
+      timer.current = null;
+    }
+    if (queue.current.length === 0) return;
+
+    const toggles = queue.current;
+    queue.current = [];
+    try {
+      const response = await authFetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ toggles }),
+        keepalive: true,
+      });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+    } catch (error) {
+      // Возвращаем неотправленное в начало очереди, чтобы порядок переключений сохранился
+      queue.current = [...toggles, ...queue.current];
+      onError?.(error);
+    }
+  }, [url, onError]);
+
+  const enqueue = useCallback((toggles: ChecklistToggle[]) => {
+    if (toggles.length === 0) return;
+    queue.current.push(...toggles);
+    if (timer.current) clearTimeout(timer.current);
+    timer.current = setTimeout(flush, FLUSH_DELAY_MS);
+  }, [flush]);
+
+  useEffect(() => {
+    const handlePageHide = () => {
+      flush();
+    };
+    window.addEventListener('pagehide', handlePageHide);
+    return () => {
+      window.removeEventListener('pagehide', handlePageHide);
+      flush();
+    };
+  }, [flush]);
+
+  return { enqueue, flush };
+}
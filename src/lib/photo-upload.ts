@@ -0,0 +1,104 @@
+import { authFetch } from '@/lib/session';
+
+export type PhotoKind = 'before' | 'after';
+
+const MAX_RETRIES = 5;
+const RETRY_DELAY_MS = 1000;
+
+interface UploadState {
+  uploadId: string;
+  chunkSize: number;
+  received: number;
+  status: string;
+}
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+const sha256Hex = async (file: Blob): Promise<string> => {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+};
+
+// Сессия запоминается по файлу, чтобы после обрыва связи или перезагрузки страницы продолжить с подтвержденного смещения
+const storageKey = (assignmentId: number, kind: PhotoKind, file: File) =>
+  `photo-upload:${assignmentId}:${kind}:${file.name}:${file.size}:${file.lastModified}`;
+
+const fetchState = async (apiUrl: string, uploadId: string): Promise<UploadState | null> => {
+  const response = await authFetch(`${apiUrl}?action=upload-status&upload_id=${uploadId}`);
+  if (!response.ok) return null;
+  const data = await response.json();
+  return { uploadId, chunkSize: data.chunk_size, received: data.received, status: data.status };
+};
+
+const openSession = async (apiUrl: string, assignmentId: number, kind: PhotoKind, file: File): Promise<UploadState> => {
+  const response = await authFetch(`${apiUrl}?action=upload-init`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      assignment_id: assignmentId,
+      kind,
+      size: file.size,
+      content_type: file.type || 'image/jpeg',
+    }),
+  });
+  const data = await response.json();
+  if (!response.ok) {
+    throw new Error(data.error || `HTTP ${response.status}`);
+  }
+  return { uploadId: data.upload_id, chunkSize: data.chunk_size, received: data.received, status: 'open' };
+};
+
+// Загружает фото частями: init -> PUT частей с offset -> finalize с sha256; при сбоях сверяется с сервером и продолжает
+export async function uploadPhotoInChunks(
+  apiUrl: string,
+  assignmentId: number,
+  kind: PhotoKind,
+  file: File,
+  onProgress?: (received: number, total: number) => void
+): Promise<void> {
+  const key = storageKey(assignmentId, kind, file);
+  const savedId = localStorage.getItem(key);
+  let state = savedId ? await fetchState(apiUrl, savedId) : null;
+  if (!state) {
+    state = await openSession(apiUrl, assignmentId, kind, file);
+    localStorage.setItem(key, state.uploadId);
+  }
+
+  let retries = 0;
+  while (state.status === 'open' && state.received < file.size) {
+    const chunk = file.slice(state.received, state.received + state.chunkSize);
+    try {
+      const response = await authFetch(
+        `${apiUrl}?action=upload-chunk&upload_id=${state.uploadId}&offset=${state.received}`,
+        { method: 'PUT', headers: { 'Content-Type': 'application/octet-stream' }, body: chunk }
+      );
+      const data = await response.json();
+      // 409 - сервер ждет другое смещение: продолжаем с того, что он подтвердил
+      if (!response.ok && response.status !== 409) {
+        throw new Error(data.error || `HTTP ${response.status}`);
+      }
+      state = { ...state, received: data.received };
+      retries = 0;
+      onProgress?.(state.received, file.size);
+    } catch (error) {
+      retries += 1;
+      if (retries > MAX_RETRIES) throw error;
+      await sleep(RETRY_DELAY_MS * retries);
+      state = (await fetchState(apiUrl, state.uploadId).catch(() => null)) || state;
+    }
+  }
+
+  const response = await authFetch(`${apiUrl}?action=upload-finalize`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ upload_id: state.uploadId, sha256: await sha256Hex(file) }),
+  });
+  if (response.ok || response.status === 422) {
+    // После 422 (контрольная сумма не сошлась) сессия удалена на сервере, следующая попытка начнется заново
+    localStorage.removeItem(key);
+  }
+  if (!response.ok) {
+    const data = await response.json();
+    throw new Error(data.error || `HTTP ${response.status}`);
+  }
+}
@@ -0,0 +1,25 @@
+const TOKEN_KEY = 'sessionToken';
+
+export function saveSessionToken(token: string | null) {
+  if (token) {
+    localStorage.setItem(TOKEN_KEY, token);
+  } else {
+    localStorage.removeItem(TOKEN_KEY);
+  }
+}
+
+export function clearSession() {
+  localStorage.removeItem('user');
+  localStorage.removeItem(TOKEN_KEY);
+}
+
+// fetch с заголовком Authorization: функции проверяют подпись токена сами, без запроса к БД
+export function authFetch(input: string, init: RequestInit = {}): Promise<Response> {
+  const token = localStorage.getItem(TOKEN_KEY);
+  if (!token) {
+    return fetch(input, init);
+  }
+  const headers = new Headers(init.headers);
+  headers.set('Authorization', `Bearer ${token}`);
+  return fetch(input, { ...init, headers });
+}
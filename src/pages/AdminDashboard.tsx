@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '@/hooks/use-toast';
+import { useChangeFeed, mergeChanges } from '@/hooks/use-change-feed';
 import AdminHeader from '@/components/admin/AdminHeader';
 import AddressForm from '@/components/admin/AddressForm';
 import AddressCard from '@/components/admin/AddressCard';
@@ -10,6 +11,10 @@ import StatusFilter from '@/components/admin/StatusFilter';
 import MaidForm from '@/components/admin/MaidForm';
 import MaidCard from '@/components/admin/MaidCard';
 import { User, Address, Maid } from '@/components/admin/types';
+import { authFetch, clearSession } from '@/lib/session';
+
+// Адреса грузятся страницами по курсору: время загрузки не зависит от длины истории
+const ADDRESSES_PAGE_SIZE = 100;
 
 const AdminDashboard = () => {
   const navigate = useNavigate();
@@ -20,6 +25,8 @@ const AdminDashboard = () => {
   const [addresses, setAddresses] = useState<Address[]>([]);
   const [maids, setMaids] = useState<Maid[]>([]);
   const [statusFilter, setStatusFilter] = useState<string>('all');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   const [showAddressForm, setShowAddressForm] = useState(false);
   const [showMaidForm, setShowMaidForm] = useState(false);
@@ -62,25 +69,76 @@ const AdminDashboard = () => {
     }
 
     setUser(parsedUser);
-    loadAddresses();
-    loadMaids();
+    loadDashboard();
   }, [navigate]);
 
+  // Первую загрузку адресов делает лента изменений, дальше приходят только дельты
+  useChangeFeed<Address>(
+    user ? 'https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=changes' : null,
+    'addresses',
+    () => loadAddresses(),
+    (page) => setAddresses(prev => mergeChanges(prev, page.items, page.removed))
+  );
+
+  const addressesPageUrl = (cursor: string | null) => {
+    const query = new URLSearchParams({ action: 'addresses', limit: String(ADDRESSES_PAGE_SIZE) });
+    if (statusFilter !== 'all') query.set('status', statusFilter);
+    if (cursor) query.set('cursor', cursor);
+    return `https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?${query}`;
+  };
+
+  // Первая страница заменяет список; следующие догружаются кнопкой «Показать еще»
   const loadAddresses = async () => {
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=addresses');
+      const response = await authFetch(addressesPageUrl(null));
       const data = await response.json();
       if (response.ok) {
         setAddresses(data.addresses);
+        setNextCursor(data.next_cursor);
       }
     } catch (error) {
       console.error('Failed to load addresses:', error);
     }
   };
 
+  const loadMoreAddresses = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const response = await authFetch(addressesPageUrl(nextCursor));
+      const data = await response.json();
+      if (response.ok) {
+        setAddresses(prev => mergeChanges(prev, data.addresses, []));
+        setNextCursor(data.next_cursor);
+      }
+    } catch (error) {
+      console.error('Failed to load more addresses:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Фильтр по статусу применяется на сервере, чтобы страницы содержали только нужные адреса
+  useEffect(() => {
+    if (user) loadAddresses();
+  }, [statusFilter]);
+
+  // Первая отрисовка: сотрудники приходят одним вызовом dashboard вместе со сводкой
+  const loadDashboard = async () => {
+    try {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=dashboard');
+      const data = await response.json();
+      if (response.ok) {
+        setMaids(data.workers);
+      }
+    } catch (error) {
+      console.error('Failed to load dashboard:', error);
+    }
+  };
+
   const loadMaids = async () => {
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=maids');
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=maids');
       const data = await response.json();
       if (response.ok) {
         setMaids(data.maids);
@@ -93,7 +151,7 @@ const AdminDashboard = () => {
   const handleAddAddress = async (e: React.FormEvent) => {
     e.preventDefault();
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=addresses', {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=addresses', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(newAddress),
@@ -124,7 +182,7 @@ const AdminDashboard = () => {
     e.preventDefault();
     console.log('Adding maid:', newMaid);
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=maids', {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=maids', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(newMaid),
@@ -149,7 +207,7 @@ const AdminDashboard = () => {
 
   const handleAssignMaid = async (addressId: number, maidId: number, salary: number, seniorCleanerId?: number, seniorCleanerSalary?: number) => {
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=assign', {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=assign', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ 
@@ -174,7 +232,7 @@ const AdminDashboard = () => {
 
   const handleVerify = async (addressId: number) => {
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=verify', {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=verify', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ address_id: addressId, admin_id: user?.id }),
@@ -195,7 +253,7 @@ const AdminDashboard = () => {
 
   const handleCancelAssignment = async (addressId: number) => {
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=cancel-assignment', {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=cancel-assignment', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ address_id: addressId }),
@@ -231,7 +289,7 @@ const AdminDashboard = () => {
     if (!editingAddress) return;
 
     try {
-      const response = await fetch(`https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=addresses&id=${editingAddress.id}`, {
+      const response = await authFetch(`https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=addresses&id=${editingAddress.id}`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(newAddress),
@@ -261,7 +319,7 @@ const AdminDashboard = () => {
 
   const handleDeleteAddress = async (addressId: number) => {
     try {
-      const response = await fetch(`https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=addresses&id=${addressId}`, {
+      const response = await authFetch(`https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=addresses&id=${addressId}`, {
         method: 'DELETE',
       });
 
@@ -279,7 +337,7 @@ const AdminDashboard = () => {
     if (!editingMaid) return;
 
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=maids', {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=maids', {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(editingMaid),
@@ -299,7 +357,7 @@ const AdminDashboard = () => {
     if (!confirm('Вы уверены, что хотите удалить этого сотрудника?')) return;
 
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=maids', {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=maids', {
         method: 'DELETE',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ id: maidId }),
@@ -315,7 +373,7 @@ const AdminDashboard = () => {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem('user');
+    clearSession();
     navigate('/login');
   };
 
@@ -424,6 +482,19 @@ const AdminDashboard = () => {
                   onCancel={handleCancelAssignment}
                 />
               ))}
+              {nextCursor && (
+                <div className="flex justify-center pt-2">
+                  <Button
+                    onClick={loadMoreAddresses}
+                    disabled={loadingMore}
+                    className="bg-gray-700 text-white hover:bg-gray-600 h-9 sm:h-10 text-sm sm:text-base"
+                    size="sm"
+                  >
+                    <Icon name={loadingMore ? 'Loader2' : 'ChevronDown'} size={16} className={`mr-2 ${loadingMore ? 'animate-spin' : ''}`} />
+                    Показать еще
+                  </Button>
+                </div>
+              )}
             </div>
           </div>
         )}
@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '@/hooks/use-toast';
+import { authFetch } from '@/lib/session';
 
 interface User {
   id: number;
@@ -37,6 +38,8 @@ const AdminPayments = () => {
   const [loading, setLoading] = useState(false);
   const [dateFrom, setDateFrom] = useState<string>('');
   const [dateTo, setDateTo] = useState<string>('');
+  const [exporting, setExporting] = useState<'csv' | 'xlsx' | null>(null);
+  const [payrollRunning, setPayrollRunning] = useState(false);
 
   useEffect(() => {
     const storedUser = localStorage.getItem('user');
@@ -75,7 +78,7 @@ const AdminPayments = () => {
         url += `&date_to=${toDate}`;
       }
       
-      const response = await fetch(url);
+      const response = await authFetch(url);
       const data = await response.json();
       if (response.ok) {
         setPayments(data.payments);
@@ -91,9 +94,84 @@ const AdminPayments = () => {
     }
   };
 
+  const exportPayments = async (format: 'csv' | 'xlsx') => {
+    setExporting(format);
+    try {
+      // Файл собирается на сервере целиком за любой период, в ответе - временная ссылка на скачивание
+      let url = `https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=payments-export&format=${format}`;
+      if (filter === 'paid') {
+        url += '&paid=true';
+      } else if (filter === 'unpaid') {
+        url += '&paid=false';
+      }
+      if (dateFrom) {
+        url += `&date_from=${dateFrom}`;
+      }
+      if (dateTo) {
+        url += `&date_to=${dateTo}`;
+      }
+
+      const response = await authFetch(url);
+      const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.error);
+      }
+      window.location.href = data.url;
+    } catch (error) {
+      toast({ 
+        title: 'Ошибка', 
+        description: 'Не удалось выгрузить выплаты', 
+        variant: 'destructive' 
+      });
+    } finally {
+      setExporting(null);
+    }
+  };
+
+  const runPayroll = async () => {
+    if (!dateFrom || !dateTo) return;
+    if (!confirm(`Отметить оплаченными все неоплаченные работы с ${dateFrom} по ${dateTo}?`)) return;
+
+    setPayrollRunning(true);
+    try {
+      // Ключ одного нажатия: повтор запроса после обрыва связи вернет тот же пакет, а не проведет второй
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=payroll-run', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ date_from: dateFrom, date_to: dateTo, idempotency_key: crypto.randomUUID() })
+      });
+      const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.error);
+      }
+
+      if (data.batch) {
+        const total = data.batch.total_salary + data.batch.total_senior_cleaner_salary;
+        toast({ 
+          title: 'Выплата проведена', 
+          description: `${data.batch.assignments_count} работ, ${data.batch.workers.length} сотрудников, ${total.toLocaleString('ru-RU')} ₽` 
+        });
+      } else {
+        toast({ 
+          title: 'Нечего выплачивать', 
+          description: 'За выбранный период нет неоплаченных работ' 
+        });
+      }
+      loadPayments(filter, dateFrom, dateTo);
+    } catch (error) {
+      toast({ 
+        title: 'Ошибка', 
+        description: 'Не удалось провести выплату', 
+        variant: 'destructive' 
+      });
+    } finally {
+      setPayrollRunning(false);
+    }
+  };
+
   const markAsPaid = async (assignmentId: number) => {
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=mark-paid', {
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=mark-paid', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ assignment_id: assignmentId })
@@ -119,7 +197,7 @@ const AdminPayments = () => {
     if (!confirm('Вы уверены, что хотите удалить эту запись оплаты?')) return;
 
     try {
-      const response = await fetch(`https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=payments&id=${assignmentId}`, {
+      const response = await authFetch(`https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=payments&id=${assignmentId}`, {
         method: 'DELETE'
       });
 
@@ -288,6 +366,33 @@ const AdminPayments = () => {
                     Сбросить
                   </Button>
                 )}
+                <Button
+                  onClick={runPayroll}
+                  disabled={!dateFrom || !dateTo || payrollRunning}
+                  className="bg-green-600 hover:bg-green-700"
+                  size="sm"
+                >
+                  <Icon name={payrollRunning ? 'Loader' : 'Wallet'} size={16} className="mr-1" />
+                  Выплатить за период
+                </Button>
+                <Button
+                  onClick={() => exportPayments('csv')}
+                  disabled={exporting !== null}
+                  variant="outline"
+                  size="sm"
+                >
+                  <Icon name={exporting === 'csv' ? 'Loader' : 'Download'} size={16} className="mr-1" />
+                  CSV
+                </Button>
+                <Button
+                  onClick={() => exportPayments('xlsx')}
+                  disabled={exporting !== null}
+                  variant="outline"
+                  size="sm"
+                >
+                  <Icon name={exporting === 'xlsx' ? 'Loader' : 'FileSpreadsheet'} size={16} className="mr-1" />
+                  Excel
+                </Button>
               </div>
             </div>
           </div>
@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '@/hooks/use-toast';
+import { authFetch } from '@/lib/session';
 
 interface User {
   id: number;
@@ -50,7 +51,7 @@ const AdminSalaryStats = () => {
 
   const loadStats = async () => {
     try {
-      const response = await fetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=salary-stats');
+      const response = await authFetch('https://functions.poehali.dev/aeb1b34e-b695-4397-aa18-2998082b0b2c?action=salary-stats');
       const data = await response.json();
       if (response.ok) {
         setStats(data.stats);
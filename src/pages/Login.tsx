@@ -5,6 +5,7 @@ import { Label } from '@/components/ui/label';
 import Icon from '@/components/ui/icon';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '@/hooks/use-toast';
+import { saveSessionToken } from '@/lib/session';
 
 const Login = () => {
   const navigate = useNavigate();
@@ -28,6 +29,7 @@ const Login = () => {
 
       if (response.ok) {
         localStorage.setItem('user', JSON.stringify(data.user));
+        saveSessionToken(data.token);
         toast({
           title: 'Вход выполнен',
           description: `Добро пожаловать, ${data.user.full_name}!`,
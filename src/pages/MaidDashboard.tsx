@@ -1,10 +1,14 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '@/hooks/use-toast';
+import { useChecklistQueue } from '@/hooks/use-checklist-queue';
+import { useChangeFeed, mergeChanges } from '@/hooks/use-change-feed';
+import { uploadPhotoInChunks, type PhotoKind } from '@/lib/photo-upload';
 import MaidHeader from '@/components/maid/MaidHeader';
 import StatsCards from '@/components/maid/StatsCards';
 import AssignmentCard from '@/components/maid/AssignmentCard';
 import EmptyState from '@/components/maid/EmptyState';
+import { authFetch, clearSession } from '@/lib/session';
 
 interface User {
   id: number;
@@ -36,6 +40,10 @@ interface Assignment {
   assigned_at: string;
   photo_before?: string;
   photo_after?: string;
+  photo_before_display?: string;
+  photo_after_display?: string;
+  photo_before_original?: string;
+  photo_after_original?: string;
   photos_uploaded_at?: string;
   salary?: number;
   verified_at?: string;
@@ -51,6 +59,11 @@ const MaidDashboard = () => {
   const [uploadingPhotos, setUploadingPhotos] = useState<number | null>(null);
   const [photoBefore, setPhotoBefore] = useState<string>('');
   const [photoAfter, setPhotoAfter] = useState<string>('');
+  const photoFiles = useRef<Partial<Record<PhotoKind, File>>>({});
+  const checklistQueue = useChecklistQueue(
+    'https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787?action=patch-checklist',
+    (error) => console.error('Failed to update checklist:', error)
+  );
 
   useEffect(() => {
     const storedUser = localStorage.getItem('user');
@@ -66,12 +79,19 @@ const MaidDashboard = () => {
     }
 
     setUser(parsedUser);
-    loadAssignments(parsedUser.id);
   }, [navigate]);
 
+  // Первую загрузку списка делает лента изменений, дальше приходят только дельты
+  useChangeFeed<Assignment>(
+    user ? `https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787?action=changes&maid_id=${user.id}` : null,
+    'assignments',
+    () => loadAssignments(user!.id),
+    (page) => setAssignments(prev => mergeChanges(prev, page.items, page.removed))
+  );
+
   const loadAssignments = async (maidId: number) => {
     try {
-      const response = await fetch(`https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787?action=assignments&maid_id=${maidId}`);
+      const response = await authFetch(`https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787?action=assignments&maid_id=${maidId}`);
       const data = await response.json();
       if (response.ok) {
         setAssignments(data.assignments);
@@ -107,7 +127,8 @@ const MaidDashboard = () => {
     }
 
     try {
-      const response = await fetch('https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787?action=update-status', {
+      await checklistQueue.flush();
+      const response = await authFetch('https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787?action=update-status', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ assignment_id: assignmentId, status }),
@@ -135,90 +156,74 @@ const MaidDashboard = () => {
     }
   };
 
+  const resetPhotos = () => {
+    if (photoBefore) URL.revokeObjectURL(photoBefore);
+    if (photoAfter) URL.revokeObjectURL(photoAfter);
+    photoFiles.current = {};
+    setPhotoBefore('');
+    setPhotoAfter('');
+  };
+
   const handlePhotoUpload = async (assignmentId: number) => {
-    if (!photoBefore && !photoAfter) {
+    const files = photoFiles.current;
+    if (!files.before && !files.after) {
       toast({ title: 'Ошибка', description: 'Загрузите хотя бы одно фото', variant: 'destructive' });
       return;
     }
 
     try {
-      const response = await fetch('https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787?action=upload-photos', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          assignment_id: assignmentId,
-          photo_before: photoBefore || null,
-          photo_after: photoAfter || null,
-        }),
-      });
-
-      if (response.ok) {
-        toast({ title: 'Успех', description: 'Фото успешно загружены' });
-        setUploadingPhotos(null);
-        setPhotoBefore('');
-        setPhotoAfter('');
-        if (user) {
-          loadAssignments(user.id);
+      for (const kind of ['before', 'after'] as const) {
+        const file = files[kind];
+        if (file) {
+          await uploadPhotoInChunks('https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787', assignmentId, kind, file);
         }
       }
+
+      toast({ title: 'Успех', description: 'Фото успешно загружены' });
+      setUploadingPhotos(null);
+      resetPhotos();
+      if (user) {
+        loadAssignments(user.id);
+      }
     } catch (error) {
       toast({ title: 'Ошибка', description: 'Не удалось загрузить фото', variant: 'destructive' });
     }
   };
 
-  const convertToBase64 = (file: File): Promise<string> => {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.readAsDataURL(file);
-      reader.onload = () => resolve(reader.result as string);
-      reader.onerror = error => reject(error);
-    });
-  };
-
-  const handleFileChange = async (e: React.ChangeEvent<HTMLInputElement>, type: 'before' | 'after') => {
+  const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>, type: PhotoKind) => {
     const file = e.target.files?.[0];
     if (!file) return;
 
-    if (file.size > 5 * 1024 * 1024) {
-      toast({ title: 'Ошибка', description: 'Размер файла не должен превышать 5МБ', variant: 'destructive' });
+    if (file.size > 20 * 1024 * 1024) {
+      toast({ title: 'Ошибка', description: 'Размер файла не должен превышать 20МБ', variant: 'destructive' });
       return;
     }
 
-    try {
-      const base64 = await convertToBase64(file);
-      if (type === 'before') {
-        setPhotoBefore(base64);
-      } else {
-        setPhotoAfter(base64);
-      }
-    } catch (error) {
-      toast({ title: 'Ошибка', description: 'Не удалось обработать файл', variant: 'destructive' });
+    // Превью показываем по object URL, файл целиком в base64 не перекодируется
+    photoFiles.current[type] = file;
+    const preview = URL.createObjectURL(file);
+    if (type === 'before') {
+      if (photoBefore) URL.revokeObjectURL(photoBefore);
+      setPhotoBefore(preview);
+    } else {
+      if (photoAfter) URL.revokeObjectURL(photoAfter);
+      setPhotoAfter(preview);
     }
   };
 
-  const handleChecklistUpdate = async (assignmentId: number, checklist: ChecklistItem[]) => {
-    try {
-      const response = await fetch('https://functions.poehali.dev/9af65dd4-4184-4636-9cc8-b12aa6b82787?action=update-checklist', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          assignment_id: assignmentId,
-          checklist_data: checklist,
-        }),
-      });
-
-      if (response.ok) {
-        if (user) {
-          loadAssignments(user.id);
-        }
-      }
-    } catch (error) {
-      console.error('Failed to update checklist:', error);
-    }
+  const handleChecklistUpdate = (assignmentId: number, checklist: ChecklistItem[]) => {
+    const previous = assignments.find(a => a.id === assignmentId)?.checklist_data || [];
+    const previousState = new Map(previous.map(item => [item.id, item.checked]));
+    checklistQueue.enqueue(
+      checklist
+        .filter(item => previousState.get(item.id) !== item.checked)
+        .map(item => ({ assignment_id: assignmentId, item_id: item.id, checked: item.checked }))
+    );
+    setAssignments(prev => prev.map(a => (a.id === assignmentId ? { ...a, checklist_data: checklist } : a)));
   };
 
   const handleLogout = () => {
-    localStorage.removeItem('user');
+    clearSession();
     navigate('/login');
   };
 
@@ -290,8 +295,7 @@ const MaidDashboard = () => {
                   onStartUpload={() => setUploadingPhotos(assignment.id)}
                   onCancelUpload={() => {
                     setUploadingPhotos(null);
-                    setPhotoBefore('');
-                    setPhotoAfter('');
+                    resetPhotos();
                   }}
                   onChecklistUpdate={handleChecklistUpdate}
                 />
@@ -320,8 +324,7 @@ const MaidDashboard = () => {
                   onStartUpload={() => setUploadingPhotos(assignment.id)}
                   onCancelUpload={() => {
                     setUploadingPhotos(null);
-                    setPhotoBefore('');
-                    setPhotoAfter('');
+                    resetPhotos();
                   }}
                   onChecklistUpdate={handleChecklistUpdate}
                 />
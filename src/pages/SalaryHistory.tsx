@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '@/hooks/use-toast';
+import { authFetch } from '@/lib/session';
 
 interface User {
   id: number;
@@ -63,7 +64,7 @@ const SalaryHistory = () => {
         url = `https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=salary-history&senior_cleaner_id=${userId}`;
       }
       
-      const response = await fetch(url);
+      const response = await authFetch(url);
       const data = await response.json();
       if (response.ok) {
         setSalaryRecords(data.records);
@@ -1,8 +1,11 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '@/hooks/use-toast';
+import { useChecklistQueue } from '@/hooks/use-checklist-queue';
+import { useChangeFeed, mergeChanges } from '@/hooks/use-change-feed';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
+import { authFetch, clearSession } from '@/lib/session';
 
 interface User {
   id: number;
@@ -33,6 +36,10 @@ interface Inspection {
   notes?: string;
   photo_before?: string;
   photo_after?: string;
+  photo_before_display?: string;
+  photo_after_display?: string;
+  photo_before_original?: string;
+  photo_after_original?: string;
   photos_uploaded_at?: string;
   senior_cleaner_salary?: number;
   inspection_checklist_data?: ChecklistItem[];
@@ -46,6 +53,10 @@ const SeniorCleanerDashboard = () => {
   const { toast } = useToast();
   const [user, setUser] = useState<User | null>(null);
   const [inspections, setInspections] = useState<Inspection[]>([]);
+  const checklistQueue = useChecklistQueue(
+    'https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=patch-inspection-checklist',
+    (error) => console.error('Failed to update checklist:', error)
+  );
 
   useEffect(() => {
     const storedUser = localStorage.getItem('user');
@@ -61,12 +72,19 @@ const SeniorCleanerDashboard = () => {
     }
 
     setUser(parsedUser);
-    loadInspections(parsedUser.id);
   }, [navigate]);
 
+  // Первую загрузку списка делает лента изменений, дальше приходят только дельты
+  useChangeFeed<Inspection>(
+    user ? `https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=changes&senior_cleaner_id=${user.id}` : null,
+    'inspections',
+    () => loadInspections(user!.id),
+    (page) => setInspections(prev => mergeChanges(prev, page.items, page.removed))
+  );
+
   const loadInspections = async (seniorCleanerId: number) => {
     try {
-      const response = await fetch(`https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=inspections&senior_cleaner_id=${seniorCleanerId}`);
+      const response = await authFetch(`https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=inspections&senior_cleaner_id=${seniorCleanerId}`);
       const data = await response.json();
       if (response.ok) {
         setInspections(data.inspections);
@@ -78,7 +96,7 @@ const SeniorCleanerDashboard = () => {
 
   const handleStartInspection = async (assignmentId: number) => {
     try {
-      const response = await fetch('https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=start-inspection', {
+      const response = await authFetch('https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=start-inspection', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ assignment_id: assignmentId }),
@@ -95,28 +113,22 @@ const SeniorCleanerDashboard = () => {
     }
   };
 
-  const handleUpdateChecklist = async (assignmentId: number, checklist: ChecklistItem[]) => {
-    try {
-      await fetch('https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=update-inspection-checklist', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          assignment_id: assignmentId,
-          checklist_data: checklist,
-        }),
-      });
-      if (user) {
-        loadInspections(user.id);
-      }
-    } catch (error) {
-      console.error('Failed to update checklist:', error);
-    }
+  const handleUpdateChecklist = (assignmentId: number, checklist: ChecklistItem[]) => {
+    const previous = inspections.find(i => i.id === assignmentId)?.inspection_checklist_data || [];
+    const previousState = new Map(previous.map(item => [item.id, item.checked]));
+    checklistQueue.enqueue(
+      checklist
+        .filter(item => previousState.get(item.id) !== item.checked)
+        .map(item => ({ assignment_id: assignmentId, item_id: item.id, checked: item.checked }))
+    );
+    setInspections(prev => prev.map(i => (i.id === assignmentId ? { ...i, inspection_checklist_data: checklist } : i)));
   };
 
   const handleCompleteInspection = async (assignmentId: number) => {
     console.log('Completing inspection:', assignmentId);
     try {
-      const response = await fetch('https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=complete-inspection', {
+      await checklistQueue.flush();
+      const response = await authFetch('https://functions.poehali.dev/8e4bbd17-1246-4e91-9377-b1a02010a354?action=complete-inspection', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ assignment_id: assignmentId }),
@@ -140,7 +152,7 @@ const SeniorCleanerDashboard = () => {
   };
 
   const handleLogout = () => {
-    localStorage.removeItem('user');
+    clearSession();
     navigate('/login');
   };
 
@@ -340,13 +352,17 @@ const InspectionCard = ({
           {inspection.photo_before && (
             <div>
               <p className="text-gray-400 text-xs sm:text-sm mb-2">Фото ДО уборки</p>
-              <img src={inspection.photo_before} alt="До уборки" className="w-full h-40 sm:h-48 object-cover rounded-lg" />
+              <a href={inspection.photo_before_display || inspection.photo_before_original} target="_blank" rel="noopener noreferrer">
+                <img src={inspection.photo_before} alt="До уборки" className="w-full h-40 sm:h-48 object-cover rounded-lg" />
+              </a>
             </div>
           )}
           {inspection.photo_after && (
             <div>
               <p className="text-gray-400 text-xs sm:text-sm mb-2">Фото ПОСЛЕ уборки</p>
-              <img src={inspection.photo_after} alt="После уборки" className="w-full h-40 sm:h-48 object-cover rounded-lg" />
+              <a href={inspection.photo_after_display || inspection.photo_after_original} target="_blank" rel="noopener noreferrer">
+                <img src={inspection.photo_after} alt="После уборки" className="w-full h-40 sm:h-48 object-cover rounded-lg" />
+              </a>
             </div>
           )}
         </div>
@@ -0,0 +1,159 @@
+'''
+Локальный ASGI-сервер для обработчиков облачных функций: /<функция>?action=... -> handler(event, context).
+Горячие GET-действия (дашборд и адреса админки, назначения, проверки) выполняются асинхронно на psycopg 3
+(async_handlers.py), если он установлен. Остальные синхронные обработчики выполняются в пуле потоков размером
+с пул соединений функции (DB_POOL_MAX): psycopg2 отпускает GIL, пока ждет PostgreSQL, поэтому один процесс
+обслуживает столько запросов к БД одновременно, сколько у него соединений, а остальные ждут в очереди без потоков.
+Запуск через uvicorn (pip install uvicorn), если он установлен.
+Использование: DATABASE_URL=postgres://... python tools/asgi_server.py [--port 8000] [--db-connections 32] [--threads-only]
+'''
+import argparse
+import asyncio
+import base64
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import async_handlers
+from handlers import FUNCTIONS, load_function
+
+# Тела с такими типами передаются обработчику строкой, остальные - base64, как их отдает шлюз
+TEXT_CONTENT_TYPES = ('application/json', 'text/', 'application/x-www-form-urlencoded')
+
+class AsyncFunction:
+    """Асинхронная обертка над функцией: горячие чтения на psycopg 3, остальное - handler в пуле потоков"""
+    
+    def __init__(self, name: str, db_connections: int, async_reads: bool = True):
+        self.name = name
+        self.module = load_function(name)
+        # Потоков столько же, сколько соединений: ThreadedConnectionPool при нехватке бросает PoolError, а не ждет.
+        # Лишние запросы ждут в очереди исполнителя, не занимая ни потока, ни соединения
+        self.executor = ThreadPoolExecutor(max_workers=db_connections, thread_name_prefix=name)
+        # У асинхронного пути свой пул соединений: AsyncConnectionPool сам держит очередь ожидающих
+        self.reads = None
+        if async_reads and async_handlers.available() and async_handlers.ASYNC_ROUTES.get(name):
+            self.reads = async_handlers.AsyncHandlers(name, self.module, db_connections)
+    
+    async def __call__(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        route = self.reads.route(event) if self.reads is not None else None
+        if route is not None:
+            return await self.reads(event, route)
+        context = SimpleNamespace(request_id=uuid.uuid4().hex, function_name=self.name)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.module.handler, event, context)
+    
+    async def open(self) -> None:
+        if self.reads is not None:
+            await self.reads.open()
+    
+    async def close(self) -> None:
+        if self.reads is not None:
+            await self.reads.close()
+        self.executor.shutdown(wait=False)
+
+def build_event(method: str, query_string: str, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+    """event в формате шлюза poehali.dev из HTTP-запроса"""
+    content_type = next((value for name, value in headers.items() if name.lower() == 'content-type'), '')
+    event: Dict[str, Any] = {
+        'httpMethod': method,
+        'queryStringParameters': dict(parse_qsl(query_string)),
+        'headers': headers,
+        'body': None,
+        'isBase64Encoded': False,
+    }
+    if body:
+        if content_type.startswith(TEXT_CONTENT_TYPES):
+            event['body'] = body.decode('utf-8')
+        else:
+            event['body'] = base64.b64encode(body).decode('ascii')
+            event['isBase64Encoded'] = True
+    return event
+
+def response_body(response: Dict[str, Any]) -> bytes:
+    """Байты тела из ответа обработчика (сжатые ответы приходят в base64)"""
+    body = response.get('body') or ''
+    return base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf-8')
+
+def response_parts(response: Dict[str, Any]) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    """(статус, заголовки, тело) ASGI-ответа из ответа обработчика"""
+    raw = response_body(response)
+    headers = [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in (response.get('headers') or {}).items()]
+    headers.append((b'content-length', str(len(raw)).encode()))
+    return response.get('statusCode', 200), headers, raw
+
+async def read_body(receive: Callable[[], Awaitable[Dict[str, Any]]]) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+def create_app(names: Tuple[str, ...] = FUNCTIONS, db_connections: int = 32, async_reads: bool = True) -> Callable:
+    """ASGI-приложение; обработчики загружаются при старте (lifespan) или при первом запросе"""
+    # Размер пула каждой функции читается из окружения при импорте index.py
+    os.environ['DB_POOL_MAX'] = str(db_connections)
+    functions: Dict[str, AsyncFunction] = {}
+    
+    def function(name: str) -> Optional[AsyncFunction]:
+        if name not in names:
+            return None
+        if name not in functions:
+            functions[name] = AsyncFunction(name, db_connections, async_reads)
+        return functions[name]
+    
+    async def app(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    for name in names:
+                        await function(name).open()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    for instance in functions.values():
+                        await instance.close()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+    
+        body = await read_body(receive)
+        target = function(scope['path'].strip('/').split('/')[0])
+        if target is None:
+            status, headers, raw = 404, [(b'content-type', b'application/json')], b'{"error": "Unknown function"}'
+        else:
+            request_headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+            event = build_event(scope['method'], scope.get('query_string', b'').decode('latin-1'), request_headers, body)
+            status, headers, raw = response_parts(await target(event))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': raw})
+    
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--db-connections', type=int, default=32, help='соединений с БД (и потоков) на функцию; у асинхронных чтений свой пул того же размера')
+    parser.add_argument('--functions', default=','.join(FUNCTIONS))
+    parser.add_argument('--threads-only', action='store_true', help='все действия через handler в пуле потоков, без psycopg 3')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required')
+    try:
+        import uvicorn
+    except ImportError:
+        parser.error('uvicorn is not installed: pip install uvicorn')
+    if not args.threads_only and not async_handlers.available():
+        print('psycopg 3 is not installed, all actions run in threads: pip install "psycopg[binary]" psycopg_pool')
+    
+    names = tuple(name for name in args.functions.split(',') if name)
+    # Журнал доступа uvicorn не нужен: строку метрик на каждый вызов пишет сам обработчик
+    uvicorn.run(create_app(names, args.db_connections, not args.threads_only), host=args.host, port=args.port, access_log=False, lifespan='on')
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,198 @@
+'''
+Асинхронные обработчики горячих GET-действий для asgi_server.py: дашборд и адреса админки, назначения горничной,
+проверки старшего клинера. Запросы идут через psycopg 3 (AsyncConnectionPool) прямо в цикле asyncio, без потока
+на запрос; SQL, разбор строк и ответы берутся из index.py функции, поэтому ответы совпадают с handler.
+Функция auth и все записи остаются на синхронном пути: asgi_server.py выполняет handler в пуле потоков.
+- auth (вход): время уходит на PBKDF2 (PASSWORD_HASH_ITERATIONS итераций), а не на ожидание БД; в цикле asyncio
+  хеш остановил бы все остальные запросы, поэтому он все равно шел бы в поток, а hashlib на время хеширования
+  отпускает GIL, и пул потоков уже считает входы параллельно. Запрос к БД один на сессию - асинхронный драйвер
+  тут ничего не дает;
+- записи (назначения, чек-листы, фото, выплаты, batch): транзакции построены на psycopg2 (execute_values,
+  точки сохранения batch, пересчет заработка в той же транзакции), и их время - блокировки строк и commit;
+  вторая копия этих транзакций под psycopg 3 расходилась бы с кодом функции при каждом его изменении;
+- долгий опрос changes: LISTEN и select() по сокету соединения psycopg2, соединение занято на все ожидание.
+Нужен psycopg 3: pip install "psycopg[binary]" psycopg_pool
+'''
+import os
+import time
+import traceback
+from types import ModuleType
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    from psycopg import AsyncClientCursor
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    AsyncClientCursor = None
+    AsyncConnectionPool = None
+
+# Действие по умолчанию, как в handler каждой функции
+DEFAULT_ACTIONS = {'admin': 'addresses', 'maid': 'assignments', 'senior-cleaner': 'inspections'}
+
+class TimedAsyncCursor:
+    """Асинхронный курсор, который записывает время и число строк каждого запроса в метрики вызова, как TimedCursor"""
+    
+    def __init__(self, module: ModuleType, cur: Any, metrics: Dict[str, Any]):
+        self.module = module
+        self.cur = cur
+        self.metrics = metrics
+    
+    async def execute(self, query: str, args: Any = None) -> None:
+        started = time.perf_counter()
+        try:
+            await self.cur.execute(query, args)
+        finally:
+            elapsed = time.perf_counter() - started
+            rows = max(self.cur.rowcount, 0)
+            self.metrics['db_seconds'] += elapsed
+            self.metrics['sql_count'] += 1
+            self.metrics['rows'] += rows
+            if len(self.metrics['sql']) < self.module.METRICS_MAX_STATEMENTS:
+                self.metrics['sql'].append({'ms': round(elapsed * 1000, 2), 'rows': rows, 'statement': self.module.statement_label(query)})
+    
+    async def fetchone(self) -> Optional[Tuple]:
+        return await self.cur.fetchone()
+    
+    async def fetchall(self) -> List[Tuple]:
+        return await self.cur.fetchall()
+
+async def attach_checklists(module: ModuleType, cur: TimedAsyncCursor, records: List[Dict[str, Any]], data_key: str, template_key: str, checked_key: str) -> None:
+    """attach_checklists функции: недостающие шаблоны одним запросом в кеш модуля, затем развертка из кеша"""
+    missing = module.missing_checklist_templates(records, data_key, template_key)
+    if missing:
+        await cur.execute(module.CHECKLIST_TEMPLATES_SQL, (missing,))
+        module.cache_checklist_templates(await cur.fetchall())
+    module.expand_checklists(records, data_key, template_key, checked_key)
+
+async def admin_dashboard(module: ModuleType, params: Dict[str, Any], cur: TimedAsyncCursor) -> Dict[str, Any]:
+    try:
+        sql, args = module.dashboard_query(params)
+    except ValueError as e:
+        return module.json_response(400, {'error': f'invalid date: {e}'})
+    await cur.execute(sql, args)
+    return module.dashboard_response(await cur.fetchone())
+
+async def admin_addresses(module: ModuleType, params: Dict[str, Any], cur: TimedAsyncCursor) -> Dict[str, Any]:
+    try:
+        sql, args, columns, page_size = module.addresses_query(params)
+    except ValueError as e:
+        return module.json_response(400, {'error': f'invalid filter or cursor: {e}'})
+    await cur.execute(sql, args)
+    return module.addresses_response(await cur.fetchall(), columns, page_size)
+
+async def maid_assignments(module: ModuleType, params: Dict[str, Any], cur: TimedAsyncCursor) -> Dict[str, Any]:
+    try:
+        sql, args, columns = module.assignments_query(params)
+    except ValueError as e:
+        return module.json_response(400, {'error': str(e)})
+    await cur.execute(sql, args)
+    assignments = [module.row_to_dict(columns, row) for row in await cur.fetchall()]
+    await attach_checklists(module, cur, assignments, 'checklist_data', 'checklist_template_id', 'checklist_checked')
+    return module.assignments_response(params, assignments)
+
+async def senior_inspections(module: ModuleType, params: Dict[str, Any], cur: TimedAsyncCursor) -> Dict[str, Any]:
+    try:
+        sql, args, columns = module.inspections_query(params)
+    except ValueError as e:
+        return module.json_response(400, {'error': str(e)})
+    await cur.execute(sql, args)
+    inspections = [module.row_to_dict(columns, row) for row in await cur.fetchall()]
+    await attach_checklists(module, cur, inspections, 'inspection_checklist_data', 'inspection_checklist_template_id', 'inspection_checklist_checked')
+    return module.inspections_response(params, inspections)
+
+AsyncRoute = Callable[[ModuleType, Dict[str, Any], TimedAsyncCursor], Awaitable[Dict[str, Any]]]
+
+ASYNC_ROUTES: Dict[str, Dict[Tuple[str, str], AsyncRoute]] = {
+    'admin': {('dashboard', 'GET'): admin_dashboard, ('addresses', 'GET'): admin_addresses},
+    'maid': {('assignments', 'GET'): maid_assignments, ('assignment', 'GET'): maid_assignments},
+    'senior-cleaner': {('inspections', 'GET'): senior_inspections, ('inspection', 'GET'): senior_inspections},
+}
+
+def available() -> bool:
+    """Установлен ли psycopg 3 с пулом"""
+    return AsyncConnectionPool is not None
+
+class AsyncHandlers:
+    """Горячие GET-действия функции на собственном асинхронном пуле соединений; порядок шагов как в handler"""
+    
+    def __init__(self, name: str, module: ModuleType, db_connections: int):
+        self.name = name
+        self.module = module
+        self.routes = ASYNC_ROUTES.get(name, {})
+        self.default_action = DEFAULT_ACTIONS.get(name, '')
+        # Клиентская подстановка параметров, как в psycopg2: SQL из index.py выполняется с той же семантикой %s.
+        # Только чтение, поэтому autocommit: без BEGIN/COMMIT вокруг запроса версии и выборки
+        self.pool = AsyncConnectionPool(
+            os.environ.get('DATABASE_URL', ''), min_size=1, max_size=db_connections, open=False,
+            kwargs={'cursor_factory': AsyncClientCursor, 'autocommit': True}, name=f'{name}-async'
+        )
+        self.opened = False
+    
+    def route(self, event: Dict[str, Any]) -> Optional[AsyncRoute]:
+        """Асинхронный обработчик вызова или None, если действие выполняется синхронным handler"""
+        if not self.routes:
+            return None
+        action = (event.get('queryStringParameters') or {}).get('action', self.default_action)
+        return self.routes.get((action, event.get('httpMethod', 'GET')))
+    
+    async def open(self) -> None:
+        if not self.opened:
+            self.opened = True
+            await self.pool.open()
+    
+    async def close(self) -> None:
+        if self.opened:
+            await self.pool.close()
+    
+    async def __call__(self, event: Dict[str, Any], route: AsyncRoute) -> Dict[str, Any]:
+        module = self.module
+        method = event.get('httpMethod', 'GET')
+        params = event.get('queryStringParameters') or {}
+        action = params.get('action', self.default_action)
+        metrics = {'connect_seconds': 0.0, 'db_seconds': 0.0, 'sql_count': 0, 'rows': 0, 'sql': []}
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.respond(event, params, action, method, route, metrics)
+            return response
+        finally:
+            metrics['total_seconds'] = time.perf_counter() - started
+            module.emit_metrics(self.name, action, method, metrics, response)
+    
+    async def respond(self, event: Dict[str, Any], params: Dict[str, Any], action: str, method: str, route: AsyncRoute, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        module = self.module
+        denied = module.authorize(event, params)
+        if denied is not None:
+            return denied
+        if not os.environ.get('DATABASE_URL'):
+            return module.json_response(500, {'error': 'Database connection error'})
+    
+        try:
+            await self.open()
+            connect_started = time.perf_counter()
+            async with self.pool.connection() as conn:
+                metrics['connect_seconds'] += time.perf_counter() - connect_started
+                async with conn.cursor() as raw_cursor:
+                    cur = TimedAsyncCursor(module, raw_cursor, metrics)
+    
+                    # Версию данных считаем до выборки, как handler
+                    etag = None
+                    version = module.ROUTE_VERSIONS.get((action, method))
+                    args = module.version_args(version, params) if version is not None else None
+                    if args is not None:
+                        await cur.execute(version[0], args)
+                        etag = module.etag_for(await cur.fetchone(), params)
+                        if etag in module.request_etags(event):
+                            return module.not_modified(etag)
+    
+                    response = await route(module, params, cur)
+            if etag is not None and response['statusCode'] == 200:
+                response['headers'] = {
+                    **response['headers'], 'ETag': etag, 'Cache-Control': module.ETAG_CACHE_CONTROL,
+                    'Access-Control-Expose-Headers': 'ETag'
+                }
+            return module.compress_response(event, response)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            traceback.print_exc()
+            return module.json_response(500, {'error': f'Server error: {str(e)}'})
\ No newline at end of file
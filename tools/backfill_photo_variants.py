@@ -0,0 +1,91 @@
+'''
+Создание превью и копий для экрана у фото, загруженных до появления уменьшенных копий
+(есть photo_*_key, но нет photo_*_thumb_key). Оригинал читается из хранилища, копии
+кладутся рядом с ним. Пачки блокируют свои строки (SKIP LOCKED) и коммитятся отдельно.
+Хранилище выбирается теми же переменными, что и в функции maid (PHOTO_STORAGE, S3_*, AWS_*).
+
+Использование: DATABASE_URL=postgres://... python tools/backfill_photo_variants.py --batch-size 50
+'''
+import argparse
+import io
+import os
+import time
+
+import psycopg2
+
+from handlers import load_function
+
+COLUMNS = ('photo_before', 'photo_after')
+
+def backfill_batch(conn, maid, after_id: int, batch_size: int) -> tuple:
+    """Обрабатывает пачку строк с id > after_id, возвращает (последний id, строк, создано копий, не читается)"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, photo_before_key, photo_after_key
+        FROM assignments
+        WHERE id > %s
+          AND ((photo_before_key IS NOT NULL AND photo_before_thumb_key IS NULL)
+            OR (photo_after_key IS NOT NULL AND photo_after_thumb_key IS NULL))
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (after_id, batch_size))
+    rows = cur.fetchall()
+    created = 0
+    unreadable = 0
+    
+    for row in rows:
+        assignment_id = row[0]
+        for column, key in zip(COLUMNS, row[1:]):
+            if not key:
+                continue
+            digest = key.rsplit('/', 1)[-1].split('.', 1)[0]
+            keys = maid.store_photo_variants(io.BytesIO(maid.get_photo_store().get(key)), digest)
+            if keys['thumb_key'] is None:
+                # Формат не читается Pillow (например, HEIC) - в списках остается оригинал
+                unreadable += 1
+                continue
+            cur.execute(
+                f"UPDATE assignments SET {column}_thumb_key = %s, {column}_display_key = %s WHERE id = %s",
+                (keys['thumb_key'], keys['display_key'], assignment_id)
+            )
+            created += 1
+    
+    conn.commit()
+    cur.close()
+    last_id = rows[-1][0] if rows else after_id
+    return last_id, len(rows), created, unreadable
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--max-batches', type=int, default=0, help='0 - до конца')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('DATABASE_URL is required')
+    
+    maid = load_function('maid')
+    conn = psycopg2.connect(args.database_url)
+    total_rows = total_created = total_unreadable = batches = last_id = 0
+    started = time.perf_counter()
+    
+    try:
+        while True:
+            last_id, rows, created, unreadable = backfill_batch(conn, maid, last_id, args.batch_size)
+            if rows == 0:
+                break
+            batches += 1
+            total_rows += rows
+            total_created += created
+            total_unreadable += unreadable
+            print(f"batch {batches}: up to id={last_id} rows={rows} created={created} unreadable={unreadable}")
+            if args.max_batches and batches >= args.max_batches:
+                break
+    finally:
+        conn.close()
+    
+    print(f"done in {time.perf_counter() - started:.1f}s: rows={total_rows} photos={total_created} unreadable={total_unreadable}")
+
+if __name__ == '__main__':
+    main()
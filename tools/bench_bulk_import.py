@@ -0,0 +1,102 @@
+'''
+Бенчмарк массового импорта: N последовательных POST action=addresses + action=assign
+против одного bulk-addresses и одного bulk-assign. Все созданные строки удаляются в конце.
+Использование: DATABASE_URL=postgres://... python tools/bench_bulk_import.py --rows 1000 10000
+'''
+import argparse
+import datetime
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict, List
+
+import psycopg2
+
+from handlers import load_function
+
+def make_rows(count: int, marker: str) -> List[Dict[str, Any]]:
+    start = datetime.date.today() + datetime.timedelta(days=1)
+    return [
+        {
+            'address': f'ул. Тестовая, д. {i}',
+            'client_name': f'Клиент {i}',
+            'client_phone': '+7 900 000 00 00',
+            'service_type': random.choice(['basic', 'deep', 'after', 'office']),
+            'area': random.randint(30, 150),
+            'price': random.randint(5000, 30000),
+            'scheduled_date': str(start + datetime.timedelta(days=i % 7)),
+            'scheduled_time': f'{9 + i % 9:02d}:00',
+            'notes': marker
+        }
+        for i in range(count)
+    ]
+
+def call(admin: Any, action: str, body: Any) -> Dict[str, Any]:
+    response = admin.handler({
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': action},
+        'body': json.dumps(body)
+    }, None)
+    if response['statusCode'] >= 300:
+        raise RuntimeError(f"{action}: {response['statusCode']} {response['body'][:200]}")
+    return json.loads(response['body'])
+
+def sequential(admin: Any, rows: List[Dict[str, Any]], maid_id: int) -> float:
+    started = time.perf_counter()
+    for row in rows:
+        address_id = call(admin, 'addresses', row)['id']
+        call(admin, 'assign', {'address_id': address_id, 'maid_id': maid_id})
+    return time.perf_counter() - started
+
+def bulk(admin: Any, rows: List[Dict[str, Any]], maid_id: int) -> float:
+    started = time.perf_counter()
+    created = call(admin, 'bulk-addresses', {'addresses': rows})
+    address_ids = [result['id'] for result in created['results']]
+    call(admin, 'bulk-assign', {'assignments': [{'address_id': address_id, 'maid_id': maid_id} for address_id in address_ids]})
+    return time.perf_counter() - started
+
+def cleanup(database_url: str, marker: str) -> None:
+    conn = psycopg2.connect(database_url)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM assignments WHERE address_id IN (SELECT id FROM cleaning_addresses WHERE notes = %s)", (marker,))
+    cur.execute("DELETE FROM cleaning_addresses WHERE notes = %s", (marker,))
+    conn.commit()
+    conn.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--sequential-limit', type=int, default=1000, help='не гонять последовательный вариант на больших N')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('DATABASE_URL is required')
+    os.environ['DATABASE_URL'] = args.database_url
+    
+    admin = load_function('admin')
+    marker = f'bench-{uuid.uuid4()}'
+    maid_id = call(admin, 'maids', {
+        'email': f'{marker}@example.com', 'password': marker, 'full_name': 'Bench Maid', 'phone': '', 'role': 'maid'
+    })['id']
+    
+    try:
+        for count in args.rows:
+            rows = make_rows(count, marker)
+            elapsed = bulk(admin, rows, maid_id)
+            print(f"bulk       rows={count:>6}  {elapsed:8.2f}s  {count / elapsed:10.0f} rows/s")
+            cleanup(args.database_url, marker)
+            if count <= args.sequential_limit:
+                elapsed = sequential(admin, rows, maid_id)
+                print(f"sequential rows={count:>6}  {elapsed:8.2f}s  {count / elapsed:10.0f} rows/s")
+                cleanup(args.database_url, marker)
+    finally:
+        cleanup(args.database_url, marker)
+        conn = psycopg2.connect(args.database_url)
+        conn.cursor().execute("DELETE FROM users WHERE id = %s", (maid_id,))
+        conn.commit()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
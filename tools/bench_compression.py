@@ -0,0 +1,64 @@
+'''
+Подбор порога и уровней сжатия ответов (COMPRESS_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY).
+Сжимает тела списка адресов разного размера и сравнивает время сжатия с временем,
+которое сэкономит передача меньшего тела на канале --bandwidth-mbit. Сжатие окупается там,
+где колонка saved больше нуля.
+Использование: python tools/bench_compression.py [--bandwidth-mbit 10] [--gzip-levels 1,6,9]
+'''
+import argparse
+import gzip
+import statistics
+import time
+from typing import Callable, List
+
+from bench_json import synthetic_rows
+from handlers import load_function
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROW_COUNTS = (1, 2, 5, 10, 25, 100, 500, 2000, 10000)
+
+def median_ms(fn: Callable[[], bytes], iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def parse_levels(value: str) -> List[int]:
+    return [int(level) for level in value.split(',') if level.strip()]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bandwidth-mbit', type=float, default=10.0, help='пропускная способность канала клиента')
+    parser.add_argument('--gzip-levels', type=parse_levels, default=[1, 6, 9])
+    parser.add_argument('--brotli-qualities', type=parse_levels, default=[1, 5, 9])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    
+    admin = load_function('admin')
+    rows = synthetic_rows(admin.ADDRESS_COLUMNS, max(ROW_COUNTS))
+    codecs = [(f'gzip-{level}', lambda raw, level=level: gzip.compress(raw, compresslevel=level, mtime=0)) for level in args.gzip_levels]
+    if brotli is not None:
+        codecs += [(f'br-{quality}', lambda raw, quality=quality: brotli.compress(raw, quality=quality)) for quality in args.brotli_qualities]
+    else:
+        print('brotli is not installed, only gzip is measured')
+    
+    bytes_per_ms = args.bandwidth_mbit * 1_000_000 / 8 / 1000
+    print(f"{'rows':>6} {'body':>10} {'codec':<8} {'ratio':>6} {'compress':>10} {'saved':>10}")
+    for count in ROW_COUNTS:
+        payload = {'addresses': [admin.row_to_dict(admin.ADDRESS_COLUMNS, row) for row in rows[:count]], 'next_cursor': None}
+        raw = admin.dumps_json(payload).encode('utf-8')
+        for name, compress in codecs:
+            compressed = compress(raw)
+            # base64 в ответе функции раздувает тело на треть, но шлюз отдает клиенту уже декодированные байты
+            spent = median_ms(lambda: compress(raw), args.iterations)
+            saved = (len(raw) - len(compressed)) / bytes_per_ms - spent
+            print(f"{count:>6} {len(raw):>9}B {name:<8} {len(raw) / len(compressed):>6.1f} {spent:>8.3f}ms {saved:>8.2f}ms")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,71 @@
+'''
+Бенчмарк: подключение к PostgreSQL на каждый запрос против пула из index.py
+Использование: DATABASE_URL=postgres://... python tools/bench_db_pool.py --iterations 200
+'''
+import argparse
+import os
+import statistics
+import time
+from typing import Callable, List
+
+import psycopg2
+
+from handlers import load_function
+
+def measure(fn: Callable[[], None], iterations: int) -> List[float]:
+    """Возвращает длительности вызовов fn в миллисекундах"""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def report(label: str, timings: List[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{label:<28} p50={statistics.median(ordered):8.2f}ms  p95={p95:8.2f}ms  mean={statistics.mean(ordered):8.2f}ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--function', default='admin', help='чей пул использовать')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('DATABASE_URL is required')
+    
+    module = load_function(args.function)
+    
+    def connect_per_request() -> None:
+        conn = psycopg2.connect(args.database_url)
+        cur = conn.cursor()
+        cur.execute('SELECT 1')
+        cur.fetchone()
+        cur.close()
+        conn.close()
+    
+    def pooled() -> None:
+        conn = module.get_connection(args.database_url)
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+        finally:
+            module.release_connection(conn)
+    
+    os.environ['DATABASE_URL'] = args.database_url
+    event = {'httpMethod': 'GET', 'queryStringParameters': {'action': 'maids'}}
+    
+    def handler_warm() -> None:
+        module.handler(dict(event), None)
+    
+    pooled()
+    report('connect per request', measure(connect_per_request, args.iterations))
+    report('pooled connection', measure(pooled, args.iterations))
+    if args.function == 'admin':
+        report('admin handler (warm pool)', measure(handler_warm, args.iterations))
+
+if __name__ == '__main__':
+    main()
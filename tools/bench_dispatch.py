@@ -0,0 +1,68 @@
+'''
+Бенчмарк накладных расходов обработчика на запрос: маршрутизация, заголовки, соединение из пула.
+Сравнивает текущий index.py с версией из git-ревизии на запросах, которые не выполняют SQL.
+Использование: DATABASE_URL=postgres://... python tools/bench_dispatch.py --function maid --baseline HEAD~1
+'''
+import argparse
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from handlers import load_function, load_function_at
+
+# Запросы, которые проходят весь путь обработчика, но отвечают до первого SQL-запроса
+REQUESTS: Dict[str, List[Dict[str, Any]]] = {
+    'admin': [
+        {'httpMethod': 'OPTIONS', 'queryStringParameters': {'action': 'addresses'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'action': 'address'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'action': 'unknown'}}
+    ],
+    'maid': [
+        {'httpMethod': 'OPTIONS', 'queryStringParameters': {'action': 'assignments'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'action': 'assignments'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'action': 'salary-history'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'action': 'unknown'}}
+    ],
+    'senior-cleaner': [
+        {'httpMethod': 'OPTIONS', 'queryStringParameters': {'action': 'inspections'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'action': 'inspections'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'action': 'salary-history'}},
+        {'httpMethod': 'GET', 'queryStringParameters': {'action': 'unknown'}}
+    ]
+}
+
+def measure(fn: Callable[[], None], iterations: int) -> List[float]:
+    """Возвращает длительности вызовов fn в микросекундах"""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+def report(label: str, timings: List[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{label:<44} p50={statistics.median(ordered):9.1f}us  p95={p95:9.1f}us")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--function', default='maid', choices=sorted(REQUESTS))
+    parser.add_argument('--baseline', default='HEAD~1', help='git-ревизия для сравнения')
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required')
+    
+    versions = {'current': load_function(args.function), args.baseline: load_function_at(args.function, args.baseline)}
+    for event in REQUESTS[args.function]:
+        for label, module in versions.items():
+            handler = module.handler
+            handler(event, None)
+            timings = measure(lambda: handler(event, None), args.iterations)
+            request = f"{event['httpMethod']} {event['queryStringParameters']['action']}"
+            report(f"{label:<10} {request}", timings)
+
+if __name__ == '__main__':
+    main()
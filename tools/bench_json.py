@@ -0,0 +1,113 @@
+'''
+Бенчмарк сериализации больших списков admin (addresses, payments) на 10k строк.
+Без БД сравнивает сборку ответа из синтетических строк: словари + json, словари + orjson,
+сырые значения + orjson с json_default и склейку готовых JSON-строк, как их отдает режим postgres.
+С --database вызывает обработчики на DATABASE_URL в режимах LIST_SERIALIZER=python и postgres
+(в базе должно быть заметное число адресов и выплат, например 10k).
+Использование: python tools/bench_json.py [--rows 10000] [--database]
+'''
+import argparse
+import datetime
+import decimal
+import json
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from handlers import load_function
+
+SAMPLE_VALUES: Dict[Any, Callable[[int], Any]] = {
+    str: lambda i: datetime.datetime(2024, 1, 1, 9, 30) + datetime.timedelta(minutes=i, microseconds=i),
+    float: lambda i: decimal.Decimal(f'{5000 + i % 7000}.00'),
+}
+
+def synthetic_rows(columns: List[Tuple[str, str, Any, bool]], count: int) -> List[Tuple]:
+    """Строки с типами, которые вернул бы psycopg2: Decimal, datetime, int, str, bool, None"""
+    rows = []
+    for i in range(count):
+        row = []
+        for key, _, convert, _ in columns:
+            if convert in SAMPLE_VALUES:
+                row.append(SAMPLE_VALUES[convert](i))
+            elif key == 'id' or key == 'area':
+                row.append(i + 1)
+            elif key.startswith('has_') or key == 'paid':
+                row.append(i % 2 == 0)
+            elif key == 'notes' and i % 3:
+                row.append(None)
+            else:
+                row.append(f'{key} {i} улица Ленина, д. {i % 200}')
+        rows.append(tuple(row))
+    return rows
+
+def measure(fn: Callable[[], Any], iterations: int) -> List[float]:
+    """Возвращает длительности вызовов fn в миллисекундах"""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def report(label: str, timings: List[float], size: int) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(f"{label:<40} p50={statistics.median(ordered):8.1f}ms  p95={p95:8.1f}ms  body={size / 1024:8.0f}KB")
+
+def bench_encoders(admin: Any, key: str, columns: List[Tuple[str, str, Any, bool]], count: int, iterations: int) -> None:
+    """Сборка тела ответа в процессе, без БД"""
+    rows = synthetic_rows(columns, count)
+    keys = [column[0] for column in columns]
+    # Так строки приходят из БД в режиме postgres: JSON-текст уже собран json_build_object
+    json_rows = [(json.dumps(admin.row_to_dict(columns, row), ensure_ascii=False),) for row in rows]
+    
+    def encode(encoder: str, build: Callable[[], Any]) -> Callable[[], str]:
+        def run() -> str:
+            admin.JSON_ENCODER = encoder
+            return admin.dumps_json({key: build(), 'next_cursor': None})
+        return run
+    
+    approaches = {
+        'row_to_dict + json': encode('json', lambda: [admin.row_to_dict(columns, row) for row in rows]),
+        'row_to_dict + orjson': encode('orjson', lambda: [admin.row_to_dict(columns, row) for row in rows]),
+        'raw values + orjson(json_default)': encode('orjson', lambda: [dict(zip(keys, row)) for row in rows]),
+        'postgres json_build_object rows': encode('json', lambda: admin.RawJson('[' + ','.join(row[0] for row in json_rows) + ']')),
+    }
+    print(f"{key}: {count} rows, {len(columns)} columns (in-process)")
+    for label, fn in approaches.items():
+        if 'orjson' in label and admin.orjson is None:
+            print(f"{label:<40} skipped: orjson is not installed")
+            continue
+        body = fn()
+        report(label, measure(fn, iterations), len(body.encode()))
+
+def bench_database(admin: Any, iterations: int) -> None:
+    """Полный обработчик на реальной БД: выборка, сборка и кодирование ответа"""
+    for action in ('addresses', 'payments'):
+        event = {'httpMethod': 'GET', 'queryStringParameters': {'action': action}}
+        for serializer in ('python', 'postgres'):
+            admin.LIST_SERIALIZER = serializer
+            admin.JSON_ENCODER = 'orjson' if admin.orjson is not None else 'json'
+            response = admin.handler(event, None)
+            count = len(json.loads(response['body'])[action])
+            timings = measure(lambda: admin.handler(event, None), iterations)
+            report(f"{action} ({count} rows) {serializer}", timings, len(response['body'].encode()))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--database', action='store_true', help='дополнительно замерить обработчики на DATABASE_URL')
+    args = parser.parse_args()
+    if args.database and not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required with --database')
+    
+    admin = load_function('admin')
+    bench_encoders(admin, 'addresses', admin.ADDRESS_COLUMNS, args.rows, args.iterations)
+    bench_encoders(admin, 'payments', admin.PAYMENT_COLUMNS, args.rows, args.iterations)
+    if args.database:
+        bench_database(admin, args.iterations)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+'''
+Бенчмарк планировщика назначений admin.plan_schedule на синтетических данных (без БД).
+Использование: python tools/bench_schedule.py --addresses 3000 --maids 1300 --seniors 60 --days 1
+'''
+import argparse
+import datetime
+import random
+import time
+
+from handlers import load_function
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--addresses', type=int, default=3000, help='адресов в день')
+    parser.add_argument('--maids', type=int, default=1300)
+    parser.add_argument('--seniors', type=int, default=60)
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--busy-share', type=float, default=0.2, help='доля горничных с уже назначенной уборкой')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    
+    admin = load_function('admin')
+    rng = random.Random(args.seed)
+    first_day = datetime.date.today()
+    days = [first_day + datetime.timedelta(days=offset) for offset in range(args.days)]
+    
+    jobs = []
+    for day in days:
+        for _ in range(args.addresses):
+            service_type = rng.choice(['basic', 'basic', 'deep', 'after', 'office'])
+            jobs.append({
+                'id': len(jobs) + 1,
+                'date': day,
+                'start': rng.randrange(8 * 60, 18 * 60, 30),
+                'duration': admin.estimate_duration_minutes(service_type, rng.randint(25, 120))
+            })
+    maid_ids = list(range(1, args.maids + 1))
+    senior_ids = list(range(args.maids + 1, args.maids + args.seniors + 1))
+    busy = {}
+    for maid_id in rng.sample(maid_ids, int(len(maid_ids) * args.busy_share)):
+        for day in days:
+            start = rng.randrange(9 * 60, 15 * 60, 30)
+            busy[(maid_id, day)] = [(start, start + 180)]
+    
+    started = time.perf_counter()
+    plan, unassigned = admin.plan_schedule(jobs, maid_ids, busy, senior_ids, {})
+    elapsed = time.perf_counter() - started
+    
+    with_senior = sum(1 for item in plan if item['senior_cleaner_id'])
+    print(f"{len(jobs)} addresses, {len(maid_ids)} maids, {len(senior_ids)} seniors, {args.days} day(s)")
+    print(f"planned={len(plan)} unassigned={len(unassigned)} with_inspector={with_senior} in {elapsed:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+Проверка, что выгрузка выплат (action=payments-export) работает в постоянной памяти.
+Создает отдельную схему export_memory_check с --rows синтетическими выплатами, затем в отдельных
+процессах выгружает небольшой диапазон (--baseline-rows) и весь объем и сравнивает пиковый RSS.
+Если RSS при полной выгрузке вырос больше чем на --max-growth-mb, скрипт завершается с кодом 1.
+С --compare-json так же замеряет обычный список action=payments для сравнения.
+Использование: DATABASE_URL=postgres://... python tools/check_export_memory.py [--rows 500000] [--format csv]
+'''
+import argparse
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict
+
+import psycopg2
+
+from handlers import load_function
+
+SCHEMA = 'export_memory_check'
+ROWS_PER_DAY = 1440
+START_DATE = datetime.date(2020, 1, 1)
+
+SETUP_SQL = f"""
+    DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+    CREATE SCHEMA {SCHEMA};
+    CREATE TABLE {SCHEMA}.users (LIKE public.users INCLUDING DEFAULTS);
+    CREATE TABLE {SCHEMA}.cleaning_addresses (LIKE public.cleaning_addresses INCLUDING DEFAULTS);
+    CREATE TABLE {SCHEMA}.assignments (LIKE public.assignments INCLUDING DEFAULTS);
+    INSERT INTO {SCHEMA}.users (id, email, password_hash, full_name, role)
+    VALUES (1, 'maid@example.com', '-', 'Горничная Тестовая', 'maid'),
+           (2, 'senior@example.com', '-', 'Старший Клинер', 'senior_cleaner');
+    INSERT INTO {SCHEMA}.cleaning_addresses (id, address, client_name, client_phone, service_type, area, price, scheduled_date, scheduled_time)
+    SELECT i, 'г. Москва, ул. Тестовая, д. ' || i, 'Клиент ' || i, '+7 900 000 00 00', 'basic', 50, 5000,
+           DATE '{START_DATE}' + i / {ROWS_PER_DAY}, TIME '10:00'
+    FROM generate_series(0, %(rows)s - 1) AS i;
+    INSERT INTO {SCHEMA}.assignments (id, address_id, maid_id, senior_cleaner_id, salary, senior_cleaner_salary, verified_at, paid)
+    SELECT i, i, 1, 2, 2500, 500, TIMESTAMP '{START_DATE}' + i * INTERVAL '1 minute', i % 2 = 0
+    FROM generate_series(0, %(rows)s - 1) AS i;
+    ANALYZE {SCHEMA}.users, {SCHEMA}.cleaning_addresses, {SCHEMA}.assignments;
+"""
+
+def run_child(action: str, export_format: str, rows: int, storage_dir: str) -> Dict[str, Any]:
+    """Выгрузка в отдельном процессе, чтобы пиковый RSS одного замера не влиял на другой"""
+    env = {
+        **os.environ,
+        # libpq применит search_path ко всем соединениям пула обработчика
+        'PGOPTIONS': f'-c search_path={SCHEMA}',
+        'EXPORT_STORAGE': 'local',
+        'EXPORT_STORAGE_DIR': storage_dir,
+    }
+    command = [sys.executable, __file__, '--child', action, '--format', export_format, '--rows', str(rows)]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def child(action: str, export_format: str, rows: int) -> None:
+    admin = load_function('admin')
+    days = -(-rows // ROWS_PER_DAY)
+    params = {
+        'action': action, 'format': export_format,
+        'date_from': START_DATE.isoformat(),
+        'date_to': (START_DATE + datetime.timedelta(days=days - 1)).isoformat(),
+    }
+    response = admin.handler({'httpMethod': 'GET', 'queryStringParameters': params, 'headers': {}}, None)
+    if response['statusCode'] != 200:
+        raise SystemExit(f"{action} failed: {response['statusCode']} {response['body']}")
+    body = json.loads(response['body'])
+    exported = body['rows'] if action == 'payments-export' else len(body['payments'])
+    print(json.dumps({'rows': exported, 'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--baseline-rows', type=int, default=20000)
+    parser.add_argument('--format', default='csv', choices=('csv', 'xlsx'))
+    parser.add_argument('--max-growth-mb', type=float, default=32.0)
+    parser.add_argument('--compare-json', action='store_true', help='замерить и обычный список action=payments')
+    parser.add_argument('--keep', action='store_true', help='не удалять схему с синтетическими данными')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required')
+    
+    if args.child:
+        child(args.child, args.format, args.rows)
+        return
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SETUP_SQL, {'rows': args.rows})
+        conn.commit()
+        
+        with tempfile.TemporaryDirectory() as storage_dir:
+            actions = ['payments-export'] + (['payments'] if args.compare_json else [])
+            results = {}
+            for action in actions:
+                for rows in (args.baseline_rows, args.rows):
+                    result = run_child(action, args.format, rows, storage_dir)
+                    results[(action, rows)] = result
+                    print(f"{action:<16} rows={result['rows']:>8}  max_rss={result['max_rss_mb']:8.1f}MB")
+        
+        growth = results[('payments-export', args.rows)]['max_rss_mb'] - results[('payments-export', args.baseline_rows)]['max_rss_mb']
+        print(f"payments-export RSS growth: {growth:.1f}MB (limit {args.max_growth_mb:.0f}MB)")
+        if growth > args.max_growth_mb:
+            sys.exit(1)
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            conn.commit()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
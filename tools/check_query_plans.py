@@ -0,0 +1,138 @@
+'''
+Регрессионная проверка планов запросов выплат и истории заработка.
+Создает схему query_plans_check с таблицами как в public, применяет к ней миграцию с индексами,
+заполняет --assignments синтетическими назначениями и вызывает настоящие обработчики admin/maid/senior-cleaner.
+Перед основным (последним) SELECT каждого запроса снимается EXPLAIN; если в плане есть Seq Scan
+по assignments или cleaning_addresses, скрипт завершается с кодом 1.
+Использование: DATABASE_URL=postgres://... python tools/check_query_plans.py [--assignments 300000]
+'''
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+
+from handlers import BACKEND_DIR, load_function
+
+SCHEMA = 'query_plans_check'
+INDEX_MIGRATION = BACKEND_DIR.parent / 'db_migrations' / 'V0018__add_payment_and_salary_history_indexes.sql'
+CHECKED_RELATIONS = ('assignments', 'cleaning_addresses')
+MAIDS = 500
+SENIOR_CLEANERS = 50
+
+SETUP_SQL = f"""
+    DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+    CREATE SCHEMA {SCHEMA};
+    CREATE TABLE {SCHEMA}.users (LIKE public.users INCLUDING DEFAULTS INCLUDING INDEXES);
+    CREATE TABLE {SCHEMA}.cleaning_addresses (LIKE public.cleaning_addresses INCLUDING DEFAULTS INCLUDING INDEXES);
+    CREATE TABLE {SCHEMA}.assignments (LIKE public.assignments INCLUDING DEFAULTS INCLUDING INDEXES);
+    SET search_path = {SCHEMA};
+    INSERT INTO users (id, email, password_hash, full_name, role)
+    SELECT i, 'worker' || i || '@example.com', '-', 'Сотрудник ' || i,
+           CASE WHEN i <= {SENIOR_CLEANERS} THEN 'senior_cleaner' ELSE 'maid' END
+    FROM generate_series(1, {MAIDS + SENIOR_CLEANERS}) AS i;
+    -- Три года уборок; проверены все, кроме последней недели, выплачены - старше месяца
+    INSERT INTO cleaning_addresses (id, address, client_name, client_phone, service_type, area, price, scheduled_date, scheduled_time, status)
+    SELECT i, 'г. Москва, ул. Тестовая, д. ' || i, 'Клиент ' || i, '+7 900 000 00 00', 'basic', 50, 5000,
+           (CURRENT_DATE - 1095) + (i * 1095 / %(count)s), TIME '10:00', 'completed'
+    FROM generate_series(1, %(count)s) AS i;
+    INSERT INTO assignments (id, address_id, maid_id, senior_cleaner_id, salary, senior_cleaner_salary,
+                             completed_at, verified_at, inspection_started_at, inspection_completed_at, paid)
+    SELECT ca.id, ca.id, {SENIOR_CLEANERS} + 1 + ca.id % {MAIDS}, 1 + ca.id % {SENIOR_CLEANERS}, 2500, 500,
+           ca.scheduled_date + TIME '13:00',
+           CASE WHEN ca.scheduled_date < CURRENT_DATE - 7 THEN ca.scheduled_date + TIME '18:00' END,
+           CASE WHEN ca.id % 2 = 0 THEN ca.scheduled_date + TIME '14:00' END,
+           CASE WHEN ca.id % 2 = 0 AND ca.scheduled_date < CURRENT_DATE - 7 THEN ca.scheduled_date + TIME '15:00' END,
+           ca.scheduled_date < CURRENT_DATE - 30
+    FROM cleaning_addresses ca;
+"""
+
+# (функция, параметры запроса): основной SELECT каждого из них должен идти по индексам
+REQUESTS: List[Tuple[str, Dict[str, str]]] = [
+    ('admin', {'action': 'payments', 'date_from': '{week_ago}', 'date_to': '{today}'}),
+    ('admin', {'action': 'payments', 'paid': 'false', 'date_from': '{month_ago}', 'date_to': '{today}'}),
+    ('admin', {'action': 'payments', 'paid': 'true', 'date_from': '{month_ago}', 'date_to': '{today}'}),
+    ('maid', {'action': 'salary-history', 'maid_id': str(SENIOR_CLEANERS + 1)}),
+    ('senior-cleaner', {'action': 'salary-history', 'senior_cleaner_id': '1'}),
+]
+
+class ExplainCursor(psycopg2.extensions.cursor):
+    """Курсор, который перед каждым SELECT снимает его план с теми же параметрами"""
+    plans: List[Tuple[str, Dict[str, Any]]] = []
+    
+    def execute(self, query: Any, vars: Any = None) -> None:
+        if self.name is None and str(query).lstrip().upper().startswith('SELECT'):
+            super().execute('EXPLAIN (FORMAT JSON) ' + query, vars)
+            ExplainCursor.plans.append((query, self.fetchone()[0][0]['Plan']))
+        super().execute(query, vars)
+
+def walk(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+def describe(plan: Dict[str, Any]) -> str:
+    nodes = []
+    for node in walk(plan):
+        target = node.get('Index Name') or node.get('Relation Name')
+        nodes.append(f"{node['Node Type']}({target})" if target else node['Node Type'])
+    return ' > '.join(nodes)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--assignments', type=int, default=300000)
+    parser.add_argument('--keep', action='store_true', help='не удалять схему с синтетическими данными')
+    args = parser.parse_args()
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        parser.error('DATABASE_URL is required')
+    
+    conn = psycopg2.connect(database_url)
+    failures = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SETUP_SQL, {'count': args.assignments})
+            cur.execute(Path(INDEX_MIGRATION).read_text())
+            cur.execute(f'ANALYZE {SCHEMA}.users, {SCHEMA}.cleaning_addresses, {SCHEMA}.assignments')
+            cur.execute("SELECT CURRENT_DATE, CURRENT_DATE - 7, CURRENT_DATE - 30")
+            today, week_ago, month_ago = (value.isoformat() for value in cur.fetchone())
+        conn.commit()
+        
+        for name, params in REQUESTS:
+            module = load_function(name)
+            if module._db_pool is None:
+                # Свой пул с тем же search_path и курсором, снимающим планы; get_connection возьмет его
+                module._db_pool = pg_pool.ThreadedConnectionPool(
+                    1, 1, database_url, cursor_factory=ExplainCursor, options=f'-c search_path={SCHEMA}'
+                )
+            params = {key: value.format(today=today, week_ago=week_ago, month_ago=month_ago) for key, value in params.items()}
+            ExplainCursor.plans.clear()
+            response = module.handler({'httpMethod': 'GET', 'queryStringParameters': params, 'headers': {}}, None)
+            if response['statusCode'] != 200 or not ExplainCursor.plans:
+                print(f"FAIL {name} {params}: status {response['statusCode']} {response['body'][:200]}")
+                failures += 1
+                continue
+        
+            _, plan = ExplainCursor.plans[-1]
+            seq_scans = [node['Relation Name'] for node in walk(plan)
+                         if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in CHECKED_RELATIONS]
+            status = 'FAIL' if seq_scans else 'ok  '
+            failures += bool(seq_scans)
+            print(f"{status} {name} {params}\n     {describe(plan)}")
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            conn.commit()
+        conn.close()
+    
+    if failures:
+        print(f"{failures} queries fall back to a sequential scan")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,57 @@
+'''
+Удаление брошенных сессий загрузки фото частями: незавершенные сессии старше
+UPLOAD_SESSION_TTL_HOURS (и завершенные - сразу) удаляются вместе с частями в хранилище.
+Хранилище выбирается теми же переменными, что и в функции maid (PHOTO_STORAGE, S3_*, AWS_*).
+
+Использование: DATABASE_URL=postgres://... python tools/cleanup_upload_sessions.py --batch-size 200
+'''
+import argparse
+import os
+
+import psycopg2
+
+from handlers import load_function
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('DATABASE_URL is required')
+    
+    maid = load_function('maid')
+    conn = psycopg2.connect(args.database_url)
+    removed = 0
+    
+    try:
+        while True:
+            cur = conn.cursor()
+            cur.execute("""
+                DELETE FROM photo_upload_sessions
+                WHERE id IN (
+                    SELECT id FROM photo_upload_sessions
+                    WHERE status = 'completed'
+                       OR updated_at < CURRENT_TIMESTAMP - make_interval(hours => %s)
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, total_size, chunk_size, status
+            """, (maid.UPLOAD_SESSION_TTL_HOURS, args.batch_size))
+            rows = cur.fetchall()
+            for upload_id, total_size, chunk_size, status in rows:
+                # Части завершенных сессий удаляются при upload-finalize
+                if status == 'open':
+                    maid.delete_upload_chunks(upload_id, -(-total_size // chunk_size))
+            conn.commit()
+            cur.close()
+            removed += len(rows)
+            if len(rows) < args.batch_size:
+                break
+    finally:
+        conn.close()
+    
+    print(f"removed {removed} upload sessions")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+'''
+Синтетические данные для локального сервера и нагрузочных тестов: сотрудники, адреса, назначения,
+чек-листы по шаблонам, проверки, ключи фото и выплаты в масштабе, заданном параметрами.
+С --reset пересоздает схему --schema и применяет к ней все миграции из db_migrations (поэтому база
+может быть пустой); без --reset добавляет данные в уже размеченную схему. Все данные генерируются
+в PostgreSQL через generate_series, так что миллион назначений создается за минуты.
+Пароль всех созданных пользователей - load-test, адреса почты - <роль><n>@load.test.
+Использование: DATABASE_URL=postgres://... python tools/generate_data.py --reset [--schema load_test] [--addresses 50000]
+'''
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, Optional
+
+import psycopg2
+
+from handlers import BACKEND_DIR, load_function
+
+MIGRATIONS_DIR = BACKEND_DIR.parent / 'db_migrations'
+# Несколько ранних миграций написаны с явной схемой облачной БД; локально их направляем в --schema
+CLOUD_SCHEMA_PREFIX = re.compile(r'\bt_p\d+_cleaning_design_site\.')
+PASSWORD = 'load-test'
+EMAIL_DOMAIN = 'load.test'
+
+USERS_SQL = """
+    INSERT INTO users (email, password_hash, full_name, role, phone)
+    SELECT role || i || '@{domain}', %(password)s, full_name || ' ' || i, role, '+7 900 ' || lpad(i::text, 7, '0')
+    FROM (VALUES ('admin', 'Администратор', %(admins)s), ('maid', 'Горничная', %(maids)s),
+                 ('senior_cleaner', 'Старший клинер', %(seniors)s)) AS roles (role, full_name, total),
+         generate_series(1, total) AS i
+""".format(domain=EMAIL_DOMAIN)
+
+# Адреса равномерно за --days дней назад и --future-days вперед; статус следует из даты
+ADDRESSES_SQL = """
+    INSERT INTO cleaning_addresses (address, client_name, client_phone, service_type, area, price, scheduled_date, scheduled_time, status, notes)
+    SELECT 'г. Москва, ул. Нагрузочная, д. ' || (i % 500 + 1) || ', кв. ' || (i % 300 + 1),
+           'Клиент ' || i, '+7 901 ' || lpad(i::text, 7, '0'), service_type, area,
+           round(area * CASE service_type WHEN 'basic' THEN 120 WHEN 'deep' THEN 220 WHEN 'after' THEN 300 ELSE 100 END, -2),
+           day, TIME '08:00' + (i % 10) * INTERVAL '1 hour',
+           CASE
+               WHEN random() < 0.03 THEN 'cancelled'
+               WHEN day > CURRENT_DATE THEN CASE WHEN random() < 0.15 THEN 'pending' ELSE 'assigned' END
+               WHEN day = CURRENT_DATE THEN CASE WHEN random() < 0.5 THEN 'in_progress' ELSE 'assigned' END
+               WHEN day >= CURRENT_DATE - 3 THEN 'completed'
+               ELSE 'verified'
+           END,
+           CASE WHEN i % 4 = 0 THEN 'Домофон ' || (i % 90 + 10) || ', ключи у консьержа' END
+    FROM (
+        SELECT i, (ARRAY['basic', 'basic', 'deep', 'after', 'office'])[1 + i % 5] AS service_type,
+               30 + (i * 7) % 120 AS area,
+               CURRENT_DATE - %(days)s + (i * (%(days)s + %(future_days)s) / %(addresses)s) AS day
+        FROM generate_series(0, %(addresses)s - 1) AS i
+    ) source
+"""
+
+# Назначения на все адреса, кроме ожидающих; чек-листы отмечены по статусу, проверено ~70% работ
+ASSIGNMENTS_SQL = """
+    WITH maids AS (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE role = 'maid' AND email LIKE %(pattern)s),
+    seniors AS (SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE role = 'senior_cleaner' AND email LIKE %(pattern)s),
+    templates AS (
+        SELECT DISTINCT ON (kind, service_type) id, kind, service_type,
+               ARRAY(SELECT item->>'id' FROM jsonb_array_elements(items) AS item) AS item_ids
+        FROM checklist_templates
+        ORDER BY kind, service_type, version DESC
+    ),
+    jobs AS (
+        SELECT ca.id, ca.status, ca.price, ca.scheduled_date + ca.scheduled_time AS starts_at,
+               maids.ids[1 + floor(random() * array_length(maids.ids, 1))::int] AS maid_id,
+               CASE WHEN random() < 0.7 THEN seniors.ids[1 + floor(random() * array_length(seniors.ids, 1))::int] END AS senior_cleaner_id,
+               ct.id AS checklist_template_id, ct.item_ids AS checklist_items,
+               it.id AS inspection_template_id, it.item_ids AS inspection_items
+        FROM cleaning_addresses ca
+        CROSS JOIN maids CROSS JOIN seniors
+        JOIN templates ct ON ct.kind = 'cleaning' AND ct.service_type = ca.service_type
+        JOIN templates it ON it.kind = 'inspection' AND it.service_type = ca.service_type
+        WHERE ca.status <> 'pending' AND ca.client_phone LIKE '+7 901 %%'
+          AND NOT EXISTS (SELECT 1 FROM assignments a WHERE a.address_id = ca.id)
+    )
+    INSERT INTO assignments (
+        address_id, maid_id, senior_cleaner_id, assigned_at, status, salary, senior_cleaner_salary,
+        checklist_template_id, checklist_checked, checklist_started_at, completed_at,
+        photo_before_key, photo_before_thumb_key, photo_before_display_key,
+        photo_after_key, photo_after_thumb_key, photo_after_display_key, photos_uploaded_at,
+        inspection_checklist_template_id, inspection_checklist_checked, inspection_started_at, inspection_completed_at,
+        verified_at, paid
+    )
+    SELECT id, maid_id, senior_cleaner_id, starts_at - INTERVAL '2 days', status, round(price * 0.4), CASE WHEN senior_cleaner_id IS NOT NULL THEN 500 END,
+           checklist_template_id,
+           CASE WHEN done THEN checklist_items
+                WHEN status = 'in_progress' THEN checklist_items[1:array_length(checklist_items, 1) / 2]
+                ELSE '{}' END,
+           CASE WHEN done OR status = 'in_progress' THEN starts_at END,
+           CASE WHEN done THEN starts_at + INTERVAL '3 hours' END,
+           CASE WHEN done OR status = 'in_progress' THEN 'load-test/' || id || '-before.jpg' END,
+           CASE WHEN done OR status = 'in_progress' THEN 'load-test/' || id || '-before-thumb.jpg' END,
+           CASE WHEN done OR status = 'in_progress' THEN 'load-test/' || id || '-before-display.jpg' END,
+           CASE WHEN done THEN 'load-test/' || id || '-after.jpg' END,
+           CASE WHEN done THEN 'load-test/' || id || '-after-thumb.jpg' END,
+           CASE WHEN done THEN 'load-test/' || id || '-after-display.jpg' END,
+           CASE WHEN done THEN starts_at + INTERVAL '3 hours' END,
+           CASE WHEN senior_cleaner_id IS NOT NULL THEN inspection_template_id END,
+           CASE WHEN inspected THEN inspection_items ELSE '{}' END,
+           CASE WHEN inspected THEN starts_at + INTERVAL '4 hours' END,
+           CASE WHEN inspected THEN starts_at + INTERVAL '5 hours' END,
+           CASE WHEN status = 'verified' THEN starts_at + INTERVAL '1 day' END,
+           status = 'verified' AND starts_at < CURRENT_DATE - 14
+    FROM (
+        SELECT jobs.*, status IN ('completed', 'verified') AS done,
+               senior_cleaner_id IS NOT NULL AND status = 'verified' AS inspected
+        FROM jobs
+    ) source
+"""
+
+def apply_migrations(cur: Any, schema: str) -> None:
+    """Пересоздает схему и применяет миграции по порядку номеров"""
+    cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+    cur.execute(f'CREATE SCHEMA {schema}')
+    cur.execute(f'SET search_path = {schema}')
+    for path in sorted(MIGRATIONS_DIR.glob('V*.sql'), key=lambda path: int(path.name[1:].split('__')[0])):
+        cur.execute(CLOUD_SCHEMA_PREFIX.sub('', path.read_text()))
+        print(f"applied {path.name}")
+
+def step(cur: Any, label: str, sql: str, params: Optional[Dict[str, Any]] = None) -> None:
+    started = time.perf_counter()
+    cur.execute(sql, params)
+    print(f"{label:<28} {cur.rowcount:>9} rows  {time.perf_counter() - started:6.1f}s")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--schema', default='load_test')
+    parser.add_argument('--reset', action='store_true', help='пересоздать схему и применить миграции')
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--maids', type=int, default=200)
+    parser.add_argument('--seniors', type=int, default=20)
+    parser.add_argument('--addresses', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=365, help='глубина истории в днях')
+    parser.add_argument('--future-days', type=int, default=14, help='на сколько дней вперед запланированы работы')
+    parser.add_argument('--seed', type=float, default=0.42, help='зерно random() от -1 до 1 для повторяемых данных')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required')
+    if args.reset and args.schema == 'public':
+        parser.error('--reset drops the schema; use a dedicated schema, not public')
+    if not re.fullmatch(r'[a-z_][a-z0-9_]*', args.schema):
+        parser.error('schema must be a lowercase identifier')
+    
+    admin = load_function('admin')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        cur = conn.cursor()
+        if args.reset:
+            apply_migrations(cur, args.schema)
+        cur.execute(f'SET search_path = {args.schema}')
+        cur.execute('SELECT setseed(%s)', (args.seed,))
+        params = {
+            # Один хеш на всех: auth проверяет его так же, как пароль, заданный в админке
+            'password': admin.hash_password(PASSWORD), 'pattern': f'%@{EMAIL_DOMAIN}',
+            'admins': args.admins, 'maids': args.maids, 'seniors': args.seniors,
+            'addresses': args.addresses, 'days': args.days, 'future_days': args.future_days,
+        }
+        step(cur, 'users', USERS_SQL, params)
+        step(cur, 'cleaning_addresses', ADDRESSES_SQL, params)
+        step(cur, 'assignments', ASSIGNMENTS_SQL, params)
+        # Сводка заработка ведется обработчиками при проверке; для сгенерированных назначений пересчитываем ее целиком
+        step(cur, 'worker_monthly_earnings', admin.REBUILD_EARNINGS_SQL)
+        conn.commit()
+        conn.autocommit = True
+        cur.execute('ANALYZE')
+    except psycopg2.Error as e:
+        conn.rollback()
+        sys.exit(f"generation failed: {e}")
+    finally:
+        conn.close()
+    print(f"done: log in as maid1@{EMAIL_DOMAIN} / {PASSWORD}; serve with tools/local_server.py --schema {args.schema}")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
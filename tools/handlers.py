@@ -0,0 +1,42 @@
+'''
+Загрузка обработчиков облачных функций из backend/<name>/index.py для локальных инструментов
+(бенчмарков, нагрузочных тестов, миграционных скриптов)
+'''
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Dict
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+FUNCTIONS = ('admin', 'auth', 'maid', 'senior-cleaner')
+
+_loaded: Dict[str, ModuleType] = {}
+
+def load_function(name: str) -> ModuleType:
+    """Импортирует index.py функции как отдельный модуль (имена с дефисом импортировать напрямую нельзя)"""
+    if name in _loaded:
+        return _loaded[name]
+    path = BACKEND_DIR / name / 'index.py'
+    module_name = f"backend_{name.replace('-', '_')}"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    _loaded[name] = module
+    return module
+
+
+def load_function_at(name: str, revision: str) -> ModuleType:
+    """Импортирует index.py функции в том виде, в каком он был в git-ревизии (для сравнения до/после)"""
+    source = subprocess.run(
+        ['git', 'show', f'{revision}:backend/{name}/index.py'],
+        cwd=BACKEND_DIR.parent, check=True, capture_output=True, text=True
+    ).stdout
+    module_name = f"backend_{name.replace('-', '_')}_{revision.replace('~', '_').replace('^', '_')}"
+    module = ModuleType(module_name)
+    module.__file__ = f'{revision}:backend/{name}/index.py'
+    sys.modules[module_name] = module
+    exec(compile(source, module.__file__, 'exec'), module.__dict__)
+    return module
\ No newline at end of file
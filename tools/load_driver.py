@@ -0,0 +1,250 @@
+'''
+Нагрузочный драйвер для локального сервера (local_server.py или asgi_server.py) на данных generate_data.py.
+Виртуальные пользователи входят через /auth и повторяют типичные сессии: администратор открывает дашборд,
+листает адреса и выплаты; горничная открывает свои назначения, карточку, шаблон чек-листа и отмечает пункты;
+старший клинер - свои проверки. Печатает пропускную способность и p50/p95/p99 по каждому действию.
+--save сохраняет результат в JSON, --compare сравнивает p95 с сохраненным и завершается с кодом 1,
+если какое-то действие стало медленнее больше чем на --max-regression (регрессия до выкладки).
+Использование: DATABASE_URL=postgres://... python tools/load_driver.py --url http://127.0.0.1:8000 --schema load_test
+               [--users 50] [--duration 60] [--mix admin=1,maid=8,senior_cleaner=2] [--no-writes]
+'''
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+
+EMAIL_PATTERN = '%@load.test'
+PASSWORD = 'load-test'
+
+class Client:
+    """HTTP-клиент одного виртуального пользователя; время каждого вызова пишется в общую статистику"""
+    
+    def __init__(self, base_url: str, stats: 'Stats'):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.headers: Dict[str, str] = {'Accept-Encoding': 'gzip'}
+    
+    def call(self, function: str, action: str, method: str = 'GET', params: Optional[Dict[str, Any]] = None, body: Any = None) -> Tuple[int, Any]:
+        query = urlencode({'action': action, **(params or {})})
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {**self.headers, **({'Content-Type': 'application/json'} if data else {})}
+        request = urllib.request.Request(f'{self.base_url}/{function}?{query}', data=data, method=method, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, raw = response.status, response.read()
+                if response.headers.get('Content-Encoding') == 'gzip':
+                    raw = gzip.decompress(raw)
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        except OSError:
+            status, raw = 0, b''
+        self.stats.record(f'{function}:{action}', time.perf_counter() - started, status)
+        try:
+            return status, json.loads(raw) if raw else None
+        except ValueError:
+            return status, None
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+    
+    def record(self, key: str, seconds: float, status: int) -> None:
+        with self.lock:
+            self.timings.setdefault(key, []).append(seconds * 1000)
+            self.errors[key] = self.errors.get(key, 0) + (status == 0 or status >= 400)
+    
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for key, timings in sorted(self.timings.items()):
+            ordered = sorted(timings)
+            result[key] = {
+                'count': len(ordered), 'errors': self.errors[key], 'rps': len(ordered) / elapsed,
+                'p50': percentile(ordered, 50), 'p95': percentile(ordered, 95), 'p99': percentile(ordered, 99),
+                'mean': statistics.mean(ordered),
+            }
+        return result
+
+def percentile(ordered: List[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * p / 100)) - 1))]
+
+def admin_session(client: Client, user: Dict[str, Any], writes: bool) -> Iterator[None]:
+    """Дашборд, страницы адресов и выплат, сотрудники и статистика зарплат"""
+    client.call('admin', 'dashboard')
+    yield
+    _, page = client.call('admin', 'addresses', params={'limit': 100, 'view': 'summary'})
+    yield
+    if page and page.get('next_cursor'):
+        client.call('admin', 'addresses', params={'limit': 100, 'view': 'summary', 'cursor': page['next_cursor']})
+        yield
+    if page and page.get('addresses'):
+        client.call('admin', 'address', params={'id': random.choice(page['addresses'])['id']})
+        yield
+    client.call('admin', 'maids')
+    yield
+    client.call('admin', 'payments', params={'paid': 'false'})
+    yield
+    client.call('admin', 'salary-stats')
+    yield
+
+def maid_session(client: Client, user: Dict[str, Any], writes: bool) -> Iterator[None]:
+    """Список назначений, карточка, шаблон чек-листа, отметки пунктов, история заработка"""
+    _, data = client.call('maid', 'assignments', params={'maid_id': user['id'], 'view': 'summary'})
+    yield
+    assignments = (data or {}).get('assignments') or []
+    for assignment in random.sample(assignments, min(2, len(assignments))):
+        _, detail = client.call('maid', 'assignment', params={'id': assignment['id'], 'maid_id': user['id']})
+        yield
+        template_id = ((detail or {}).get('assignment') or {}).get('checklist_template_id')
+        if template_id:
+            _, template = client.call('maid', 'checklist-template', params={'id': template_id})
+            yield
+            items = (template or {}).get('items') or []
+            if writes and items:
+                toggles = [{'item_id': item['id'], 'checked': random.random() < 0.5} for item in random.sample(items, min(3, len(items)))]
+                client.call('maid', 'patch-checklist', 'POST', body={'assignment_id': assignment['id'], 'toggles': toggles})
+                yield
+    client.call('maid', 'salary-history', params={'maid_id': user['id']})
+    yield
+
+def senior_session(client: Client, user: Dict[str, Any], writes: bool) -> Iterator[None]:
+    """Список проверок, карточка, отметки пунктов проверки, история заработка"""
+    _, data = client.call('senior-cleaner', 'inspections', params={'senior_cleaner_id': user['id'], 'view': 'summary'})
+    yield
+    inspections = (data or {}).get('inspections') or []
+    for inspection in random.sample(inspections, min(2, len(inspections))):
+        _, detail = client.call('senior-cleaner', 'inspection', params={'id': inspection['id'], 'senior_cleaner_id': user['id']})
+        yield
+        template_id = ((detail or {}).get('inspection') or {}).get('inspection_checklist_template_id')
+        if writes and template_id:
+            _, template = client.call('senior-cleaner', 'checklist-template', params={'id': template_id})
+            yield
+            items = (template or {}).get('items') or []
+            if items:
+                toggles = [{'item_id': item['id'], 'checked': True} for item in random.sample(items, min(3, len(items)))]
+                client.call('senior-cleaner', 'patch-inspection-checklist', 'POST', body={'assignment_id': inspection['id'], 'toggles': toggles})
+                yield
+    client.call('senior-cleaner', 'salary-history', params={'senior_cleaner_id': user['id']})
+    yield
+
+SESSIONS: Dict[str, Callable[[Client, Dict[str, Any], bool], Iterator[None]]] = {
+    'admin': admin_session, 'maid': maid_session, 'senior_cleaner': senior_session,
+}
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(','):
+        role, _, weight = item.partition('=')
+        if role not in SESSIONS:
+            raise argparse.ArgumentTypeError(f'unknown role {role}')
+        mix[role] = float(weight or 1)
+    return mix
+
+def load_users(schema: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Пользователи generate_data.py по ролям"""
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], options=f'-c search_path={schema}')
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT id, email, role FROM users WHERE email LIKE %s ORDER BY id', (EMAIL_PATTERN,))
+            users: Dict[str, List[Dict[str, Any]]] = {}
+            for user_id, email, role in cur.fetchall():
+                users.setdefault(role, []).append({'id': user_id, 'email': email})
+            return users
+    finally:
+        conn.close()
+
+def virtual_user(base_url: str, stats: Stats, users: Dict[str, List[Dict[str, Any]]], mix: Dict[str, float], writes: bool, deadline: float, think: float) -> None:
+    """Входит случайным пользователем роли из mix, проходит сессию, повторяет до конца замера"""
+    roles = [role for role in mix if users.get(role)]
+    while time.monotonic() < deadline:
+        role = random.choices(roles, weights=[mix[role] for role in roles])[0]
+        user = random.choice(users[role])
+        client = Client(base_url, stats)
+        status, data = client.call('auth', 'login', 'POST', body={'email': user['email'], 'password': PASSWORD})
+        if status != 200:
+            time.sleep(1)
+            continue
+        if data.get('token'):
+            client.headers['Authorization'] = f"Bearer {data['token']}"
+        for _ in SESSIONS[role](client, user, writes):
+            if time.monotonic() >= deadline:
+                return
+            if think:
+                time.sleep(random.uniform(0, 2 * think))
+
+def compare(summary: Dict[str, Dict[str, float]], baseline_path: str, max_regression: float) -> bool:
+    """Печатает изменение p95 относительно сохраненного прогона; False, если есть регрессия"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['actions']
+    ok = True
+    for key, current in summary.items():
+        before = baseline.get(key)
+        if not before or not before['p95']:
+            continue
+        change = current['p95'] / before['p95'] - 1
+        regressed = change > max_regression
+        ok = ok and not regressed
+        print(f"{'REGRESSION' if regressed else 'ok':<10} {key:<42} p95 {before['p95']:8.1f} -> {current['p95']:8.1f}ms ({change:+.0%})")
+    return ok
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--schema', default='load_test', help='схема с пользователями generate_data.py')
+    parser.add_argument('--users', type=int, default=50, help='одновременных виртуальных пользователей')
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('admin=1,maid=8,senior_cleaner=2'))
+    parser.add_argument('--think', type=float, default=0.0, help='средняя пауза между действиями, секунд')
+    parser.add_argument('--no-writes', action='store_true', help='только чтение, без отметок чек-листов')
+    parser.add_argument('--save', help='сохранить результат в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения p95')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='допустимый рост p95, доля')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required')
+    
+    users = load_users(args.schema)
+    if not any(users.get(role) for role in args.mix):
+        sys.exit(f'no generated users in schema {args.schema}; run tools/generate_data.py first')
+    
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=virtual_user, args=(args.url, stats, users, args.mix, not args.no_writes, deadline, args.think), daemon=True)
+        for _ in range(args.users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    
+    summary = stats.summary(elapsed)
+    print(f"{'action':<42} {'count':>7} {'errors':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for key, row in summary.items():
+        print(f"{key:<42} {row['count']:>7} {row['errors']:>6} {row['rps']:>7.1f} {row['p50']:>6.1f}ms {row['p95']:>6.1f}ms {row['p99']:>6.1f}ms")
+    total = sum(row['count'] for row in summary.values())
+    print(f"total {total} requests in {elapsed:.0f}s: {total / elapsed:.1f} rps")
+    
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'users': args.users, 'duration': elapsed, 'actions': summary}, f, indent=2)
+    if args.compare and not compare(summary, args.compare, args.max_regression):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
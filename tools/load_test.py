@@ -0,0 +1,180 @@
+'''
+Нагрузочный тест: запросы в секунду и задержки синхронного обработчика против ASGI-сервера из asgi_server.py.
+sync - один поток вызывает handler подряд, как один экземпляр облачной функции;
+asgi - --concurrency одновременных клиентов в одном процессе через ASGI-приложение (без сети): сначала
+с асинхронными чтениями на psycopg 3 (если установлен), затем только с пулом потоков;
+с --url - по HTTP к уже запущенному серверу.
+Если задан SESSION_SECRET, запросы подписываются токеном администратора.
+Использование: DATABASE_URL=postgres://... python tools/load_test.py [--concurrency 200] [--duration 20]
+'''
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import async_handlers
+from asgi_server import create_app
+from handlers import load_function
+
+# (функция, строка запроса): так загружаются экраны админки и сотрудников
+DEFAULT_REQUESTS = 'admin:action=dashboard,admin:action=addresses&limit=50&view=summary,admin:action=maids'
+
+def parse_requests(value: str) -> List[Tuple[str, str]]:
+    return [tuple(item.split(':', 1)) for item in value.split(',') if item]
+
+def session_headers() -> Dict[str, str]:
+    if not os.environ.get('SESSION_SECRET'):
+        return {}
+    token, _ = load_function('auth').issue_session_token(0, 'admin')
+    return {'Authorization': f'Bearer {token}'}
+
+def report(label: str, timings: List[float], errors: int, elapsed: float) -> None:
+    ordered = sorted(timings) or [0.0]
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(
+        f"{label:<24} rps={len(timings) / elapsed:8.1f}  p50={statistics.median(ordered):8.1f}ms  "
+        f"p95={p95:8.1f}ms  requests={len(timings)}  errors={errors}"
+    )
+
+def run_sync(requests: List[Tuple[str, str]], headers: Dict[str, str], duration: float) -> None:
+    """Последовательные вызовы handler: пропускная способность одного синхронного экземпляра"""
+    events = [
+        (load_function(name), {'httpMethod': 'GET', 'queryStringParameters': dict(pair.split('=', 1) for pair in query.split('&')), 'headers': headers})
+        for name, query in requests
+    ]
+    timings: List[float] = []
+    errors = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        module, event = events[len(timings) % len(events)]
+        call_started = time.perf_counter()
+        if module.handler(event, None)['statusCode'] >= 400:
+            errors += 1
+        timings.append((time.perf_counter() - call_started) * 1000)
+    report('sync handler', timings, errors, time.perf_counter() - started)
+
+async def call_app(app: Callable, name: str, query: str, headers: Dict[str, str]) -> int:
+    """Один запрос к ASGI-приложению в процессе; возвращает HTTP-статус"""
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': f'/{name}', 'query_string': query.encode(),
+        'headers': [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+    }
+    status = 0
+    
+    async def receive() -> Dict[str, Any]:
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+    
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+    
+    await app(scope, receive, send)
+    return status
+
+class Lifespan:
+    """Старт и остановка ASGI-приложения, как у uvicorn: открывает и закрывает пулы соединений"""
+    
+    def __init__(self, app: Callable):
+        self.app = app
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.outgoing: asyncio.Queue = asyncio.Queue()
+        self.task = None
+    
+    async def __aenter__(self) -> None:
+        self.task = asyncio.create_task(self.app({'type': 'lifespan'}, self.incoming.get, self.outgoing.put))
+        await self.incoming.put({'type': 'lifespan.startup'})
+        await self.outgoing.get()
+    
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.incoming.put({'type': 'lifespan.shutdown'})
+        await self.outgoing.get()
+        await self.task
+
+async def run_asgi(requests: List[Tuple[str, str]], headers: Dict[str, str], duration: float, concurrency: int, db_connections: int, async_reads: bool) -> None:
+    """--concurrency клиентов одновременно, каждый шлет запросы подряд до конца замера"""
+    app = create_app(tuple({name for name, _ in requests}), db_connections, async_reads)
+    timings: List[float] = []
+    errors = 0
+    
+    
+    async def client(offset: int) -> None:
+        nonlocal errors
+        index = offset
+        while time.perf_counter() - started < duration:
+            name, query = requests[index % len(requests)]
+            index += 1
+            call_started = time.perf_counter()
+            if await call_app(app, name, query, headers) >= 400:
+                errors += 1
+            timings.append((time.perf_counter() - call_started) * 1000)
+    
+    async with Lifespan(app):
+        started = time.perf_counter()
+        await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    report(f"asgi {'psycopg3' if async_reads else 'threads'} x{concurrency}", timings, errors, elapsed)
+
+def run_http(url: str, requests: List[Tuple[str, str]], headers: Dict[str, str], duration: float, concurrency: int) -> None:
+    """То же по HTTP к запущенному серверу: клиенты - потоки с urllib"""
+    timings: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    started = time.perf_counter()
+    
+    def client(offset: int) -> None:
+        nonlocal errors
+        index = offset
+        while time.perf_counter() - started < duration:
+            name, query = requests[index % len(requests)]
+            index += 1
+            call_started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(f"{url.rstrip('/')}/{name}?{query}", headers=headers)) as response:
+                    response.read()
+                failed = False
+            except OSError:
+                failed = True
+            with lock:
+                errors += failed
+                timings.append((time.perf_counter() - call_started) * 1000)
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    report(f'http x{concurrency}', timings, errors, time.perf_counter() - started)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=parse_requests, default=parse_requests(DEFAULT_REQUESTS),
+                        help='список функция:строка_запроса через запятую')
+    parser.add_argument('--duration', type=float, default=20.0, help='секунд на каждый режим')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--db-connections', type=int, default=32)
+    parser.add_argument('--url', help='адрес запущенного asgi_server.py вместо вызовов в процессе')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required')
+    # Построчный JSON метрик на каждый вызов заглушил бы отчет
+    os.environ.setdefault('METRICS_LOG', 'off')
+    
+    headers = session_headers()
+    print(f"requests: {json.dumps(['/'.join(item) for item in args.requests], ensure_ascii=False)}")
+    if args.url:
+        run_http(args.url, args.requests, headers, args.duration, args.concurrency)
+        return
+    # ASGI первым: create_app задает DB_POOL_MAX до импорта обработчиков, sync использует тот же модуль
+    if async_handlers.available():
+        asyncio.run(run_asgi(args.requests, headers, args.duration, args.concurrency, args.db_connections, True))
+    else:
+        print('psycopg 3 is not installed, skipping async reads: pip install "psycopg[binary]" psycopg_pool')
+    asyncio.run(run_asgi(args.requests, headers, args.duration, args.concurrency, args.db_connections, False))
+    run_sync(args.requests, headers, args.duration)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
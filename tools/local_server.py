@@ -0,0 +1,92 @@
+'''
+Локальный сервер со всеми четырьмя функциями: /admin, /auth, /maid, /senior-cleaner (?action=... как в облаке).
+Работает на стандартной библиотеке (ThreadingHTTPServer), uvicorn не нужен; формат event и ответа тот же,
+что у asgi_server.py. Вызовы каждой функции ограничены размером ее пула соединений (--db-connections).
+С --schema все соединения обработчиков работают в этой схеме (например, с данными из generate_data.py).
+Использование: DATABASE_URL=postgres://... python tools/local_server.py [--port 8000] [--schema load_test]
+'''
+import argparse
+import json
+import os
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import ModuleType, SimpleNamespace
+from typing import Dict, Tuple
+
+from asgi_server import build_event, response_body
+from handlers import FUNCTIONS, load_function
+
+class FunctionSlot:
+    """Обработчик функции и семафор: одновременных вызовов не больше, чем соединений в пуле"""
+    
+    def __init__(self, name: str, db_connections: int):
+        self.name = name
+        self.module: ModuleType = load_function(name)
+        self.slots = threading.BoundedSemaphore(db_connections)
+    
+    def __call__(self, event: Dict) -> Dict:
+        context = SimpleNamespace(request_id=uuid.uuid4().hex, function_name=self.name)
+        with self.slots:
+            return self.module.handler(event, context)
+
+def make_request_handler(functions: Dict[str, FunctionSlot]) -> type:
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+    
+        def handle_any(self) -> None:
+            path, _, query_string = self.path.partition('?')
+            function = functions.get(path.strip('/').split('/')[0])
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            if function is None:
+                self.respond(404, {'Content-Type': 'application/json'}, json.dumps({'error': 'Unknown function'}).encode())
+                return
+            event = build_event(self.command, query_string, dict(self.headers.items()), body)
+            response = function(event)
+            self.respond(response.get('statusCode', 200), response.get('headers') or {}, response_body(response))
+    
+        def respond(self, status: int, headers: Dict[str, str], raw: bytes) -> None:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, str(value))
+            self.send_header('Content-Length', str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+    
+        do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = handle_any
+    
+        def log_message(self, format: str, *args: Tuple) -> None:
+            # Журнал доступа не нужен: строку метрик на каждый вызов пишет сам обработчик
+            pass
+    
+    return RequestHandler
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--db-connections', type=int, default=16, help='соединений с БД на функцию')
+    parser.add_argument('--schema', help='схема с данными (search_path для всех соединений обработчиков)')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL is required')
+    
+    # Окружение читается при импорте index.py, поэтому задаем его до загрузки обработчиков
+    os.environ['DB_POOL_MAX'] = str(args.db_connections)
+    if args.schema:
+        os.environ['PGOPTIONS'] = f"{os.environ.get('PGOPTIONS', '')} -c search_path={args.schema}".strip()
+    functions = {name: FunctionSlot(name, args.db_connections) for name in FUNCTIONS}
+    
+    server = ThreadingHTTPServer((args.host, args.port), make_request_handler(functions))
+    server.daemon_threads = True
+    print(f"serving {', '.join('/' + name for name in FUNCTIONS)} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
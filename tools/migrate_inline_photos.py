@@ -0,0 +1,101 @@
+'''
+Перенос фото, сохраненных в assignments.photo_before/photo_after как data URL, в хранилище фото.
+Работает пачками: каждая пачка блокирует свои строки (SKIP LOCKED) и коммитится отдельно,
+поэтому скрипт можно прервать и перезапустить, а несколько копий не мешают друг другу.
+Хранилище выбирается теми же переменными, что и в функции maid (PHOTO_STORAGE, S3_*, AWS_*).
+
+Использование: DATABASE_URL=postgres://... python tools/migrate_inline_photos.py --batch-size 50
+'''
+import argparse
+import os
+import time
+
+import psycopg2
+
+from handlers import load_function
+
+COLUMNS = (('photo_before', 'photo_before_key'), ('photo_after', 'photo_after_key'))
+
+def migrate_batch(conn, maid, after_id: int, batch_size: int, dry_run: bool) -> tuple:
+    """Переносит пачку строк с id > after_id, возвращает (последний id, строк, перенесено фото, пропущено)"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, photo_before, photo_after
+        FROM assignments
+        WHERE id > %s
+          AND ((photo_before IS NOT NULL AND photo_before_key IS NULL)
+            OR (photo_after IS NOT NULL AND photo_after_key IS NULL))
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (after_id, batch_size))
+    rows = cur.fetchall()
+    moved = 0
+    skipped = 0
+    
+    for row in rows:
+        assignment_id = row[0]
+        for (inline_column, key_column), value in zip(COLUMNS, row[1:]):
+            if not value:
+                continue
+            if not value.startswith('data:'):
+                # Не data URL (например, уже ссылка) - оставляем как есть
+                skipped += 1
+                continue
+            if dry_run:
+                moved += 1
+                continue
+            keys = maid.store_photo(value)
+            cur.execute(
+                f"""
+                UPDATE assignments
+                SET {key_column} = %s, {inline_column}_thumb_key = %s, {inline_column}_display_key = %s,
+                    {inline_column} = NULL
+                WHERE id = %s
+                """,
+                (keys['key'], keys['thumb_key'], keys['display_key'], assignment_id)
+            )
+            moved += 1
+    
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    cur.close()
+    last_id = rows[-1][0] if rows else after_id
+    return last_id, len(rows), moved, skipped
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--max-batches', type=int, default=0, help='0 - до конца')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('DATABASE_URL is required')
+    
+    maid = load_function('maid')
+    conn = psycopg2.connect(args.database_url)
+    total_rows = total_moved = total_skipped = batches = last_id = 0
+    started = time.perf_counter()
+    
+    try:
+        while True:
+            last_id, rows, moved, skipped = migrate_batch(conn, maid, last_id, args.batch_size, args.dry_run)
+            if rows == 0:
+                break
+            batches += 1
+            total_rows += rows
+            total_moved += moved
+            total_skipped += skipped
+            print(f"batch {batches}: up to id={last_id} rows={rows} moved={moved} skipped={skipped}")
+            if args.dry_run or (args.max_batches and batches >= args.max_batches):
+                break
+    finally:
+        conn.close()
+    
+    print(f"done in {time.perf_counter() - started:.1f}s: rows={total_rows} photos moved={total_moved} skipped={total_skipped}")
+
+if __name__ == '__main__':
+    main()
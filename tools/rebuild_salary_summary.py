@@ -0,0 +1,46 @@
+'''
+Пересчет сводки worker_monthly_earnings из assignments в одной транзакции.
+Нужен, если сводка разошлась с назначениями (ручные правки в БД, смена зарплаты после проверки).
+Использование: DATABASE_URL=postgres://... python tools/rebuild_salary_summary.py [--check]
+'''
+import argparse
+import os
+
+import psycopg2
+
+from handlers import load_function
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='только показать расхождения, ничего не менять')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('DATABASE_URL is required')
+    
+    admin = load_function('admin')
+    conn = psycopg2.connect(args.database_url)
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT worker_id, role, month, earned, jobs_count FROM worker_monthly_earnings')
+        before = {row[:3]: row[3:] for row in cur.fetchall()}
+        
+        cur.execute('LOCK TABLE worker_monthly_earnings IN EXCLUSIVE MODE')
+        cur.execute(admin.REBUILD_EARNINGS_SQL)
+        cur.execute('SELECT worker_id, role, month, earned, jobs_count FROM worker_monthly_earnings')
+        after = {row[:3]: row[3:] for row in cur.fetchall()}
+        
+        drift = sorted(key for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+        for key in drift:
+            print(f"{key[0]:>6} {key[1]:<15} {key[2]}  {before.get(key)} -> {after.get(key)}")
+        print(f"{len(after)} rows, {len(drift)} differed")
+        
+        if args.check:
+            conn.rollback()
+        else:
+            conn.commit()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()